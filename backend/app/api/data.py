@@ -1,88 +1,291 @@
 """
 Data Management API Endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, desc, func
 from datetime import datetime, timedelta
+from typing import Optional
+import os
 
 from app.database.init_db import get_db
-from app.models.stock_data import StockPrice
+from app.models.stock_data import StockPrice, PriceRollup
+from app.data.sync import sync_jobs, SyncQueueFull
+from app.data.rollups import ROLLUP_INTERVALS
+from app.data.bar_store import BarStore, COLUMN_DTYPES
+from app.data.indicators import INDICATOR_COLUMNS
+from app.data.metadata import symbol_metadata, METADATA_FIELDS
+from app.data.panel import refresh_universe_indicators
+from app.data.registry import list_symbols
+from app.utils.cache import cached
+from app.utils.downsample import downsample_columns
+from app.utils.pagination import keyset_page, next_cursor, set_next_cursor
+from app.utils.serialization import (
+    negotiate_format, columnar_response, columns_payload, encode_payload, payload_response
+)
+from app.utils.market_config import MarketConfig
 
 router = APIRouter()
 
+PRICE_FIELDS = ["open", "high", "low", "close", "volume", "rsi", "macd", "bb_upper", "bb_lower"]
+ROLLUP_FIELDS = ["open", "high", "low", "close", "volume", "bar_count"]
+
+def price_columns(rows, fields, timestamp_attr: str, points: Optional[int]) -> dict:
+    """Column-wise price rows, LTTB-downsampled to ``points`` when requested"""
+    columns = {"timestamp": [getattr(row, timestamp_attr) for row in rows]}
+    for field in fields:
+        columns[field] = [getattr(row, field) for row in rows]
+    
+    sum_columns = [name for name in ("volume", "bar_count") if name in fields]
+    return downsample_columns(
+        columns, points, x="timestamp", y="close",
+        max_columns=["high"], min_columns=["low"], sum_columns=sum_columns
+    )
+
 @router.get("/price/{symbol}")
+@cached("prices:{symbol}")
 async def get_stock_prices(
     symbol: str,
+    request: Request,
     days: int = 30,
+    interval: str = "1d",
+    points: Optional[int] = Query(None, ge=3),
+    format: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=100000),
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_db)
 ):
-    """Get historical stock prices"""
-    try:
+    """
+    Get historical stock prices
+    
+    ``interval`` selects raw bars (1d) or a precomputed rollup
+    (5m, 15m, 1h, 1w, 1mo); rollup rows carry OHLCV only. ``points``
+    downsamples the series (LTTB on close) for charting; each returned
+    bar's high/low/volume cover all the bars it stands for. The response
+    format is negotiated (``format`` or Accept: json, columnar, msgpack).
+    
+    With ``limit`` (or ``cursor``) the endpoint pages backwards instead of
+    using ``days``: each page holds the ``limit`` bars preceding the cursor,
+    in chronological order, and X-Next-Cursor points further back.
+    """
+    response_format = negotiate_format(request, format)
+    if interval != "1d" and interval not in ROLLUP_INTERVALS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown interval {interval}; use 1d or one of {', '.join(ROLLUP_INTERVALS)}"
+        )
+    
+    if interval != "1d":
+        model, timestamp_attr, fields = PriceRollup, "bucket_start", ROLLUP_FIELDS
+        query = select(PriceRollup).where(
+            PriceRollup.symbol == symbol.upper(), PriceRollup.interval == interval
+        )
+    else:
+        model, timestamp_attr, fields = StockPrice, "timestamp", PRICE_FIELDS
+        query = select(StockPrice).where(StockPrice.symbol == symbol.upper())
+    timestamp_column = getattr(model, timestamp_attr)
+    
+    paged = limit is not None or cursor is not None
+    if paged:
+        limit = limit or 500
+        query = keyset_page(query, timestamp_column, model.id, cursor, limit)
+    else:
         start_date = datetime.utcnow() - timedelta(days=days)
+        query = query.where(timestamp_column >= start_date).order_by(timestamp_column)
+    
+    try:
+        result = await db.execute(query)
+        rows = result.scalars().all()
+        
+        following = None
+        if paged:
+            rows, following = next_cursor(rows, limit, timestamp_attr)
+            rows = rows[::-1]
         
+        columns = price_columns(rows, fields, timestamp_attr, points)
+        return set_next_cursor(columnar_response(request, columns, response_format), following)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+BATCH_FIELDS = ["open", "high", "low", "close", "volume"] + INDICATOR_COLUMNS
+MAX_BATCH_SYMBOLS = int(os.getenv("BATCH_PRICE_MAX_SYMBOLS", "500"))
+
+@router.get("/prices")
+async def get_batch_prices(
+    request: Request,
+    symbols: str,
+    days: int = 30,
+    fields: str = "close",
+    format: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get price history for several symbols in one request
+    
+    One ``symbol IN (...)`` query on the (symbol, timestamp) index selects
+    only the requested ``fields``; the result is grouped by symbol, in the
+    order requested (symbols without bars map to an empty series).
+    """
+    response_format = negotiate_format(request, format)
+    universe = list(dict.fromkeys(s.strip().upper() for s in symbols.split(",") if s.strip()))
+    requested = list(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    if not universe:
+        raise HTTPException(status_code=400, detail="No symbols requested")
+    if len(universe) > MAX_BATCH_SYMBOLS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SYMBOLS} symbols per request")
+    unknown = [f for f in requested if f not in BATCH_FIELDS]
+    if unknown or not requested:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}; choose from {', '.join(BATCH_FIELDS)}"
+        )
+    
+    try:
+        start_date = datetime.utcnow() - timedelta(days=days)
         result = await db.execute(
-            select(StockPrice)
-            .where(
-                StockPrice.symbol == symbol.upper(),
-                StockPrice.timestamp >= start_date
-            )
-            .order_by(StockPrice.timestamp)
+            select(StockPrice.symbol, StockPrice.timestamp, *(getattr(StockPrice, f) for f in requested))
+            .where(StockPrice.symbol.in_(universe), StockPrice.timestamp >= start_date)
+            .order_by(StockPrice.symbol, StockPrice.timestamp)
         )
-        prices = result.scalars().all()
         
-        return [
-            {
-                "timestamp": price.timestamp.isoformat(),
-                "open": price.open,
-                "high": price.high,
-                "low": price.low,
-                "close": price.close,
-                "volume": price.volume,
-                "rsi": price.rsi,
-                "macd": price.macd,
-                "bb_upper": price.bb_upper,
-                "bb_lower": price.bb_lower
+        grouped = {symbol: {"timestamp": [], **{f: [] for f in requested}} for symbol in universe}
+        for row in result.all():
+            series = grouped[row[0]]
+            series["timestamp"].append(row[1])
+            for field, value in zip(requested, row[2:]):
+                series[field].append(value)
+        
+        payload = {
+            "days": days,
+            "fields": requested,
+            "prices": {
+                symbol: columns_payload(columns, response_format)
+                for symbol, columns in grouped.items()
             }
-            for price in prices
+        }
+        return payload_response(request, encode_payload(payload, response_format), response_format)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/bars/{symbol}")
+async def get_stored_bars(
+    symbol: str,
+    days: int = 30,
+    columns: str = "open,high,low,close,volume"
+):
+    """Get bars from the columnar bar store (memory-mapped, no database query)"""
+    requested = [c.strip() for c in columns.split(",") if c.strip()]
+    unknown = [c for c in requested if c not in COLUMN_DTYPES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown columns: {', '.join(unknown)}")
+    
+    try:
+        start_date = datetime.utcnow() - timedelta(days=days)
+        data = BarStore().read(symbol.upper(), requested, start=start_date)
+        
+        timestamps = data.pop("timestamp").astype("datetime64[ns]").astype("datetime64[us]").tolist()
+        # NaN (indicator warm-up) is not valid JSON
+        values = {
+            name: [None if v != v else v for v in array.tolist()]
+            for name, array in data.items()
+        }
+        
+        return [
+            {"timestamp": ts.isoformat(), **{name: values[name][i] for name in values}}
+            for i, ts in enumerate(timestamps)
         ]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/sync/{symbol}")
-async def sync_stock_data(symbol: str):
-    """Trigger data synchronization for a symbol"""
+async def sync_stock_data(symbol: str, background_tasks: BackgroundTasks):
+    """Start a background incremental sync for a symbol"""
     try:
-        # This would trigger the data collection process
+        job = sync_jobs.create(symbol.upper())
+        background_tasks.add_task(sync_jobs.run, job["job_id"])
+        
         return {
             "status": "sync_started",
-            "symbol": symbol.upper(),
+            "symbol": job["symbol"],
+            "job_id": job["job_id"],
             "message": "Data synchronization initiated"
         }
+    except SyncQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/sync/jobs/{job_id}")
+async def get_sync_status(job_id: str):
+    """Get progress of a sync job: rows added, bytes fetched and elapsed time"""
+    job = sync_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown sync job {job_id}")
+    return job
+
 @router.get("/symbols")
 async def get_available_symbols(db: AsyncSession = Depends(get_db)):
-    """Get list of available symbols"""
+    """Get stored symbols with bar coverage (from the symbol registry) and cached metadata"""
     try:
-        import os
-        
-        result = await db.execute(
-            select(StockPrice.symbol)
-            .distinct()
-        )
-        symbols = result.scalars().all()
+        coverage = await list_symbols(db)
+        symbols = [entry["symbol"] for entry in coverage]
         
         # Default to Indian NSE stocks if none in database
         default_symbols = os.getenv("DEFAULT_STOCKS", 
             "RELIANCE.NS,TCS.NS,HDFCBANK.NS,INFY.NS,HINDUNILVR.NS,ICICIBANK.NS,BHARTIARTL.NS,ITC.NS,SBIN.NS,KOTAKBANK.NS"
         ).split(",")
+        symbols = list(symbols) if symbols else default_symbols
+        
+        metadata = await symbol_metadata.get_many(db, symbols)
         
         return {
-            "symbols": list(symbols) if symbols else default_symbols,
+            "symbols": symbols,
+            "coverage": {
+                entry["symbol"]: {
+                    "first_timestamp": entry["first_timestamp"].isoformat(),
+                    "last_timestamp": entry["last_timestamp"].isoformat(),
+                    "bar_count": entry["bar_count"]
+                }
+                for entry in coverage
+            },
+            "metadata": {
+                symbol: {field: entry[field] for field in METADATA_FIELDS}
+                for symbol, entry in metadata.items()
+            },
             "exchange": os.getenv("STOCK_EXCHANGE", "NSE"),
             "currency": os.getenv("CURRENCY", "INR")
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/symbols/metadata/refresh")
+async def refresh_symbol_metadata(
+    symbols: str = None,
+    force: bool = False,
+    db: AsyncSession = Depends(get_db)
+):
+    """Refetch provider metadata for expired (or all, with force) symbols"""
+    try:
+        universe = symbols.split(",") if symbols else MarketConfig.get_default_stocks()
+        refreshed = await symbol_metadata.refresh(
+            db, [s.strip().upper() for s in universe], sync_jobs.collector.provider, force=force
+        )
+        return {"refreshed": refreshed, "requested": len(universe)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/indicators/refresh")
+async def refresh_indicators(symbols: str = None, db: AsyncSession = Depends(get_db)):
+    """
+    Recompute the stored indicator columns from stored closes
+    
+    Runs one vectorized panel pass over the given symbols (every stored
+    symbol by default) and writes the results back to stock_prices, e.g.
+    after a bulk backfill or a change to the indicator definitions.
+    """
+    try:
+        universe = [s.strip().upper() for s in symbols.split(",") if s.strip()] if symbols else None
+        updated = await refresh_universe_indicators(db, universe)
+        return {"updated": updated, "symbols": universe}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -4,6 +4,8 @@ Health Check Endpoints
 from fastapi import APIRouter
 from datetime import datetime
 
+from app.utils.cache import response_cache
+
 router = APIRouter()
 
 @router.get("/health")
@@ -25,3 +27,8 @@ async def system_status():
         "trading_engine": "active",
         "timestamp": datetime.utcnow().isoformat()
     }
+
+@router.get("/cache/stats")
+async def cache_stats():
+    """Response cache hit/miss counters"""
+    return response_cache.get_stats()
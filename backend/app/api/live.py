@@ -0,0 +1,73 @@
+"""
+Live WebSocket Feed
+
+``/ws`` streams prices, signals, positions and metrics updates. Clients
+send JSON control messages::
+
+    {"action": "subscribe", "topics": ["prices:RELIANCE.NS", "signals"]}
+    {"action": "unsubscribe", "topics": ["signals"]}
+
+and receive ``{"topic": ..., "data": ..., "ts": ...}`` frames. The slow
+client policy can be chosen per connection with ``/ws?policy=drop``.
+Initial state comes from the REST endpoints; the feed carries deltas.
+"""
+import asyncio
+import json
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from loguru import logger
+
+from app.utils.broadcast import live_feed, normalize_topic, POLICIES
+
+router = APIRouter()
+
+@router.websocket("/ws")
+async def live_updates(websocket: WebSocket, policy: str = None):
+    """Subscribe to live topics over a WebSocket"""
+    if policy is not None and policy not in POLICIES:
+        await websocket.close(code=1008, reason=f"Unknown policy {policy}")
+        return
+
+    await websocket.accept()
+    subscriber = live_feed.connect(policy)
+    sender = asyncio.create_task(live_feed.pump(subscriber, websocket.send_text))
+
+    try:
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+                action = message["action"]
+                requested = list(message.get("topics", []))
+            except (ValueError, KeyError, TypeError):
+                await websocket.send_json({"error": "Expected {\"action\": ..., \"topics\": [...]}"})
+                continue
+
+            topics = [normalize_topic(t) for t in requested]
+            invalid = [t for t, normalized in zip(requested, topics) if normalized is None]
+            if invalid:
+                await websocket.send_json({"error": f"Unknown topics: {invalid}"})
+                continue
+
+            if action == "subscribe":
+                for topic in topics:
+                    live_feed.subscribe(subscriber, topic)
+            elif action == "unsubscribe":
+                for topic in topics:
+                    live_feed.unsubscribe(subscriber, topic)
+            else:
+                await websocket.send_json({"error": f"Unknown action {action}"})
+                continue
+
+            await websocket.send_json({"subscribed": sorted(subscriber.topics)})
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.warning(f"Live feed connection closed: {e}")
+    finally:
+        sender.cancel()
+        live_feed.disconnect(subscriber)
+
+@router.get("/api/live/stats")
+async def live_stats():
+    """Live feed connection, fan-out and slow-client counters"""
+    return live_feed.get_stats()
@@ -3,11 +3,14 @@ Machine Learning API Endpoints
 """
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc
-from typing import List
+from sqlalchemy import select, desc, func
+from sqlalchemy.orm import aliased
+from typing import List, Optional
 
 from app.database.init_db import get_db
 from app.models.stock_data import MLPrediction
+from app.utils.cache import cached
+from app.utils.market_config import MarketConfig
 
 router = APIRouter()
 
@@ -44,30 +47,50 @@ async def get_predictions(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/signals")
-async def get_trading_signals(db: AsyncSession = Depends(get_db)):
-    """Get current trading signals from ML models"""
+@cached("signals")
+async def get_trading_signals(
+    symbols: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get current trading signals from ML models
+    
+    Returns the latest prediction for each symbol in ``symbols``
+    (comma-separated) or, by default, the configured universe, using a
+    single window-function query.
+    """
     try:
-        # Get latest predictions for all symbols
-        symbols = ["AAPL", "GOOGL", "MSFT", "TSLA", "AMZN"]
-        signals = []
+        if symbols:
+            universe = [s.strip().upper() for s in symbols.split(",") if s.strip()]
+        else:
+            universe = MarketConfig.get_default_stocks()
         
-        for symbol in symbols:
-            result = await db.execute(
-                select(MLPrediction)
-                .where(MLPrediction.symbol == symbol)
-                .order_by(desc(MLPrediction.timestamp))
-                .limit(1)
+        latest = (
+            select(
+                MLPrediction,
+                func.row_number().over(
+                    partition_by=MLPrediction.symbol,
+                    order_by=(desc(MLPrediction.timestamp), desc(MLPrediction.id))
+                ).label("rank")
             )
-            pred = result.scalar_one_or_none()
-            
-            if pred:
-                signals.append({
-                    "symbol": pred.symbol,
-                    "signal": pred.predicted_direction,
-                    "confidence": pred.confidence,
-                    "model": pred.model_name,
-                    "timestamp": pred.timestamp.isoformat()
-                })
+            .where(MLPrediction.symbol.in_(universe))
+            .subquery()
+        )
+        prediction = aliased(MLPrediction, latest)
+        result = await db.execute(select(prediction).where(latest.c.rank == 1))
+        by_symbol = {pred.symbol: pred for pred in result.scalars().all()}
+        
+        signals = [
+            {
+                "symbol": pred.symbol,
+                "signal": pred.predicted_direction,
+                "confidence": pred.confidence,
+                "model": pred.model_name,
+                "timestamp": pred.timestamp.isoformat()
+            }
+            for pred in (by_symbol.get(symbol) for symbol in universe)
+            if pred is not None
+        ]
         
         return {"signals": signals}
     except Exception as e:
@@ -1,79 +1,110 @@
 """
 Portfolio Management API Endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, desc
-from typing import List
+from typing import List, Optional
 from datetime import datetime, timedelta
+import os
+import time
+import numpy as np
+import pandas as pd
 
 from app.database.init_db import get_db
-from app.models.portfolio import Position, PortfolioSnapshot
+from app.models.portfolio import PortfolioSnapshot
+from app.models.stock_data import StockPrice
+from app.trading.mark_to_market import mark_to_market, VALUATION_FIELDS
+from app.trading.optimizer import covariance_tracker, optimize, risk_contributions, OPTIMIZER_METHODS
+from app.trading.var import var_engine, VAR_METHODS
+from app.trading.snapshots import choose_tier, equity_history
+from app.trading.analytics import risk_accumulator, align_benchmark, rolling_beta, simple_returns
+from app.utils.cache import cached
+from app.utils.downsample import downsample_columns
+from app.utils.serialization import negotiate_format, columnar_response
+from app.utils.market_config import MarketConfig
 
 router = APIRouter()
 
 @router.get("/positions")
 async def get_positions(db: AsyncSession = Depends(get_db)):
-    """Get current portfolio positions"""
+    """
+    Get current portfolio positions
+    
+    Valued at the latest ingested price for each symbol (the stored price
+    if none has arrived since startup).
+    """
     try:
-        result = await db.execute(select(Position))
-        positions = result.scalars().all()
+        await mark_to_market.ensure_loaded(db)
+        values = mark_to_market.valuation()
+        columns = {field: values[field].tolist() for field in VALUATION_FIELDS}
         
         return [
             {
-                "symbol": pos.symbol,
-                "quantity": pos.quantity,
-                "avg_entry_price": pos.avg_entry_price,
-                "current_price": pos.current_price,
-                "unrealized_pnl": pos.unrealized_pnl,
-                "unrealized_pnl_percent": pos.unrealized_pnl_percent,
-                "market_value": pos.quantity * pos.current_price,
-                "stop_loss": pos.stop_loss,
-                "take_profit": pos.take_profit
+                "symbol": symbol,
+                "quantity": int(columns["quantity"][i]),
+                "avg_entry_price": columns["avg_entry_price"][i],
+                "current_price": columns["current_price"][i],
+                "unrealized_pnl": columns["unrealized_pnl"][i],
+                "unrealized_pnl_percent": columns["unrealized_pnl_percent"][i],
+                "market_value": columns["market_value"][i],
+                "stop_loss": mark_to_market.stop_loss[i],
+                "take_profit": mark_to_market.take_profit[i]
             }
-            for pos in positions
+            for i, symbol in enumerate(values["symbol"])
         ]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+SNAPSHOT_FIELDS = [
+    "total_value", "cash_balance", "positions_value",
+    "total_pnl", "total_pnl_percent", "daily_return"
+]
+
 @router.get("/performance")
+@cached("portfolio")
 async def get_performance(
+    request: Request,
     days: int = 30,
+    points: Optional[int] = Query(None, ge=3),
+    format: Optional[str] = None,
     db: AsyncSession = Depends(get_db)
 ):
-    """Get portfolio performance history"""
+    """
+    Get portfolio performance history
+    
+    The retention tier is chosen from ``days``: raw snapshots for the raw
+    retention window, hourly rollups up to the hourly retention, daily
+    beyond (reported in the ``X-Snapshot-Resolution`` header). ``points``
+    downsamples the history (LTTB on total_value) for charting. The
+    response format is negotiated (``format`` or Accept: json, columnar,
+    msgpack).
+    """
+    response_format = negotiate_format(request, format)
     try:
         start_date = datetime.utcnow() - timedelta(days=days)
+        tier = choose_tier(days)
+        history = await equity_history(db, start_date, tier)
         
-        result = await db.execute(
-            select(PortfolioSnapshot)
-            .where(PortfolioSnapshot.timestamp >= start_date)
-            .order_by(PortfolioSnapshot.timestamp)
-        )
-        snapshots = result.scalars().all()
-        
-        return {
-            "history": [
-                {
-                    "timestamp": snap.timestamp.isoformat(),
-                    "total_value": snap.total_value,
-                    "cash_balance": snap.cash_balance,
-                    "positions_value": snap.positions_value,
-                    "total_pnl": snap.total_pnl,
-                    "total_pnl_percent": snap.total_pnl_percent,
-                    "daily_return": snap.daily_return
-                }
-                for snap in snapshots
-            ]
+        columns = {
+            "timestamp": list(pd.DatetimeIndex(history.index).to_pydatetime()),
+            "total_value": history["close"].tolist(),
         }
+        for field in SNAPSHOT_FIELDS[1:]:
+            columns[field] = [None if pd.isna(v) else v for v in history[field].tolist()]
+        columns = downsample_columns(columns, points, x="timestamp", y="total_value")
+        
+        response = columnar_response(request, columns, response_format, envelope="history")
+        response.headers["X-Snapshot-Resolution"] = tier
+        return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/metrics")
+@cached("portfolio")
 async def get_portfolio_metrics(db: AsyncSession = Depends(get_db)):
     """Get current portfolio metrics"""
     try:
-        import os
         currency = os.getenv("CURRENCY", "INR")
         currency_symbol = os.getenv("CURRENCY_SYMBOL", "₹")
         initial_capital = float(os.getenv("INITIAL_CAPITAL", "1000000"))
@@ -109,3 +140,163 @@ async def get_portfolio_metrics(db: AsyncSession = Depends(get_db)):
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/risk")
+@cached("portfolio")
+async def get_risk_metrics(
+    windows: str = "20,60,252",
+    beta_window: int = Query(60, ge=2),
+    benchmark: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get portfolio risk analytics
+    
+    Full-history metrics come from the running accumulator; ``windows``
+    (snapshot counts) select trailing-window metrics, each with beta against
+    ``benchmark`` (default index for the exchange). ``rolling_beta`` covers
+    the retained history.
+    """
+    try:
+        sizes = sorted({int(w) for w in windows.split(",") if w.strip()})
+    except ValueError:
+        raise HTTPException(status_code=400, detail="windows must be comma-separated integers")
+    limit = risk_accumulator.history_size - 1
+    if any(size < 2 or size > limit for size in sizes) or beta_window > limit:
+        raise HTTPException(status_code=400, detail=f"Windows must be between 2 and {limit} snapshots")
+    benchmark = (benchmark or MarketConfig.get_benchmark_symbol()).upper()
+    
+    try:
+        await risk_accumulator.ensure_loaded(db)
+        timestamps = list(risk_accumulator.timestamps)
+        
+        bench_closes = align_benchmark(timestamps, [], [])
+        if timestamps:
+            result = await db.execute(
+                select(StockPrice.timestamp, StockPrice.close)
+                .where(
+                    StockPrice.symbol == benchmark,
+                    StockPrice.timestamp >= timestamps[0] - timedelta(days=7),
+                    StockPrice.timestamp <= timestamps[-1]
+                )
+                .order_by(StockPrice.timestamp)
+            )
+            rows = result.all()
+            bench_closes = align_benchmark(timestamps, [r[0] for r in rows], [r[1] for r in rows])
+        
+        window_metrics = {
+            str(size): risk_accumulator.window(size, bench_closes[-(size + 1):])
+            for size in sizes
+        }
+        betas = rolling_beta(
+            simple_returns(risk_accumulator.recent(limit)), simple_returns(bench_closes), beta_window
+        )
+        
+        return {
+            "as_of": timestamps[-1] if timestamps else None,
+            "benchmark": benchmark,
+            "periods_per_year": risk_accumulator.periods_per_year,
+            "risk_free_rate": risk_accumulator.risk_free_rate,
+            "overall": risk_accumulator.overall(),
+            "windows": window_metrics,
+            "rolling_beta": {
+                "window": beta_window,
+                "timestamp": timestamps[1:],
+                "beta": [float(b) if b == b else None for b in betas],
+            }
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/var")
+async def get_value_at_risk(
+    method: str = "historical",
+    confidence: float = Query(0.95, gt=0.5, lt=1.0),
+    horizon: int = Query(1, ge=1, le=250),
+    lookback: int = Query(365, ge=30),
+    paths: int = Query(100_000, ge=1000, le=5_000_000),
+    seed: Optional[int] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get Value-at-Risk and Expected Shortfall (CVaR) of current positions
+    
+    ``method`` is historical, parametric or monte_carlo; ``horizon`` is in
+    days and ``lookback`` the return history in calendar days. ``seed``
+    makes Monte Carlo runs reproducible. Losses are positive amounts in the
+    portfolio currency.
+    """
+    if method not in VAR_METHODS:
+        raise HTTPException(status_code=400, detail=f"method must be one of {', '.join(VAR_METHODS)}")
+    
+    try:
+        await mark_to_market.ensure_loaded(db)
+        values = mark_to_market.valuation()
+        return await var_engine.compute(
+            db, values["symbol"], values["quantity"], values["current_price"],
+            method=method, confidence=confidence, horizon=horizon,
+            lookback_days=lookback, paths=paths, seed=seed
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/optimize")
+async def get_target_weights(
+    method: str = "min_variance",
+    symbols: Optional[str] = None,
+    risk_aversion: float = Query(5.0, gt=0),
+    max_weight: float = Query(1.0, gt=0, le=1.0),
+    capital: Optional[float] = Query(None, gt=0),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get target portfolio weights
+    
+    ``method`` is min_variance, mean_variance or risk_parity, solved over
+    the EWMA covariance of ``symbols`` (default universe when omitted).
+    ``capital`` (default INITIAL_CAPITAL) is split by weight into
+    allocations. Symbols without return history are reported as missing.
+    """
+    if method not in OPTIMIZER_METHODS:
+        raise HTTPException(status_code=400, detail=f"method must be one of {', '.join(OPTIMIZER_METHODS)}")
+    universe = (
+        [s.strip().upper() for s in symbols.split(",") if s.strip()]
+        if symbols else MarketConfig.get_default_stocks()
+    )
+    capital = capital or float(os.getenv("INITIAL_CAPITAL", "1000000"))
+    
+    try:
+        estimator = await covariance_tracker.refresh(db, universe)
+        estimates = estimator.estimates()
+        valid = np.flatnonzero(np.diag(estimates["cov"]) > 0)
+        covered = [estimator.symbols[i] for i in valid]
+        response = {
+            "method": method,
+            "as_of": estimator.last_timestamp,
+            "observations": estimator.observations,
+            "missing": [s for s in estimator.symbols if s not in covered],
+            "weights": {},
+        }
+        if not covered:
+            return response
+        
+        mean = estimates["mean"][valid]
+        cov = estimates["cov"][np.ix_(valid, valid)]
+        # A cap below 1/n cannot be fully invested; fall back to equal weight
+        cap = max(max_weight, 1.0 / len(covered))
+        started = time.perf_counter()
+        weights = optimize(method, mean, cov, risk_aversion, cap)
+        solve_ms = (time.perf_counter() - started) * 1000
+        
+        contributions = risk_contributions(weights, cov)
+        response.update({
+            "weights": dict(zip(covered, weights.tolist())),
+            "allocations": dict(zip(covered, (weights * capital).tolist())),
+            "risk_contributions": dict(zip(covered, contributions.tolist())),
+            "expected_return": float(mean @ weights),
+            "volatility": float(np.sqrt(max(weights @ cov @ weights, 0.0))),
+            "solve_ms": solve_ms,
+        })
+        return response
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
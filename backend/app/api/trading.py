@@ -1,24 +1,60 @@
 """
 Trading API Endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, desc
-from typing import List
-from datetime import datetime
+from typing import Dict, List, Optional
+from datetime import datetime, timedelta
+import asyncio
+import secrets
+import uuid
 
 from app.database.init_db import get_db
 from app.models.trades import Trade, Order, OrderSide, OrderType, OrderStatus
-from pydantic import BaseModel
+from app.trading.backtest import Backtester, load_bar_panel, warmup_start, BAR_FIELDS, STRATEGIES
+from app.trading.order_book import order_book, RestingOrder
+from app.trading.sweep import (
+    sweep_runner, grid, random_samples, walk_forward_splits, rank_results, walk_forward_report,
+    config_key, check_config, load_sweep, save_sweep, SWEEP_METRICS
+)
+from app.utils.market_config import MarketConfig
+from app.utils.pagination import keyset_page, next_cursor, set_next_cursor
+from app.utils.serialization import negotiate_format, columnar_response
+from pydantic import BaseModel, Field
 
 router = APIRouter()
 
 class OrderRequest(BaseModel):
     symbol: str
     side: str
-    quantity: int
+    quantity: int = Field(gt=0)
     order_type: str = "MARKET"
-    price: float = None
+    price: Optional[float] = Field(None, gt=0)
+
+class WalkForward(BaseModel):
+    train: int
+    test: int
+    step: Optional[int] = None
+    anchored: bool = False
+
+class SweepRequest(BaseModel):
+    strategy: str = "sma_crossover"
+    space: Dict
+    mode: str = "grid"  # grid, random, bayesian
+    samples: int = 50
+    rounds: int = 5
+    seed: Optional[int] = None
+    metric: str = "sharpe"
+    symbols: Optional[List[str]] = None
+    days: int = 730
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    walk_forward: Optional[WalkForward] = None
+    initial_capital: Optional[float] = None
+    commission_rate: Optional[float] = None
+    vectorized: bool = True
+    sweep_id: Optional[str] = None
 
 class TradeResponse(BaseModel):
     id: int
@@ -26,7 +62,7 @@ class TradeResponse(BaseModel):
     side: str
     quantity: int
     price: float
-    pnl: float = None
+    pnl: Optional[float] = None
     timestamp: datetime
 
 @router.post("/orders")
@@ -34,11 +70,22 @@ async def create_order(
     order_req: OrderRequest,
     db: AsyncSession = Depends(get_db)
 ):
-    """Create a new trading order"""
+    """
+    Create a new trading order
+    
+    The order rests in the order book as PENDING: MARKET orders fill at the
+    next price (immediately if the symbol already has one), LIMIT and
+    STOP_LOSS orders when a price crosses ``price``. Fills are written back
+    to the order in batches.
+    """
     try:
+        order_type = OrderType[order_req.order_type]
+        if order_type != OrderType.MARKET and order_req.price is None:
+            raise ValueError(f"{order_type.value} orders need a price")
+        
         order = Order(
             symbol=order_req.symbol.upper(),
-            order_type=OrderType[order_req.order_type],
+            order_type=order_type,
             side=OrderSide[order_req.side],
             quantity=order_req.quantity,
             price=order_req.price,
@@ -48,58 +95,106 @@ async def create_order(
         db.add(order)
         await db.commit()
         await db.refresh(order)
-        
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    fill = None
+    if order_book.engine is not None:
+        fill = order_book.add(RestingOrder(
+            order.id, order.symbol, order.side, order.order_type, order.quantity, order.price
+        ))
+    
+    if fill is None:
         return {
             "order_id": order.id,
             "status": order.status.value,
             "message": "Order created successfully"
         }
+    status = OrderStatus.FILLED if fill["status"] == "filled" else OrderStatus.REJECTED
+    return {
+        "order_id": order.id,
+        "status": status.value,
+        "filled_price": fill["price"] if status == OrderStatus.FILLED else None,
+        "message": "Order filled" if status == OrderStatus.FILLED else f"Order rejected: {fill.get('reason')}"
+    }
+
+@router.delete("/orders/{order_id}")
+async def cancel_order(order_id: int, db: AsyncSession = Depends(get_db)):
+    """Cancel a PENDING order"""
+    try:
+        order = await db.get(Order, order_id)
     except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+    if order is None:
+        raise HTTPException(status_code=404, detail=f"Order {order_id} not found")
+    # A fill may be buffered but not yet written; the book is authoritative
+    if order.status != OrderStatus.PENDING or (order_book.engine is not None and not order_book.cancel(order_id)):
+        raise HTTPException(status_code=400, detail=f"Order {order_id} is not pending")
+    
+    order.status = OrderStatus.CANCELLED
+    await db.commit()
+    return {"order_id": order_id, "status": order.status.value}
+
+@router.get("/orderbook")
+async def get_order_book_stats():
+    """Resting order counts and fill statistics of the order book"""
+    return order_book.get_stats()
 
 @router.get("/trades", response_model=List[TradeResponse])
 async def get_trades(
-    limit: int = 50,
+    request: Request,
+    limit: int = Query(50, ge=1, le=5000),
+    cursor: Optional[str] = None,
+    format: Optional[str] = None,
     db: AsyncSession = Depends(get_db)
 ):
-    """Get recent trade history"""
+    """
+    Get trade history, newest first
+    
+    Rows have the TradeResponse shape; the response format is negotiated
+    (``format`` or Accept: json, columnar, msgpack). Pass the
+    X-Next-Cursor header of a page as ``cursor`` to fetch the next one.
+    """
+    response_format = negotiate_format(request, format)
+    query = keyset_page(select(Trade), Trade.timestamp, Trade.id, cursor, limit)
     try:
-        result = await db.execute(
-            select(Trade)
-            .order_by(desc(Trade.timestamp))
-            .limit(limit)
-        )
-        trades = result.scalars().all()
+        result = await db.execute(query)
+        trades, following = next_cursor(result.scalars().all(), limit)
         
-        return [
-            TradeResponse(
-                id=trade.id,
-                symbol=trade.symbol,
-                side=trade.side.value,
-                quantity=trade.quantity,
-                price=trade.price,
-                pnl=trade.pnl,
-                timestamp=trade.timestamp
-            )
-            for trade in trades
-        ]
+        columns = {
+            "id": [trade.id for trade in trades],
+            "symbol": [trade.symbol for trade in trades],
+            "side": [trade.side.value for trade in trades],
+            "quantity": [trade.quantity for trade in trades],
+            "price": [trade.price for trade in trades],
+            "pnl": [trade.pnl for trade in trades],
+            "timestamp": [trade.timestamp for trade in trades],
+        }
+        return set_next_cursor(columnar_response(request, columns, response_format), following)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/orders")
 async def get_orders(
+    response: Response,
     status: str = None,
+    limit: int = Query(50, ge=1, le=5000),
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_db)
 ):
-    """Get order history"""
+    """
+    Get order history, newest first
+    
+    Pass the X-Next-Cursor header of a page as ``cursor`` to fetch the next one.
+    """
+    query = keyset_page(select(Order), Order.created_at, Order.id, cursor, limit)
     try:
-        query = select(Order).order_by(desc(Order.created_at))
-        
         if status:
             query = query.where(Order.status == OrderStatus[status])
         
-        result = await db.execute(query.limit(50))
-        orders = result.scalars().all()
+        result = await db.execute(query)
+        orders, following = next_cursor(result.scalars().all(), limit, "created_at")
+        set_next_cursor(response, following)
         
         return [
             {
@@ -109,9 +204,213 @@ async def get_orders(
                 "quantity": order.quantity,
                 "price": order.price,
                 "status": order.status.value,
+                "filled_quantity": order.filled_quantity,
+                "filled_price": order.filled_price,
                 "created_at": order.created_at.isoformat()
             }
             for order in orders
         ]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/backtest")
+async def run_backtest(
+    strategy: str = "sma_crossover",
+    symbols: Optional[str] = None,
+    days: int = Query(730, ge=30),
+    allocation: float = Query(0.05, gt=0, le=1.0),
+    initial_capital: Optional[float] = Query(None, gt=0),
+    commission_rate: Optional[float] = Query(None, ge=0, lt=0.1),
+    vectorized: bool = False,
+    max_trades: int = Query(1000, ge=0),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Backtest a built-in strategy over stored bars
+    
+    ``strategy`` is sma_crossover or rsi_reversion, replayed over the last
+    ``days`` of ``symbols`` (default universe when omitted). Returns the
+    equity curve, the latest ``max_trades`` trades and summary stats.
+    ``vectorized`` evaluates the signals over the whole panel at once
+    instead of bar by bar.
+    """
+    if strategy not in STRATEGIES:
+        raise HTTPException(status_code=400, detail=f"strategy must be one of {', '.join(STRATEGIES)}")
+    universe = (
+        [s.strip().upper() for s in symbols.split(",") if s.strip()]
+        if symbols else MarketConfig.get_default_stocks()
+    )
+    
+    try:
+        model = STRATEGIES[strategy](allocation=allocation)
+        panel = await load_bar_panel(
+            db, universe, start=datetime.utcnow() - timedelta(days=days),
+            fields=[name for name in model.fields if name in BAR_FIELDS]
+        )
+        backtester = Backtester(initial_capital, commission_rate)
+        run = backtester.run_vectorized if vectorized else backtester.run
+        result = await asyncio.to_thread(run, panel, model)
+        return {"strategy": strategy, "vectorized": vectorized, **result.to_dict(max_trades)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/sweeps")
+async def start_sweep(sweep: SweepRequest, db: AsyncSession = Depends(get_db)):
+    """
+    Start a parameter sweep in the background
+    
+    ``space`` maps strategy parameters to a list of values or a
+    ``{"low", "high"}`` range (random and bayesian modes). With
+    ``walk_forward`` every parameter set is scored on rolling train/test
+    windows of bars. Bars from ``start`` (default ``days`` before ``end``)
+    to ``end`` (default now) are scored; earlier bars are loaded as
+    indicator warm-up. A new sweep stores its window, seed (drawn if not
+    given) and random samples. Posting again with an existing ``sweep_id``
+    resumes it on that stored window and samples, skipping stored results,
+    as long as the data, splits and costs are unchanged.
+    """
+    if sweep.strategy not in STRATEGIES:
+        raise HTTPException(status_code=400, detail=f"strategy must be one of {', '.join(STRATEGIES)}")
+    if sweep.metric not in SWEEP_METRICS:
+        raise HTTPException(status_code=400, detail=f"metric must be one of {', '.join(SWEEP_METRICS)}")
+    if sweep.mode not in ("grid", "random", "bayesian"):
+        raise HTTPException(status_code=400, detail="mode must be grid, random or bayesian")
+    sweep_id = sweep.sweep_id or uuid.uuid4().hex
+    if sweep_runner.running(sweep_id):
+        raise HTTPException(status_code=400, detail=f"Sweep {sweep_id} is already running")
+    
+    # Stored bars are naive wall time; aware request values keep their wall time
+    requested = {
+        name: value.replace(tzinfo=None) if value is not None else None
+        for name, value in (("start", sweep.start), ("end", sweep.end))
+    }
+    stored = await load_sweep(db, sweep_id)
+    if stored is not None:
+        if stored["mode"] != sweep.mode or any(
+            value is not None and value != stored[name] for name, value in requested.items()
+        ):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Sweep {sweep_id} is a {stored['mode']} sweep of {stored['start'].isoformat()} "
+                       f"to {stored['end'].isoformat()}; start a new sweep_id for another mode or window"
+            )
+        scored_from, scored_to, seed = stored["start"], stored["end"], stored["seed"]
+    else:
+        scored_to = requested["end"] or datetime.utcnow()
+        scored_from = requested["start"] or scored_to - timedelta(days=sweep.days)
+        seed = sweep.seed if sweep.seed is not None else secrets.randbits(31)
+        if scored_from >= scored_to:
+            raise HTTPException(status_code=400, detail="start must be before end")
+    
+    try:
+        if sweep.mode == "grid":
+            samples = grid(sweep.space)
+        elif stored is not None and stored["samples"] is not None:
+            samples = stored["samples"]
+        else:
+            samples = random_samples(sweep.space, sweep.samples, seed)
+    except (KeyError, TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid space: {e}")
+    fields, warmup, error = set(), 0, None
+    for params in samples:
+        try:
+            model = STRATEGIES[sweep.strategy](**params)
+        except (TypeError, ValueError) as e:
+            error = e
+            continue
+        fields.update(model.fields)
+        warmup = max(warmup, model.warmup)
+    if not fields:
+        raise HTTPException(status_code=400, detail=f"No valid parameter sets: {error}")
+    
+    universe = [s.upper() for s in sweep.symbols] if sweep.symbols else MarketConfig.get_default_stocks()
+    try:
+        panel = await load_bar_panel(
+            db, universe, start=warmup_start(scored_from, warmup), end=scored_to,
+            fields=[name for name in BAR_FIELDS if name in fields or name == "close"]
+        )
+        start = int(panel.timestamps.searchsorted(scored_from))
+        if start >= len(panel.timestamps):
+            raise HTTPException(
+                status_code=400,
+                detail=f"No bars between {scored_from.isoformat()} and {scored_to.isoformat()}"
+            )
+        splits = None
+        if sweep.walk_forward is not None:
+            wf = sweep.walk_forward
+            splits = walk_forward_splits(len(panel.timestamps), wf.train, wf.test, wf.step, wf.anchored, start)
+            if not splits:
+                raise HTTPException(status_code=400, detail="Not enough bars for one walk-forward split")
+        
+        options = {
+            "initial_capital": sweep.initial_capital, "commission_rate": sweep.commission_rate,
+            "vectorized": sweep.vectorized, "start": start,
+        }
+        key = config_key(
+            panel, sweep.strategy, start, splits, sweep.initial_capital, sweep.commission_rate, sweep.vectorized
+        )
+        try:
+            await check_config(db, sweep_id, key)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        await save_sweep(
+            db, sweep_id, sweep.strategy, sweep.mode, scored_from, scored_to, seed,
+            samples if sweep.mode == "random" else None, key
+        )
+        if sweep.mode == "bayesian":
+            job = sweep_runner.run_bayesian(
+                sweep_id, panel, sweep.strategy, sweep.space, sweep.rounds, sweep.samples,
+                sweep.metric, splits, seed, **options
+            )
+        else:
+            job = sweep_runner.run(sweep_id, panel, sweep.strategy, samples, splits, **options)
+        sweep_runner.start(sweep_id, job)
+        return {
+            "sweep_id": sweep_id, "status": "running", "bars": int(panel.mask[start:].sum()),
+            "warmup_bars": int(panel.mask[:start].sum()), "splits": len(splits or []),
+            "start": scored_from.isoformat(), "end": scored_to.isoformat(), "seed": seed,
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/sweeps/{sweep_id}")
+async def get_sweep(
+    sweep_id: str,
+    metric: str = "sharpe",
+    limit: int = Query(20, ge=1, le=1000),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Progress, stored window and seed, and ranked results of a sweep
+    
+    Walk-forward sweeps are ranked by their mean out-of-sample (test)
+    score and include the per-split train-selected parameters.
+    """
+    if metric not in SWEEP_METRICS:
+        raise HTTPException(status_code=400, detail=f"metric must be one of {', '.join(SWEEP_METRICS)}")
+    try:
+        report = await walk_forward_report(db, sweep_id, metric)
+        segment = "test" if report["splits"] else "full"
+        ranked = await rank_results(db, sweep_id, metric, segment, limit)
+        progress = sweep_runner.progress.get(sweep_id)
+        stored = await load_sweep(db, sweep_id)
+        if not ranked and progress is None and stored is None:
+            raise HTTPException(status_code=404, detail=f"Sweep {sweep_id} not found")
+        return {
+            "sweep_id": sweep_id,
+            "progress": progress or {"status": "stored"},
+            "config": {
+                "mode": stored["mode"], "start": stored["start"].isoformat(),
+                "end": stored["end"].isoformat(), "seed": stored["seed"],
+            } if stored else None,
+            "metric": metric,
+            "segment": segment,
+            "ranked": ranked,
+            "walk_forward": report if report["splits"] else None,
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,190 @@
+"""
+Columnar Bar Store
+
+Per-symbol on-disk storage for OHLCV bars and indicators. Each column is a
+raw fixed-dtype file (``data/bars/{symbol}/{column}.bin``) with a small
+``meta.json`` holding the row count, so reads are memory-mapped NumPy
+arrays with no parsing or copying. New bars are appended in place;
+overlapping bars are deduplicated on timestamp.
+"""
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from app.data.indicators import INDICATOR_COLUMNS
+
+OHLCV_COLUMNS = ["open", "high", "low", "close", "volume"]
+
+COLUMN_DTYPES = {
+    "timestamp": "<i8",  # nanoseconds since epoch, exchange-local wall time
+    "open": "<f8",
+    "high": "<f8",
+    "low": "<f8",
+    "close": "<f8",
+    "volume": "<i8",
+    **{name: "<f8" for name in INDICATOR_COLUMNS},
+}
+
+
+class BarStore:
+    """Append-only, memory-mapped columnar bar storage"""
+
+    def __init__(self, root: str = None):
+        """
+        Args:
+            root: Store directory (BAR_STORE_PATH, default data/bars)
+        """
+        self.root = Path(root or os.getenv("BAR_STORE_PATH", "data/bars"))
+
+    def _symbol_dir(self, symbol: str) -> Path:
+        return self.root / symbol.upper()
+
+    def _read_meta(self, symbol: str) -> Dict:
+        meta_path = self._symbol_dir(symbol) / "meta.json"
+        if not meta_path.exists():
+            return {"length": 0, "columns": COLUMN_DTYPES}
+        return json.loads(meta_path.read_text())
+
+    def _write_meta(self, symbol: str, length: int):
+        directory = self._symbol_dir(symbol)
+        tmp_path = directory / "meta.json.tmp"
+        tmp_path.write_text(json.dumps({"length": length, "columns": COLUMN_DTYPES}))
+        tmp_path.replace(directory / "meta.json")
+
+    def symbols(self) -> List[str]:
+        """Symbols with stored bars"""
+        if not self.root.exists():
+            return []
+        return sorted(p.name for p in self.root.iterdir() if (p / "meta.json").exists())
+
+    def length(self, symbol: str) -> int:
+        return self._read_meta(symbol)["length"]
+
+    @staticmethod
+    def frame_to_columns(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+        """Convert a collector DataFrame (or lower-case column frame) into store columns"""
+        index = df.index
+        if getattr(index, "tz", None) is not None:
+            index = index.tz_localize(None)
+
+        columns = {"timestamp": pd.DatetimeIndex(index).as_unit("ns").asi8.astype(COLUMN_DTYPES["timestamp"])}
+        for name, dtype in COLUMN_DTYPES.items():
+            if name == "timestamp":
+                continue
+            # The collector names OHLCV columns 'Open', 'Close', ...
+            source = name.title() if name in OHLCV_COLUMNS and name.title() in df.columns else name
+            if source in df.columns:
+                columns[name] = df[source].to_numpy(dtype=dtype)
+            elif name in INDICATOR_COLUMNS:
+                columns[name] = np.full(len(df), np.nan, dtype=dtype)
+            else:
+                raise ValueError(f"Missing column {name}")
+        return columns
+
+    def append(self, symbol: str, df: pd.DataFrame) -> int:
+        """
+        Add bars for a symbol, deduplicating on timestamp
+
+        Bars newer than the last stored one are appended to the column files
+        in place; if the new bars overlap stored history the symbol is merged
+        (new values win) and rewritten.
+
+        Returns:
+            Number of timestamps that were not stored before
+        """
+        if df is None or df.empty:
+            return 0
+
+        new = self.frame_to_columns(df)
+        order = np.argsort(new["timestamp"], kind="stable")
+        # Keep the last occurrence of duplicate timestamps within the batch
+        ts_sorted = new["timestamp"][order]
+        keep = np.append(ts_sorted[1:] != ts_sorted[:-1], True)
+        new = {name: values[order][keep] for name, values in new.items()}
+
+        directory = self._symbol_dir(symbol)
+        directory.mkdir(parents=True, exist_ok=True)
+        length = self.length(symbol)
+
+        if length == 0 or new["timestamp"][0] > self._last_timestamp(symbol, length):
+            for name, values in new.items():
+                path = directory / f"{name}.bin"
+                with open(path, "r+b" if path.exists() else "wb") as fh:
+                    # Drop any bytes past the committed length from an interrupted append
+                    fh.truncate(length * values.dtype.itemsize)
+                    fh.seek(0, os.SEEK_END)
+                    fh.write(values.tobytes())
+            self._write_meta(symbol, length + len(new["timestamp"]))
+            return len(new["timestamp"])
+
+        existing = {name: np.array(values) for name, values in self.read(symbol).items()}
+        merged = {name: np.concatenate([existing[name], new[name]]) for name in new}
+        order = np.argsort(merged["timestamp"], kind="stable")
+        ts_sorted = merged["timestamp"][order]
+        keep = np.append(ts_sorted[1:] != ts_sorted[:-1], True)
+        merged = {name: values[order][keep] for name, values in merged.items()}
+
+        for name, values in merged.items():
+            tmp_path = directory / f"{name}.bin.tmp"
+            tmp_path.write_bytes(values.tobytes())
+            tmp_path.replace(directory / f"{name}.bin")
+        self._write_meta(symbol, len(merged["timestamp"]))
+
+        added = len(merged["timestamp"]) - length
+        logger.debug(f"Merged {len(new['timestamp'])} bars into {symbol} ({added} new)")
+        return added
+
+    def _last_timestamp(self, symbol: str, length: int) -> int:
+        timestamps = np.memmap(
+            self._symbol_dir(symbol) / "timestamp.bin",
+            dtype=COLUMN_DTYPES["timestamp"], mode="r", shape=(length,)
+        )
+        return int(timestamps[-1])
+
+    def read(
+        self,
+        symbol: str,
+        columns: Optional[List[str]] = None,
+        start=None,
+        end=None
+    ) -> Dict[str, np.ndarray]:
+        """
+        Memory-map stored columns for a symbol
+
+        Args:
+            symbol: Stock symbol
+            columns: Columns to map (all by default); timestamp is always included
+            start: Optional inclusive lower timestamp bound
+            end: Optional inclusive upper timestamp bound
+
+        Returns:
+            Dict of column name -> read-only array view into the mapped file
+        """
+        length = self.length(symbol)
+        names = ["timestamp"] + [c for c in (columns or COLUMN_DTYPES) if c != "timestamp"]
+        if length == 0:
+            return {name: np.empty(0, dtype=COLUMN_DTYPES[name]) for name in names}
+
+        directory = self._symbol_dir(symbol)
+        mapped = {
+            name: np.memmap(directory / f"{name}.bin", dtype=COLUMN_DTYPES[name], mode="r", shape=(length,))
+            for name in names
+        }
+
+        lo, hi = 0, length
+        if start is not None:
+            lo = int(np.searchsorted(mapped["timestamp"], pd.Timestamp(start).value, side="left"))
+        if end is not None:
+            hi = int(np.searchsorted(mapped["timestamp"], pd.Timestamp(end).value, side="right"))
+        return {name: values[lo:hi] for name, values in mapped.items()}
+
+    def to_frame(self, symbol: str, columns: Optional[List[str]] = None, start=None, end=None) -> pd.DataFrame:
+        """Copy stored columns into a DataFrame indexed by timestamp"""
+        data = self.read(symbol, columns, start, end)
+        index = pd.DatetimeIndex(np.asarray(data.pop("timestamp")).astype("datetime64[ns]"), name="timestamp")
+        return pd.DataFrame({name: np.asarray(values) for name, values in data.items()}, index=index)
@@ -1,24 +1,56 @@
 """
 Stock Data Collection Module
 """
-import yfinance as yf
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 from loguru import logger
+import os
+import time
 import ta
 
+from app.data.bar_store import BarStore
+from app.data.indicators import IndicatorEngine, INDICATOR_COLUMNS
+from app.data.metadata import symbol_metadata
+from app.data.providers import DataProvider, YFinanceProvider
+
 class DataCollector:
     """Collect and process stock market data"""
     
-    def __init__(self, symbols: list = None, exchange: str = "NSE"):
+    def __init__(
+        self,
+        symbols: list = None,
+        exchange: str = "NSE",
+        provider: DataProvider = None,
+        max_workers: int = None,
+        max_retries: int = None,
+        backoff: float = 0.5
+    ):
         """
         Initialize DataCollector with symbols and exchange
         
         Args:
             symbols: List of stock symbols
             exchange: Stock exchange (NSE for Indian stocks, US for American stocks)
+            provider: Market data source (defaults to yfinance, rate limited by DATA_RATE_LIMIT)
+            max_workers: Concurrent fetches in fetch_all_symbols (DATA_FETCH_WORKERS, default 8)
+            max_retries: Retries per symbol after a failed request (DATA_FETCH_RETRIES, default 3)
+            backoff: Base delay in seconds for exponential retry backoff
         """
         self.exchange = exchange
+        self.provider = provider or YFinanceProvider(
+            rate_limit=float(os.getenv("DATA_RATE_LIMIT", "5")),
+            burst=int(os.getenv("DATA_RATE_BURST", "5"))
+        )
+        self.max_workers = max_workers or int(os.getenv("DATA_FETCH_WORKERS", "8"))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("DATA_FETCH_RETRIES", "3"))
+        self.backoff = backoff
+        
+        # Per-symbol timing and error details from the latest fetch
+        self.fetch_report = {}
+        
+        # Rolling indicator state for incremental bar updates (loaded on first use)
+        self._indicator_engine = None
         
         if symbols:
             self.symbols = symbols
@@ -40,37 +72,98 @@ class DataCollector:
             # Default US stocks
             self.symbols = ["AAPL", "GOOGL", "MSFT", "TSLA", "AMZN"]
     
-    def fetch_historical_data(self, symbol: str, period: str = "2y"):
+    @property
+    def indicator_engine(self) -> IndicatorEngine:
+        if self._indicator_engine is None:
+            self._indicator_engine = IndicatorEngine().load()
+        return self._indicator_engine
+    
+    @indicator_engine.setter
+    def indicator_engine(self, engine: IndicatorEngine):
+        self._indicator_engine = engine
+    
+    def fetch_historical_data(self, symbol: str, period: str = "2y", indicators: bool = True):
         """
         Fetch historical data from yfinance
         
         Args:
             symbol: Stock symbol (e.g., 'RELIANCE.NS' for NSE, 'AAPL' for US)
             period: Time period for historical data
+            indicators: Add full-frame technical indicators (False returns raw OHLCV)
         """
+        started = time.perf_counter()
+        report = {"status": "error", "rows": 0, "attempts": 0, "elapsed": 0.0, "error": None}
+        self.fetch_report[symbol] = report
+        
         try:
             logger.info(f"Fetching data for {symbol} from {self.exchange}...")
-            ticker = yf.Ticker(symbol)
-            df = ticker.history(period=period)
+            df = self._fetch_with_retry(symbol, period, report)
             
-            # Get additional info for Indian stocks
+            # Log descriptive info from the metadata cache (no extra provider request)
             if self.exchange == "NSE" and df is not None and not df.empty:
-                info = ticker.info
-                logger.info(f"Stock: {info.get('longName', symbol)}, Currency: {info.get('currency', 'INR')}")
+                info = symbol_metadata.get_cached(symbol) or {}
+                logger.info(f"Stock: {info.get('long_name') or symbol}, Currency: {info.get('currency') or 'INR'}")
             
-            if df.empty:
+            if df is None or df.empty:
                 logger.warning(f"No data retrieved for {symbol}")
+                report["status"] = "empty"
                 return None
             
             # Add technical indicators
-            df = self.add_technical_indicators(df)
+            if indicators:
+                df = self.add_technical_indicators(df)
             
+            report["status"] = "ok"
+            report["rows"] = len(df)
             logger.info(f"Successfully fetched {len(df)} records for {symbol}")
             return df
         
         except Exception as e:
+            report["error"] = str(e)
             logger.error(f"Error fetching data for {symbol}: {e}")
             return None
+        
+        finally:
+            report["elapsed"] = time.perf_counter() - started
+    
+    def fetch_bars(self, symbol: str, period: str = "2y", start: datetime = None):
+        """
+        Fetch raw OHLCV bars (no indicators) with retry
+        
+        Args:
+            symbol: Stock symbol
+            period: Time period for historical data, ignored when start is given
+            start: Only fetch bars from this timestamp on (incremental sync)
+        
+        Raises:
+            The provider's exception once retries are exhausted
+        """
+        report = {"status": "error", "rows": 0, "attempts": 0, "elapsed": 0.0, "error": None}
+        self.fetch_report[symbol] = report
+        started = time.perf_counter()
+        try:
+            df = self._fetch_with_retry(symbol, period, report, start)
+            report["status"] = "ok" if df is not None and not df.empty else "empty"
+            report["rows"] = 0 if df is None else len(df)
+            return df
+        except Exception as e:
+            report["error"] = str(e)
+            raise
+        finally:
+            report["elapsed"] = time.perf_counter() - started
+    
+    def _fetch_with_retry(self, symbol: str, period: str, report: dict, start: datetime = None):
+        """Call the provider, retrying failed requests with exponential backoff"""
+        while True:
+            report["attempts"] += 1
+            try:
+                return self.provider.fetch_history(symbol, period=period, start=start)
+            except Exception as e:
+                if report["attempts"] > self.max_retries:
+                    raise
+                delay = self.backoff * (2 ** (report["attempts"] - 1))
+                logger.warning(f"Fetch for {symbol} failed ({e}), retrying in {delay:.2f}s")
+                time.sleep(delay)
     
     def add_technical_indicators(self, df: pd.DataFrame):
         """Add technical indicators to dataframe"""
@@ -102,17 +195,124 @@ class DataCollector:
             logger.error(f"Error adding technical indicators: {e}")
             return df
     
-    def fetch_all_symbols(self):
-        """Fetch data for all configured symbols"""
-        data = {}
-        for symbol in self.symbols:
-            df = self.fetch_historical_data(symbol)
-            if df is not None:
-                data[symbol] = df
-        return data
+    def update_indicators(self, symbol: str, df: pd.DataFrame):
+        """
+        Compute indicators for new bars incrementally
+        
+        Bars at or before the symbol's last streamed timestamp are skipped;
+        each remaining bar updates the rolling state in constant time. Call
+        ``indicator_engine.save()`` to persist the state afterwards.
+        
+        Args:
+            symbol: Stock symbol
+            df: Bars in timestamp order with a 'Close' column
+        
+        Returns:
+            The new bars with indicator columns filled in
+        """
+        state = self.indicator_engine.get_state(symbol)
+        if state.last_timestamp is not None:
+            last = pd.Timestamp(state.last_timestamp)
+            if df.index.tz is not None and last.tzinfo is None:
+                last = last.tz_localize(df.index.tz)
+            df = df[df.index > last]
+        
+        df = df.copy()
+        values = self.indicator_engine.update_many(symbol, df['Close'].tolist(), df.index)
+        for column in INDICATOR_COLUMNS:
+            df[column] = [v[column] for v in values]
+        
+        return df
+    
+    def iter_symbols(self, period: str = "2y", max_workers: int = None, indicators: bool = True):
+        """
+        Fetch configured symbols, yielding (symbol, DataFrame) as each completes
+        
+        At most ``max_workers`` fetches are in flight and nothing is kept
+        after it is yielded, so consumers (e.g. database ingestion) see
+        bounded memory regardless of universe size. Symbols that fail or
+        return no data are skipped; see ``fetch_report``.
+        
+        Args:
+            period: Time period for historical data
+            max_workers: Override the configured worker count (1 fetches sequentially)
+            indicators: Add full-frame technical indicators (False yields raw OHLCV)
+        """
+        workers = max_workers or self.max_workers
+        self.fetch_report = {}
+        started = time.perf_counter()
+        fetched = 0
+        
+        if workers <= 1:
+            for symbol in self.symbols:
+                df = self.fetch_historical_data(symbol, period, indicators)
+                if df is not None:
+                    fetched += 1
+                    yield symbol, df
+        else:
+            pending_symbols = iter(self.symbols)
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = {}
+                for symbol in pending_symbols:
+                    futures[pool.submit(self.fetch_historical_data, symbol, period, indicators)] = symbol
+                    if len(futures) >= workers:
+                        break
+                
+                while futures:
+                    future = next(as_completed(futures))
+                    symbol = futures.pop(future)
+                    
+                    # Refill the window before handing the result over
+                    next_symbol = next(pending_symbols, None)
+                    if next_symbol is not None:
+                        futures[pool.submit(self.fetch_historical_data, next_symbol, period, indicators)] = next_symbol
+                    
+                    df = future.result()
+                    if df is not None:
+                        fetched += 1
+                        yield symbol, df
+        
+        failed = [s for s, r in self.fetch_report.items() if r["status"] != "ok"]
+        logger.info(
+            f"Fetched {fetched}/{len(self.symbols)} symbols in "
+            f"{time.perf_counter() - started:.2f}s with {workers} workers"
+            + (f" (failed: {', '.join(failed)})" if failed else "")
+        )
+    
+    def fetch_all_symbols(self, period: str = "2y", max_workers: int = None):
+        """
+        Fetch data for all configured symbols
+        
+        Symbols are fetched concurrently on a bounded thread pool; the
+        provider's rate limiter keeps the request rate within its quota.
+        Timing and errors for each symbol are left in ``fetch_report``.
+        Use ``iter_symbols`` to process results without holding them all.
+        
+        Args:
+            period: Time period for historical data
+            max_workers: Override the configured worker count (1 fetches sequentially)
+        """
+        return dict(self.iter_symbols(period, max_workers))
+    
+    def save_bars(self, df: pd.DataFrame, symbol: str, store: BarStore = None):
+        """
+        Append bars to the columnar bar store
+        
+        Only bars not already stored are added (deduplicated on timestamp),
+        so running this every day does not duplicate history.
+        """
+        try:
+            store = store or BarStore()
+            added = store.append(symbol, df)
+            logger.info(f"Stored {added} new bars for {symbol} in {store.root}")
+            return added
+        
+        except Exception as e:
+            logger.error(f"Error storing bars for {symbol}: {e}")
+            return 0
     
     def save_to_csv(self, df: pd.DataFrame, symbol: str, path: str = "data/raw"):
-        """Save dataframe to CSV"""
+        """Export dataframe to a dated CSV snapshot (use save_bars for storage)"""
         try:
             import os
             os.makedirs(path, exist_ok=True)
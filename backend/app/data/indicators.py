@@ -0,0 +1,227 @@
+"""
+Streaming Technical Indicators
+
+Incremental versions of the indicators computed by
+``DataCollector.add_technical_indicators``. Each symbol keeps a small
+rolling state (Wilder RSI averages, MACD EMAs, rolling sums over the last
+50 closes) so a new bar costs O(1) instead of recomputing the full frame.
+The outputs follow the ``ta`` library conventions (same seeding and
+warm-up periods) so they line up with the stored columns.
+"""
+import json
+import math
+import os
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from loguru import logger
+
+RSI_WINDOW = 14
+MACD_FAST = 12
+MACD_SLOW = 26
+MACD_SIGNAL = 9
+BB_WINDOW = 20
+BB_DEV = 2
+SMA_SHORT = 20
+SMA_LONG = 50
+
+# Rolling sums are rebuilt from the window this often to cancel float drift
+RESYNC_INTERVAL = 5000
+
+INDICATOR_COLUMNS = [
+    "rsi", "macd", "macd_signal",
+    "bb_upper", "bb_middle", "bb_lower",
+    "sma_20", "sma_50"
+]
+
+
+class IndicatorState:
+    """Rolling indicator state for a single symbol"""
+
+    __slots__ = (
+        "count", "prev_close", "avg_up", "avg_down",
+        "ema_fast", "ema_slow", "macd_count", "ema_signal",
+        "window", "sum_short", "sumsq_short", "sum_long",
+        "last_timestamp"
+    )
+
+    def __init__(self):
+        self.count = 0
+        self.prev_close = None
+        self.avg_up = 0.0
+        self.avg_down = 0.0
+        self.ema_fast = None
+        self.ema_slow = None
+        self.macd_count = 0
+        self.ema_signal = None
+        self.window = deque(maxlen=SMA_LONG)
+        self.sum_short = 0.0
+        self.sumsq_short = 0.0
+        self.sum_long = 0.0
+        self.last_timestamp = None
+
+    @staticmethod
+    def _ema(previous: Optional[float], value: float, alpha: float) -> float:
+        if previous is None:
+            return value
+        return previous + alpha * (value - previous)
+
+    def _resync(self):
+        """Rebuild rolling sums exactly from the stored window"""
+        values = list(self.window)
+        short = values[-BB_WINDOW:]
+        self.sum_short = math.fsum(short)
+        self.sumsq_short = math.fsum(v * v for v in short)
+        self.sum_long = math.fsum(values)
+
+    def update(self, close: float) -> Dict[str, Optional[float]]:
+        """Consume one close and return the indicator values for that bar"""
+        close = float(close)
+
+        # RSI: Wilder smoothing of gains/losses; ta seeds the first bar with a zero move
+        change = 0.0 if self.prev_close is None else close - self.prev_close
+        rsi_alpha = 1.0 / RSI_WINDOW
+        self.avg_up += rsi_alpha * (max(change, 0.0) - self.avg_up)
+        self.avg_down += rsi_alpha * (max(-change, 0.0) - self.avg_down)
+        self.prev_close = close
+
+        # MACD
+        self.ema_fast = self._ema(self.ema_fast, close, 2.0 / (MACD_FAST + 1))
+        self.ema_slow = self._ema(self.ema_slow, close, 2.0 / (MACD_SLOW + 1))
+
+        # Rolling windows
+        if len(self.window) == SMA_LONG:
+            self.sum_long -= self.window[0]
+        if len(self.window) >= BB_WINDOW:
+            dropped = self.window[-BB_WINDOW]
+            self.sum_short -= dropped
+            self.sumsq_short -= dropped * dropped
+        self.window.append(close)
+        self.sum_short += close
+        self.sumsq_short += close * close
+        self.sum_long += close
+
+        self.count += 1
+        if self.count % RESYNC_INTERVAL == 0:
+            self._resync()
+
+        values = dict.fromkeys(INDICATOR_COLUMNS)
+
+        if self.count >= RSI_WINDOW:
+            if self.avg_down == 0:
+                values["rsi"] = 100.0
+            else:
+                values["rsi"] = 100.0 - 100.0 / (1.0 + self.avg_up / self.avg_down)
+
+        if self.count >= MACD_SLOW:
+            macd = self.ema_fast - self.ema_slow
+            self.ema_signal = self._ema(self.ema_signal, macd, 2.0 / (MACD_SIGNAL + 1))
+            self.macd_count += 1
+            values["macd"] = macd
+            if self.macd_count >= MACD_SIGNAL:
+                values["macd_signal"] = self.ema_signal
+
+        if self.count >= BB_WINDOW:
+            mean = self.sum_short / BB_WINDOW
+            std = math.sqrt(max(self.sumsq_short / BB_WINDOW - mean * mean, 0.0))
+            values["bb_middle"] = mean
+            values["bb_upper"] = mean + BB_DEV * std
+            values["bb_lower"] = mean - BB_DEV * std
+            values["sma_20"] = mean
+
+        if self.count >= SMA_LONG:
+            values["sma_50"] = self.sum_long / SMA_LONG
+
+        return values
+
+    def to_dict(self) -> Dict:
+        """Serialize to plain JSON-compatible types"""
+        state = {name: getattr(self, name) for name in self.__slots__ if name != "window"}
+        state["window"] = list(self.window)
+        return state
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "IndicatorState":
+        state = cls()
+        for name in cls.__slots__:
+            if name == "window":
+                state.window = deque(data.get("window", []), maxlen=SMA_LONG)
+            elif name in data:
+                setattr(state, name, data[name])
+        return state
+
+
+class IndicatorEngine:
+    """Per-symbol streaming indicator states with JSON persistence"""
+
+    def __init__(self, state_path: str = None):
+        """
+        Args:
+            state_path: JSON file the states are saved to (INDICATOR_STATE_PATH,
+                default data/processed/indicator_state.json)
+        """
+        self.state_path = Path(state_path or os.getenv(
+            "INDICATOR_STATE_PATH", "data/processed/indicator_state.json"
+        ))
+        self.states: Dict[str, IndicatorState] = {}
+
+    def get_state(self, symbol: str) -> IndicatorState:
+        if symbol not in self.states:
+            self.states[symbol] = IndicatorState()
+        return self.states[symbol]
+
+    def update(self, symbol: str, close: float, timestamp=None) -> Dict[str, Optional[float]]:
+        """Feed one new bar for a symbol and return its indicator values"""
+        state = self.get_state(symbol)
+        values = state.update(close)
+        if timestamp is not None:
+            state.last_timestamp = str(timestamp)
+        return values
+
+    def update_many(self, symbol: str, closes: Iterable[float], timestamps: Iterable = None):
+        """Feed several bars in order; returns one value dict per bar"""
+        if timestamps is None:
+            return [self.update(symbol, close) for close in closes]
+        return [self.update(symbol, close, ts) for close, ts in zip(closes, timestamps)]
+
+    def is_current(self, symbol: str, timestamp: Optional[datetime]) -> bool:
+        """Whether the symbol's state has consumed exactly the bars up to ``timestamp``"""
+        state = self.states.get(symbol)
+        if state is None or state.last_timestamp is None or timestamp is None:
+            return False
+        return datetime.fromisoformat(state.last_timestamp) == timestamp
+
+    def reset(self, symbol: str):
+        self.states.pop(symbol, None)
+
+    def to_dict(self) -> Dict:
+        return {symbol: state.to_dict() for symbol, state in self.states.items()}
+
+    @classmethod
+    def from_dict(cls, data: Dict, state_path: str = None) -> "IndicatorEngine":
+        engine = cls(state_path)
+        engine.states = {symbol: IndicatorState.from_dict(s) for symbol, s in data.items()}
+        return engine
+
+    def save(self):
+        """Persist all states so streaming can resume after a restart"""
+        try:
+            self.state_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.state_path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(self.to_dict()))
+            tmp_path.replace(self.state_path)
+        except Exception as e:
+            logger.error(f"Error saving indicator state: {e}")
+
+    def load(self) -> "IndicatorEngine":
+        """Load persisted states if the state file exists"""
+        try:
+            if self.state_path.exists():
+                data = json.loads(self.state_path.read_text())
+                self.states = {symbol: IndicatorState.from_dict(s) for symbol, s in data.items()}
+                logger.info(f"Loaded indicator state for {len(self.states)} symbols")
+        except Exception as e:
+            logger.error(f"Error loading indicator state: {e}")
+        return self
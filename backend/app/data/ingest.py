@@ -0,0 +1,212 @@
+"""
+Bulk Bar Ingestion
+
+Streams collector output into ``stock_prices`` with batched executemany
+upserts keyed on the unique (symbol, timestamp) index. Symbols are written
+as soon as their fetch completes, so memory stays bounded by the batch
+size and the fetch window rather than the whole universe.
+
+``ingest_collector`` computes indicators with the collector's streaming
+indicator state: a symbol whose state ends at its last stored bar only
+has the newer bars computed and written; any other symbol replays the
+whole fetched frame.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Dict
+
+import pandas as pd
+from sqlalchemy.ext.asyncio import AsyncSession
+from loguru import logger
+
+from app.data.collector import DataCollector
+from app.data.bar_store import BarStore
+from app.data.indicators import INDICATOR_COLUMNS
+from app.data.registry import get_symbol_range, record_bars
+from app.data.rollups import update_rollups
+from app.database.upsert import upsert_statement
+from app.models.stock_data import StockPrice
+from app.trading.mark_to_market import mark_to_market
+from app.trading.order_book import order_book
+from app.utils.broadcast import live_feed, price_topic
+from app.utils.cache import response_cache, price_tag
+
+UPSERT_COLUMNS = ["open", "high", "low", "close", "volume"] + INDICATOR_COLUMNS
+
+
+def to_naive_index(index: pd.DatetimeIndex) -> pd.DatetimeIndex:
+    """Drop the timezone, keeping exchange-local wall time (the stored convention)"""
+    if index.tz is not None:
+        return index.tz_localize(None)
+    return index
+
+
+def frame_to_rows(symbol: str, df: pd.DataFrame) -> list:
+    """Convert a collector DataFrame into StockPrice column dicts"""
+    data = {
+        "timestamp": to_naive_index(df.index).to_pydatetime().tolist(),
+        "open": df["Open"].to_numpy(dtype=float).tolist(),
+        "high": df["High"].to_numpy(dtype=float).tolist(),
+        "low": df["Low"].to_numpy(dtype=float).tolist(),
+        "close": df["Close"].to_numpy(dtype=float).tolist(),
+        "volume": df["Volume"].to_numpy(dtype="int64").tolist(),
+    }
+    for name in INDICATOR_COLUMNS:
+        if name in df.columns:
+            # NaN -> None so the database stores NULL
+            data[name] = [None if v != v else v for v in df[name].to_numpy(dtype=float).tolist()]
+
+    names = list(data)
+    return [dict(zip(names, values), symbol=symbol) for values in zip(*data.values())]
+
+
+class BarIngestor:
+    """Batched upsert writer for stock_prices"""
+
+    def __init__(self, db: AsyncSession, batch_size: int = None, store: BarStore = None, rollups: bool = True):
+        """
+        Args:
+            db: Database session; each batch is committed
+            batch_size: Rows per executemany (INGEST_BATCH_SIZE, default 1000)
+            store: Optional columnar bar store to append to as well
+            rollups: Maintain price_rollups for the ingested bars
+        """
+        self.db = db
+        self.batch_size = batch_size or int(os.getenv("INGEST_BATCH_SIZE", "1000"))
+        self.store = store
+        self.rollups = rollups
+        self.stats = {"symbols": 0, "rows": 0, "elapsed": 0.0, "rows_per_second": 0.0}
+
+    async def ingest_rows(self, rows: list) -> int:
+        """Upsert prepared StockPrice rows in batches"""
+        if not rows:
+            return 0
+
+        columns = [name for name in UPSERT_COLUMNS if name in rows[0]]
+        stmt = upsert_statement(self.db, StockPrice.__table__, ["symbol", "timestamp"], columns)
+        for offset in range(0, len(rows), self.batch_size):
+            await self.db.execute(stmt, rows[offset:offset + self.batch_size])
+            await self.db.commit()
+        
+        timestamps_by_symbol = defaultdict(list)
+        for row in rows:
+            timestamps_by_symbol[row["symbol"]].append(row["timestamp"])
+        await record_bars(self.db, timestamps_by_symbol)
+        await self.db.commit()
+        
+        response_cache.invalidate(*(price_tag(symbol) for symbol in timestamps_by_symbol))
+        self._publish_latest(rows, timestamps_by_symbol)
+        return len(rows)
+    
+    @staticmethod
+    def _publish_latest(rows: list, timestamps_by_symbol: Dict):
+        """Feed each symbol's newest ingested close to mark-to-market and the order book, and push the bar to live subscribers"""
+        for symbol, timestamps in timestamps_by_symbol.items():
+            newest = max(timestamps)
+            row = next(r for r in reversed(rows) if r["symbol"] == symbol and r["timestamp"] == newest)
+            # Skip NaN closes; backfilled bars older than the latest price are not ticks
+            if row["close"] == row["close"] and mark_to_market.update_price(symbol, row["close"], newest):
+                order_book.on_price(symbol, row["close"])
+            topic = price_topic(symbol)
+            if live_feed.has_subscribers(topic):
+                live_feed.publish(topic, row)
+
+    async def ingest_frame(self, symbol: str, df: pd.DataFrame) -> int:
+        """Upsert one symbol's bars; returns the number of rows written"""
+        started = time.perf_counter()
+        rows = frame_to_rows(symbol, df)
+        written = await self.ingest_rows(rows)
+
+        if self.rollups and rows:
+            await update_rollups(self.db, symbol, min(row["timestamp"] for row in rows))
+
+        if self.store is not None:
+            await asyncio.to_thread(self.store.append, symbol, df)
+
+        self.stats["symbols"] += 1
+        self.stats["rows"] += written
+        self.stats["elapsed"] += time.perf_counter() - started
+        if self.stats["elapsed"] > 0:
+            self.stats["rows_per_second"] = self.stats["rows"] / self.stats["elapsed"]
+        return written
+
+
+async def new_bars_with_indicators(db: AsyncSession, collector: DataCollector, symbol: str, df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Stream a fetched frame through the collector's indicator state
+
+    Returns:
+        The bars after the symbol's last stored bar if its state ends there,
+        else the whole frame (with the state rebuilt from its first bar)
+    """
+    coverage = await get_symbol_range(db, symbol)
+    if not collector.indicator_engine.is_current(symbol, coverage["last_timestamp"] if coverage else None):
+        collector.indicator_engine.reset(symbol)
+    df = df.copy()
+    df.index = to_naive_index(df.index)
+    return collector.update_indicators(symbol, df)
+
+
+async def ingest_collector(
+    collector: DataCollector,
+    ingestor: BarIngestor,
+    period: str = "2y",
+    queue_size: int = 4
+) -> Dict:
+    """
+    Fetch the collector's universe and ingest each symbol as it arrives
+
+    Fetching runs on the collector's thread pool; a bounded queue hands
+    finished symbols to the event loop, so at most ``queue_size`` fetched
+    frames wait for ingestion at any time. Frames are fetched without
+    indicators; they are streamed through ``collector.update_indicators``
+    and the indicator state is saved once ingestion finishes.
+
+    Returns:
+        Ingestion stats (symbols, rows, elapsed, rows_per_second)
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    started = time.perf_counter()
+
+    def produce():
+        try:
+            for item in collector.iter_symbols(period, indicators=False):
+                if stop.is_set():
+                    break
+                asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+        finally:
+            if not stop.is_set():
+                asyncio.run_coroutine_threadsafe(queue.put(None), loop).result()
+
+    producer = loop.run_in_executor(None, produce)
+
+    try:
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            symbol, df = item
+            await ingestor.ingest_frame(symbol, await new_bars_with_indicators(ingestor.db, collector, symbol, df))
+
+        await producer
+        await asyncio.to_thread(collector.indicator_engine.save)
+    finally:
+        if not producer.done():
+            # Ingestion failed: stop the producer and free any put it is blocked on
+            stop.set()
+            while not producer.done():
+                while not queue.empty():
+                    queue.get_nowait()
+                await asyncio.wait({producer}, timeout=0.05)
+
+    wall = time.perf_counter() - started
+    logger.info(
+        f"Ingested {ingestor.stats['rows']} rows for {ingestor.stats['symbols']} symbols "
+        f"in {wall:.2f}s ({ingestor.stats['rows_per_second']:.0f} rows/s written)"
+    )
+    return {**ingestor.stats, "wall_time": wall}
@@ -0,0 +1,166 @@
+"""
+Symbol Metadata Service
+
+Descriptive symbol data (long name, currency, exchange, lot size, sector)
+lives in the ``symbol_metadata`` table and is fronted by an in-memory LRU,
+so API handlers and display helpers never make provider requests. Entries
+are refreshed from the provider only when older than the TTL.
+"""
+import asyncio
+import os
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from loguru import logger
+
+from app.data.providers import DataProvider
+from app.models.stock_data import SymbolMetadata
+
+METADATA_FIELDS = ["long_name", "currency", "exchange", "lot_size", "sector"]
+
+
+def normalize_info(symbol: str, info: Dict) -> Dict:
+    """Map a provider info payload (yfinance keys) to metadata fields"""
+    return {
+        "symbol": symbol,
+        "long_name": info.get("longName") or info.get("shortName"),
+        "currency": info.get("currency"),
+        "exchange": info.get("exchange"),
+        # Cash equities trade in single shares; providers rarely report a lot size
+        "lot_size": int(info.get("lotSize") or 1),
+        "sector": info.get("sector"),
+    }
+
+
+class SymbolMetadataService:
+    """Table-backed symbol metadata with an in-memory LRU and TTL refresh"""
+
+    def __init__(self, max_entries: int = None, ttl_hours: float = None):
+        """
+        Args:
+            max_entries: LRU capacity (SYMBOL_METADATA_CACHE_SIZE, default 4096)
+            ttl_hours: Age after which an entry is refetched (SYMBOL_METADATA_TTL_HOURS, default 168)
+        """
+        self.max_entries = max_entries or int(os.getenv("SYMBOL_METADATA_CACHE_SIZE", "4096"))
+        self.ttl = timedelta(hours=ttl_hours or float(os.getenv("SYMBOL_METADATA_TTL_HOURS", "168")))
+        self._cache: "OrderedDict[str, Dict]" = OrderedDict()
+
+    @staticmethod
+    def _row_to_dict(row: SymbolMetadata) -> Dict:
+        entry = {field: getattr(row, field) for field in METADATA_FIELDS}
+        entry["symbol"] = row.symbol
+        entry["updated_at"] = row.updated_at
+        return entry
+
+    def _remember(self, entry: Dict):
+        self._cache[entry["symbol"]] = entry
+        self._cache.move_to_end(entry["symbol"])
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def is_stale(self, entry: Optional[Dict]) -> bool:
+        if entry is None or entry.get("updated_at") is None:
+            return True
+        return datetime.utcnow() - entry["updated_at"] > self.ttl
+
+    def get_cached(self, symbol: str) -> Optional[Dict]:
+        """Memory-only lookup, safe to call from synchronous code"""
+        entry = self._cache.get(symbol)
+        if entry is not None:
+            self._cache.move_to_end(symbol)
+        return entry
+
+    async def get_many(self, db: AsyncSession, symbols: Iterable[str]) -> Dict[str, Dict]:
+        """Resolve symbols from the LRU, loading misses with a single query"""
+        symbols = list(symbols)
+        found = {}
+        misses = []
+        for symbol in symbols:
+            entry = self.get_cached(symbol)
+            if entry is None:
+                misses.append(symbol)
+            else:
+                found[symbol] = entry
+
+        if misses:
+            result = await db.execute(select(SymbolMetadata).where(SymbolMetadata.symbol.in_(misses)))
+            for row in result.scalars().all():
+                entry = self._row_to_dict(row)
+                self._remember(entry)
+                found[row.symbol] = entry
+
+        return found
+
+    async def load_all(self, db: AsyncSession) -> int:
+        """Warm the LRU with the most recently refreshed entries"""
+        result = await db.execute(
+            select(SymbolMetadata)
+            .order_by(SymbolMetadata.updated_at.desc())
+            .limit(self.max_entries)
+        )
+        rows = result.scalars().all()
+        for row in reversed(rows):
+            self._remember(self._row_to_dict(row))
+        return len(rows)
+
+    async def refresh(
+        self,
+        db: AsyncSession,
+        symbols: List[str],
+        provider: DataProvider,
+        force: bool = False,
+        concurrency: int = 8
+    ) -> int:
+        """
+        Refetch metadata for missing or expired symbols
+
+        Provider calls run concurrently on worker threads (the provider's
+        rate limiter still applies) and results are written in one batch.
+
+        Returns:
+            Number of symbols refreshed
+        """
+        known = {} if force else await self.get_many(db, symbols)
+        stale = [s for s in symbols if force or self.is_stale(known.get(s))]
+        if not stale:
+            return 0
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(symbol: str):
+            async with semaphore:
+                try:
+                    return normalize_info(symbol, await asyncio.to_thread(provider.fetch_info, symbol))
+                except Exception as e:
+                    logger.warning(f"Metadata fetch failed for {symbol}: {e}")
+                    return None
+
+        entries = [e for e in await asyncio.gather(*(fetch(s) for s in stale)) if e is not None]
+        if not entries:
+            return 0
+
+        now = datetime.utcnow()
+        existing = {
+            row.symbol: row for row in (await db.execute(
+                select(SymbolMetadata).where(SymbolMetadata.symbol.in_([e["symbol"] for e in entries]))
+            )).scalars().all()
+        }
+        for entry in entries:
+            entry["updated_at"] = now
+            row = existing.get(entry["symbol"])
+            if row is None:
+                db.add(SymbolMetadata(**entry))
+            else:
+                for field in METADATA_FIELDS + ["updated_at"]:
+                    setattr(row, field, entry[field])
+            self._remember(entry)
+
+        await db.commit()
+        logger.info(f"Refreshed metadata for {len(entries)} symbols")
+        return len(entries)
+
+
+symbol_metadata = SymbolMetadataService()
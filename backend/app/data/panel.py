@@ -0,0 +1,251 @@
+"""
+Panel Technical Indicators
+
+Computes the indicator set of ``DataCollector.add_technical_indicators``
+for a whole symbol universe at once. Closes are loaded into one aligned
+(symbols x time) array with a validity mask and every indicator is
+evaluated with array operations across all symbols together, instead of
+one ``ta`` call chain per symbol.
+"""
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from sqlalchemy import select, update, bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
+from loguru import logger
+
+from app.data.indicators import (
+    INDICATOR_COLUMNS, RSI_WINDOW, MACD_FAST, MACD_SLOW, MACD_SIGNAL,
+    BB_WINDOW, BB_DEV, SMA_SHORT, SMA_LONG
+)
+from app.models.stock_data import StockPrice
+from app.utils.cache import response_cache, price_tag
+
+
+class ClosePanel:
+    """Closes for many symbols aligned on a shared timestamp axis"""
+
+    def __init__(self, symbols: List[str], timestamps: pd.DatetimeIndex, closes: np.ndarray, mask: np.ndarray):
+        """
+        Args:
+            symbols: Row labels
+            timestamps: Column labels (sorted union of all bar timestamps)
+            closes: float64 array of shape (symbols, timestamps), NaN where absent
+            mask: bool array, True where the symbol has a bar at that timestamp
+        """
+        self.symbols = symbols
+        self.timestamps = timestamps
+        self.closes = closes
+        self.mask = mask
+
+    @classmethod
+    def from_frames(cls, frames: Dict[str, pd.DataFrame], column: str = "Close") -> "ClosePanel":
+        """Align per-symbol DataFrames (as returned by fetch_all_symbols)"""
+        symbols = list(frames)
+        if not symbols:
+            return cls([], pd.DatetimeIndex([]), np.empty((0, 0)), np.empty((0, 0), dtype=bool))
+
+        indexes = [frames[symbol].index for symbol in symbols]
+        timestamps = indexes[0].append(indexes[1:]).unique().sort_values()
+
+        closes = np.full((len(symbols), len(timestamps)), np.nan)
+        for row, symbol in enumerate(symbols):
+            df = frames[symbol]
+            closes[row, timestamps.get_indexer(df.index)] = df[column].to_numpy(dtype=float)
+
+        return cls(symbols, timestamps, closes, ~np.isnan(closes))
+
+    @classmethod
+    def from_rows(cls, symbols: np.ndarray, timestamps: np.ndarray, closes: np.ndarray) -> "ClosePanel":
+        """Build from flat (symbol, timestamp, close) columns, e.g. a stock_prices query"""
+        row_labels, rows = np.unique(symbols, return_inverse=True)
+        col_labels, cols = np.unique(timestamps, return_inverse=True)
+
+        panel = np.full((len(row_labels), len(col_labels)), np.nan)
+        panel[rows, cols] = closes
+        return cls(list(row_labels), pd.DatetimeIndex(col_labels), panel, ~np.isnan(panel))
+
+
+def _ewm(values: np.ndarray, alpha: float, start: int = 0) -> np.ndarray:
+    """Recursive EWM (adjust=False) along axis 1, seeded with the value at ``start``"""
+    out = np.full(values.shape, np.nan)
+    if values.shape[1] <= start:
+        return out
+
+    current = values[:, start].copy()
+    out[:, start] = current
+    for t in range(start + 1, values.shape[1]):
+        current += alpha * (values[:, t] - current)
+        out[:, t] = current
+    return out
+
+
+def _rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    out = np.full(values.shape, np.nan)
+    if values.shape[1] < window:
+        return out
+    out[:, window - 1:] = sliding_window_view(values, window, axis=1).mean(axis=-1)
+    return out
+
+
+def _rolling_std(values: np.ndarray, window: int) -> np.ndarray:
+    out = np.full(values.shape, np.nan)
+    if values.shape[1] < window:
+        return out
+    out[:, window - 1:] = sliding_window_view(values, window, axis=1).std(axis=-1)
+    return out
+
+
+def compute_panel_indicators(closes: np.ndarray, mask: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Compute RSI, MACD, Bollinger Bands and SMA-20/50 for every row at once
+
+    Each symbol's bars are packed to the left so indicator windows span the
+    symbol's own consecutive bars (as the per-symbol path does), computed
+    together, then scattered back onto the shared timestamp axis.
+
+    Args:
+        closes: (symbols, timestamps) close prices
+        mask: validity mask of the same shape
+
+    Returns:
+        Dict of indicator name -> (symbols, timestamps) array, NaN where undefined
+    """
+    if closes.size == 0:
+        return {name: closes.copy() for name in INDICATOR_COLUMNS}
+
+    order = np.argsort(~mask, axis=1, kind="stable")
+    lengths = mask.sum(axis=1)
+    packed = np.take_along_axis(np.where(mask, closes, 0.0), order, axis=1)
+    positions = np.arange(packed.shape[1])
+
+    # Carry the last real close into the padding so tails stay finite
+    in_range = positions[None, :] < lengths[:, None]
+    last_close = packed[np.arange(len(packed)), np.maximum(lengths - 1, 0)]
+    packed = np.where(in_range, packed, last_close[:, None])
+
+    # RSI (ta seeds the first bar with a zero move)
+    diff = np.diff(packed, axis=1, prepend=packed[:, :1])
+    avg_up = _ewm(np.maximum(diff, 0.0), 1.0 / RSI_WINDOW)
+    avg_down = _ewm(np.maximum(-diff, 0.0), 1.0 / RSI_WINDOW)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = np.where(avg_down == 0, 100.0, 100.0 - 100.0 / (1.0 + avg_up / avg_down))
+
+    # MACD; the signal EMA starts at the first defined MACD value
+    macd = _ewm(packed, 2.0 / (MACD_FAST + 1)) - _ewm(packed, 2.0 / (MACD_SLOW + 1))
+    macd_signal = _ewm(macd, 2.0 / (MACD_SIGNAL + 1), start=MACD_SLOW - 1)
+
+    # Bollinger Bands and moving averages
+    sma_20 = _rolling_mean(packed, SMA_SHORT)
+    bb_middle = _rolling_mean(packed, BB_WINDOW)
+    bb_std = _rolling_std(packed, BB_WINDOW)
+
+    packed_results = {
+        "rsi": (rsi, RSI_WINDOW),
+        "macd": (macd, MACD_SLOW),
+        "macd_signal": (macd_signal, MACD_SLOW + MACD_SIGNAL - 1),
+        "bb_upper": (bb_middle + BB_DEV * bb_std, BB_WINDOW),
+        "bb_middle": (bb_middle, BB_WINDOW),
+        "bb_lower": (bb_middle - BB_DEV * bb_std, BB_WINDOW),
+        "sma_20": (sma_20, SMA_SHORT),
+        "sma_50": (_rolling_mean(packed, SMA_LONG), SMA_LONG),
+    }
+
+    results = {}
+    for name, (values, warm_up) in packed_results.items():
+        values = np.where(in_range & (positions[None, :] >= warm_up - 1), values, np.nan)
+        out = np.empty_like(values)
+        np.put_along_axis(out, order, values, axis=1)
+        results[name] = out
+
+    return results
+
+
+def add_panel_indicators(frames: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+    """
+    Panel equivalent of calling add_technical_indicators on every frame
+
+    Warm-up gaps are filled forward/backward like the per-symbol path. The
+    fill runs on the whole panel at once: leading NaNs before a symbol's
+    first value pick up that value, and nothing a symbol reads comes from
+    another symbol's row.
+    """
+    panel = ClosePanel.from_frames(frames)
+    indicators = compute_panel_indicators(panel.closes, panel.mask)
+
+    # (timestamps, symbols * indicators) so one ffill/bfill covers everything
+    stacked = np.stack([indicators[name] for name in INDICATOR_COLUMNS], axis=-1)
+    n_symbols, n_times, n_cols = stacked.shape
+    flat = stacked.transpose(1, 0, 2).reshape(n_times, n_symbols * n_cols)
+    filled = pd.DataFrame(flat).ffill().bfill().to_numpy()
+    filled = filled.reshape(n_times, n_symbols, n_cols).transpose(1, 0, 2)
+
+    output = {}
+    for row, symbol in enumerate(panel.symbols):
+        df = frames[symbol]
+        block = filled[row, panel.timestamps.get_indexer(df.index)]
+        output[symbol] = pd.concat(
+            [df, pd.DataFrame(block, index=df.index, columns=INDICATOR_COLUMNS)], axis=1
+        )
+    return output
+
+
+async def load_close_panel(db: AsyncSession, symbols: List[str] = None, start_date=None) -> ClosePanel:
+    """Load stored closes for a universe into a ClosePanel"""
+    query = select(StockPrice.symbol, StockPrice.timestamp, StockPrice.close)
+    if symbols:
+        query = query.where(StockPrice.symbol.in_(symbols))
+    if start_date is not None:
+        query = query.where(StockPrice.timestamp >= start_date)
+
+    rows = (await db.execute(query)).all()
+    if not rows:
+        return ClosePanel.from_frames({})
+
+    symbol_col, ts_col, close_col = zip(*rows)
+    return ClosePanel.from_rows(
+        np.array(symbol_col, dtype=object),
+        np.array(ts_col, dtype="datetime64[us]"),
+        np.array(close_col, dtype=float)
+    )
+
+
+async def write_panel_indicators(db: AsyncSession, panel: ClosePanel, indicators: Dict[str, np.ndarray]) -> int:
+    """Write panel results back to the StockPrice indicator columns in one executemany"""
+    rows, cols = np.nonzero(panel.mask)
+    if len(rows) == 0:
+        return 0
+
+    timestamps = panel.timestamps.to_pydatetime()
+    symbols = np.array(panel.symbols, dtype=object)
+    columns = {name: indicators[name][rows, cols] for name in INDICATOR_COLUMNS}
+
+    params = []
+    for i in range(len(rows)):
+        entry = {"b_symbol": symbols[rows[i]], "b_timestamp": timestamps[cols[i]]}
+        for name in INDICATOR_COLUMNS:
+            value = columns[name][i]
+            entry[name] = None if np.isnan(value) else float(value)
+        params.append(entry)
+
+    table = StockPrice.__table__
+    stmt = (
+        update(table)
+        .where(table.c.symbol == bindparam("b_symbol"), table.c.timestamp == bindparam("b_timestamp"))
+        .values({name: bindparam(name) for name in INDICATOR_COLUMNS})
+    )
+    await db.execute(stmt, params)
+    return len(params)
+
+
+async def refresh_universe_indicators(db: AsyncSession, symbols: List[str] = None) -> int:
+    """Recompute and store indicators for the universe in one vectorized pass"""
+    panel = await load_close_panel(db, symbols)
+    indicators = compute_panel_indicators(panel.closes, panel.mask)
+    updated = await write_panel_indicators(db, panel, indicators)
+    await db.commit()
+    response_cache.invalidate(*(price_tag(symbol) for symbol in panel.symbols))
+    logger.info(f"Updated indicators for {updated} bars across {len(panel.symbols)} symbols")
+    return updated
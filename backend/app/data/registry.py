@@ -0,0 +1,119 @@
+"""
+Symbol Registry
+
+``symbol_registry`` holds one row per stored symbol with its first and
+last bar timestamps and bar count. Ingestion keeps it current, so symbol
+listings and range lookups read O(symbols) rows instead of scanning
+``stock_prices`` with DISTINCT/MIN/MAX.
+"""
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from loguru import logger
+
+from app.database.upsert import upsert_statement
+from app.models.stock_data import StockPrice, SymbolRegistry
+
+REGISTRY_COLUMNS = ["first_timestamp", "last_timestamp", "bar_count", "updated_at"]
+
+# Plain column selects: the registry is written with Core upserts, so ORM
+# instances held in a session's identity map could be stale
+ENTRY_COLUMNS = (
+    SymbolRegistry.symbol,
+    SymbolRegistry.first_timestamp,
+    SymbolRegistry.last_timestamp,
+    SymbolRegistry.bar_count,
+)
+
+
+def _entry(row) -> Dict:
+    return dict(row._mapping)
+
+
+async def _count_stored(db: AsyncSession, symbols: Optional[List[str]] = None) -> Dict[str, Dict]:
+    """Exact coverage from stock_prices (index range scan per symbol; all symbols if None)"""
+    query = select(
+        StockPrice.symbol,
+        func.min(StockPrice.timestamp),
+        func.max(StockPrice.timestamp),
+        func.count()
+    ).group_by(StockPrice.symbol)
+    if symbols is not None:
+        query = query.where(StockPrice.symbol.in_(symbols))
+    rows = (await db.execute(query)).all()
+    return {
+        symbol: {"symbol": symbol, "first_timestamp": first, "last_timestamp": last, "bar_count": count}
+        for symbol, first, last, count in rows
+    }
+
+
+async def _write(db: AsyncSession, entries: Iterable[Dict]):
+    now = datetime.utcnow()
+    params = [{**entry, "updated_at": now} for entry in entries]
+    if params:
+        stmt = upsert_statement(db, SymbolRegistry.__table__, ["symbol"], REGISTRY_COLUMNS)
+        await db.execute(stmt, params)
+
+
+async def record_bars(db: AsyncSession, timestamps_by_symbol: Dict[str, List[datetime]]):
+    """
+    Update coverage after bars were upserted (caller commits)
+
+    Bars strictly after a symbol's last stored timestamp (the delta sync
+    case) extend the entry in place; anything that may overlap stored
+    history is recounted from the index.
+    """
+    if not timestamps_by_symbol:
+        return
+
+    known = {
+        row.symbol: _entry(row) for row in (await db.execute(
+            select(*ENTRY_COLUMNS).where(SymbolRegistry.symbol.in_(list(timestamps_by_symbol)))
+        )).all()
+    }
+
+    entries, recount = [], []
+    for symbol, timestamps in timestamps_by_symbol.items():
+        entry = known.get(symbol)
+        if entry is not None and min(timestamps) > entry["last_timestamp"]:
+            entry["last_timestamp"] = max(timestamps)
+            entry["bar_count"] += len(set(timestamps))
+            entries.append(entry)
+        else:
+            recount.append(symbol)
+
+    if recount:
+        entries += (await _count_stored(db, recount)).values()
+    await _write(db, entries)
+
+
+async def rebuild_registry(db: AsyncSession) -> int:
+    """Recompute every entry from stock_prices (one-off backfill); returns the symbol count"""
+    entries = list((await _count_stored(db)).values())
+    await _write(db, entries)
+    await db.commit()
+    logger.info(f"Rebuilt symbol registry for {len(entries)} symbols")
+    return len(entries)
+
+
+async def ensure_registry(db: AsyncSession) -> int:
+    """Backfill the registry if it is empty but bars are stored (databases predating it)"""
+    if (await db.execute(select(SymbolRegistry.symbol).limit(1))).first() is not None:
+        return 0
+    if (await db.execute(select(StockPrice.id).limit(1))).first() is None:
+        return 0
+    return await rebuild_registry(db)
+
+
+async def list_symbols(db: AsyncSession) -> List[Dict]:
+    """Registry entries for every stored symbol, ordered by symbol"""
+    result = await db.execute(select(*ENTRY_COLUMNS).order_by(SymbolRegistry.symbol))
+    return [_entry(row) for row in result.all()]
+
+
+async def get_symbol_range(db: AsyncSession, symbol: str) -> Optional[Dict]:
+    """Coverage for one symbol, or None if no bars are stored"""
+    row = (await db.execute(select(*ENTRY_COLUMNS).where(SymbolRegistry.symbol == symbol))).first()
+    return _entry(row) if row is not None else None
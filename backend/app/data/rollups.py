@@ -0,0 +1,130 @@
+"""
+Multi-Timeframe OHLCV Rollups
+
+Materialized weekly/monthly (and, for intraday data, 5m/15m/1h) bars in
+``price_rollups``. Rollups are maintained incrementally: when bars are
+ingested only the buckets touching the new bars are recomputed from
+``stock_prices`` and upserted, so long-range chart queries read one row
+per bucket instead of every bar.
+"""
+from datetime import datetime
+from typing import List, Optional
+
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from loguru import logger
+
+from app.database.upsert import upsert_statement
+from app.models.stock_data import StockPrice, PriceRollup
+from app.utils.cache import response_cache, price_tag
+
+INTRADAY_INTERVALS = {"5m": "5min", "15m": "15min", "1h": "1h"}
+CALENDAR_INTERVALS = ["1w", "1mo"]
+ROLLUP_INTERVALS = list(INTRADAY_INTERVALS) + CALENDAR_INTERVALS
+
+ROLLUP_COLUMNS = ["open", "high", "low", "close", "volume", "bar_count"]
+
+
+def bucket_starts(timestamps: pd.DatetimeIndex, interval: str) -> pd.DatetimeIndex:
+    """Start of the bucket each timestamp falls into (weeks start on Monday)"""
+    if interval in INTRADAY_INTERVALS:
+        return timestamps.floor(INTRADAY_INTERVALS[interval])
+    if interval == "1w":
+        days = timestamps.normalize()
+        return days - pd.to_timedelta(days.weekday, unit="D")
+    if interval == "1mo":
+        return timestamps.to_period("M").to_timestamp()
+    raise ValueError(f"Unknown rollup interval {interval}")
+
+
+def is_intraday(timestamps: pd.DatetimeIndex) -> bool:
+    """True when bars carry a time of day (daily bars sit at midnight)"""
+    return bool(len(timestamps)) and bool((timestamps != timestamps.normalize()).any())
+
+
+def compute_rollups(bars: pd.DataFrame, interval: str) -> pd.DataFrame:
+    """
+    Aggregate bars (lower-case OHLCV columns, timestamp index) into buckets
+
+    Returns:
+        DataFrame indexed by bucket_start with open/high/low/close/volume/bar_count
+    """
+    grouped = bars.groupby(bucket_starts(bars.index, interval), sort=True)
+    rollup = pd.DataFrame({
+        "open": grouped["open"].first(),
+        "high": grouped["high"].max(),
+        "low": grouped["low"].min(),
+        "close": grouped["close"].last(),
+        "volume": grouped["volume"].sum(),
+        "bar_count": grouped["close"].count(),
+    })
+    rollup.index.name = "bucket_start"
+    return rollup
+
+
+async def update_rollups(
+    db: AsyncSession,
+    symbol: str,
+    since: datetime,
+    intervals: Optional[List[str]] = None
+) -> int:
+    """
+    Recompute the rollup buckets affected by bars at or after ``since``
+
+    Only stored bars from the earliest affected bucket onward are read.
+
+    Returns:
+        Number of rollup rows written
+    """
+    intervals = intervals or ROLLUP_INTERVALS
+    since_index = pd.DatetimeIndex([since])
+    earliest = min(bucket_starts(since_index, interval)[0] for interval in intervals)
+
+    rows = (await db.execute(
+        select(
+            StockPrice.timestamp, StockPrice.open, StockPrice.high,
+            StockPrice.low, StockPrice.close, StockPrice.volume
+        )
+        .where(StockPrice.symbol == symbol, StockPrice.timestamp >= earliest.to_pydatetime())
+        .order_by(StockPrice.timestamp)
+    )).all()
+    if not rows:
+        return 0
+
+    bars = pd.DataFrame(
+        [r[1:] for r in rows],
+        index=pd.DatetimeIndex([r[0] for r in rows]),
+        columns=["open", "high", "low", "close", "volume"]
+    )
+    intraday = is_intraday(bars.index)
+
+    params = []
+    for interval in intervals:
+        if interval in INTRADAY_INTERVALS and not intraday:
+            continue
+        start = bucket_starts(since_index, interval)[0]
+        rollup = compute_rollups(bars[bars.index >= start], interval)
+        for bucket_start, bucket in zip(rollup.index.to_pydatetime(), rollup.itertuples(index=False)):
+            params.append({
+                "symbol": symbol,
+                "interval": interval,
+                "bucket_start": bucket_start,
+                "open": float(bucket.open),
+                "high": float(bucket.high),
+                "low": float(bucket.low),
+                "close": float(bucket.close),
+                "volume": int(bucket.volume),
+                "bar_count": int(bucket.bar_count),
+            })
+
+    if params:
+        stmt = upsert_statement(
+            db, PriceRollup.__table__, ["symbol", "interval", "bucket_start"], ROLLUP_COLUMNS
+        )
+        await db.execute(stmt, params)
+        await db.commit()
+        response_cache.invalidate(price_tag(symbol))
+
+    logger.debug(f"Updated {len(params)} rollup buckets for {symbol} since {since}")
+    return len(params)
@@ -1,6 +1,7 @@
 """
 Database Initialization and Schema Setup
 """
+from sqlalchemy import func, inspect, select
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 from loguru import logger
@@ -38,12 +39,50 @@ async def get_db():
         finally:
             await session.close()
 
+def upgrade_unique_indexes(conn) -> list:
+    """
+    Rebuild indexes that the models declare unique but an older database has as plain indexes
+    
+    ``create_all`` never alters an existing index, and upserts need a
+    unique index on their conflict columns. For each such index, duplicate
+    rows are removed (the most recently inserted row of each key is kept),
+    and then the index is dropped and recreated as unique.
+    
+    Args:
+        conn: Synchronous connection (run through ``AsyncConnection.run_sync``)
+    
+    Returns:
+        Names of the rebuilt indexes
+    """
+    inspector = inspect(conn)
+    rebuilt = []
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index["name"]: index for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if not index.unique or index.name not in existing or existing[index.name]["unique"]:
+                continue
+            
+            primary = table.primary_key.columns.values()[0]
+            keep = select(func.max(primary)).group_by(*index.columns)
+            removed = conn.execute(table.delete().where(primary.not_in(keep))).rowcount
+            index.drop(conn)
+            index.create(conn)
+            logger.warning(
+                f"Rebuilt {index.name} on {table.name} as a unique index "
+                f"({removed} duplicate rows removed)"
+            )
+            rebuilt.append(index.name)
+    return rebuilt
+
 async def init_database():
     """Initialize database tables"""
     try:
         # Ensure data directory exists
         os.makedirs("data", exist_ok=True)
         os.makedirs("data/raw", exist_ok=True)
+        os.makedirs("data/bars", exist_ok=True)
         os.makedirs("data/processed", exist_ok=True)
         os.makedirs("data/models", exist_ok=True)
         os.makedirs("logs", exist_ok=True)
@@ -54,6 +93,7 @@ async def init_database():
         # Create all tables
         async with engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(upgrade_unique_indexes)
         
         logger.info("Database tables created successfully")
     except Exception as e:
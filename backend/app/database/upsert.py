@@ -0,0 +1,24 @@
+"""
+Dialect-aware INSERT ... ON CONFLICT helpers
+"""
+from sqlalchemy import Table
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def upsert_statement(db: AsyncSession, table: Table, index_elements: list, update_columns: list):
+    """
+    Build INSERT ... ON CONFLICT (index_elements) DO UPDATE for the session's dialect
+
+    Executed with a list of parameter dicts it becomes one batched
+    executemany. SQLite and PostgreSQL are supported.
+    """
+    if db.bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    stmt = insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=index_elements,
+        set_={name: stmt.excluded[name] for name in update_columns}
+    )
@@ -10,8 +10,16 @@ from dotenv import load_dotenv
 import sys
 import os
 
-from app.api import health, trading, portfolio, ml, data
-from app.database.init_db import init_database
+from app.api import health, trading, portfolio, ml, data, live
+from app.database.init_db import init_database, AsyncSessionLocal
+from app.data.metadata import symbol_metadata
+from app.data.registry import ensure_registry
+from app.trading.engine import TradingEngine
+from app.trading.mark_to_market import mark_to_market
+from app.trading.order_book import order_book
+from app.trading.sweep import sweep_runner
+from app.trading.snapshots import snapshot_recorder
+from app.trading.var import var_engine
 
 # Load environment variables
 load_dotenv()
@@ -43,6 +51,7 @@ app.include_router(trading.router, prefix="/api/trading", tags=["trading"])
 app.include_router(portfolio.router, prefix="/api/portfolio", tags=["portfolio"])
 app.include_router(ml.router, prefix="/api/ml", tags=["machine-learning"])
 app.include_router(data.router, prefix="/api/data", tags=["data"])
+app.include_router(live.router, tags=["live"])
 
 @app.get("/")
 async def root():
@@ -64,6 +73,23 @@ async def startup_event():
     logger.info(f"Starting QuantEdge Trading Simulator for {exchange} ({currency})...")
     await init_database()
     logger.info("Database initialized successfully")
+    
+    # Warm the symbol metadata cache so lookups never hit the provider
+    async with AsyncSessionLocal() as db:
+        await ensure_registry(db)
+        loaded = await symbol_metadata.load_all(db)
+    logger.info(f"Loaded metadata for {loaded} symbols")
+    
+    app.state.trading_engine = TradingEngine(
+        initial_capital=float(os.getenv("INITIAL_CAPITAL", "1000000")),
+        currency=currency
+    )
+    # Restores positions and cash first, so snapshots start from the persisted portfolio
+    await order_book.start(app.state.trading_engine)
+    if snapshot_recorder.interval > 0:
+        snapshot_recorder.start(app.state.trading_engine)
+    if mark_to_market.flush_seconds > 0:
+        mark_to_market.start()
     # Load ML models here if needed
     logger.info("QuantEdge is ready!")
 
@@ -71,6 +97,11 @@ async def startup_event():
 async def shutdown_event():
     """Cleanup on shutdown"""
     logger.info("Shutting down QuantEdge...")
+    await snapshot_recorder.stop()
+    await sweep_runner.stop()
+    await order_book.stop()
+    await mark_to_market.stop()
+    var_engine.shutdown()
 
 if __name__ == "__main__":
     import uvicorn
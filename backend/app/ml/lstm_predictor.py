@@ -10,6 +10,14 @@ import joblib
 from loguru import logger
 from pathlib import Path
 
+from app.data.bar_store import BarStore
+
+# Default model inputs; close comes first because prepare_sequences targets column 0
+FEATURE_COLUMNS = [
+    "close", "open", "high", "low", "volume",
+    "rsi", "macd", "macd_signal", "bb_upper", "bb_lower"
+]
+
 class LSTMPredictor:
     """LSTM model for stock price prediction"""
     
@@ -42,6 +50,21 @@ class LSTMPredictor:
         logger.info("LSTM model built successfully")
         return model
     
+    def load_training_data(self, symbol: str, store: BarStore = None, columns: list = None, start=None):
+        """
+        Build a (bars, features) matrix straight from the columnar bar store
+        
+        Columns are read from memory-mapped files, so no CSV parsing or
+        pandas frame is involved. Bars with missing indicator values
+        (the warm-up period) are dropped.
+        """
+        store = store or BarStore()
+        columns = columns or FEATURE_COLUMNS[:self.features]
+        data = store.read(symbol, columns, start=start)
+        
+        matrix = np.column_stack([np.asarray(data[c], dtype=np.float32) for c in columns])
+        return matrix[~np.isnan(matrix).any(axis=1)]
+    
     def prepare_sequences(self, data: np.ndarray):
         """Prepare sequences for LSTM training"""
         X, y = [], []
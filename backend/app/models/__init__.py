@@ -1,6 +1,6 @@
 # Database models package
-from app.models.stock_data import StockPrice, MLPrediction
-from app.models.trades import Trade, Order
-from app.models.portfolio import Position, PortfolioSnapshot
+from app.models.stock_data import StockPrice, MLPrediction, SymbolMetadata, SymbolRegistry, PriceRollup
+from app.models.trades import Trade, Order, SweepResult
+from app.models.portfolio import Position, PortfolioSnapshot, PortfolioRollup
 
-__all__ = ['StockPrice', 'MLPrediction', 'Trade', 'Order', 'Position', 'PortfolioSnapshot']
+__all__ = ['StockPrice', 'MLPrediction', 'SymbolMetadata', 'SymbolRegistry', 'PriceRollup', 'Trade', 'Order', 'SweepResult', 'Position', 'PortfolioSnapshot', 'PortfolioRollup']
@@ -1,7 +1,7 @@
 """
 Portfolio and Position Models
 """
-from sqlalchemy import Column, Integer, String, Float, DateTime
+from sqlalchemy import Column, Integer, String, Float, DateTime, Index
 from app.database.init_db import Base
 from datetime import datetime
 
@@ -45,3 +45,30 @@ class PortfolioSnapshot(Base):
     daily_return = Column(Float, nullable=True)
     
     created_at = Column(DateTime, default=datetime.utcnow)
+
+class PortfolioRollup(Base):
+    """Compacted portfolio snapshots: OHLC of equity per hour or day"""
+    __tablename__ = "portfolio_rollups"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    interval = Column(String(5), nullable=False)  # 1h, 1d
+    bucket_start = Column(DateTime, nullable=False)
+    
+    # Total value over the bucket
+    open = Column(Float, nullable=False)
+    high = Column(Float, nullable=False)
+    low = Column(Float, nullable=False)
+    close = Column(Float, nullable=False)
+    
+    # Values at the last snapshot in the bucket
+    cash_balance = Column(Float, nullable=False)
+    positions_value = Column(Float, nullable=False)
+    total_pnl = Column(Float, nullable=False)
+    total_pnl_percent = Column(Float, nullable=False)
+    daily_return = Column(Float, nullable=True)
+    
+    snapshot_count = Column(Integer, nullable=False)
+    
+    __table_args__ = (
+        Index('idx_portfolio_rollup_interval_bucket', 'interval', 'bucket_start', unique=True),
+    )
@@ -1,7 +1,7 @@
 """
 Stock Data Models
 """
-from sqlalchemy import Column, Integer, String, Float, DateTime, Index
+from sqlalchemy import Column, BigInteger, Integer, String, Float, DateTime, Index
 from app.database.init_db import Base
 from datetime import datetime
 
@@ -33,7 +33,9 @@ class StockPrice(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     
     __table_args__ = (
-        Index('idx_symbol_timestamp', 'symbol', 'timestamp'),
+        # Unique so ingestion can upsert on (symbol, timestamp); also the
+        # keyset pagination index for a symbol's history
+        Index('idx_symbol_timestamp', 'symbol', 'timestamp', unique=True),
     )
 
 class MLPrediction(Base):
@@ -55,3 +57,52 @@ class MLPrediction(Base):
     lower_bound = Column(Float, nullable=True)
     
     created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        # Latest-prediction-per-symbol lookups
+        Index('idx_prediction_symbol_timestamp', 'symbol', 'timestamp'),
+    )
+
+class SymbolMetadata(Base):
+    """Cached descriptive data for a symbol (refreshed from the data provider on a TTL)"""
+    __tablename__ = "symbol_metadata"
+    
+    symbol = Column(String(20), primary_key=True)
+    long_name = Column(String(200), nullable=True)
+    currency = Column(String(10), nullable=True)
+    exchange = Column(String(20), nullable=True)
+    lot_size = Column(Integer, nullable=False, default=1)
+    sector = Column(String(100), nullable=True)
+    
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class SymbolRegistry(Base):
+    """Per-symbol bar coverage, maintained by ingestion"""
+    __tablename__ = "symbol_registry"
+    
+    symbol = Column(String(20), primary_key=True)
+    first_timestamp = Column(DateTime, nullable=False)
+    last_timestamp = Column(DateTime, nullable=False)
+    bar_count = Column(Integer, nullable=False, default=0)
+    
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class PriceRollup(Base):
+    """OHLCV aggregated to coarser intervals (weekly, monthly, intraday buckets)"""
+    __tablename__ = "price_rollups"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    symbol = Column(String(20), nullable=False)
+    interval = Column(String(5), nullable=False)  # 5m, 15m, 1h, 1w, 1mo
+    bucket_start = Column(DateTime, nullable=False)
+    
+    open = Column(Float, nullable=False)
+    high = Column(Float, nullable=False)
+    low = Column(Float, nullable=False)
+    close = Column(Float, nullable=False)
+    volume = Column(BigInteger, nullable=False)
+    bar_count = Column(Integer, nullable=False)
+    
+    __table_args__ = (
+        Index('idx_rollup_symbol_interval_bucket', 'symbol', 'interval', 'bucket_start', unique=True),
+    )
@@ -1,7 +1,7 @@
 """
 Trade and Order Models
 """
-from sqlalchemy import Column, Integer, String, Float, DateTime, Enum as SQLEnum
+from sqlalchemy import Column, BigInteger, Integer, String, Float, DateTime, Index, Text, Enum as SQLEnum
 from app.database.init_db import Base
 from datetime import datetime
 import enum
@@ -27,7 +27,7 @@ class Trade(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     symbol = Column(String(10), nullable=False, index=True)
-    timestamp = Column(DateTime, nullable=False, index=True)
+    timestamp = Column(DateTime, nullable=False)
     
     # Trade details
     side = Column(SQLEnum(OrderSide), nullable=False)
@@ -44,6 +44,12 @@ class Trade(Base):
     signal_source = Column(String(50), nullable=True)
     
     created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        # Keyset pagination key for trade history; also serves plain
+        # timestamp lookups, so the column carries no index of its own
+        Index('idx_trade_timestamp_id', 'timestamp', 'id'),
+    )
 
 class Order(Base):
     """Active and historical orders"""
@@ -65,3 +71,60 @@ class Order(Base):
     
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        # Keyset pagination key for order history
+        Index('idx_order_created_id', 'created_at', 'id'),
+    )
+
+class Sweep(Base):
+    """Configuration a sweep was started with, reused when it is resumed"""
+    __tablename__ = "sweeps"
+    
+    sweep_id = Column(String(64), primary_key=True)
+    strategy = Column(String(50), nullable=False)
+    mode = Column(String(10), nullable=False)
+    
+    # Scored window; bars after ``end`` never enter a resumed run
+    start = Column(DateTime, nullable=False)
+    end = Column(DateTime, nullable=False)
+    seed = Column(BigInteger, nullable=False)
+    samples = Column(Text, nullable=True)  # JSON, random mode
+    config_key = Column(String(32), nullable=False)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class SweepResult(Base):
+    """Backtest score of one parameter set on one segment of a sweep"""
+    __tablename__ = "sweep_results"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    sweep_id = Column(String(64), nullable=False)
+    strategy = Column(String(50), nullable=False)
+    params_key = Column(String(32), nullable=False)
+    params = Column(String(1000), nullable=False)  # JSON
+    # Fingerprint of the data, splits and costs; a resume must match it
+    config_key = Column(String(32), nullable=False)
+    
+    # Walk-forward split (0 for a full-period sweep) and train/test/full segment
+    split = Column(Integer, nullable=False, default=0)
+    segment = Column(String(5), nullable=False)
+    start = Column(DateTime, nullable=True)
+    end = Column(DateTime, nullable=True)
+    
+    # Scores
+    total_return = Column(Float, nullable=True)
+    annualized_return = Column(Float, nullable=True)
+    sharpe = Column(Float, nullable=True)
+    sortino = Column(Float, nullable=True)
+    max_drawdown = Column(Float, nullable=True)
+    win_rate = Column(Float, nullable=True)
+    final_value = Column(Float, nullable=True)
+    trades = Column(Integer, nullable=True)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        # One row per task, so an interrupted sweep resumes by skipping stored keys
+        Index('idx_sweep_result_task', 'sweep_id', 'params_key', 'split', 'segment', unique=True),
+    )
@@ -0,0 +1,320 @@
+"""
+Portfolio Risk Analytics
+
+Vectorized risk metrics over the ``portfolio_snapshots`` value series:
+volatility, Sharpe, Sortino, max drawdown, Calmar and beta against a
+benchmark index.
+
+``RiskAccumulator`` works on daily closes: snapshots (taken every
+``SNAPSHOT_INTERVAL_SECONDS``) and compacted hourly/daily rows are reduced
+to the last value of each UTC day, so every return spans one trading day
+and annualizes with ``RISK_PERIODS_PER_YEAR``. It keeps running sums
+(Welford mean/variance, downside deviation, peak and max drawdown) over
+completed days, plus a bounded window of recent closes whose last entry
+is the current day so far, and is updated as each snapshot is committed.
+The risk endpoint therefore reads O(window) state rather than rescanning
+the snapshot table; stored history (compacted tiers included) is scanned
+once when the accumulator is first loaded (or if snapshots arrive out of
+order).
+"""
+import copy
+import math
+import os
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from loguru import logger
+
+from app.models.portfolio import PortfolioSnapshot
+from app.trading.snapshots import equity_series
+
+
+def _finite(value: float) -> Optional[float]:
+    return float(value) if value is not None and math.isfinite(value) else None
+
+
+def simple_returns(values: np.ndarray) -> np.ndarray:
+    """Period-over-period returns of a value series"""
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) < 2:
+        return np.empty(0)
+    return values[1:] / values[:-1] - 1.0
+
+
+def max_drawdown(values: np.ndarray) -> float:
+    """Largest peak-to-trough decline as a negative fraction (0.0 if none)"""
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return 0.0
+    peaks = np.maximum.accumulate(values)
+    return float(np.min(values / peaks - 1.0))
+
+
+def risk_metrics(
+    values: Sequence[float],
+    periods_per_year: int = 252,
+    risk_free_rate: float = 0.0,
+    benchmark: Optional[Sequence[float]] = None
+) -> Dict:
+    """
+    Risk metrics for a value series
+
+    Args:
+        values: Portfolio values, oldest first
+        periods_per_year: Snapshots per year, used to annualize
+        risk_free_rate: Annual risk-free rate for Sharpe and Sortino
+        benchmark: Benchmark closes aligned with ``values`` (for beta)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    returns = simple_returns(values)
+    n = len(returns)
+    target = risk_free_rate / periods_per_year
+
+    metrics = {
+        "observations": n,
+        "total_return": None, "annualized_return": None, "volatility": None,
+        "sharpe": None, "sortino": None, "max_drawdown": None, "calmar": None, "beta": None,
+    }
+    if n == 0:
+        return metrics
+
+    excess = returns - target
+    std = returns.std(ddof=1) if n > 1 else float("nan")
+    downside = math.sqrt(np.mean(np.minimum(excess, 0.0) ** 2))
+    return _summarize(
+        metrics,
+        first=values[0], last=values[-1], n=n,
+        mean_excess=float(excess.mean()), std=std, downside=downside,
+        drawdown=max_drawdown(values), periods_per_year=periods_per_year,
+        beta=beta(returns, simple_returns(benchmark)) if benchmark is not None else None,
+    )
+
+
+def _summarize(metrics: Dict, first, last, n, mean_excess, std, downside, drawdown, periods_per_year, beta=None) -> Dict:
+    scale = math.sqrt(periods_per_year)
+    total_return = last / first - 1.0
+    annualized = (last / first) ** (periods_per_year / n) - 1.0 if last > 0 and first > 0 else float("nan")
+    metrics.update({
+        "total_return": _finite(total_return),
+        "annualized_return": _finite(annualized),
+        "volatility": _finite(std * scale),
+        "sharpe": _finite(mean_excess / std * scale) if std > 0 else None,
+        "sortino": _finite(mean_excess / downside * scale) if downside > 0 else None,
+        "max_drawdown": _finite(drawdown),
+        "calmar": _finite(annualized / -drawdown) if drawdown < 0 else None,
+        "beta": _finite(beta) if beta is not None else None,
+    })
+    return metrics
+
+
+def beta(returns: np.ndarray, benchmark_returns: np.ndarray) -> Optional[float]:
+    """Beta of ``returns`` against aligned benchmark returns"""
+    mask = np.isfinite(returns) & np.isfinite(benchmark_returns)
+    if mask.sum() < 2:
+        return None
+    x, y = benchmark_returns[mask], returns[mask]
+    variance = x.var(ddof=1)
+    if variance == 0:
+        return None
+    return float(np.cov(y, x, ddof=1)[0, 1] / variance)
+
+
+def rolling_beta(returns: np.ndarray, benchmark_returns: np.ndarray, window: int) -> np.ndarray:
+    """
+    Beta over each trailing ``window`` of returns (NaN until the window fills)
+
+    Uses windowed sums from cumulative sums, so the whole series is O(n).
+    Pairs with a missing value are skipped, as in ``beta``; a window needs
+    at least two valid pairs.
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    benchmark_returns = np.asarray(benchmark_returns, dtype=np.float64)
+    out = np.full(len(returns), np.nan)
+    if window < 2 or len(returns) < window:
+        return out
+
+    valid = np.isfinite(returns) & np.isfinite(benchmark_returns)
+    x = np.where(valid, benchmark_returns, 0.0)
+    y = np.where(valid, returns, 0.0)
+
+    def windowed(a):
+        c = np.concatenate(([0.0], np.cumsum(a)))
+        return c[window:] - c[:-window]
+
+    count = windowed(valid.astype(np.float64))
+    sx, sy = windowed(x), windowed(y)
+    sxx, sxy = windowed(x * x), windowed(x * y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        variance = sxx - sx * sx / count
+        covariance = sxy - sx * sy / count
+        out[window - 1:] = np.where((count >= 2) & (variance > 1e-18), covariance / variance, np.nan)
+    return out
+
+
+def align_benchmark(timestamps: Sequence[datetime], bench_times: Sequence[datetime], bench_closes: Sequence[float]) -> np.ndarray:
+    """Last benchmark close at or before each timestamp (NaN before the first close)"""
+    if len(bench_times) == 0:
+        return np.full(len(timestamps), np.nan)
+    bench = np.asarray(bench_times, dtype="datetime64[ns]")
+    positions = np.searchsorted(bench, np.asarray(timestamps, dtype="datetime64[ns]"), side="right") - 1
+    closes = np.asarray(bench_closes, dtype=np.float64)
+    return np.where(positions >= 0, closes[np.clip(positions, 0, None)], np.nan)
+
+
+class RiskAccumulator:
+    """Running risk statistics over committed portfolio snapshots"""
+
+    def __init__(self, history_size: int = None, periods_per_year: int = None, risk_free_rate: float = None):
+        """
+        Args:
+            history_size: Recent daily closes kept for windowed metrics (RISK_HISTORY_SIZE, default 2520)
+            periods_per_year: Trading days per year (RISK_PERIODS_PER_YEAR, default 252)
+            risk_free_rate: Annual risk-free rate (RISK_FREE_RATE, default 0.0)
+        """
+        self.history_size = history_size or int(os.getenv("RISK_HISTORY_SIZE", "2520"))
+        self.periods_per_year = periods_per_year or int(os.getenv("RISK_PERIODS_PER_YEAR", "252"))
+        self.risk_free_rate = (
+            risk_free_rate if risk_free_rate is not None else float(os.getenv("RISK_FREE_RATE", "0.0"))
+        )
+        self.reset()
+
+    def reset(self):
+        self.loaded = False
+        self._loading = False
+        self._pending: List = []
+        self.timestamps: deque = deque(maxlen=self.history_size)
+        self.values: deque = deque(maxlen=self.history_size)
+        self.first_value = None
+        self.last_close = None  # last completed day's close
+        self.count = 0          # returns seen
+        self.mean = 0.0         # Welford running mean of returns
+        self.m2 = 0.0           # Welford sum of squared deviations
+        self.downside_sq = 0.0  # sum of squared shortfalls below the risk-free target
+        self.peak = None
+        self.max_drawdown = 0.0
+
+    @property
+    def target(self) -> float:
+        return self.risk_free_rate / self.periods_per_year
+
+    def record(self, timestamp: datetime, value: float):
+        """Fold one snapshot into the running state (O(1))"""
+        if not self.loaded:
+            # Committed rows are picked up by the load scan; only buffer while it runs
+            if self._loading:
+                self._pending.append((timestamp, value))
+            return
+        if self.timestamps and timestamp <= self.timestamps[-1]:
+            if timestamp < self.timestamps[-1]:
+                # Backfilled history: running sums are order dependent, rescan on next read
+                self.reset()
+            return
+
+        if self.timestamps and timestamp.date() == self.timestamps[-1].date():
+            # Same day: the latest value stands as the day's close so far
+            self.timestamps[-1] = timestamp
+            self.values[-1] = value
+            return
+        if self.values:
+            # A new day completes the previous one
+            self._fold_close(self.values[-1])
+        self.timestamps.append(timestamp)
+        self.values.append(value)
+
+    def _fold_close(self, value: float):
+        """Fold one completed day's close into the running sums"""
+        if self.last_close is not None:
+            r = value / self.last_close - 1.0 if self.last_close else 0.0
+            self.count += 1
+            delta = r - self.mean
+            self.mean += delta / self.count
+            self.m2 += delta * (r - self.mean)
+            shortfall = min(r - self.target, 0.0)
+            self.downside_sq += shortfall * shortfall
+        else:
+            self.first_value = value
+
+        self.peak = value if self.peak is None else max(self.peak, value)
+        if self.peak > 0:
+            self.max_drawdown = min(self.max_drawdown, value / self.peak - 1.0)
+        self.last_close = value
+
+    async def ensure_loaded(self, db: AsyncSession):
+        """Build the running state from stored snapshots (once)"""
+        if self.loaded:
+            return
+        self._loading = True
+        try:
+            rows = await equity_series(db)
+        finally:
+            self._loading = False
+        if self.loaded:
+            return
+
+        pending, self._pending = self._pending, []
+        self.reset()
+        self.loaded = True
+        for timestamp, value in rows:
+            self.record(timestamp, value)
+        # Commits that landed while the scan ran (already-seen timestamps are skipped)
+        for timestamp, value in sorted(pending):
+            self.record(timestamp, value)
+        logger.debug(f"Risk accumulator loaded {len(rows)} snapshots")
+
+    def overall(self) -> Dict:
+        """Full-history metrics from the running sums"""
+        metrics = risk_metrics([], self.periods_per_year, self.risk_free_rate)
+        if not self.values:
+            return metrics
+        # Include the current day's close without committing it to the running sums
+        state = copy.copy(self)
+        state._fold_close(self.values[-1])
+        if state.count == 0:
+            return metrics
+        metrics["observations"] = state.count
+        std = math.sqrt(state.m2 / (state.count - 1)) if state.count > 1 else float("nan")
+        return _summarize(
+            metrics,
+            first=state.first_value, last=self.values[-1], n=state.count,
+            mean_excess=state.mean - self.target, std=std,
+            downside=math.sqrt(state.downside_sq / state.count),
+            drawdown=state.max_drawdown, periods_per_year=self.periods_per_year,
+        )
+
+    def window(self, size: int, benchmark: Optional[np.ndarray] = None) -> Dict:
+        """Metrics over the last ``size`` returns; ``benchmark`` aligns with ``recent(size)``"""
+        return risk_metrics(self.recent(size), self.periods_per_year, self.risk_free_rate, benchmark)
+
+    def recent(self, size: int) -> np.ndarray:
+        """The last ``size`` + 1 daily closes (``size`` returns)"""
+        values = np.fromiter(self.values, dtype=np.float64, count=len(self.values))
+        return values[-(size + 1):]
+
+    def recent_timestamps(self, size: int) -> List[datetime]:
+        return list(self.timestamps)[-(size + 1):]
+
+
+risk_accumulator = RiskAccumulator()
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_snapshots(session, flush_context):
+    for obj in session.new:
+        if isinstance(obj, PortfolioSnapshot):
+            session.info.setdefault("risk_snapshots", []).append((obj.timestamp, obj.total_value))
+
+
+@event.listens_for(Session, "after_commit")
+def _record_snapshots(session):
+    for timestamp, value in sorted(session.info.pop("risk_snapshots", [])):
+        risk_accumulator.record(timestamp, value)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_snapshots(session):
+    session.info.pop("risk_snapshots", None)
@@ -0,0 +1,427 @@
+"""
+Backtesting
+
+Replays stored bars through a ``TradingEngine``. Bars for the universe are
+loaded into a ``BarPanel`` (time x symbols arrays per field, NaN where a
+symbol has no bar), from ``stock_prices`` (streamed in timestamp order) or
+from the columnar bar store.
+
+``Backtester.run`` is the event-driven path: for each timestamp it marks
+positions to the bar closes, hands the strategy that timestamp's bars
+(OHLCV plus the precomputed indicators it asks for) and executes the
+returned orders at the close through the engine, commission included.
+
+``Backtester.run_vectorized`` is the fast path for ``SignalStrategy``
+subclasses: the strategy's entry/exit signal is evaluated on the whole
+panel at once and positions, cash and equity follow from array
+operations. It produces the same fills as the event-driven path as long
+as the engine never rejects an order for lack of cash.
+"""
+import math
+import os
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from loguru import logger
+
+from app.data.bar_store import BarStore
+from app.data.indicators import INDICATOR_COLUMNS
+from app.models.stock_data import StockPrice
+from app.trading.analytics import risk_metrics
+from app.trading.engine import TradingEngine
+
+BAR_FIELDS = ["open", "high", "low", "close", "volume"] + INDICATOR_COLUMNS
+STREAM_BATCH = 10_000
+
+
+class BarPanel:
+    """Bars for many symbols aligned on a shared timestamp axis (rows are timestamps)"""
+
+    def __init__(self, symbols: List[str], timestamps: pd.DatetimeIndex, fields: Dict[str, np.ndarray]):
+        """
+        Args:
+            symbols: Column labels
+            timestamps: Row labels, sorted
+            fields: float64 arrays of shape (timestamps, symbols), NaN where absent
+        """
+        self.symbols = symbols
+        self.timestamps = timestamps
+        self.fields = fields
+        self.mask = ~np.isnan(fields["close"]) if "close" in fields else np.zeros((len(timestamps), len(symbols)), dtype=bool)
+
+    @property
+    def bars(self) -> int:
+        return int(self.mask.sum())
+
+    def slice(self, start: int, stop: int) -> "BarPanel":
+        """Rows ``start:stop`` as views (no copy)"""
+        return BarPanel(self.symbols, self.timestamps[start:stop], {name: values[start:stop] for name, values in self.fields.items()})
+
+    @classmethod
+    def from_columns(cls, symbols: np.ndarray, timestamps: np.ndarray, columns: Dict[str, np.ndarray]) -> "BarPanel":
+        """Build from flat per-bar columns (one entry per symbol and timestamp)"""
+        col_labels, cols = np.unique(symbols, return_inverse=True)
+        row_labels, rows = np.unique(timestamps, return_inverse=True)
+        fields = {}
+        for name, values in columns.items():
+            panel = np.full((len(row_labels), len(col_labels)), np.nan)
+            panel[rows, cols] = values
+            fields[name] = panel
+        return cls(list(col_labels), pd.DatetimeIndex(row_labels), fields)
+
+    @classmethod
+    def from_store(
+        cls,
+        store: BarStore,
+        symbols: Optional[Sequence[str]] = None,
+        fields: Optional[List[str]] = None,
+        start=None,
+        end=None
+    ) -> "BarPanel":
+        """Load from the columnar bar store (memory-mapped reads)"""
+        fields = fields or BAR_FIELDS
+        symbol_parts, timestamp_parts = [], []
+        columns = {name: [] for name in fields}
+        for symbol in symbols or store.symbols():
+            data = store.read(symbol, fields, start, end)
+            symbol_parts.append(np.full(len(data["timestamp"]), symbol.upper(), dtype=object))
+            timestamp_parts.append(np.asarray(data["timestamp"]).astype("datetime64[ns]"))
+            for name in fields:
+                columns[name].append(np.asarray(data[name], dtype=np.float64))
+        if not symbol_parts:
+            return cls([], pd.DatetimeIndex([]), {name: np.empty((0, 0)) for name in fields})
+        return cls.from_columns(
+            np.concatenate(symbol_parts), np.concatenate(timestamp_parts),
+            {name: np.concatenate(parts) for name, parts in columns.items()}
+        )
+
+
+async def load_bar_panel(
+    db: AsyncSession,
+    symbols: Optional[Sequence[str]] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    fields: Optional[List[str]] = None
+) -> BarPanel:
+    """Stream stored bars in timestamp order into a BarPanel"""
+    fields = fields or BAR_FIELDS
+    query = select(StockPrice.timestamp, StockPrice.symbol, *(getattr(StockPrice, name) for name in fields))
+    if symbols:
+        query = query.where(StockPrice.symbol.in_(list(symbols)))
+    if start is not None:
+        query = query.where(StockPrice.timestamp >= start)
+    if end is not None:
+        query = query.where(StockPrice.timestamp <= end)
+    query = query.order_by(StockPrice.timestamp, StockPrice.symbol).execution_options(yield_per=STREAM_BATCH)
+
+    timestamp_parts, symbol_parts = [], []
+    columns = {name: [] for name in fields}
+    result = await db.stream(query)
+    async for partition in result.partitions():
+        timestamps, symbols_, *values = zip(*partition)
+        timestamp_parts.append(np.array(timestamps, dtype="datetime64[us]"))
+        symbol_parts.append(np.array(symbols_, dtype=object))
+        for name, column in zip(fields, values):
+            # None (NULL indicators) becomes NaN
+            columns[name].append(np.array(column, dtype=np.float64))
+
+    if not symbol_parts:
+        return BarPanel([], pd.DatetimeIndex([]), {name: np.empty((0, 0)) for name in fields})
+    return BarPanel.from_columns(
+        np.concatenate(symbol_parts), np.concatenate(timestamp_parts),
+        {name: np.concatenate(parts) for name, parts in columns.items()}
+    )
+
+
+def rolling_sma(closes: np.ndarray, mask: np.ndarray, window: int) -> np.ndarray:
+    """
+    Simple moving average over each symbol's own bars (columns of a time x symbols panel)
+
+    Bars are packed to the top of each column so windows skip missing
+    timestamps, as the stored SMA columns do; NaN until ``window`` bars.
+    """
+    order = np.argsort(~mask, axis=0, kind="stable")
+    packed = np.take_along_axis(np.where(mask, closes, 0.0), order, axis=0)
+    sums = np.cumsum(packed, axis=0)
+    means = np.full_like(packed, np.nan)
+    if len(packed) >= window:
+        means[window - 1:] = sums[window - 1:]
+        means[window:] -= sums[:-window]
+        means[window - 1:] /= window
+    rows = np.arange(len(packed))[:, None]
+    means[rows >= mask.sum(axis=0)[None, :]] = np.nan
+    out = np.empty_like(means)
+    np.put_along_axis(out, order, means, axis=0)
+    return out
+
+
+class Strategy:
+    """
+    Backtest strategy interface
+
+    ``fields`` names the bar columns passed to ``on_bar``; ``close`` is
+    always included.
+    """
+
+    fields: List[str] = ["close"]
+    # Bars of history ``prepare`` needs before the first scored bar
+    warmup: int = 0
+
+    def prepare(self, panel: BarPanel):
+        """Add any derived fields the strategy needs to ``panel`` (before the first bar)"""
+
+    def start(self, symbols: List[str], engine: TradingEngine):
+        """Called once before the first bar"""
+
+    def on_bar(
+        self,
+        timestamp: datetime,
+        columns: np.ndarray,
+        bar: Dict[str, np.ndarray],
+        engine: TradingEngine
+    ) -> List[Tuple[int, int]]:
+        """
+        React to one timestamp's bars
+
+        Args:
+            timestamp: Bar time
+            columns: Universe indexes of the symbols with a bar now
+            bar: Field -> values aligned with ``columns``
+            engine: Engine holding the backtest portfolio
+
+        Returns:
+            Orders as (universe index, signed share quantity) filled at this bar's close
+        """
+        return []
+
+
+class SignalStrategy(Strategy, ABC):
+    """
+    Long-only strategy driven by an entry/exit signal
+
+    ``signal`` maps bar fields to +1 (be long), -1 (be flat) or 0 (keep the
+    current state), elementwise, so it evaluates the same on one
+    timestamp's bars or on the whole panel. Each entry buys as many shares
+    as ``allocation`` of the initial capital affords; each exit sells them.
+    """
+
+    def __init__(self, allocation: float = 0.05):
+        self.allocation = allocation
+
+    @abstractmethod
+    def signal(self, bar: Dict[str, np.ndarray]) -> np.ndarray:
+        """+1 / -1 / 0 per element of the bar fields"""
+
+    def start(self, symbols: List[str], engine: TradingEngine):
+        self.budget = engine.initial_capital * self.allocation
+        self.shares = np.zeros(len(symbols), dtype=np.int64)
+        self.held = np.zeros(len(symbols), dtype=bool)
+
+    def on_bar(self, timestamp, columns, bar, engine):
+        signal = self.signal(bar)
+        held = self.held[columns]
+        exits = columns[(signal < 0) & held]
+        enter = (signal > 0) & ~held
+        self.held[exits] = False
+        self.held[columns[enter]] = True
+
+        orders = [(int(column), -int(self.shares[column])) for column in exits if self.shares[column]]
+        self.shares[exits] = 0
+        for column, price in zip(columns[enter], bar["close"][enter]):
+            shares = math.floor(self.budget / price)
+            self.shares[column] = shares
+            if shares:
+                orders.append((int(column), shares))
+        return orders
+
+
+class SmaCrossover(SignalStrategy):
+    """Long while the ``short``-bar SMA is above the ``long``-bar SMA"""
+
+    def __init__(self, allocation: float = 0.05, short: int = 20, long: int = 50):
+        if not 0 < short < long:
+            raise ValueError("SMA windows need 0 < short < long")
+        super().__init__(allocation)
+        self.short = short
+        self.long = long
+        self.fields = ["close", f"sma_{short}", f"sma_{long}"]
+        self.warmup = long
+
+    def prepare(self, panel):
+        # sma_20 and sma_50 are stored; other windows are computed from the closes,
+        # which sweeps load ``warmup`` bars early so every window is filled alike
+        for window in (self.short, self.long):
+            if f"sma_{window}" not in panel.fields:
+                panel.fields[f"sma_{window}"] = rolling_sma(panel.fields["close"], panel.mask, window)
+
+    def signal(self, bar):
+        short, long = bar[self.fields[1]], bar[self.fields[2]]
+        return np.where(short > long, 1, np.where(short < long, -1, 0))
+
+
+class RsiReversion(SignalStrategy):
+    """Buy when RSI drops below ``oversold``, sell when it rises above ``overbought``"""
+
+    fields = ["close", "rsi"]
+
+    def __init__(self, allocation: float = 0.05, oversold: float = 30.0, overbought: float = 70.0):
+        super().__init__(allocation)
+        self.oversold = oversold
+        self.overbought = overbought
+
+    def signal(self, bar):
+        rsi = bar["rsi"]
+        return np.where(rsi < self.oversold, 1, np.where(rsi > self.overbought, -1, 0))
+
+
+STRATEGIES = {"sma_crossover": SmaCrossover, "rsi_reversion": RsiReversion}
+
+
+def warmup_start(start: datetime, bars: int) -> datetime:
+    """A load start far enough before ``start`` to cover ``bars`` daily bars"""
+    return start - timedelta(days=math.ceil(bars * 365 / 252) + 7) if bars else start
+
+
+@dataclass
+class BacktestResult:
+    timestamps: List[datetime]
+    equity: np.ndarray
+    trades: List[Dict] = field(default_factory=list)
+    stats: Dict = field(default_factory=dict)
+
+    def to_dict(self, max_trades: int = None) -> Dict:
+        trades = self.trades if max_trades is None else self.trades[-max_trades:]
+        return {
+            "stats": self.stats,
+            "equity": {"timestamp": self.timestamps, "value": self.equity.tolist()},
+            "trades": trades,
+        }
+
+
+def _forward_index(present: np.ndarray) -> np.ndarray:
+    """Per cell, the row of the latest ``present`` cell at or above it in its column (-1 if none)"""
+    rows = np.arange(len(present))[:, None]
+    return np.maximum.accumulate(np.where(present, rows, -1), axis=0)
+
+
+def _take(values: np.ndarray, index: np.ndarray) -> np.ndarray:
+    return np.take_along_axis(values, np.clip(index, 0, None), axis=0)
+
+
+class Backtester:
+    """Replays a BarPanel through a TradingEngine"""
+
+    def __init__(self, initial_capital: float = None, commission_rate: float = None, periods_per_year: int = None):
+        """
+        Args:
+            initial_capital: Starting cash (INITIAL_CAPITAL, default 1000000)
+            commission_rate: Commission per traded value (the engine's default if None)
+            periods_per_year: Bars per year for the summary stats (RISK_PERIODS_PER_YEAR, default 252)
+        """
+        self.initial_capital = initial_capital or float(os.getenv("INITIAL_CAPITAL", "1000000"))
+        self.commission_rate = commission_rate
+        self.periods_per_year = periods_per_year or int(os.getenv("RISK_PERIODS_PER_YEAR", "252"))
+
+    def _engine(self) -> TradingEngine:
+        engine = TradingEngine(initial_capital=self.initial_capital, log_fills=False)
+        if self.commission_rate is not None:
+            engine.commission_rate = self.commission_rate
+        return engine
+
+    def run(self, panel: BarPanel, strategy: Strategy) -> BacktestResult:
+        """Event-driven replay, one strategy call per timestamp"""
+        engine = self._engine()
+        strategy.prepare(panel)
+        strategy.start(panel.symbols, engine)
+        symbols = np.array(panel.symbols, dtype=object)
+        fields = list(dict.fromkeys(["close"] + list(strategy.fields)))
+        arrays = {name: panel.fields[name] for name in fields}
+        closes = arrays["close"]
+        timestamps = list(panel.timestamps.to_pydatetime())
+
+        equity = np.empty(len(timestamps))
+        trades = []
+        for t, timestamp in enumerate(timestamps):
+            columns = np.flatnonzero(panel.mask[t])
+            row = closes[t]
+            engine.update_prices(dict(zip(symbols[columns].tolist(), row[columns].tolist())))
+
+            bar = {name: values[t, columns] for name, values in arrays.items()}
+            for column, quantity in strategy.on_bar(timestamp, columns, bar, engine):
+                symbol, price = symbols[column], float(row[column])
+                result = engine.execute_order(symbol, "BUY" if quantity > 0 else "SELL", abs(quantity), price)
+                if result["status"] == "filled":
+                    trade = result["trade"]
+                    trades.append({
+                        "timestamp": timestamp, "symbol": symbol, "side": trade["action"],
+                        "quantity": trade["quantity"], "price": price,
+                        "commission": trade["commission"], "pnl": trade.get("pnl"),
+                    })
+            equity[t] = engine.get_portfolio_value()
+
+        return self._result(panel, timestamps, equity, trades)
+
+    def run_vectorized(self, panel: BarPanel, strategy: SignalStrategy) -> BacktestResult:
+        """Whole-panel evaluation of a SignalStrategy (assumes no order is rejected)"""
+        rate = self.commission_rate if self.commission_rate is not None else self._engine().commission_rate
+        budget = self.initial_capital * strategy.allocation
+        strategy.prepare(panel)
+        closes = panel.fields["close"]
+
+        signal = strategy.signal({name: panel.fields[name] for name in strategy.fields})
+        signal = np.where(panel.mask, signal, 0)
+        last_signal = _forward_index(signal != 0)
+        held = (last_signal >= 0) & (_take(signal, last_signal) > 0)
+
+        previous = np.vstack((np.zeros((1, held.shape[1]), dtype=bool), held[:-1]))
+        entries = held & ~previous
+        with np.errstate(divide="ignore", invalid="ignore"):
+            entry_shares = np.where(entries, np.floor(budget / closes), 0.0)
+        last_entry = _forward_index(entries)
+        shares = np.where(held, _take(entry_shares, last_entry), 0.0)
+        entry_price = _take(closes, last_entry)
+
+        delta = np.diff(shares, axis=0, prepend=0.0)
+        traded = delta != 0
+        prices = np.where(traded, closes, 0.0)
+        commission = np.abs(delta) * prices * rate
+        cash = self.initial_capital - np.cumsum((delta * prices + commission).sum(axis=1))
+        marks = np.nan_to_num(_take(closes, _forward_index(panel.mask)))
+        equity = cash + (shares * marks).sum(axis=1)
+
+        timestamps = list(panel.timestamps.to_pydatetime())
+        trades = []
+        # Sells before buys within a timestamp, as the event-driven path submits them
+        rows, columns = np.nonzero(traded)
+        order = np.lexsort((columns, delta[rows, columns] > 0, rows))
+        for t, column in zip(rows[order], columns[order]):
+            quantity, price = delta[t, column], closes[t, column]
+            fee = abs(quantity) * price * rate
+            trades.append({
+                "timestamp": timestamps[t], "symbol": panel.symbols[column],
+                "side": "BUY" if quantity > 0 else "SELL", "quantity": int(abs(quantity)),
+                "price": float(price), "commission": float(fee),
+                "pnl": None if quantity > 0 else float((price - entry_price[t - 1, column]) * -quantity - fee),
+            })
+        return self._result(panel, timestamps, equity, trades)
+
+    def _result(self, panel: BarPanel, timestamps: List[datetime], equity: np.ndarray, trades: List[Dict]) -> BacktestResult:
+        stats = risk_metrics(np.concatenate(([self.initial_capital], equity)), self.periods_per_year)
+        closed = [t["pnl"] for t in trades if t["pnl"] is not None]
+        stats.update({
+            "initial_capital": self.initial_capital,
+            "final_value": float(equity[-1]) if len(equity) else self.initial_capital,
+            "bars": panel.bars,
+            "symbols": len(panel.symbols),
+            "trades": len(trades),
+            "commission": float(sum(t["commission"] for t in trades)),
+            "win_rate": sum(pnl > 0 for pnl in closed) / len(closed) if closed else None,
+        })
+        logger.debug(f"Backtest over {stats['bars']} bars: {len(trades)} trades, final value {stats['final_value']:.2f}")
+        return BacktestResult(timestamps, equity, trades, stats)
@@ -1,30 +1,37 @@
 """
 Trading Simulation Engine
 """
-from typing import Dict, List
+from typing import Dict, List, Union
 from datetime import datetime
+
+import numpy as np
 from loguru import logger
 
+from app.trading.positions import PositionBook
+
 class TradingEngine:
     """Core trading simulation engine"""
     
-    def __init__(self, initial_capital: float = 1000000, currency: str = "INR"):
+    def __init__(self, initial_capital: float = 1000000, currency: str = "INR", log_fills: bool = True):
         """
         Initialize trading engine
         
         Args:
             initial_capital: Starting capital
             currency: Currency (INR for Indian market, USD for US market)
+            log_fills: Log every fill at INFO (backtests turn this off)
         """
         self.initial_capital = initial_capital
         self.cash_balance = initial_capital
-        self.positions: Dict[str, Dict] = {}
+        self.positions = PositionBook()
         self.orders: List[Dict] = []
         self.trades: List[Dict] = []
         self.commission_rate = 0.001  # 0.1% commission
         self.currency = currency
+        self.log_fills = log_fills
         
-        logger.info(f"Trading engine initialized with {currency} {initial_capital:,.2f}")
+        if log_fills:
+            logger.info(f"Trading engine initialized with {currency} {initial_capital:,.2f}")
     
     def execute_order(self, symbol: str, action: str, quantity: int, price: float):
         """Execute a trading order"""
@@ -41,24 +48,7 @@ class TradingEngine:
                 # Update cash
                 self.cash_balance -= total_cost
                 
-                # Update position
-                if symbol in self.positions:
-                    current_qty = self.positions[symbol]['quantity']
-                    current_avg = self.positions[symbol]['avg_price']
-                    new_qty = current_qty + quantity
-                    new_avg = ((current_qty * current_avg) + (quantity * price)) / new_qty
-                    
-                    self.positions[symbol] = {
-                        'quantity': new_qty,
-                        'avg_price': new_avg,
-                        'current_price': price
-                    }
-                else:
-                    self.positions[symbol] = {
-                        'quantity': quantity,
-                        'avg_price': price,
-                        'current_price': price
-                    }
+                self.positions.buy(symbol, quantity, price)
                 
                 trade = {
                     'symbol': symbol,
@@ -70,25 +60,24 @@ class TradingEngine:
                 }
                 self.trades.append(trade)
                 
-                logger.info(f"BUY {quantity} {symbol} @ ${price:.2f}")
+                if self.log_fills:
+                    logger.info(f"BUY {quantity} {symbol} @ ${price:.2f}")
                 return {"status": "filled", "trade": trade}
             
             elif action.upper() == "SELL":
-                if symbol not in self.positions or self.positions[symbol]['quantity'] < quantity:
+                position = self.positions.get(symbol)
+                if position is None or position['quantity'] < quantity:
                     logger.warning(f"Insufficient shares for {symbol} sale")
                     return {"status": "rejected", "reason": "insufficient_shares"}
                 
                 # Calculate P&L
-                avg_price = self.positions[symbol]['avg_price']
+                avg_price = position['avg_price']
                 pnl = (price - avg_price) * quantity - commission
                 
                 # Update cash
                 self.cash_balance += quantity * price - commission
                 
-                # Update position
-                self.positions[symbol]['quantity'] -= quantity
-                if self.positions[symbol]['quantity'] == 0:
-                    del self.positions[symbol]
+                self.positions.sell(symbol, quantity)
                 
                 trade = {
                     'symbol': symbol,
@@ -101,26 +90,21 @@ class TradingEngine:
                 }
                 self.trades.append(trade)
                 
-                logger.info(f"SELL {quantity} {symbol} @ ${price:.2f} (P&L: ${pnl:.2f})")
+                if self.log_fills:
+                    logger.info(f"SELL {quantity} {symbol} @ ${price:.2f} (P&L: ${pnl:.2f})")
                 return {"status": "filled", "trade": trade}
             
         except Exception as e:
             logger.error(f"Order execution error: {e}")
             return {"status": "error", "reason": str(e)}
     
-    def update_prices(self, prices: Dict[str, float]):
-        """Update current prices for all positions"""
-        for symbol, price in prices.items():
-            if symbol in self.positions:
-                self.positions[symbol]['current_price'] = price
+    def update_prices(self, prices: Union[Dict[str, float], np.ndarray]):
+        """Update current prices for all positions (a dict, or an array aligned with positions.symbols)"""
+        self.positions.update_prices(prices)
     
     def get_portfolio_value(self):
         """Calculate total portfolio value"""
-        positions_value = sum(
-            pos['quantity'] * pos['current_price']
-            for pos in self.positions.values()
-        )
-        return self.cash_balance + positions_value
+        return self.cash_balance + self.positions.market_value
     
     def get_portfolio_metrics(self):
         """Get portfolio performance metrics"""
@@ -0,0 +1,244 @@
+"""
+Mark-to-Market Service
+
+Keeps the latest price per symbol in memory (fed by bar ingestion) and
+values every open position in one vectorized pass. The ``positions``
+table is brought up to date in a single batched UPDATE per flush, every
+``MTM_FLUSH_SECONDS``, touching only positions whose price moved, instead
+of a row write per tick.
+
+Position quantities and entry prices are cached as arrays and reloaded
+after any ORM commit that changes a Position.
+"""
+import asyncio
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import bindparam, event, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from loguru import logger
+
+from app.database.init_db import AsyncSessionLocal
+from app.models.portfolio import Position
+from app.utils.broadcast import live_feed
+
+VALUATION_FIELDS = [
+    "quantity", "avg_entry_price", "current_price",
+    "market_value", "unrealized_pnl", "unrealized_pnl_percent",
+]
+
+
+class MarkToMarket:
+    """In-memory price cache and vectorized position valuation"""
+
+    def __init__(self, session_factory=None, flush_seconds: float = None):
+        """
+        Args:
+            session_factory: Session factory for background flushes (defaults to AsyncSessionLocal)
+            flush_seconds: Seconds between batched writes (MTM_FLUSH_SECONDS, default 5)
+        """
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.flush_seconds = flush_seconds if flush_seconds is not None else float(os.getenv("MTM_FLUSH_SECONDS", "5"))
+        self._task: Optional[asyncio.Task] = None
+        self.reset()
+
+    def reset(self):
+        self.prices: Dict[str, float] = {}
+        self.price_times: Dict[str, datetime] = {}
+        self._changed: set = set()
+        self.loaded = False
+        self.symbols = np.empty(0, dtype=object)
+        self.quantity = np.empty(0)
+        self.avg_entry_price = np.empty(0)
+        self.stored_price = np.empty(0)
+        self.stop_loss: List = []
+        self.take_profit: List = []
+        self.stats = {"ticks": 0, "flushes": 0, "rows_written": 0}
+
+    def update_price(self, symbol: str, price: float, timestamp: datetime = None) -> bool:
+        """Record a price; returns False (ignored) if older than the cached one"""
+        if timestamp is not None:
+            last = self.price_times.get(symbol)
+            if last is not None and timestamp < last:
+                return False
+            self.price_times[symbol] = timestamp
+        if self.prices.get(symbol) != price:
+            self.prices[symbol] = price
+            self._changed.add(symbol)
+        self.stats["ticks"] += 1
+        return True
+
+    def update_prices(self, prices: Dict[str, float]):
+        for symbol, price in prices.items():
+            self.update_price(symbol, price)
+
+    def invalidate_positions(self):
+        """Reload positions before the next valuation"""
+        self.loaded = False
+        # Freshly loaded rows may carry a stored price older than the cache
+        self._changed.update(self.prices)
+
+    async def ensure_loaded(self, db: AsyncSession):
+        if self.loaded:
+            return
+        rows = (await db.execute(
+            select(
+                Position.symbol, Position.quantity, Position.avg_entry_price,
+                Position.current_price, Position.stop_loss, Position.take_profit
+            ).order_by(Position.symbol)
+        )).all()
+        self.symbols = np.array([r[0] for r in rows], dtype=object)
+        self.quantity = np.array([r[1] for r in rows], dtype=np.float64)
+        self.avg_entry_price = np.array([r[2] for r in rows], dtype=np.float64)
+        self.stored_price = np.array([r[3] for r in rows], dtype=np.float64)
+        self.stop_loss = [r[4] for r in rows]
+        self.take_profit = [r[5] for r in rows]
+        self.loaded = True
+
+    def valuation(self) -> Dict[str, np.ndarray]:
+        """
+        Value every loaded position at the cached price (stored price if none)
+
+        Returns:
+            Column arrays keyed by ``symbol`` and VALUATION_FIELDS
+        """
+        prices = np.fromiter(
+            (self.prices.get(s, p) for s, p in zip(self.symbols, self.stored_price)),
+            dtype=np.float64, count=len(self.symbols)
+        )
+        cost = self.quantity * self.avg_entry_price
+        market_value = self.quantity * prices
+        unrealized = market_value - cost
+        with np.errstate(divide="ignore", invalid="ignore"):
+            percent = np.where(self.avg_entry_price != 0, (prices / self.avg_entry_price - 1.0) * 100, 0.0)
+        return {
+            "symbol": self.symbols,
+            "quantity": self.quantity,
+            "avg_entry_price": self.avg_entry_price,
+            "current_price": prices,
+            "market_value": market_value,
+            "unrealized_pnl": unrealized,
+            "unrealized_pnl_percent": percent,
+        }
+
+    async def flush(self, db: AsyncSession) -> int:
+        """
+        Persist valuations of positions whose price moved (one executemany UPDATE)
+
+        Returns:
+            Number of positions written
+        """
+        await self.ensure_loaded(db)
+        changed, self._changed = self._changed, set()
+        if not changed or not len(self.symbols):
+            return 0
+
+        values = self.valuation()
+        mask = np.fromiter((s in changed for s in self.symbols), dtype=bool, count=len(self.symbols))
+        mask &= values["current_price"] != self.stored_price
+        if not mask.any():
+            return 0
+
+        now = datetime.utcnow()
+        params = [
+            {
+                "b_symbol": symbol,
+                "current_price": float(price),
+                "unrealized_pnl": float(pnl),
+                "unrealized_pnl_percent": float(percent),
+                "updated_at": now,
+            }
+            for symbol, price, pnl, percent in zip(
+                values["symbol"][mask], values["current_price"][mask],
+                values["unrealized_pnl"][mask], values["unrealized_pnl_percent"][mask]
+            )
+        ]
+        stmt = (
+            update(Position.__table__)
+            .where(Position.__table__.c.symbol == bindparam("b_symbol"))
+            .values(
+                current_price=bindparam("current_price"),
+                unrealized_pnl=bindparam("unrealized_pnl"),
+                unrealized_pnl_percent=bindparam("unrealized_pnl_percent"),
+                updated_at=bindparam("updated_at"),
+            )
+        )
+        try:
+            await db.execute(stmt, params)
+            await db.commit()
+        except Exception:
+            self._changed.update(changed)
+            raise
+
+        self.stored_price[mask] = values["current_price"][mask]
+        self.stats["flushes"] += 1
+        self.stats["rows_written"] += len(params)
+        self._publish(values, mask)
+        return len(params)
+
+    @staticmethod
+    def _publish(values: Dict[str, np.ndarray], mask: np.ndarray):
+        if not live_feed.has_subscribers("positions"):
+            return
+        for i in np.flatnonzero(mask):
+            live_feed.publish("positions", {
+                "symbol": values["symbol"][i],
+                "quantity": int(values["quantity"][i]),
+                "avg_entry_price": float(values["avg_entry_price"][i]),
+                "current_price": float(values["current_price"][i]),
+                "unrealized_pnl": float(values["unrealized_pnl"][i]),
+                "unrealized_pnl_percent": float(values["unrealized_pnl_percent"][i]),
+                "closed": False,
+            })
+
+    async def run(self):
+        """Flush on the configured cadence until cancelled"""
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            try:
+                async with self.session_factory() as db:
+                    await self.flush(db)
+            except Exception as e:
+                logger.error(f"Mark-to-market flush failed: {e}")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+            logger.info(f"Marking positions to market every {self.flush_seconds:g}s")
+
+    async def stop(self):
+        """Stop the background task and write any pending valuations"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            async with self.session_factory() as db:
+                await self.flush(db)
+
+
+mark_to_market = MarkToMarket()
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_position_changes(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Position):
+            session.info["positions_changed"] = True
+            return
+
+
+@event.listens_for(Session, "after_commit")
+def _reload_positions(session):
+    if session.info.pop("positions_changed", False):
+        mark_to_market.invalidate_positions()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_position_changes(session):
+    session.info.pop("positions_changed", None)
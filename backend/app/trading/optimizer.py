@@ -0,0 +1,349 @@
+"""
+Portfolio Construction
+
+Target weights from an exponentially weighted (EWMA) covariance of bar
+returns:
+
+- ``min_variance``: lowest-variance fully invested long-only portfolio
+- ``mean_variance``: maximizes ``mu'w - risk_aversion / 2 * w'Sw``
+- ``risk_parity``: every symbol contributes equally to portfolio variance
+
+The covariance is maintained incrementally: ``EWMACovariance.update``
+folds one bar in O(n^2), and ``CovarianceTracker.refresh`` reads only the
+``stock_prices`` closes newer than each symbol's last folded bar. The
+tracker keeps a small LRU of estimators keyed by universe, so callers
+alternating between universes do not replay history on every request.
+History is replayed from scratch for a universe not in the LRU or when a
+bar arrives for a timestamp that was already folded.
+
+The long-only solvers use NumPy only: accelerated projected gradient for
+the quadratic programs and damped Newton for risk parity.
+"""
+import asyncio
+import os
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from loguru import logger
+
+from app.models.stock_data import StockPrice
+
+OPTIMIZER_METHODS = ["min_variance", "mean_variance", "risk_parity"]
+
+
+class EWMACovariance:
+    """Exponentially weighted mean and covariance of bar returns, updated per bar"""
+
+    def __init__(self, symbols: Sequence[str], decay: float = None):
+        """
+        Args:
+            symbols: Universe, in matrix order
+            decay: Weight of the previous estimate per bar (EWMA_DECAY, default 0.94)
+        """
+        self.symbols = list(symbols)
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.decay = decay or float(os.getenv("EWMA_DECAY", "0.94"))
+        n = len(self.symbols)
+        self.mean = np.zeros(n)
+        self.cov = np.zeros((n, n))
+        self.last_close = np.full(n, np.nan)
+        self.last_timestamp: Optional[datetime] = None
+        # Per symbol: timestamp of the last folded close (NaT if none yet)
+        self.last_seen = np.full(n, np.datetime64("NaT"), dtype="datetime64[us]")
+        # Returns folded into each (i, j) entry; the diagonal counts per symbol
+        self.counts = np.zeros((n, n), dtype=np.int64)
+        self.observations = 0
+
+    def update(self, timestamp: datetime, closes: np.ndarray):
+        """
+        Fold one bar of closes (NaN where a symbol has no bar)
+
+        Only symbols with a close now and before contribute a return; their
+        rows and columns of the covariance are updated, the rest carry over.
+        """
+        closes = np.asarray(closes, dtype=np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            returns = closes / self.last_close - 1.0
+        present = np.flatnonzero(np.isfinite(returns))
+        has_close = np.isfinite(closes)
+        self.last_close[has_close] = closes[has_close]
+        self.last_seen[has_close] = np.datetime64(timestamp, "us")
+        self.last_timestamp = timestamp
+        if not len(present):
+            return
+
+        lam = self.decay
+        r = returns[present]
+        deviation = r - self.mean[present]
+        self.mean[present] += (1.0 - lam) * deviation
+        if len(present) == len(self.symbols):
+            # Every symbol has a bar: update in place, avoiding the fancy-index copy
+            self.cov *= lam
+            self.cov += (1.0 - lam) * np.outer(deviation, deviation)
+            self.counts += 1
+        else:
+            block = np.ix_(present, present)
+            self.cov[block] = lam * self.cov[block] + (1.0 - lam) * np.outer(deviation, deviation)
+            self.counts[block] += 1
+        self.observations += 1
+
+    def update_many(self, timestamps: Sequence[datetime], closes: np.ndarray):
+        """Fold consecutive bars (rows of ``closes``) in order"""
+        for timestamp, row in zip(timestamps, closes):
+            self.update(timestamp, row)
+
+    def estimates(self, shrinkage: float = None) -> Dict[str, np.ndarray]:
+        """
+        Bias-corrected mean and covariance (the recursion starts from zero)
+
+        Each entry is corrected by its own count of folded returns, so a
+        symbol with a short history is not understated.
+
+        Args:
+            shrinkage: Weight moved from the covariances onto the diagonal
+                (COVARIANCE_SHRINKAGE, default 0.1); an EWMA over more
+                symbols than its effective window is otherwise singular
+        """
+        if shrinkage is None:
+            shrinkage = float(os.getenv("COVARIANCE_SHRINKAGE", "0.1"))
+        correction = np.where(self.counts > 0, 1.0 - self.decay ** self.counts, 1.0)
+        cov = self.cov / correction
+        if shrinkage:
+            cov = (1.0 - shrinkage) * cov + shrinkage * np.diag(np.diag(cov))
+        return {"mean": self.mean / np.diag(correction), "cov": cov}
+
+
+def project_capped_simplex(v: np.ndarray, cap: float = 1.0) -> np.ndarray:
+    """
+    Euclidean projection onto {w : sum(w) = 1, 0 <= w <= cap}
+
+    The projection is ``clip(v - s, 0, cap)`` for the shift ``s`` where the
+    clipped sum is 1. That sum is piecewise linear in ``s`` with breakpoints
+    at ``v`` and ``v - cap``, so sorting the breakpoints locates ``s``
+    exactly in O(n log n).
+    """
+    breakpoints = np.concatenate((v, v - cap))
+    # Moving s downward, a weight starts growing at v and stops at v - cap
+    slopes = np.concatenate((np.ones(len(v)), -np.ones(len(v))))
+    order = np.argsort(-breakpoints, kind="stable")
+    breakpoints, slopes = breakpoints[order], np.cumsum(slopes[order])
+    totals = np.concatenate(([0.0], np.cumsum(slopes[:-1] * -np.diff(breakpoints))))
+    k = min(int(np.searchsorted(totals, 1.0)), len(totals) - 1)
+    if totals[k] < 1.0 or slopes[k - 1] <= 0:
+        # Infeasible cap (cap * n < 1) or exact hit: take the breakpoint
+        shift = breakpoints[k]
+    else:
+        shift = breakpoints[k - 1] - (1.0 - totals[k - 1]) / slopes[k - 1]
+    return np.clip(v - shift, 0.0, cap)
+
+
+def _max_eigenvalue(matrix: np.ndarray, iterations: int = 50) -> float:
+    v = np.full(len(matrix), 1.0 / np.sqrt(len(matrix)))
+    value = 0.0
+    for _ in range(iterations):
+        w = matrix @ v
+        value = float(np.linalg.norm(w))
+        if value == 0.0:
+            return 0.0
+        v = w / value
+    return value
+
+
+def solve_quadratic(
+    cov: np.ndarray,
+    mean: Optional[np.ndarray] = None,
+    risk_aversion: float = 1.0,
+    max_weight: float = 1.0,
+    tolerance: float = 1e-9,
+    max_iterations: int = 10000
+) -> np.ndarray:
+    """
+    Long-only weights minimizing ``risk_aversion / 2 * w'Sw - mu'w``
+
+    Accelerated projected gradient (FISTA) with adaptive restart. With
+    ``mean`` None this is the minimum-variance portfolio.
+    """
+    n = len(cov)
+    mean = np.zeros(n) if mean is None else mean
+    lipschitz = risk_aversion * _max_eigenvalue(cov) * 1.1 or 1.0
+    step = 1.0 / lipschitz
+
+    w = project_capped_simplex(np.full(n, 1.0 / n), max_weight)
+    y, t = w.copy(), 1.0
+    for _ in range(max_iterations):
+        gradient = risk_aversion * (cov @ y) - mean
+        w_next = project_capped_simplex(y - step * gradient, max_weight)
+        if (y - w_next) @ (w_next - w) > 0:
+            # Momentum is pointing uphill: restart the acceleration
+            t = 1.0
+        t_next = (1.0 + np.sqrt(1.0 + 4.0 * t * t)) / 2.0
+        y = w_next + ((t - 1.0) / t_next) * (w_next - w)
+        converged = np.abs(w_next - w).max() < tolerance
+        w, t = w_next, t_next
+        if converged:
+            break
+    return w
+
+
+def solve_risk_parity(
+    cov: np.ndarray,
+    budgets: Optional[np.ndarray] = None,
+    tolerance: float = 1e-12,
+    max_iterations: int = 100
+) -> np.ndarray:
+    """
+    Long-only equal (or ``budgets``) risk contribution weights
+
+    Damped Newton on the convex ``x'Sx / 2 - sum(b log x)``, whose minimizer
+    normalized to sum 1 has risk contributions proportional to ``b``.
+    """
+    n = len(cov)
+    budgets = np.full(n, 1.0 / n) if budgets is None else budgets / budgets.sum()
+
+    def objective(x):
+        return 0.5 * x @ cov @ x - budgets @ np.log(x)
+
+    diag = np.clip(np.diag(cov), 1e-18, None)
+    x = 1.0 / np.sqrt(diag)
+    x *= np.sqrt(budgets.sum() / (x @ cov @ x))
+    value = objective(x)
+    for _ in range(max_iterations):
+        gradient = cov @ x - budgets / x
+        hessian = cov + np.diag(budgets / (x * x))
+        direction = -np.linalg.solve(hessian, gradient)
+        decrement = -gradient @ direction
+        if decrement / 2 < tolerance:
+            break
+        step = 1.0
+        while (x + step * direction <= 0).any():
+            step *= 0.5
+        while step > 1e-12:
+            candidate = x + step * direction
+            candidate_value = objective(candidate)
+            if candidate_value <= value - 0.25 * step * decrement:
+                break
+            step *= 0.5
+        else:
+            # No acceptable step (round-off level progress): keep the current x
+            break
+        x, value = candidate, candidate_value
+    return x / x.sum()
+
+
+def risk_contributions(weights: np.ndarray, cov: np.ndarray) -> np.ndarray:
+    """Fraction of portfolio variance contributed by each weight"""
+    marginal = cov @ weights
+    variance = float(weights @ marginal)
+    return weights * marginal / variance if variance > 0 else np.zeros_like(weights)
+
+
+def optimize(
+    method: str,
+    mean: np.ndarray,
+    cov: np.ndarray,
+    risk_aversion: float = 5.0,
+    max_weight: float = 1.0
+) -> np.ndarray:
+    """Target weights for one of OPTIMIZER_METHODS"""
+    if method == "min_variance":
+        return solve_quadratic(cov, None, 1.0, max_weight)
+    if method == "mean_variance":
+        return solve_quadratic(cov, mean, risk_aversion, max_weight)
+    if method == "risk_parity":
+        return solve_risk_parity(cov)
+    raise ValueError(f"Unknown optimizer method {method}")
+
+
+class CovarianceTracker:
+    """EWMA covariances for recently requested universes, kept current from stock_prices"""
+
+    def __init__(self, lookback_days: int = None, decay: float = None, cache_size: int = None):
+        """
+        Args:
+            lookback_days: History replayed for a new universe (COVARIANCE_LOOKBACK_DAYS, default 730)
+            decay: EWMA decay (EWMA_DECAY, default 0.94)
+            cache_size: Universes whose estimators are kept (COVARIANCE_CACHE_SIZE, default 8)
+        """
+        self.lookback_days = lookback_days or int(os.getenv("COVARIANCE_LOOKBACK_DAYS", "730"))
+        self.decay = decay
+        self.cache_size = cache_size or int(os.getenv("COVARIANCE_CACHE_SIZE", "8"))
+        self.estimators: "OrderedDict[tuple, EWMACovariance]" = OrderedDict()
+        self._lock = asyncio.Lock()
+
+    def reset(self):
+        self.estimators.clear()
+
+    async def refresh(self, db: AsyncSession, symbols: Sequence[str]) -> EWMACovariance:
+        """
+        Fold bars newer than each symbol's last folded one (replaying the lookback for a new universe)
+
+        Ingestion runs per symbol, so a symbol's bar can land after other
+        symbols' bars for the same timestamp were folded; the lookback is
+        then replayed so every bar is folded in timestamp order.
+        """
+        async with self._lock:
+            universe = list(dict.fromkeys(symbols))
+            key = tuple(universe)
+            since = datetime.utcnow() - timedelta(days=self.lookback_days)
+            estimator = self.estimators.get(key)
+            if estimator is not None:
+                self.estimators.move_to_end(key)
+                closes = await self._load_closes(db, universe, since, estimator)
+                last = estimator.last_timestamp
+                if last is None or closes.empty or closes.index[0] > last:
+                    self._fold(estimator, closes)
+                    return estimator
+                logger.info(f"Bars arrived for {closes.index[0]} after {last} was folded; replaying the EWMA covariance")
+
+            estimator = EWMACovariance(universe, self.decay)
+            self._fold(estimator, await self._load_closes(db, universe, since))
+            self.estimators[key] = estimator
+            self.estimators.move_to_end(key)
+            while len(self.estimators) > self.cache_size:
+                self.estimators.popitem(last=False)
+            return estimator
+
+    @staticmethod
+    async def _load_closes(
+        db: AsyncSession,
+        universe: Sequence[str],
+        since: datetime,
+        estimator: Optional[EWMACovariance] = None
+    ) -> pd.DataFrame:
+        """Timestamp x symbol closes since ``since``, after each symbol's last folded bar"""
+        query = select(StockPrice.timestamp, StockPrice.symbol, StockPrice.close).where(StockPrice.timestamp >= since)
+        if estimator is None:
+            query = query.where(StockPrice.symbol.in_(universe))
+        else:
+            # Symbols usually share their last folded timestamp, so this is a handful of ranges
+            seen, groups = np.unique(estimator.last_seen, return_inverse=True)
+            conditions = []
+            for i, timestamp in enumerate(seen):
+                group = StockPrice.symbol.in_([universe[j] for j in np.flatnonzero(groups == i)])
+                if np.isnat(timestamp):
+                    conditions.append(group)
+                else:
+                    conditions.append(and_(group, StockPrice.timestamp > timestamp.astype(datetime)))
+            query = query.where(or_(*conditions))
+
+        rows = (await db.execute(query)).all()
+        if not rows:
+            return pd.DataFrame(columns=list(universe), dtype=np.float64)
+        frame = pd.DataFrame(rows, columns=["timestamp", "symbol", "close"])
+        closes = frame.pivot_table(index="timestamp", columns="symbol", values="close", aggfunc="last")
+        return closes.reindex(columns=list(universe)).sort_index()
+
+    @staticmethod
+    def _fold(estimator: EWMACovariance, closes: pd.DataFrame):
+        if closes.empty:
+            return
+        estimator.update_many(list(closes.index.to_pydatetime()), closes.to_numpy(dtype=np.float64))
+        logger.debug(f"Folded {len(closes)} bars into the EWMA covariance of {len(closes.columns)} symbols")
+
+
+covariance_tracker = CovarianceTracker()
@@ -0,0 +1,403 @@
+"""
+Resting Order Book
+
+Fills PENDING orders as prices arrive. Each symbol keeps four heaps keyed
+on trigger price:
+
+- buy limits (highest limit first): fill when price <= limit
+- sell limits (lowest limit first): fill when price >= limit
+- sell stops (highest stop first): trigger when price <= stop
+- buy stops (lowest stop first): trigger when price >= stop
+
+so a tick only looks at the heap tops and pops the orders that actually
+trigger, O(log n) each. MARKET orders fill on the next price. Cancelled
+orders are removed lazily when they reach a heap top; once they make up
+more than half of a symbol's entries its heaps are rebuilt without them.
+
+Fills execute through ``TradingEngine.execute_order`` at the tick price.
+The resulting order status updates, trades and touched positions are
+buffered and written every ``ORDER_FLUSH_SECONDS`` as one executemany per
+table. On start-up the engine is restored from the stored positions and the
+cash ledger, so fills continue from the persisted portfolio.
+"""
+import asyncio
+import heapq
+import itertools
+import os
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import bindparam, case, delete, func, select, update, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from loguru import logger
+
+from app.database.init_db import AsyncSessionLocal
+from app.database.upsert import upsert_statement
+from app.models.portfolio import Position, PortfolioSnapshot
+from app.models.trades import Order, OrderSide, OrderStatus, OrderType, Trade
+from app.trading.mark_to_market import mark_to_market
+from app.utils.cache import response_cache
+
+POSITION_COLUMNS = ["quantity", "avg_entry_price", "current_price", "unrealized_pnl", "unrealized_pnl_percent", "updated_at"]
+
+
+@dataclass
+class RestingOrder:
+    id: int
+    symbol: str
+    side: OrderSide
+    order_type: OrderType
+    quantity: int
+    price: Optional[float]
+
+
+class SymbolBook:
+    """Trigger heaps for one symbol"""
+
+    __slots__ = ("buy_limits", "sell_limits", "buy_stops", "sell_stops", "market", "stale")
+
+    HEAPS = ("buy_limits", "sell_limits", "buy_stops", "sell_stops")
+
+    def __init__(self):
+        # Entries are (sort key, sequence, order id); max-heaps store negated prices
+        self.buy_limits: List = []
+        self.sell_limits: List = []
+        self.buy_stops: List = []
+        self.sell_stops: List = []
+        self.market: deque = deque()
+        # Entries whose order was cancelled but not yet popped
+        self.stale = 0
+
+    def __len__(self) -> int:
+        return len(self.market) + sum(len(getattr(self, name)) for name in self.HEAPS)
+
+    def compact(self, live: Dict):
+        """Drop entries whose order is no longer in ``live`` and re-heapify"""
+        for name in self.HEAPS:
+            heap = [entry for entry in getattr(self, name) if entry[2] in live]
+            heapq.heapify(heap)
+            setattr(self, name, heap)
+        self.market = deque(order_id for order_id in self.market if order_id in live)
+        self.stale = 0
+
+
+class OrderBook:
+    """Per-symbol trigger heaps over resting orders, filling through a TradingEngine"""
+
+    def __init__(self, session_factory=None, flush_seconds: float = None):
+        """
+        Args:
+            session_factory: Session factory for background flushes (defaults to AsyncSessionLocal)
+            flush_seconds: Seconds between batched writes (ORDER_FLUSH_SECONDS, default 1)
+        """
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.flush_seconds = flush_seconds if flush_seconds is not None else float(os.getenv("ORDER_FLUSH_SECONDS", "1"))
+        self.engine = None
+        self._task: Optional[asyncio.Task] = None
+        self.reset()
+
+    def reset(self):
+        self.books: Dict[str, SymbolBook] = defaultdict(SymbolBook)
+        self.orders: Dict[int, RestingOrder] = {}
+        self.last_price: Dict[str, float] = {}
+        self._sequence = itertools.count()
+        self._order_updates: List[Dict] = []
+        self._trades: List[Dict] = []
+        self._touched: set = set()
+        self.stats = {"ticks": 0, "filled": 0, "rejected": 0, "flushes": 0}
+
+    def add(self, order: RestingOrder) -> Optional[Dict]:
+        """
+        Rest an order (MARKET orders fill now if the symbol has a price)
+
+        Returns:
+            The fill for an immediately executed MARKET order, else None
+        """
+        if order.quantity is None or order.quantity <= 0:
+            raise ValueError(f"Order quantity must be positive, got {order.quantity}")
+        if order.order_type != OrderType.MARKET and (order.price is None or order.price <= 0):
+            raise ValueError(f"{order.order_type.value} order needs a positive price")
+        self.orders[order.id] = order
+        book = self.books[order.symbol]
+        entry_id = (next(self._sequence), order.id)
+
+        if order.order_type == OrderType.MARKET:
+            if order.symbol in self.last_price and self.engine is not None:
+                return self._fill(order, self.last_price[order.symbol])
+            book.market.append(order.id)
+        elif order.order_type == OrderType.LIMIT:
+            if order.side == OrderSide.BUY:
+                heapq.heappush(book.buy_limits, (-order.price, *entry_id))
+            else:
+                heapq.heappush(book.sell_limits, (order.price, *entry_id))
+        else:
+            if order.side == OrderSide.BUY:
+                heapq.heappush(book.buy_stops, (order.price, *entry_id))
+            else:
+                heapq.heappush(book.sell_stops, (-order.price, *entry_id))
+        return None
+
+    def cancel(self, order_id: int) -> bool:
+        """
+        Remove a resting order
+
+        Its heap entry is dropped when it reaches a heap top, or when stale
+        entries exceed half of the symbol's book and the heaps are rebuilt.
+        """
+        order = self.orders.pop(order_id, None)
+        if order is None:
+            return False
+        book = self.books[order.symbol]
+        book.stale += 1
+        if book.stale * 2 > len(book):
+            book.compact(self.orders)
+            if not len(book):
+                del self.books[order.symbol]
+        return True
+
+    def __len__(self) -> int:
+        return len(self.orders)
+
+    def on_price(self, symbol: str, price: float) -> List[Dict]:
+        """
+        Fill every resting order of ``symbol`` that ``price`` triggers
+
+        Returns:
+            Fills, in trigger order
+        """
+        self.last_price[symbol] = price
+        if self.engine is None:
+            return []
+        self.stats["ticks"] += 1
+        if symbol in self.engine.positions:
+            self.engine.update_prices({symbol: price})
+        book = self.books.get(symbol)
+        if book is None:
+            return []
+
+        triggered = list(book.market)
+        book.market.clear()
+        triggered += self._pop_while(book.buy_limits, lambda key: -key >= price)
+        triggered += self._pop_while(book.sell_limits, lambda key: key <= price)
+        triggered += self._pop_while(book.sell_stops, lambda key: -key >= price)
+        triggered += self._pop_while(book.buy_stops, lambda key: key <= price)
+        live = [order_id for order_id in triggered if order_id in self.orders]
+        book.stale -= len(triggered) - len(live)
+
+        fills = []
+        for order_id in live:
+            order = self.orders.get(order_id)
+            if order is not None:
+                fills.append(self._fill(order, price))
+        return fills
+
+    def _pop_while(self, heap: List, triggers) -> List[int]:
+        popped = []
+        while heap and triggers(heap[0][0]):
+            popped.append(heapq.heappop(heap)[2])
+        return popped
+
+    def _fill(self, order: RestingOrder, price: float) -> Dict:
+        del self.orders[order.id]
+        result = self.engine.execute_order(order.symbol, order.side.value, order.quantity, price)
+        now = datetime.utcnow()
+
+        if result["status"] == "filled":
+            trade = result["trade"]
+            self._order_updates.append({
+                "b_id": order.id, "status": OrderStatus.FILLED.name,
+                "filled_quantity": order.quantity, "filled_price": price, "updated_at": now,
+            })
+            self._trades.append({
+                "symbol": order.symbol, "timestamp": trade["timestamp"], "side": order.side.name,
+                "quantity": order.quantity, "price": price, "pnl": trade.get("pnl"),
+                "strategy": "order_book", "created_at": now,
+            })
+            self._touched.add(order.symbol)
+            self.stats["filled"] += 1
+        else:
+            self._order_updates.append({
+                "b_id": order.id, "status": OrderStatus.REJECTED.name,
+                "filled_quantity": 0, "filled_price": None, "updated_at": now,
+            })
+            self.stats["rejected"] += 1
+        return {"order_id": order.id, "symbol": order.symbol, "price": price, **result}
+
+    async def load(self, db: AsyncSession) -> int:
+        """
+        Rest every PENDING order from the database
+
+        Stored orders the book would not accept (non-positive quantity or
+        price) are queued as REJECTED instead.
+
+        Returns:
+            Number of PENDING orders read
+        """
+        rows = (await db.execute(
+            select(Order.id, Order.symbol, Order.side, Order.order_type, Order.quantity, Order.price)
+            .where(Order.status == OrderStatus.PENDING)
+            .order_by(Order.id)
+        )).all()
+        for row in rows:
+            if row.id not in self.orders:
+                try:
+                    self.add(RestingOrder(*row))
+                except ValueError as e:
+                    logger.warning(f"Rejecting stored order {row.id}: {e}")
+                    self._order_updates.append({
+                        "b_id": row.id, "status": OrderStatus.REJECTED.name,
+                        "filled_quantity": 0, "filled_price": None, "updated_at": datetime.utcnow(),
+                    })
+                    self.stats["rejected"] += 1
+        return len(rows)
+
+    async def restore(self, db: AsyncSession) -> Dict:
+        """
+        Rebuild the engine's positions and cash from the database
+
+        Positions come from the ``positions`` table. Cash is the latest
+        snapshot's balance (initial capital if none) moved by every trade
+        since, commission at the engine's rate.
+
+        Returns:
+            Restored position count and cash balance
+        """
+        engine = self.engine
+        rows = (await db.execute(
+            select(Position.symbol, Position.quantity, Position.avg_entry_price, Position.current_price)
+            .where(Position.quantity > 0)
+        )).all()
+        for symbol, quantity, avg_price, current_price in rows:
+            if symbol not in engine.positions:
+                engine.positions.buy(symbol, quantity, avg_price)
+                engine.positions.update_prices({symbol: current_price})
+
+        snapshot = (await db.execute(
+            select(PortfolioSnapshot.timestamp, PortfolioSnapshot.cash_balance)
+            .order_by(PortfolioSnapshot.timestamp.desc())
+            .limit(1)
+        )).first()
+        cash = snapshot.cash_balance if snapshot else engine.initial_capital
+        value = Trade.quantity * Trade.price
+        query = select(func.sum(case((Trade.side == OrderSide.BUY, -value), else_=value)), func.sum(value))
+        if snapshot:
+            query = query.where(Trade.timestamp > snapshot.timestamp)
+        flow, traded = (await db.execute(query)).one()
+        engine.cash_balance = cash + (flow or 0.0) - (traded or 0.0) * engine.commission_rate
+        return {"positions": len(rows), "cash_balance": engine.cash_balance}
+
+    async def flush(self, db: AsyncSession) -> int:
+        """
+        Write buffered order updates, trades and touched positions (one executemany each)
+
+        Returns:
+            Number of order rows updated
+        """
+        updates, self._order_updates = self._order_updates, []
+        trades, self._trades = self._trades, []
+        touched, self._touched = self._touched, set()
+        if not updates:
+            return 0
+
+        try:
+            orders = Order.__table__
+            await db.execute(
+                update(orders)
+                .where(orders.c.id == bindparam("b_id"))
+                .values(
+                    status=bindparam("status"),
+                    filled_quantity=bindparam("filled_quantity"),
+                    filled_price=bindparam("filled_price"),
+                    updated_at=bindparam("updated_at"),
+                ),
+                updates
+            )
+            if trades:
+                await db.execute(insert(Trade.__table__), trades)
+            await self._write_positions(db, touched)
+            await db.commit()
+        except Exception:
+            self._order_updates = updates + self._order_updates
+            self._trades = trades + self._trades
+            self._touched |= touched
+            raise
+
+        self.stats["flushes"] += 1
+        response_cache.invalidate("trades", "portfolio")
+        if touched:
+            mark_to_market.invalidate_positions()
+        return len(updates)
+
+    async def _write_positions(self, db: AsyncSession, symbols: set):
+        if not symbols:
+            return
+        now = datetime.utcnow()
+        held, closed = [], []
+        for symbol in symbols:
+            position = self.engine.positions.get(symbol)
+            if position is None:
+                closed.append(symbol)
+                continue
+            avg, current = position["avg_price"], position["current_price"]
+            held.append({
+                "symbol": symbol,
+                "quantity": position["quantity"],
+                "avg_entry_price": avg,
+                "current_price": current,
+                "unrealized_pnl": (current - avg) * position["quantity"],
+                "unrealized_pnl_percent": (current / avg - 1) * 100 if avg else 0.0,
+                "updated_at": now,
+            })
+        if held:
+            await db.execute(upsert_statement(db, Position.__table__, ["symbol"], POSITION_COLUMNS), held)
+        if closed:
+            await db.execute(delete(Position.__table__).where(Position.__table__.c.symbol.in_(closed)))
+
+    async def run(self):
+        """Flush on the configured cadence until cancelled"""
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            try:
+                async with self.session_factory() as db:
+                    await self.flush(db)
+            except Exception as e:
+                logger.error(f"Order book flush failed: {e}")
+
+    async def start(self, engine):
+        """Restore the engine, load resting orders and start flushing (call from the event loop)"""
+        self.engine = engine
+        async with self.session_factory() as db:
+            restored = await self.restore(db)
+            loaded = await self.load(db)
+        logger.info(
+            f"Restored {restored['positions']} positions and {restored['cash_balance']:,.2f} cash; "
+            f"order book resting {loaded} pending orders"
+        )
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Stop the background task and write any buffered fills"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        async with self.session_factory() as db:
+            await self.flush(db)
+
+    def get_stats(self) -> Dict:
+        return {
+            "resting": len(self.orders),
+            "symbols": len({order.symbol for order in self.orders.values()}),
+            "stale_entries": sum(book.stale for book in self.books.values()),
+            "pending_writes": len(self._order_updates),
+            **self.stats,
+        }
+
+
+order_book = OrderBook()
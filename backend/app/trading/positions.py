@@ -0,0 +1,145 @@
+"""
+Array-Backed Position Book
+
+Open positions stored column-wise in NumPy arrays (quantity, average
+price, current price) with a symbol -> slot index. Slots stay dense:
+closing a position moves the last slot into its place, so ``[:len(book)]``
+of every array is the live book and price updates are single vectorized
+passes.
+
+The total market value is maintained incrementally on every fill and price
+update, making the portfolio value O(1). The book reads like the former
+dict of dicts: ``book[symbol]`` returns ``{"quantity", "avg_price",
+"current_price"}``.
+"""
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Union
+
+import numpy as np
+
+# Dicts up to this size are applied element-wise; building index arrays costs more
+SMALL_UPDATE = 8
+
+
+class PositionBook(Mapping):
+    """Open positions as aligned arrays, keyed by symbol"""
+
+    def __init__(self, capacity: int = 64):
+        self.index: Dict[str, int] = {}
+        self.symbols: List[str] = []
+        self.quantity = np.zeros(capacity, dtype=np.int64)
+        self.avg_price = np.zeros(capacity)
+        self.current_price = np.zeros(capacity)
+        self.market_value = 0.0
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self.symbols))
+
+    def __contains__(self, symbol) -> bool:
+        return symbol in self.index
+
+    def __getitem__(self, symbol: str) -> Dict:
+        slot = self.index[symbol]
+        return {
+            "quantity": self.quantity.item(slot),
+            "avg_price": self.avg_price.item(slot),
+            "current_price": self.current_price.item(slot),
+        }
+
+    def _grow(self):
+        capacity = len(self.quantity) * 2
+        for name in ("quantity", "avg_price", "current_price"):
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:len(column)] = column
+            setattr(self, name, grown)
+
+    def buy(self, symbol: str, quantity: int, price: float):
+        """Add to (or open) a position at ``price``, which also becomes its current price"""
+        slot = self.index.get(symbol)
+        if slot is None:
+            slot = len(self.symbols)
+            if slot == len(self.quantity):
+                self._grow()
+            self.index[symbol] = slot
+            self.symbols.append(symbol)
+            self.quantity[slot] = quantity
+            self.avg_price[slot] = price
+            self.current_price[slot] = price
+            self.market_value += quantity * price
+            return
+
+        # .item() reads Python scalars, cheaper than NumPy scalar arithmetic per fill
+        held = self.quantity.item(slot)
+        current = self.current_price.item(slot)
+        total = held + quantity
+        self.avg_price[slot] = (held * self.avg_price.item(slot) + quantity * price) / total
+        self.quantity[slot] = total
+        self.current_price[slot] = price
+        self.market_value += total * price - held * current
+
+    def sell(self, symbol: str, quantity: int):
+        """Reduce a position (closing it at zero); the caller checks it holds ``quantity``"""
+        slot = self.index[symbol]
+        remaining = self.quantity.item(slot) - quantity
+        self.market_value -= quantity * self.current_price.item(slot)
+        if remaining:
+            self.quantity[slot] = remaining
+        else:
+            self._close(symbol, slot)
+
+    def _close(self, symbol: str, slot: int):
+        last = len(self.symbols) - 1
+        if slot != last:
+            moved = self.symbols[last]
+            self.symbols[slot] = moved
+            self.index[moved] = slot
+            self.quantity[slot] = self.quantity[last]
+            self.avg_price[slot] = self.avg_price[last]
+            self.current_price[slot] = self.current_price[last]
+        self.symbols.pop()
+        del self.index[symbol]
+        self.quantity[last] = 0
+        if not self.symbols:
+            # Nothing held: drop any accumulated rounding
+            self.market_value = 0.0
+
+    def update_prices(self, prices: Union[Dict[str, float], np.ndarray]):
+        """
+        Set current prices and adjust the market value
+
+        Args:
+            prices: Symbol -> price (symbols not held are ignored), or an
+                array aligned with ``symbols``
+        """
+        n = len(self.symbols)
+        if isinstance(prices, np.ndarray):
+            if len(prices) != n:
+                raise ValueError(f"Expected {n} prices aligned with the book, got {len(prices)}")
+            self.market_value += float(self.quantity[:n] @ (prices - self.current_price[:n]))
+            self.current_price[:n] = prices
+            return
+
+        if len(prices) <= SMALL_UPDATE:
+            for symbol, price in prices.items():
+                slot = self.index.get(symbol)
+                if slot is not None:
+                    self.market_value += self.quantity.item(slot) * (price - self.current_price.item(slot))
+                    self.current_price[slot] = price
+            return
+
+        slots = np.fromiter((self.index.get(s, -1) for s in prices), dtype=np.intp, count=len(prices))
+        values = np.fromiter(prices.values(), dtype=np.float64, count=len(prices))
+        held = slots >= 0
+        slots, values = slots[held], values[held]
+        self.market_value += float(self.quantity[slots] @ (values - self.current_price[slots]))
+        self.current_price[slots] = values
+
+    def revalue(self) -> float:
+        """Recompute the market value from the arrays (resets incremental rounding)"""
+        n = len(self.symbols)
+        self.market_value = float(self.quantity[:n] @ self.current_price[:n])
+        return self.market_value
@@ -0,0 +1,305 @@
+"""
+Portfolio Snapshot Recorder
+
+Records ``TradingEngine.get_portfolio_metrics()`` into
+``portfolio_snapshots`` on a fixed interval and keeps the table bounded
+with tiered retention:
+
+- raw snapshots for ``SNAPSHOT_RAW_RETENTION_HOURS`` (default 24)
+- then hourly OHLC-of-equity rows in ``portfolio_rollups`` for
+  ``SNAPSHOT_HOURLY_RETENTION_DAYS`` (default 30)
+- then daily OHLC-of-equity rows, kept indefinitely
+
+Compaction is incremental: each pass folds at most ``SNAPSHOT_COMPACT_BATCH``
+expired rows per tier into their buckets (merging with any partially
+compacted bucket) and deletes them in the same transaction.
+"""
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+import pandas as pd
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from loguru import logger
+
+from app.database.init_db import AsyncSessionLocal
+from app.database.upsert import upsert_statement
+from app.models.portfolio import PortfolioSnapshot, PortfolioRollup
+from app.utils.cache import response_cache
+
+TIERS = ["raw", "1h", "1d"]
+TIER_FREQ = {"1h": "1h", "1d": "1D"}
+
+LAST_FIELDS = ["cash_balance", "positions_value", "total_pnl", "total_pnl_percent", "daily_return"]
+ROLLUP_COLUMNS = ["open", "high", "low", "close"] + LAST_FIELDS + ["snapshot_count"]
+
+RAW_COLUMNS = (
+    PortfolioSnapshot.timestamp, PortfolioSnapshot.total_value, PortfolioSnapshot.cash_balance,
+    PortfolioSnapshot.positions_value, PortfolioSnapshot.total_pnl,
+    PortfolioSnapshot.total_pnl_percent, PortfolioSnapshot.daily_return,
+)
+PART_COLUMNS = ["timestamp"] + ROLLUP_COLUMNS
+
+
+def raw_parts(rows) -> pd.DataFrame:
+    """Raw snapshot rows as single-snapshot buckets"""
+    frame = pd.DataFrame(
+        [tuple(r) for r in rows],
+        columns=["timestamp", "total_value"] + LAST_FIELDS
+    )
+    for column in ("open", "high", "low", "close"):
+        frame[column] = frame["total_value"]
+    frame["snapshot_count"] = 1
+    return frame[PART_COLUMNS]
+
+
+def rollup_parts(rows) -> pd.DataFrame:
+    """Rollup rows (bucket_start first) as buckets"""
+    return pd.DataFrame([tuple(r) for r in rows], columns=PART_COLUMNS)
+
+
+def compact_parts(parts: List[pd.DataFrame], interval: str) -> pd.DataFrame:
+    """
+    Merge buckets into ``interval`` buckets
+
+    Parts are ordered by timestamp (stable, so earlier parts win ties) and
+    combined as OHLC of equity, last non-null value of the other fields and
+    the summed snapshot count.
+
+    Returns:
+        DataFrame indexed by bucket_start with ROLLUP_COLUMNS
+    """
+    parts = [p for p in parts if len(p)]
+    if not parts:
+        return pd.DataFrame(columns=ROLLUP_COLUMNS, index=pd.DatetimeIndex([], name="bucket_start"))
+    frame = pd.concat(parts, ignore_index=True).sort_values("timestamp", kind="mergesort")
+    grouped = frame.groupby(pd.DatetimeIndex(frame["timestamp"]).floor(TIER_FREQ[interval]), sort=True)
+    rollup = pd.DataFrame({
+        "open": grouped["open"].first(),
+        "high": grouped["high"].max(),
+        "low": grouped["low"].min(),
+        "close": grouped["close"].last(),
+        **{field: grouped[field].last() for field in LAST_FIELDS},
+        "snapshot_count": grouped["snapshot_count"].sum(),
+    })
+    rollup.index.name = "bucket_start"
+    return rollup
+
+
+def _rollup_columns():
+    return (
+        PortfolioRollup.bucket_start, *(getattr(PortfolioRollup, c) for c in ROLLUP_COLUMNS)
+    )
+
+
+async def _merge_into(db: AsyncSession, interval: str, parts: pd.DataFrame) -> int:
+    """Fold parts into stored ``interval`` buckets (upsert); returns the bucket count"""
+    buckets = pd.DatetimeIndex(parts["timestamp"]).floor(TIER_FREQ[interval]).unique()
+    existing = (await db.execute(
+        select(*_rollup_columns()).where(
+            PortfolioRollup.interval == interval,
+            PortfolioRollup.bucket_start.in_(list(buckets.to_pydatetime()))
+        )
+    )).all()
+    rollup = compact_parts([rollup_parts(existing), parts], interval)
+
+    params = []
+    for bucket_start, bucket in zip(rollup.index.to_pydatetime(), rollup.to_dict("records")):
+        daily_return = bucket["daily_return"]
+        params.append({
+            **bucket,
+            "interval": interval,
+            "bucket_start": bucket_start,
+            "daily_return": None if pd.isna(daily_return) else float(daily_return),
+            "snapshot_count": int(bucket["snapshot_count"]),
+        })
+    stmt = upsert_statement(db, PortfolioRollup.__table__, ["interval", "bucket_start"], ROLLUP_COLUMNS)
+    await db.execute(stmt, params)
+    return len(params)
+
+
+async def compact_snapshots(
+    db: AsyncSession,
+    now: datetime = None,
+    raw_retention: timedelta = None,
+    hourly_retention: timedelta = None,
+    batch_size: int = None
+) -> dict:
+    """
+    One incremental compaction pass (commits)
+
+    Only whole buckets older than each tier's retention are eligible.
+
+    Returns:
+        Rows compacted per tier, e.g. ``{"raw": 120, "1h": 0}``
+    """
+    now = now or datetime.utcnow()
+    raw_retention = raw_retention or timedelta(hours=float(os.getenv("SNAPSHOT_RAW_RETENTION_HOURS", "24")))
+    hourly_retention = hourly_retention or timedelta(days=float(os.getenv("SNAPSHOT_HOURLY_RETENTION_DAYS", "30")))
+    batch_size = batch_size or int(os.getenv("SNAPSHOT_COMPACT_BATCH", "5000"))
+    compacted = {"raw": 0, "1h": 0}
+
+    raw_cutoff = pd.Timestamp(now - raw_retention).floor("1h").to_pydatetime()
+    rows = (await db.execute(
+        select(PortfolioSnapshot.id, *RAW_COLUMNS)
+        .where(PortfolioSnapshot.timestamp < raw_cutoff)
+        .order_by(PortfolioSnapshot.timestamp, PortfolioSnapshot.id)
+        .limit(batch_size)
+    )).all()
+    if rows:
+        await _merge_into(db, "1h", raw_parts([r[1:] for r in rows]))
+        await db.execute(delete(PortfolioSnapshot).where(PortfolioSnapshot.id.in_([r[0] for r in rows])))
+        compacted["raw"] = len(rows)
+
+    hourly_cutoff = pd.Timestamp(now - hourly_retention).floor("1D").to_pydatetime()
+    rows = (await db.execute(
+        select(PortfolioRollup.id, *_rollup_columns())
+        .where(PortfolioRollup.interval == "1h", PortfolioRollup.bucket_start < hourly_cutoff)
+        .order_by(PortfolioRollup.bucket_start)
+        .limit(batch_size)
+    )).all()
+    if rows:
+        await _merge_into(db, "1d", rollup_parts([r[1:] for r in rows]))
+        await db.execute(delete(PortfolioRollup).where(PortfolioRollup.id.in_([r[0] for r in rows])))
+        compacted["1h"] = len(rows)
+
+    if rows or compacted["raw"]:
+        await db.commit()
+        response_cache.invalidate("portfolio")
+        logger.debug(f"Compacted portfolio snapshots: {compacted}")
+    return compacted
+
+
+def choose_tier(days: float, raw_retention: timedelta = None, hourly_retention: timedelta = None) -> str:
+    """Finest tier that still covers the last ``days``"""
+    raw_retention = raw_retention or timedelta(hours=float(os.getenv("SNAPSHOT_RAW_RETENTION_HOURS", "24")))
+    hourly_retention = hourly_retention or timedelta(days=float(os.getenv("SNAPSHOT_HOURLY_RETENTION_DAYS", "30")))
+    span = timedelta(days=days)
+    if span <= raw_retention:
+        return "raw"
+    if span <= hourly_retention:
+        return "1h"
+    return "1d"
+
+
+async def equity_history(db: AsyncSession, start: datetime, tier: str) -> pd.DataFrame:
+    """
+    Portfolio history since ``start`` at one tier's resolution
+
+    Coarser tiers include the not-yet-compacted finer rows, aggregated on
+    the fly, so the most recent buckets are always present.
+
+    Returns:
+        DataFrame indexed by timestamp with ROLLUP_COLUMNS (``close`` is the total value)
+    """
+    raw = (await db.execute(
+        select(*RAW_COLUMNS)
+        .where(PortfolioSnapshot.timestamp >= start)
+        .order_by(PortfolioSnapshot.timestamp, PortfolioSnapshot.id)
+    )).all()
+    if tier == "raw":
+        frame = raw_parts(raw).set_index("timestamp")
+        frame.index.name = "bucket_start"
+        return frame
+
+    parts = []
+    for interval in TIERS[1:TIERS.index(tier) + 1][::-1]:
+        rows = (await db.execute(
+            select(*_rollup_columns())
+            .where(
+                PortfolioRollup.interval == interval,
+                PortfolioRollup.bucket_start >= pd.Timestamp(start).floor(TIER_FREQ[interval]).to_pydatetime()
+            )
+            .order_by(PortfolioRollup.bucket_start)
+        )).all()
+        parts.append(rollup_parts(rows))
+    parts.append(raw_parts(raw))
+    return compact_parts(parts, tier)
+
+
+async def equity_series(db: AsyncSession) -> List:
+    """Every stored (timestamp, total value), oldest first, across all tiers"""
+    raw = (await db.execute(select(PortfolioSnapshot.timestamp, PortfolioSnapshot.total_value))).all()
+    compacted = (await db.execute(select(PortfolioRollup.bucket_start, PortfolioRollup.close))).all()
+    return sorted([tuple(r) for r in compacted] + [tuple(r) for r in raw])
+
+
+class SnapshotRecorder:
+    """Background task that snapshots the trading engine and compacts history"""
+
+    def __init__(self, session_factory=None, interval_seconds: float = None):
+        """
+        Args:
+            session_factory: Session factory (defaults to the app's AsyncSessionLocal)
+            interval_seconds: Seconds between snapshots (SNAPSHOT_INTERVAL_SECONDS, default 60)
+        """
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.interval = interval_seconds or float(os.getenv("SNAPSHOT_INTERVAL_SECONDS", "60"))
+        self.engine = None
+        self._task: Optional[asyncio.Task] = None
+        self._previous_close: Optional[float] = None
+        self._last_value: Optional[float] = None
+        self._last_day = None
+
+    async def record(self, now: datetime = None) -> PortfolioSnapshot:
+        """Write one snapshot of the engine's current metrics"""
+        now = now or datetime.utcnow()
+        metrics = self.engine.get_portfolio_metrics()
+
+        if self._last_day is not None and now.date() != self._last_day:
+            self._previous_close = self._last_value
+        daily_return = None
+        if self._previous_close:
+            daily_return = (metrics["total_value"] / self._previous_close - 1) * 100
+
+        snapshot = PortfolioSnapshot(
+            timestamp=now,
+            total_value=metrics["total_value"],
+            cash_balance=metrics["cash_balance"],
+            positions_value=metrics["positions_value"],
+            total_pnl=metrics["total_pnl"],
+            total_pnl_percent=metrics["total_pnl_percent"],
+            daily_return=daily_return,
+        )
+        async with self.session_factory() as db:
+            db.add(snapshot)
+            await db.commit()
+
+        self._last_value = metrics["total_value"]
+        self._last_day = now.date()
+        return snapshot
+
+    async def compact(self, now: datetime = None) -> dict:
+        async with self.session_factory() as db:
+            return await compact_snapshots(db, now)
+
+    async def run(self):
+        """Snapshot and compact every interval until cancelled"""
+        while True:
+            try:
+                await self.record()
+                await self.compact()
+            except Exception as e:
+                logger.error(f"Portfolio snapshot failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self, engine):
+        """Start recording ``engine`` in the background (call from the event loop)"""
+        self.engine = engine
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+            logger.info(f"Recording portfolio snapshots every {self.interval:g}s")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+snapshot_recorder = SnapshotRecorder()
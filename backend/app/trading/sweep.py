@@ -0,0 +1,588 @@
+"""
+Strategy Parameter Sweeps
+
+Fans backtests of many parameter sets out across a process pool:
+
+- ``grid``: every combination of the listed values
+- ``random_samples``: draws from choices (lists) and ranges
+  (``{"low", "high"}``; integers if both bounds are)
+- ``bayesian_suggest``: next candidates by expected improvement under a
+  Gaussian-process fit of the scores seen so far (NumPy only)
+
+Optionally each parameter set is scored on walk-forward splits (rolling or
+anchored train windows, each followed by an out-of-sample test window).
+
+The panel is copied once into a ``multiprocessing.shared_memory`` block;
+workers map it on start-up, so tasks carry only the parameters and a row
+range. Scores are upserted into ``sweep_results`` in batches as tasks
+finish, keyed on (sweep, parameters, split, segment): re-running a sweep
+with the same id skips the tasks already stored, which resumes an
+interrupted run. Each row carries a fingerprint of the sweep's data,
+splits and costs, and a resume with a different configuration is
+rejected rather than mixed into the ranking. The ``sweeps`` table keeps the
+scored window, the seed and any random samples a sweep started with, so a
+resume replays the same bars and parameter sets whenever it is posted.
+
+Rows before ``start`` are warm-up only: strategies compute derived fields
+(e.g. SMA windows) over them, but scoring begins at ``start``.
+"""
+import asyncio
+import hashlib
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from loguru import logger
+
+from app.database.init_db import AsyncSessionLocal
+from app.database.upsert import upsert_statement
+from app.models.trades import Sweep, SweepResult
+from app.trading.backtest import BarPanel, Backtester, STRATEGIES
+
+SWEEP_METRICS = ["sharpe", "sortino", "total_return", "annualized_return", "max_drawdown", "win_rate", "final_value"]
+SCORE_COLUMNS = SWEEP_METRICS + ["trades"]
+RESULT_COLUMNS = ["strategy", "params", "config_key", "start", "end"] + SCORE_COLUMNS
+
+
+def params_key(params: Dict) -> str:
+    return hashlib.blake2b(json.dumps(params, sort_keys=True).encode(), digest_size=12).hexdigest()
+
+
+def grid(space: Dict[str, Sequence]) -> List[Dict]:
+    """Every combination of the listed values"""
+    for name, values in space.items():
+        if not isinstance(values, (list, tuple)):
+            raise ValueError(f"Grid parameter {name} needs a list of values")
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+
+
+def _is_int_range(spec: Dict) -> bool:
+    return isinstance(spec["low"], int) and isinstance(spec["high"], int)
+
+
+def random_samples(space: Dict, count: int, seed=None) -> List[Dict]:
+    """``count`` independent draws: uniform over choices (lists) or ranges ({"low", "high"})"""
+    rng = np.random.default_rng(seed)
+    samples = []
+    for _ in range(count):
+        params = {}
+        for name, spec in space.items():
+            if isinstance(spec, dict):
+                if _is_int_range(spec):
+                    params[name] = int(rng.integers(spec["low"], spec["high"] + 1))
+                else:
+                    params[name] = float(rng.uniform(spec["low"], spec["high"]))
+            else:
+                params[name] = spec[int(rng.integers(len(spec)))]
+        samples.append(params)
+    return samples
+
+
+def _encode(space: Dict, params: Dict) -> np.ndarray:
+    """Parameters as a point in the unit cube (choices by index)"""
+    point = []
+    for name, spec in space.items():
+        if isinstance(spec, dict):
+            span = spec["high"] - spec["low"]
+            point.append((params[name] - spec["low"]) / span if span else 0.0)
+        else:
+            point.append(list(spec).index(params[name]) / max(len(spec) - 1, 1))
+    return np.array(point)
+
+
+def _decode(space: Dict, point: np.ndarray) -> Dict:
+    params = {}
+    for (name, spec), u in zip(space.items(), point):
+        if isinstance(spec, dict):
+            value = spec["low"] + u * (spec["high"] - spec["low"])
+            params[name] = int(round(value)) if _is_int_range(spec) else float(value)
+        else:
+            params[name] = spec[int(round(u * (len(spec) - 1)))]
+    return params
+
+
+def bayesian_suggest(
+    space: Dict,
+    observed: List[Dict],
+    scores: Sequence[float],
+    count: int,
+    seed=None,
+    candidates: int = 1000,
+    length_scale: float = 0.2
+) -> List[Dict]:
+    """
+    Next ``count`` untried parameter sets by expected improvement
+
+    Fits a Gaussian process (RBF kernel on the unit-cube encoding) to the
+    observed scores, higher being better, and ranks random candidates by
+    expected improvement over the best score. Falls back to random samples
+    until a few scores are known.
+    """
+    rng = np.random.default_rng(seed)
+    seen = {params_key(p) for p in observed}
+    known = [(p, s) for p, s in zip(observed, scores) if s is not None and math.isfinite(s)]
+    if len(known) < max(3, len(space) + 1):
+        fresh = [p for p in random_samples(space, count * 4, rng) if params_key(p) not in seen]
+        return list({params_key(p): p for p in fresh}.values())[:count]
+
+    x = np.array([_encode(space, p) for p, _ in known])
+    y = np.array([s for _, s in known])
+    y = (y - y.mean()) / (y.std() or 1.0)
+
+    def kernel(a, b):
+        distance = ((a[:, None, :] - b[None, :, :]) ** 2).sum(axis=-1)
+        return np.exp(-0.5 * distance / length_scale ** 2)
+
+    factor = np.linalg.cholesky(kernel(x, x) + 1e-6 * np.eye(len(x)))
+    alpha = np.linalg.solve(factor.T, np.linalg.solve(factor, y))
+
+    # Decode then re-encode so candidates sit on the parameter grid
+    pool = [_decode(space, u) for u in rng.random((candidates, len(space)))]
+    pool = [p for p in {params_key(p): p for p in pool}.values() if params_key(p) not in seen]
+    if not pool:
+        return []
+    points = np.array([_encode(space, p) for p in pool])
+    cross = kernel(points, x)
+    mean = cross @ alpha
+    v = np.linalg.solve(factor, cross.T)
+    sd = np.sqrt(np.clip(1.0 - (v * v).sum(axis=0), 1e-12, None))
+
+    z = (mean - y.max()) / sd
+    cdf = 0.5 * (1.0 + np.array([math.erf(value / math.sqrt(2.0)) for value in z]))
+    pdf = np.exp(-0.5 * z * z) / math.sqrt(2.0 * math.pi)
+    improvement = (mean - y.max()) * cdf + sd * pdf
+    return [pool[i] for i in np.argsort(-improvement)[:count]]
+
+
+def walk_forward_splits(
+    rows: int,
+    train: int,
+    test: int,
+    step: int = None,
+    anchored: bool = False,
+    start: int = 0
+) -> List[Tuple[int, int, int]]:
+    """
+    (train_start, test_start, test_stop) row bounds
+
+    Train windows of ``train`` rows from row ``start`` (growing from it if
+    ``anchored``) are each followed by ``test`` rows; windows advance by
+    ``step`` (default ``test``).
+    """
+    step = step or test
+    splits = []
+    offset = start
+    while offset + train + test <= rows:
+        splits.append((start if anchored else offset, offset + train, offset + train + test))
+        offset += step
+    return splits
+
+
+def config_key(
+    panel: BarPanel,
+    strategy: str,
+    start: int = 0,
+    splits: Optional[List[Tuple[int, int, int]]] = None,
+    initial_capital: float = None,
+    commission_rate: float = None,
+    vectorized: bool = True
+) -> str:
+    """Fingerprint of everything besides the parameters that a sweep's scores depend on"""
+    backtester = Backtester(initial_capital, commission_rate)
+    timestamps = panel.timestamps
+    config = {
+        "strategy": strategy,
+        "symbols": list(panel.symbols),
+        "rows": len(timestamps) - start,
+        "first": timestamps[start].isoformat() if start < len(timestamps) else None,
+        "last": timestamps[-1].isoformat() if len(timestamps) else None,
+        "splits": [[a - start, b - start, c - start] for a, b, c in splits or []],
+        "initial_capital": backtester.initial_capital,
+        "commission_rate": backtester._engine().commission_rate,
+        "vectorized": vectorized,
+    }
+    return params_key(config)
+
+
+async def check_config(db: AsyncSession, sweep_id: str, key: str):
+    """Raise ValueError if ``sweep_id`` was started or has results stored under another configuration"""
+    started = await db.scalar(select(Sweep.config_key).where(Sweep.sweep_id == sweep_id))
+    stored = (await db.execute(
+        select(SweepResult.config_key).where(SweepResult.sweep_id == sweep_id, SweepResult.config_key != key).limit(1)
+    )).scalar()
+    if stored is not None or started not in (None, key):
+        raise ValueError(
+            f"Sweep {sweep_id} has results for different data, splits or costs; start a new sweep_id"
+        )
+
+
+async def load_sweep(db: AsyncSession, sweep_id: str) -> Optional[Dict]:
+    """The stored window, seed and samples of a sweep, or None if it was never started"""
+    row = await db.get(Sweep, sweep_id)
+    if row is None:
+        return None
+    return {
+        "strategy": row.strategy, "mode": row.mode, "start": row.start, "end": row.end,
+        "seed": row.seed, "samples": json.loads(row.samples) if row.samples else None,
+        "config_key": row.config_key,
+    }
+
+
+async def save_sweep(
+    db: AsyncSession,
+    sweep_id: str,
+    strategy: str,
+    mode: str,
+    start: datetime,
+    end: datetime,
+    seed: int,
+    samples: Optional[List[Dict]],
+    key: str
+):
+    """Record the configuration a new sweep starts with (kept as is on resume)"""
+    if await db.get(Sweep, sweep_id) is None:
+        db.add(Sweep(
+            sweep_id=sweep_id, strategy=strategy, mode=mode, start=start, end=end, seed=seed,
+            samples=json.dumps(samples) if samples is not None else None, config_key=key,
+        ))
+        await db.commit()
+
+
+def share_panel(panel: BarPanel) -> Tuple[SharedMemory, Dict]:
+    """Copy the panel's fields into one shared memory block; returns it and the spec to attach"""
+    names = list(panel.fields)
+    shape = (len(names), len(panel.timestamps), len(panel.symbols))
+    shm = SharedMemory(create=True, size=max(int(np.prod(shape)) * 8, 1))
+    block = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    for i, name in enumerate(names):
+        block[i] = panel.fields[name]
+    spec = {
+        "name": shm.name, "shape": shape, "fields": names, "symbols": panel.symbols,
+        "timestamps": panel.timestamps.asi8,
+    }
+    return shm, spec
+
+
+def attach_panel(spec: Dict) -> Tuple[SharedMemory, BarPanel]:
+    """Map a shared panel (views into the block, no copy)"""
+    shm = SharedMemory(name=spec["name"])
+    block = np.ndarray(spec["shape"], dtype=np.float64, buffer=shm.buf)
+    fields = {name: block[i] for i, name in enumerate(spec["fields"])}
+    return shm, BarPanel(spec["symbols"], pd.DatetimeIndex(spec["timestamps"]), fields)
+
+
+_worker: Dict = {}
+
+
+def _init_worker(spec: Dict, config: Dict):
+    shm, panel = attach_panel(spec)
+    if config.pop("untrack", False):
+        # Spawned workers run their own resource tracker, which would unlink the block on exit
+        resource_tracker.unregister(shm._name, "shared_memory")
+    _worker.update(shm=shm, panel=panel, backtester=Backtester(**config))
+
+
+def evaluate(panel: BarPanel, backtester: Backtester, task: Tuple) -> Dict:
+    """Scores of one (strategy, params, start row, stop row, vectorized) task"""
+    name, params, start, stop, vectorized = task
+    strategy = STRATEGIES[name](**params)
+    segment = panel.slice(start, stop)
+    result = backtester.run_vectorized(segment, strategy) if vectorized else backtester.run(segment, strategy)
+    return {column: result.stats.get(column) for column in SCORE_COLUMNS}
+
+
+def _evaluate_in_worker(task: Tuple) -> Dict:
+    return evaluate(_worker["panel"], _worker["backtester"], task)
+
+
+class SweepRunner:
+    """Parallel backtest sweeps persisted to sweep_results"""
+
+    def __init__(self, session_factory=None, workers: int = None, write_batch: int = None):
+        """
+        Args:
+            session_factory: Session factory for result writes (defaults to AsyncSessionLocal)
+            workers: Process pool size; 1 runs in-process (SWEEP_WORKERS, default CPU count)
+            write_batch: Results per upsert (SWEEP_WRITE_BATCH, default 50)
+        """
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.workers = workers or int(os.getenv("SWEEP_WORKERS", str(os.cpu_count() or 1)))
+        self.write_batch = write_batch or int(os.getenv("SWEEP_WRITE_BATCH", "50"))
+        self.progress: Dict[str, Dict] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def tasks(
+        self,
+        strategy: str,
+        samples: List[Dict],
+        rows: int,
+        splits: Optional[List[Tuple[int, int, int]]] = None,
+        vectorized: bool = True,
+        start: int = 0
+    ) -> List[Tuple[str, int, str, Tuple]]:
+        """(params key, split, segment, task) per parameter set and segment"""
+        out = []
+        for params in samples:
+            key = params_key(params)
+            if not splits:
+                out.append((key, 0, "full", (strategy, params, start, rows, vectorized)))
+                continue
+            for split, (train_start, test_start, test_stop) in enumerate(splits, start=1):
+                out.append((key, split, "train", (strategy, params, train_start, test_start, vectorized)))
+                out.append((key, split, "test", (strategy, params, test_start, test_stop, vectorized)))
+        return out
+
+    async def run(
+        self,
+        sweep_id: str,
+        panel: BarPanel,
+        strategy: str,
+        samples: List[Dict],
+        splits: Optional[List[Tuple[int, int, int]]] = None,
+        initial_capital: float = None,
+        commission_rate: float = None,
+        vectorized: bool = True,
+        start: int = 0,
+        on_progress: Optional[Callable[[Dict], None]] = None
+    ) -> Dict:
+        """
+        Backtest every sample (on every split) and store the scores
+
+        Tasks already stored under ``sweep_id`` are skipped; a ValueError is
+        raised if they were stored under a different configuration.
+        Parameter sets the strategy rejects are dropped with a warning.
+        ``splits`` are absolute row bounds, at or after ``start``.
+
+        Returns:
+            Progress counts (total, skipped, done, failed, elapsed)
+        """
+        valid = []
+        for params in samples:
+            try:
+                # Derived fields (e.g. other SMA windows) are computed once, before sharing
+                STRATEGIES[strategy](**params).prepare(panel)
+                valid.append(params)
+            except (TypeError, ValueError) as e:
+                logger.warning(f"Skipping {strategy} parameters {params}: {e}")
+
+        pending = self.tasks(strategy, valid, len(panel.timestamps), splits, vectorized, start)
+        key = config_key(panel, strategy, start, splits, initial_capital, commission_rate, vectorized)
+        async with self.session_factory() as db:
+            await check_config(db, sweep_id, key)
+            stored = set((await db.execute(
+                select(SweepResult.params_key, SweepResult.split, SweepResult.segment)
+                .where(SweepResult.sweep_id == sweep_id)
+            )).all())
+        todo = [item for item in pending if item[:3] not in stored]
+        progress = self.progress[sweep_id] = {
+            "sweep_id": sweep_id, "status": "running", "total": len(pending),
+            "skipped": len(pending) - len(todo), "done": 0, "failed": 0,
+            "started_at": datetime.utcnow(), "elapsed": 0.0,
+        }
+        if not todo:
+            progress["status"] = "completed"
+            return progress
+
+        started = time.perf_counter()
+        config = {"initial_capital": initial_capital, "commission_rate": commission_rate}
+        timestamps = list(panel.timestamps.to_pydatetime()) + [None]
+        buffer: List[Dict] = []
+
+        async def record(item, scores):
+            task_key, split, segment, (_, params, first, stop, _) = item
+            buffer.append({
+                "sweep_id": sweep_id, "params_key": task_key, "split": split, "segment": segment,
+                "strategy": strategy, "params": json.dumps(params, sort_keys=True), "config_key": key,
+                "start": timestamps[first], "end": timestamps[stop - 1] if stop else None,
+                "created_at": datetime.utcnow(), **scores,
+            })
+            progress["done"] += 1
+            progress["elapsed"] = time.perf_counter() - started
+            if len(buffer) >= self.write_batch:
+                await self._write(buffer)
+            if on_progress is not None:
+                on_progress(progress)
+
+        shm = pool = None
+        try:
+            if self.workers == 1:
+                backtester = Backtester(**config)
+                for item in todo:
+                    await record(item, evaluate(panel, backtester, item[3]))
+                    # Let other requests run between backtests
+                    await asyncio.sleep(0)
+            else:
+                shm, spec = share_panel(panel)
+                config["untrack"] = multiprocessing.get_start_method() != "fork"
+                pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(spec, config))
+                loop = asyncio.get_running_loop()
+
+                async def submit(item):
+                    return item, await loop.run_in_executor(pool, _evaluate_in_worker, item[3])
+
+                for finished in asyncio.as_completed([submit(item) for item in todo]):
+                    try:
+                        item, scores = await finished
+                    except Exception as e:
+                        progress["failed"] += 1
+                        logger.error(f"Sweep {sweep_id} task failed: {e}")
+                        continue
+                    await record(item, scores)
+            progress["status"] = "completed"
+        except asyncio.CancelledError:
+            progress["status"] = "interrupted"
+            raise
+        except Exception:
+            progress["status"] = "failed"
+            raise
+        finally:
+            if buffer:
+                await self._write(buffer)
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+            progress["elapsed"] = time.perf_counter() - started
+            logger.info(
+                f"Sweep {sweep_id} {progress['status']}: {progress['done']} run, "
+                f"{progress['skipped']} resumed, {progress['failed']} failed in {progress['elapsed']:.1f}s"
+            )
+        return progress
+
+    async def _write(self, buffer: List[Dict]):
+        rows = list(buffer)
+        buffer.clear()
+        async with self.session_factory() as db:
+            stmt = upsert_statement(db, SweepResult.__table__, ["sweep_id", "params_key", "split", "segment"], RESULT_COLUMNS)
+            await db.execute(stmt, rows)
+            await db.commit()
+
+    async def run_bayesian(
+        self,
+        sweep_id: str,
+        panel: BarPanel,
+        strategy: str,
+        space: Dict,
+        rounds: int,
+        batch: int,
+        metric: str = "sharpe",
+        splits: Optional[List[Tuple[int, int, int]]] = None,
+        seed: int = None,
+        **options
+    ) -> Dict:
+        """Rounds of ``batch`` suggestions, each fitted to every score stored for the sweep so far"""
+        rng = np.random.default_rng(seed)
+        progress = {}
+        for _ in range(rounds):
+            async with self.session_factory() as db:
+                ranked = await rank_results(db, sweep_id, metric, "train" if splits else "full", limit=None)
+            observed = [row["params"] for row in ranked]
+            suggestions = bayesian_suggest(space, observed, [row[metric] for row in ranked], batch, rng)
+            if not suggestions:
+                break
+            progress = await self.run(sweep_id, panel, strategy, suggestions, splits, **options)
+        return progress
+
+    def start(self, sweep_id: str, coroutine) -> asyncio.Task:
+        """Run a sweep in the background (call from the event loop)"""
+        task = asyncio.create_task(coroutine)
+        self._tasks[sweep_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(sweep_id, None))
+        return task
+
+    def running(self, sweep_id: str) -> bool:
+        return sweep_id in self._tasks
+
+    async def stop(self):
+        """Interrupt background sweeps (they resume when re-run with the same id)"""
+        for task in list(self._tasks.values()):
+            task.cancel()
+        for task in list(self._tasks.values()):
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+
+async def rank_results(
+    db: AsyncSession,
+    sweep_id: str,
+    metric: str = "sharpe",
+    segment: str = "full",
+    limit: Optional[int] = 20
+) -> List[Dict]:
+    """
+    Parameter sets ordered by ``metric`` (best first)
+
+    Walk-forward segments are averaged across splits.
+    """
+    if metric not in SWEEP_METRICS:
+        raise ValueError(f"Unknown metric {metric}")
+    column = getattr(SweepResult, metric)
+    score = func.avg(column).label("score")
+    query = (
+        select(
+            SweepResult.params_key, SweepResult.params, score,
+            func.avg(SweepResult.total_return), func.avg(SweepResult.max_drawdown),
+            func.avg(SweepResult.trades), func.count(),
+        )
+        .where(SweepResult.sweep_id == sweep_id, SweepResult.segment == segment)
+        .group_by(SweepResult.params_key, SweepResult.params)
+        .order_by(score.desc().nulls_last(), SweepResult.params_key)
+    )
+    if limit is not None:
+        query = query.limit(limit)
+    rows = (await db.execute(query)).all()
+    return [
+        {
+            "params_key": key, "params": json.loads(params), metric: value,
+            "total_return": total_return, "max_drawdown": drawdown, "trades": trades, "segments": count,
+        }
+        for key, params, value, total_return, drawdown, trades, count in rows
+    ]
+
+
+async def walk_forward_report(db: AsyncSession, sweep_id: str, metric: str = "sharpe") -> Dict:
+    """Per split, the best parameters on the train window and their out-of-sample test score"""
+    if metric not in SWEEP_METRICS:
+        raise ValueError(f"Unknown metric {metric}")
+    column = getattr(SweepResult, metric)
+    rows = (await db.execute(
+        select(SweepResult.split, SweepResult.segment, SweepResult.params, SweepResult.params_key,
+               SweepResult.start, SweepResult.end, column)
+        .where(SweepResult.sweep_id == sweep_id, SweepResult.segment.in_(["train", "test"]))
+    )).all()
+
+    train, test = {}, {}
+    for split, segment, params, key, start, end, value in rows:
+        if segment == "train":
+            best = train.get(split)
+            if value is not None and (best is None or value > best["train"]):
+                train[split] = {"params": json.loads(params), "params_key": key, "train": value, "train_start": start}
+        else:
+            test[(split, key)] = (value, start, end)
+
+    splits = []
+    for split in sorted(train):
+        chosen = train[split]
+        value, start, end = test.get((split, chosen.pop("params_key")), (None, None, None))
+        splits.append({"split": split, **chosen, "test": value, "test_start": start, "test_end": end})
+    scores = [s["test"] for s in splits if s["test"] is not None]
+    return {"metric": metric, "splits": splits, "out_of_sample": float(np.mean(scores)) if scores else None}
+
+
+sweep_runner = SweepRunner()
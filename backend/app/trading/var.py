@@ -0,0 +1,288 @@
+"""
+Value-at-Risk and Expected Shortfall
+
+Estimates the loss of the current positions over a horizon from the
+positions' return history in ``stock_prices``:
+
+- ``historical``: empirical quantile of the positions' P&L on past returns
+- ``parametric``: normal approximation from the mean and covariance
+- ``monte_carlo``: correlated normal returns simulated through the
+  Cholesky factor of the covariance, vectorized in NumPy; large runs are
+  split into chunks across a process pool
+
+Losses are positive currency amounts. Every method scales a multi-day
+horizon the same way: the one-period mean P&L by the horizon and the
+deviations around it by its square root (square-root-of-time). Results
+are cached per (positions, coarse exposures, UTC date, parameters).
+"""
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from statistics import NormalDist
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from loguru import logger
+
+from app.models.stock_data import StockPrice
+
+VAR_METHODS = ["historical", "parametric", "monte_carlo"]
+
+
+def positions_hash(symbols: Sequence[str], quantities: Sequence[float]) -> str:
+    """Stable hash of the held (symbol, quantity) pairs"""
+    held = sorted((str(s), float(q)) for s, q in zip(symbols, quantities) if q)
+    return hashlib.blake2b(repr(held).encode(), digest_size=12).hexdigest()
+
+
+def exposures_hash(symbols: Sequence[str], exposures: Sequence[float], digits: int = 3) -> str:
+    """
+    Hash of the (symbol, exposure) pairs, exposures rounded to ``digits`` significant figures
+
+    VaR is linear in the exposures, so price moves below the rounding keep
+    the cached result (within about 0.1% at 3 digits).
+    """
+    held = sorted(
+        (str(s), float(f"{float(e):.{digits - 1}e}")) for s, e in zip(symbols, exposures) if e
+    )
+    return hashlib.blake2b(repr(held).encode(), digest_size=12).hexdigest()
+
+
+def returns_matrix(rows, symbols: List[str]) -> pd.DataFrame:
+    """
+    Period returns per symbol from (symbol, timestamp, close) rows
+
+    Closes are aligned on timestamp and forward-filled; periods before every
+    symbol has a close are dropped.
+    """
+    if not rows:
+        return pd.DataFrame(columns=symbols, dtype=float)
+    frame = pd.DataFrame(rows, columns=["symbol", "timestamp", "close"])
+    closes = frame.pivot_table(index="timestamp", columns="symbol", values="close", aggfunc="last")
+    closes = closes.reindex(columns=[s for s in symbols if s in closes.columns]).sort_index().ffill()
+    return closes.pct_change(fill_method=None).dropna()
+
+
+def cholesky_factor(covariance: np.ndarray) -> np.ndarray:
+    """Lower Cholesky factor, nudging the diagonal if the sample covariance is not positive definite"""
+    jitter = 0.0
+    scale = float(np.mean(np.diag(covariance))) or 1.0
+    for _ in range(8):
+        try:
+            return np.linalg.cholesky(covariance + jitter * np.eye(len(covariance)))
+        except np.linalg.LinAlgError:
+            jitter = scale * 1e-10 if jitter == 0.0 else jitter * 100
+    # Singular beyond repair (e.g. constant prices): fall back to a PSD square root
+    values, vectors = np.linalg.eigh(covariance)
+    return vectors * np.sqrt(np.clip(values, 0.0, None))
+
+
+def _tail(pnl: np.ndarray, confidence: float) -> Dict:
+    cutoff = np.quantile(pnl, 1.0 - confidence)
+    tail = pnl[pnl <= cutoff]
+    return {"var": float(-cutoff), "cvar": float(-tail.mean()) if len(tail) else float(-cutoff)}
+
+
+def historical_var(returns: np.ndarray, exposures: np.ndarray, confidence: float, horizon: int = 1) -> Dict:
+    """VaR/CVaR from the empirical distribution of past portfolio P&L"""
+    pnl = returns @ exposures
+    mean = pnl.mean()
+    return _tail(mean * horizon + (pnl - mean) * np.sqrt(horizon), confidence)
+
+
+def parametric_var(returns: np.ndarray, exposures: np.ndarray, confidence: float, horizon: int = 1) -> Dict:
+    """Normal (variance-covariance) VaR/CVaR"""
+    mean = float(returns.mean(axis=0) @ exposures) * horizon
+    covariance = np.atleast_2d(np.cov(returns, rowvar=False))
+    sd = float(np.sqrt(max(exposures @ covariance @ exposures, 0.0) * horizon))
+    normal = NormalDist()
+    z = normal.inv_cdf(1.0 - confidence)
+    return {
+        "var": -(mean + z * sd),
+        "cvar": -(mean - sd * normal.pdf(z) / (1.0 - confidence)),
+    }
+
+
+def simulate_pnl(
+    mean: np.ndarray,
+    factor: np.ndarray,
+    exposures: np.ndarray,
+    paths: int,
+    seed,
+    block: int = 10_000
+) -> np.ndarray:
+    """
+    P&L of ``paths`` correlated normal return draws (``mean + z @ factor.T``)
+
+    Draws are generated ``block`` paths at a time to bound memory.
+    """
+    rng = np.random.default_rng(seed)
+    # (mean + z L^T) e == mean.e + z (L^T e): project once instead of per path
+    loadings = factor.T @ exposures
+    base = float(mean @ exposures)
+    pnl = np.empty(paths)
+    for start in range(0, paths, block):
+        stop = min(start + block, paths)
+        z = rng.standard_normal((stop - start, len(mean)))
+        pnl[start:stop] = base + z @ loadings
+    return pnl
+
+
+class VaREngine:
+    """VaR/CVaR over current positions with a per-day result cache"""
+
+    def __init__(self, workers: int = None, chunk_paths: int = None, cache_size: int = None):
+        """
+        Args:
+            workers: Process pool size for Monte Carlo (VAR_WORKERS, default CPU count)
+            chunk_paths: Paths per pool task; smaller runs stay in-process (VAR_CHUNK_PATHS, default 50000)
+            cache_size: Cached results (VAR_CACHE_SIZE, default 64)
+        """
+        self.workers = workers or int(os.getenv("VAR_WORKERS", str(os.cpu_count() or 1)))
+        self.chunk_paths = chunk_paths or int(os.getenv("VAR_CHUNK_PATHS", "50000"))
+        self.cache_size = cache_size or int(os.getenv("VAR_CACHE_SIZE", "64"))
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._cache: "OrderedDict[tuple, Dict]" = OrderedDict()
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    def clear(self):
+        self._cache.clear()
+
+    async def monte_carlo_var(
+        self,
+        returns: np.ndarray,
+        exposures: np.ndarray,
+        confidence: float,
+        horizon: int = 1,
+        paths: int = 100_000,
+        seed: int = None
+    ) -> Dict:
+        """Monte Carlo VaR/CVaR; runs larger than one chunk are spread over the process pool"""
+        mean = returns.mean(axis=0) * horizon
+        factor = cholesky_factor(np.atleast_2d(np.cov(returns, rowvar=False)) * horizon)
+
+        chunks = [self.chunk_paths] * (paths // self.chunk_paths)
+        if paths % self.chunk_paths:
+            chunks.append(paths % self.chunk_paths)
+        seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+
+        if len(chunks) == 1 or self.workers == 1:
+            def simulate():
+                return np.concatenate([simulate_pnl(mean, factor, exposures, n, s) for n, s in zip(chunks, seeds)])
+
+            # Off the event loop: millions of paths take seconds
+            pnl = await asyncio.to_thread(simulate)
+        else:
+            loop = asyncio.get_running_loop()
+            parts = await asyncio.gather(*(
+                loop.run_in_executor(self.pool, simulate_pnl, mean, factor, exposures, n, s)
+                for n, s in zip(chunks, seeds)
+            ))
+            pnl = np.concatenate(parts)
+        return _tail(pnl, confidence)
+
+    async def compute(
+        self,
+        db: AsyncSession,
+        symbols: Sequence[str],
+        quantities: Sequence[float],
+        prices: Sequence[float],
+        method: str = "historical",
+        confidence: float = 0.95,
+        horizon: int = 1,
+        lookback_days: int = 365,
+        paths: int = 100_000,
+        seed: int = None
+    ) -> Dict:
+        """
+        VaR and CVaR for positions
+
+        Args:
+            db: Database session (return history)
+            symbols, quantities, prices: Current positions and their prices
+            method: historical, parametric or monte_carlo
+            confidence: Confidence level, e.g. 0.95 or 0.99
+            horizon: Horizon in return periods (days for daily bars)
+            lookback_days: Return history window
+            paths: Monte Carlo paths
+            seed: Monte Carlo seed (random if None)
+        """
+        if method not in VAR_METHODS:
+            raise ValueError(f"Unknown VaR method {method}")
+
+        exposures_by_symbol = {
+            s: float(q) * float(p) for s, q, p in zip(symbols, quantities, prices) if q
+        }
+        simulated = method == "monte_carlo"
+        key = (
+            positions_hash(symbols, quantities),
+            exposures_hash(list(exposures_by_symbol), list(exposures_by_symbol.values())),
+            datetime.utcnow().date(), method, confidence, horizon, lookback_days,
+            paths if simulated else None, seed if simulated else None
+        )
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            return {**cached, "cached": True}
+
+        held = sorted(exposures_by_symbol)
+        start = datetime.utcnow() - timedelta(days=lookback_days)
+        rows = (await db.execute(
+            select(StockPrice.symbol, StockPrice.timestamp, StockPrice.close)
+            .where(StockPrice.symbol.in_(held), StockPrice.timestamp >= start)
+        )).all() if held else []
+        returns = returns_matrix(rows, held)
+
+        covered = list(returns.columns)
+        exposures = np.array([exposures_by_symbol[s] for s in covered], dtype=np.float64)
+        matrix = returns.to_numpy(dtype=np.float64)
+
+        result = {
+            "method": method,
+            "confidence": confidence,
+            "horizon": horizon,
+            "portfolio_value": float(sum(exposures_by_symbol.values())),
+            "covered_value": float(exposures.sum()),
+            "observations": len(matrix),
+            "symbols": covered,
+            "missing": [s for s in held if s not in covered],
+            "var": 0.0,
+            "cvar": 0.0,
+        }
+        if len(matrix) >= 2 and len(covered):
+            if method == "historical":
+                result.update(historical_var(matrix, exposures, confidence, horizon))
+            elif method == "parametric":
+                result.update(parametric_var(matrix, exposures, confidence, horizon))
+            else:
+                result.update(await self.monte_carlo_var(matrix, exposures, confidence, horizon, paths, seed))
+                result["paths"] = paths
+        value = result["portfolio_value"]
+        result["var_percent"] = result["var"] / value * 100 if value else 0.0
+        result["cvar_percent"] = result["cvar"] / value * 100 if value else 0.0
+        result["computed_at"] = datetime.utcnow()
+
+        self._cache[key] = result
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        logger.debug(f"{method} VaR {result['var']:.2f} over {len(covered)} symbols")
+        return {**result, "cached": False}
+
+
+var_engine = VaREngine()
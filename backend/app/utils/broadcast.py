@@ -0,0 +1,261 @@
+"""
+Live Feed Broadcaster
+
+Fan-out of live updates to WebSocket subscribers. Topics are
+``prices:{SYMBOL}``, ``signals``, ``positions`` and ``metrics``. Each
+update is serialized once and the same text frame is queued for every
+subscriber of the topic.
+
+Every connection has a bounded queue drained by its own sender task, so a
+slow client never blocks the publisher or other clients. When a queue is
+full the connection's policy applies:
+
+- ``coalesce`` (default): keep only the newest pending update per topic
+- ``drop``: discard the oldest pending update
+
+Writers publish after committing: bar ingestion publishes the newest bar
+per symbol, mark-to-market flushes publish repriced positions, and ORM
+commits of MLPrediction, Position and PortfolioSnapshot publish through the
+session listeners below.
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict, defaultdict, deque
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from loguru import logger
+
+from app.models.portfolio import Position, PortfolioSnapshot
+from app.models.stock_data import MLPrediction
+from app.utils.serialization import encode_json
+
+POLICIES = ("coalesce", "drop")
+
+
+def price_topic(symbol: str) -> str:
+    return f"prices:{symbol.upper()}"
+
+
+def normalize_topic(topic) -> Optional[str]:
+    """Canonical topic name, or None if the topic is not recognised"""
+    if not isinstance(topic, str):
+        return None
+    if topic in ("signals", "positions", "metrics"):
+        return topic
+    if topic.startswith("prices:") and len(topic) > len("prices:"):
+        return price_topic(topic[len("prices:"):])
+    return None
+
+
+class Subscriber:
+    """One connection's topics and bounded outbound queue"""
+
+    def __init__(self, max_pending: int, policy: str):
+        self.topics: Set[str] = set()
+        self.max_pending = max_pending
+        self.policy = policy
+        self.dropped = 0
+        self.coalesced = 0
+        self._by_topic: "OrderedDict[str, str]" = OrderedDict()
+        self._queue: deque = deque()
+        self.ready = asyncio.Event()
+
+    def offer(self, topic: str, frame: str):
+        """Queue a frame, applying the overflow policy"""
+        if self.policy == "coalesce":
+            if topic in self._by_topic:
+                self._by_topic[topic] = frame
+                self.coalesced += 1
+            else:
+                if len(self._by_topic) >= self.max_pending:
+                    self._by_topic.popitem(last=False)
+                    self.dropped += 1
+                self._by_topic[topic] = frame
+        else:
+            if len(self._queue) >= self.max_pending:
+                self._queue.popleft()
+                self.dropped += 1
+            self._queue.append(frame)
+        self.ready.set()
+
+    def drain(self) -> List[str]:
+        """Take every pending frame, oldest first"""
+        if self.policy == "coalesce":
+            frames = list(self._by_topic.values())
+            self._by_topic.clear()
+        else:
+            frames = list(self._queue)
+            self._queue.clear()
+        self.ready.clear()
+        return frames
+
+    @property
+    def pending(self) -> int:
+        return len(self._by_topic) if self.policy == "coalesce" else len(self._queue)
+
+
+class LiveFeed:
+    """Topic registry and fan-out for live WebSocket updates"""
+
+    def __init__(self, max_pending: int = None, policy: str = None):
+        """
+        Args:
+            max_pending: Per-connection queue bound (LIVE_QUEUE_SIZE, default 256)
+            policy: Default overflow policy (LIVE_SLOW_CLIENT_POLICY, default coalesce)
+        """
+        self.max_pending = max_pending or int(os.getenv("LIVE_QUEUE_SIZE", "256"))
+        self.policy = policy or os.getenv("LIVE_SLOW_CLIENT_POLICY", "coalesce")
+        self._topics: Dict[str, Set[Subscriber]] = defaultdict(set)
+        self._subscribers: Set[Subscriber] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stats = defaultdict(int)
+
+    def connect(self, policy: str = None) -> Subscriber:
+        """Register a connection (call from the event loop)"""
+        self._loop = asyncio.get_running_loop()
+        subscriber = Subscriber(self.max_pending, policy or self.policy)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def disconnect(self, subscriber: Subscriber):
+        for topic in list(subscriber.topics):
+            self.unsubscribe(subscriber, topic)
+        self._subscribers.discard(subscriber)
+        self.stats["dropped"] += subscriber.dropped
+        self.stats["coalesced"] += subscriber.coalesced
+
+    def subscribe(self, subscriber: Subscriber, topic: str):
+        subscriber.topics.add(topic)
+        self._topics[topic].add(subscriber)
+
+    def unsubscribe(self, subscriber: Subscriber, topic: str):
+        subscriber.topics.discard(topic)
+        subscribers = self._topics.get(topic)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._topics[topic]
+
+    def has_subscribers(self, topic: str) -> bool:
+        return bool(self._topics.get(topic))
+
+    def publish(self, topic: str, data) -> int:
+        """
+        Serialize an update once and queue it for every subscriber of the topic
+
+        Safe to call from any thread; off-loop calls are handed to the loop.
+
+        Returns:
+            Number of subscribers the update was queued for (0 when handed off)
+        """
+        subscribers = self._topics.get(topic)
+        if not subscribers:
+            return 0
+
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if self._loop is not None and running is not self._loop:
+            if not self._loop.is_closed():
+                self._loop.call_soon_threadsafe(self.publish, topic, data)
+            return 0
+
+        frame = encode_json({"topic": topic, "data": data, "ts": time.time()}).decode()
+        self.stats["published"] += 1
+        for subscriber in subscribers:
+            subscriber.offer(topic, frame)
+        self.stats["queued"] += len(subscribers)
+        return len(subscribers)
+
+    async def pump(self, subscriber: Subscriber, send):
+        """Send a connection's queued frames until cancelled"""
+        while True:
+            await subscriber.ready.wait()
+            for frame in subscriber.drain():
+                await send(frame)
+                self.stats["sent"] += 1
+
+    def get_stats(self) -> Dict:
+        live_dropped = sum(s.dropped for s in self._subscribers)
+        live_coalesced = sum(s.coalesced for s in self._subscribers)
+        return {
+            "connections": len(self._subscribers),
+            "topics": {topic: len(subs) for topic, subs in self._topics.items()},
+            "published": self.stats["published"],
+            "queued": self.stats["queued"],
+            "sent": self.stats["sent"],
+            "dropped": self.stats["dropped"] + live_dropped,
+            "coalesced": self.stats["coalesced"] + live_coalesced,
+        }
+
+
+live_feed = LiveFeed()
+
+
+def position_update(position: Position, closed: bool = False) -> Dict:
+    return {
+        "symbol": position.symbol,
+        "quantity": 0 if closed else position.quantity,
+        "avg_entry_price": position.avg_entry_price,
+        "current_price": position.current_price,
+        "unrealized_pnl": position.unrealized_pnl,
+        "unrealized_pnl_percent": position.unrealized_pnl_percent,
+        "closed": closed,
+    }
+
+
+def snapshot_update(snapshot: PortfolioSnapshot) -> Dict:
+    return {
+        "timestamp": snapshot.timestamp.isoformat(),
+        "total_value": snapshot.total_value,
+        "cash_balance": snapshot.cash_balance,
+        "positions_value": snapshot.positions_value,
+        "total_pnl": snapshot.total_pnl,
+        "total_pnl_percent": snapshot.total_pnl_percent,
+        "daily_return": snapshot.daily_return,
+    }
+
+
+def signal_update(prediction: MLPrediction) -> Dict:
+    return {
+        "symbol": prediction.symbol,
+        "signal": prediction.predicted_direction,
+        "confidence": prediction.confidence,
+        "model": prediction.model_name,
+        "timestamp": prediction.timestamp.isoformat(),
+    }
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_updates(session, flush_context):
+    if not live_feed._topics:
+        return
+    updates = session.info.setdefault("live_feed_updates", [])
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Position):
+            updates.append(("positions", position_update(obj)))
+        elif isinstance(obj, PortfolioSnapshot):
+            updates.append(("metrics", snapshot_update(obj)))
+        elif isinstance(obj, MLPrediction):
+            updates.append(("signals", signal_update(obj)))
+    for obj in session.deleted:
+        if isinstance(obj, Position):
+            updates.append(("positions", position_update(obj, closed=True)))
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_updates(session):
+    for topic, data in session.info.pop("live_feed_updates", []):
+        try:
+            live_feed.publish(topic, data)
+        except Exception as e:
+            logger.warning(f"Live feed publish to {topic} failed: {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_updates(session):
+    session.info.pop("live_feed_updates", None)
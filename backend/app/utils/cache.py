@@ -0,0 +1,269 @@
+"""
+Read-Through Response Cache
+
+In-process cache for dashboard polling endpoints. Rendered responses are
+kept per (path, query, Accept, Accept-Encoding) with a TTL and LRU bound,
+identical concurrent misses share one handler call (single-flight), and
+every response carries an ETag so pollers get ``304 Not Modified``.
+
+Entries carry tags (``portfolio``, ``signals``, ``prices:{symbol}``) and
+are dropped by the code paths that write the underlying tables: Core bulk
+writers call ``response_cache.invalidate`` after committing, and ORM writes
+of StockPrice, Trade, PortfolioSnapshot and MLPrediction invalidate on
+commit through the session listeners below.
+"""
+import asyncio
+import functools
+import hashlib
+import inspect
+import os
+import time
+from collections import OrderedDict, defaultdict
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from loguru import logger
+
+from app.models.portfolio import PortfolioSnapshot
+from app.models.stock_data import StockPrice, MLPrediction
+from app.models.trades import Trade
+from app.utils.serialization import encode_json
+
+# Headers of the original response that are replayed from the cache
+REPLAYED_HEADERS = ("content-type", "content-encoding", "vary", "x-next-cursor", "x-snapshot-resolution")
+
+
+def price_tag(symbol: str) -> str:
+    return f"prices:{symbol}"
+
+
+class ResponseCache:
+    """TTL + LRU response cache with single-flight misses and tag invalidation"""
+
+    def __init__(self, max_entries: int = None, ttl_seconds: float = None):
+        """
+        Args:
+            max_entries: LRU capacity (RESPONSE_CACHE_SIZE, default 512)
+            ttl_seconds: Entry lifetime (RESPONSE_CACHE_TTL, default 30); 0 disables caching
+        """
+        self.max_entries = max_entries or int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+        self.ttl = ttl_seconds if ttl_seconds is not None else float(os.getenv("RESPONSE_CACHE_TTL", "30"))
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Bumped on invalidation so a render that started before a write is not stored
+        self._tag_versions: Dict[str, int] = defaultdict(int)
+        self.stats = defaultdict(int)
+
+    @staticmethod
+    def key_for(request: Request) -> str:
+        query = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+        return "|".join([
+            request.url.path,
+            query,
+            request.headers.get("accept", ""),
+            request.headers.get("accept-encoding", ""),
+        ])
+
+    def _lookup(self, key: str) -> Optional[Dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry["expires"] <= time.monotonic():
+            del self._entries[key]
+            self.stats["expired"] += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key: str, entry: Dict):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _render(self, result, tags: List[str]) -> Dict:
+        if isinstance(result, Response):
+            body = bytes(result.body)
+            status_code = result.status_code
+            headers = {k: v for k, v in result.headers.items() if k in REPLAYED_HEADERS}
+        else:
+            body = encode_json(jsonable_encoder(result))
+            status_code = 200
+            headers = {"content-type": "application/json"}
+        return {
+            "body": body,
+            "status_code": status_code,
+            "headers": headers,
+            "etag": '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"',
+            "tags": tags,
+            "expires": time.monotonic() + self.ttl,
+        }
+
+    def _respond(self, entry: Dict, request: Request, source: str) -> Response:
+        headers = {
+            **entry["headers"],
+            "ETag": entry["etag"],
+            "Cache-Control": "private, no-cache",
+            "X-Cache": source,
+        }
+        if_none_match = request.headers.get("if-none-match")
+        if entry["status_code"] == 200 and if_none_match:
+            if entry["etag"] in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+                self.stats["not_modified"] += 1
+                headers.pop("content-type", None)
+                headers.pop("content-encoding", None)
+                return Response(status_code=304, headers=headers)
+        return Response(content=entry["body"], status_code=entry["status_code"], headers=headers)
+
+    async def serve(
+        self,
+        request: Request,
+        tags: Iterable[str],
+        compute: Callable[[], Awaitable]
+    ) -> Response:
+        """
+        Answer from the cache, or run ``compute`` once for all concurrent callers
+
+        Args:
+            request: Incoming request (cache key, conditional headers)
+            tags: Invalidation tags for the entry
+            compute: Coroutine factory returning a Response or JSON-able value
+        """
+        tags = [tag.lower() for tag in tags]
+        key = self.key_for(request)
+
+        if self.ttl > 0:
+            entry = self._lookup(key)
+            if entry is not None:
+                self.stats["hits"] += 1
+                return self._respond(entry, request, "HIT")
+
+            inflight = self._inflight.get(key)
+            if inflight is not None:
+                self.stats["coalesced"] += 1
+                entry = await asyncio.shield(inflight)
+                return self._respond(entry, request, "HIT")
+
+        self.stats["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        versions = [self._tag_versions[tag] for tag in tags]
+        try:
+            entry = self._render(await compute(), tags)
+            fresh = versions == [self._tag_versions[tag] for tag in tags]
+            if self.ttl > 0 and entry["status_code"] == 200 and fresh:
+                self._store(key, entry)
+            future.set_result(entry)
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so a failure without waiters isn't logged as unhandled
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+        return self._respond(entry, request, "MISS")
+
+    def invalidate(self, *tags: str) -> int:
+        """Drop every entry carrying any of the tags; returns the number dropped"""
+        tags = {tag.lower() for tag in tags}
+        if not tags:
+            return 0
+        for tag in tags:
+            self._tag_versions[tag] += 1
+
+        stale = [key for key, entry in self._entries.items() if tags.intersection(entry["tags"])]
+        for key in stale:
+            del self._entries[key]
+        self.stats["invalidations"] += len(stale)
+        if stale:
+            logger.debug(f"Invalidated {len(stale)} cached responses for {sorted(tags)}")
+        return len(stale)
+
+    def clear(self):
+        self._entries.clear()
+        self._tag_versions.clear()
+        self.stats.clear()
+
+    def get_stats(self) -> Dict:
+        hits = self.stats["hits"] + self.stats["coalesced"]
+        lookups = hits + self.stats["misses"]
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.stats["hits"],
+            "coalesced": self.stats["coalesced"],
+            "misses": self.stats["misses"],
+            "not_modified": self.stats["not_modified"],
+            "invalidations": self.stats["invalidations"],
+            "evictions": self.stats["evictions"],
+            "expired": self.stats["expired"],
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
+
+
+response_cache = ResponseCache()
+
+
+def cached(*tags: str):
+    """
+    Serve a route through ``response_cache``
+
+    Tags may reference the handler's parameters, e.g. ``"prices:{symbol}"``.
+    A ``Request`` parameter is added to the route signature if the handler
+    does not take one.
+    """
+    def decorator(handler):
+        signature = inspect.signature(handler)
+        takes_request = "request" in signature.parameters
+        parameters = list(signature.parameters.values())
+        if not takes_request:
+            parameters.append(inspect.Parameter(
+                "request", inspect.Parameter.KEYWORD_ONLY, annotation=Request
+            ))
+
+        @functools.wraps(handler)
+        async def wrapper(**kwargs):
+            request = kwargs["request"] if takes_request else kwargs.pop("request")
+            entry_tags = [tag.format(**kwargs) for tag in tags]
+            return await response_cache.serve(request, entry_tags, lambda: handler(**kwargs))
+
+        wrapper.__signature__ = signature.replace(parameters=parameters)
+        return wrapper
+    return decorator
+
+
+def _write_tags(obj) -> List[str]:
+    if isinstance(obj, StockPrice):
+        return [price_tag(obj.symbol)]
+    if isinstance(obj, Trade):
+        return ["trades", "portfolio"]
+    if isinstance(obj, PortfolioSnapshot):
+        return ["portfolio"]
+    if isinstance(obj, MLPrediction):
+        return ["signals"]
+    return []
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_write_tags(session, flush_context):
+    tags = session.info.setdefault("response_cache_tags", set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        tags.update(_write_tags(obj))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    tags = session.info.pop("response_cache_tags", None)
+    if tags:
+        response_cache.invalidate(*tags)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_write_tags(session):
+    session.info.pop("response_cache_tags", None)
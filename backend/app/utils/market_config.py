@@ -46,6 +46,12 @@ class MarketConfig:
             # US market defaults
             return ["AAPL", "GOOGL", "MSFT", "TSLA", "AMZN"]
     
+    @staticmethod
+    def get_benchmark_symbol() -> str:
+        """Get the benchmark index used for beta (NIFTY 50 or S&P 500)"""
+        default = "^NSEI" if MarketConfig.get_exchange() == "NSE" else "^GSPC"
+        return os.getenv("RISK_BENCHMARK_SYMBOL", default)
+    
     @staticmethod
     def get_market_hours() -> Dict[str, time]:
         """Get market trading hours"""
@@ -116,6 +122,13 @@ class MarketConfig:
     @staticmethod
     def get_stock_display_name(symbol: str) -> str:
         """Get display name for stock symbol"""
+        # Prefer the cached long name; never triggers a provider request
+        from app.data.metadata import symbol_metadata
+        
+        metadata = symbol_metadata.get_cached(symbol)
+        if metadata and metadata.get("long_name"):
+            return metadata["long_name"]
+        
         # Remove exchange suffix for display
         if symbol.endswith(".NS") or symbol.endswith(".BO"):
             return symbol[:-3]
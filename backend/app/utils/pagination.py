@@ -0,0 +1,73 @@
+"""
+Keyset Cursor Pagination
+
+History endpoints page newest-first on a ``(timestamp, id)`` key. The
+cursor is an opaque token encoding the key of the last row served; the
+next page is fetched with ``WHERE (timestamp, id) < cursor`` against a
+composite index, so every page costs the same no matter how deep the user
+has scrolled (no OFFSET scans). The token for the following page is
+returned in the ``X-Next-Cursor`` response header.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, Response
+from sqlalchemy import tuple_, desc
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    """Opaque URL-safe token for a (timestamp, id) key"""
+    raw = json.dumps([timestamp.isoformat(), row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Recover the (timestamp, id) key from a token
+
+    Raises:
+        HTTPException: 400 if the token is malformed
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset_page(query, timestamp_column, id_column, cursor: Optional[str], limit: int):
+    """
+    Restrict a select to one newest-first page
+
+    Fetches ``limit + 1`` rows so the caller can tell whether a further
+    page exists (see ``next_cursor``).
+    """
+    if cursor:
+        query = query.where(tuple_(timestamp_column, id_column) < tuple_(*decode_cursor(cursor)))
+    return query.order_by(desc(timestamp_column), desc(id_column)).limit(limit + 1)
+
+
+def next_cursor(rows: list, limit: int, timestamp_attr: str = "timestamp") -> Tuple[list, Optional[str]]:
+    """
+    Split the extra look-ahead row off a page
+
+    Returns:
+        (rows to serve, cursor for the next page or None on the last page)
+    """
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, timestamp_attr), last.id)
+
+
+def set_next_cursor(response: Response, cursor: Optional[str]) -> Response:
+    """Attach the next-page token, if any, to a response"""
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
+    return response
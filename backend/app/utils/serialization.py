@@ -0,0 +1,204 @@
+"""
+Response Serialization and Content Negotiation
+
+History endpoints hand over their data column-wise and this module encodes
+it in the format the client asked for:
+
+- ``json`` (default): one object per row, the historical response shape
+- ``columnar``: one JSON array per field (``application/vnd.quantedge.columnar+json``)
+- ``msgpack``: the columnar layout as MessagePack, datetimes as wall-clock
+  milliseconds since 1970-01-01 00:00 (see ``_wall_clock_millis``)
+
+The format comes from the ``format`` query parameter or the Accept header.
+JSON is encoded with orjson when installed, and large bodies are compressed
+with brotli or gzip according to Accept-Encoding.
+"""
+import gzip
+import json
+import os
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+import numpy as np
+from fastapi import HTTPException, Request, Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional format
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional encoding
+    brotli = None
+
+MEDIA_TYPES = {
+    "json": "application/json",
+    "columnar": "application/vnd.quantedge.columnar+json",
+    "msgpack": "application/x-msgpack",
+}
+
+ACCEPT_FORMATS = {
+    "application/vnd.quantedge.columnar+json": "columnar",
+    "application/x-msgpack": "msgpack",
+    "application/msgpack": "msgpack",
+    "application/json": "json",
+}
+
+COMPRESS_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", "1024"))
+
+
+def negotiate_format(request: Request, format: Optional[str] = None) -> str:
+    """
+    Pick the response format from ``?format=`` or the Accept header
+
+    Raises:
+        HTTPException: 400 for an unknown format, 406 when msgpack is not installed
+    """
+    if format:
+        if format not in MEDIA_TYPES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown format {format}; use one of {', '.join(MEDIA_TYPES)}"
+            )
+        chosen = format
+    else:
+        chosen = "json"
+        for part in request.headers.get("accept", "").split(","):
+            media_type = part.split(";")[0].strip().lower()
+            if media_type in ACCEPT_FORMATS:
+                chosen = ACCEPT_FORMATS[media_type]
+                break
+
+    if chosen == "msgpack" and msgpack is None:
+        raise HTTPException(status_code=406, detail="MessagePack responses require the msgpack package")
+    return chosen
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def encode_json(payload) -> bytes:
+    """Encode with orjson when available, falling back to the standard library"""
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, default=_default).encode()
+
+
+def _wall_clock_millis(values: np.ndarray) -> list:
+    """
+    Milliseconds from 1970-01-01 00:00 to each datetime's wall-clock reading
+
+    Stored timestamps are naive and carry no zone (bars are exchange-local
+    wall time, see ``ingest.to_naive_index``), so they are counted on the
+    same clock the ISO strings of the JSON formats show, not as UTC
+    instants. Aware values keep their own wall time, as on ingest.
+    """
+    return [
+        None if v is None else int(v.replace(tzinfo=timezone.utc).timestamp() * 1000)
+        for v in values.tolist()
+    ]
+
+
+def _is_datetime_column(values: np.ndarray) -> bool:
+    return values.dtype == object and len(values) > 0 and isinstance(values[0], datetime)
+
+
+def columns_payload(columns: Dict, format: str):
+    """
+    Arrange equal-length columns for the given format (not yet encoded)
+
+    Args:
+        columns: Field name -> sequence; datetimes as ``datetime`` objects
+        format: One of ``MEDIA_TYPES``
+    """
+    columns = {name: np.asarray(values) for name, values in columns.items()}
+
+    if format == "json":
+        names = list(columns)
+        lists = [columns[name].tolist() for name in names]
+        return [dict(zip(names, row)) for row in zip(*lists)]
+    if format == "columnar":
+        return {
+            # orjson writes numeric arrays directly; other columns go via lists
+            name: values if orjson is not None and values.dtype.kind in "biuf" else values.tolist()
+            for name, values in columns.items()
+        }
+    if format == "msgpack":
+        return {
+            name: _wall_clock_millis(values) if _is_datetime_column(values) else values.tolist()
+            for name, values in columns.items()
+        }
+    raise ValueError(f"Unknown format {format}")
+
+
+def encode_payload(payload, format: str) -> bytes:
+    """Encode a payload built from ``columns_payload`` pieces"""
+    if format == "msgpack":
+        return msgpack.packb(payload, use_bin_type=True)
+    return encode_json(payload)
+
+
+def encode_columns(columns: Dict, format: str, envelope: Optional[str] = None) -> bytes:
+    """
+    Serialize equal-length columns in the given format
+
+    Args:
+        columns: Field name -> sequence; datetimes as ``datetime`` objects
+        format: One of ``MEDIA_TYPES``
+        envelope: Optional key the rows/columns are nested under
+
+    Returns:
+        Encoded body
+    """
+    payload = columns_payload(columns, format)
+    if envelope is not None:
+        payload = {envelope: payload}
+    return encode_payload(payload, format)
+
+
+def compress_body(body: bytes, accept_encoding: str) -> tuple:
+    """
+    Compress a body the client can decode, preferring brotli
+
+    Returns:
+        (body, content-encoding or None)
+    """
+    if len(body) < COMPRESS_MIN_BYTES:
+        return body, None
+
+    accepted = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")}
+    if "br" in accepted and brotli is not None:
+        # Low quality keeps compression well under the serialization cost
+        return brotli.compress(body, quality=4), "br"
+    if "gzip" in accepted:
+        return gzip.compress(body, compresslevel=6), "gzip"
+    return body, None
+
+
+def payload_response(request: Request, body: bytes, format: str) -> Response:
+    """Wrap an encoded body in the negotiated, possibly compressed, response"""
+    body, encoding = compress_body(body, request.headers.get("accept-encoding", ""))
+
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=MEDIA_TYPES[format], headers=headers)
+
+
+def columnar_response(
+    request: Request,
+    columns: Dict,
+    format: str,
+    envelope: Optional[str] = None
+) -> Response:
+    """Build the negotiated, possibly compressed, response for column data"""
+    return payload_response(request, encode_columns(columns, format, envelope), format)
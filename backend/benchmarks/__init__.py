@@ -0,0 +1,5 @@
+"""
+Offline benchmarks for QuantEdge backend
+
+Run from the backend directory, e.g. ``python -m benchmarks.bench_fetch``.
+"""
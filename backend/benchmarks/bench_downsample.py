@@ -0,0 +1,54 @@
+"""
+Benchmark price-series payload size and serialization with LTTB downsampling
+
+    python -m benchmarks.bench_downsample --bars 10000 100000 --points 1000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.data.providers import synthetic_history
+from app.utils.downsample import downsample_columns
+from app.utils.serialization import encode_columns
+
+
+def run(bars: int, points: int):
+    """Return (full bytes, full s, sampled bytes, sampled s) for one series length"""
+    df = synthetic_history(min(bars, 10_000), seed=bars)
+    if bars > len(df):
+        # Intraday-length series: repeat the walk on a one-minute grid
+        df = df.iloc[np.arange(bars) % len(df)]
+        df.index = pd.date_range("2020-01-01 09:15", periods=bars, freq="1min")
+    columns = {
+        "timestamp": df.index.to_pydatetime(),
+        "open": df["Open"].to_numpy(),
+        "high": df["High"].to_numpy(),
+        "low": df["Low"].to_numpy(),
+        "close": df["Close"].to_numpy(),
+        "volume": df["Volume"].to_numpy(),
+    }
+
+    results = []
+    for target in (None, points):
+        started = time.perf_counter()
+        sampled = downsample_columns(
+            columns, target, x="timestamp", y="close",
+            max_columns=["high"], min_columns=["low"], sum_columns=["volume"]
+        )
+        payload = encode_columns(sampled, "json")
+        results += [len(payload), time.perf_counter() - started]
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--bars", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--points", type=int, default=1000)
+    args = parser.parse_args()
+
+    print(f"{'bars':>8} {'full KB':>9} {'full s':>8} {'LTTB KB':>9} {'LTTB s':>8}")
+    for bars in args.bars:
+        full_bytes, full_s, sampled_bytes, sampled_s = run(bars, args.points)
+        print(f"{bars:>8} {full_bytes / 1024:>9.0f} {full_s:>8.3f} {sampled_bytes / 1024:>9.0f} {sampled_s:>8.3f}")
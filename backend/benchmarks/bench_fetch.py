@@ -0,0 +1,47 @@
+"""
+Benchmark sequential vs concurrent symbol fetching
+
+Uses the replay provider with an artificial per-request latency so the
+result reflects I/O overlap rather than network conditions.
+
+    python -m benchmarks.bench_fetch --symbols 500 --latency 0.05
+"""
+import argparse
+import time
+
+from loguru import logger
+
+from app.data.collector import DataCollector
+from app.data.providers import ReplayProvider, synthetic_history
+
+
+def run(symbols: int, bars: int, latency: float, workers: list):
+    """Time fetch_all_symbols for each worker count"""
+    names = [f"SYM{i:04d}.NS" for i in range(symbols)]
+    frames = {name: synthetic_history(bars, seed=i) for i, name in enumerate(names)}
+    provider = ReplayProvider(frames=frames, latency=latency)
+    collector = DataCollector(symbols=names, provider=provider)
+
+    results = []
+    for count in workers:
+        started = time.perf_counter()
+        data = collector.fetch_all_symbols(max_workers=count)
+        elapsed = time.perf_counter() - started
+        slowest = max(r["elapsed"] for r in collector.fetch_report.values())
+        results.append((count, elapsed, len(data), slowest))
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--symbols", type=int, default=200)
+    parser.add_argument("--bars", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 8, 32])
+    args = parser.parse_args()
+
+    logger.remove()
+    print(f"{'workers':>8} {'seconds':>9} {'symbols/s':>10} {'slowest':>9}")
+    for count, elapsed, fetched, slowest in run(args.symbols, args.bars, args.latency, args.workers):
+        print(f"{count:>8} {elapsed:>9.2f} {fetched / elapsed:>10.1f} {slowest:>9.3f}")
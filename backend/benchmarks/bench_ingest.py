@@ -0,0 +1,84 @@
+"""
+Benchmark ORM row inserts vs batched upsert ingestion into stock_prices
+
+Each mode writes into a fresh SQLite file database.
+
+    python -m benchmarks.bench_ingest --symbols 50 --bars 500
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from loguru import logger
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from app.data.collector import DataCollector
+from app.data.ingest import BarIngestor, frame_to_rows
+from app.data.providers import ReplayProvider, synthetic_history
+from app.database.init_db import Base
+from app.models.stock_data import StockPrice
+
+
+async def fresh_session(path: str):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    return engine, async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+async def bench_orm(frames: dict, path: str) -> float:
+    """One ORM object per row, committed per symbol"""
+    engine, factory = await fresh_session(path)
+    started = time.perf_counter()
+    async with factory() as db:
+        for symbol, df in frames.items():
+            for row in frame_to_rows(symbol, df):
+                db.add(StockPrice(**row))
+            await db.commit()
+    elapsed = time.perf_counter() - started
+    await engine.dispose()
+    return elapsed
+
+
+async def bench_bulk(frames: dict, path: str, batch_size: int) -> float:
+    """Batched executemany upserts"""
+    engine, factory = await fresh_session(path)
+    started = time.perf_counter()
+    async with factory() as db:
+        ingestor = BarIngestor(db, batch_size=batch_size)
+        for symbol, df in frames.items():
+            await ingestor.ingest_frame(symbol, df)
+    elapsed = time.perf_counter() - started
+    await engine.dispose()
+    return elapsed
+
+
+async def main(symbols: int, bars: int, batch_size: int):
+    names = [f"SYM{i:04d}.NS" for i in range(symbols)]
+    collector = DataCollector(
+        symbols=names,
+        provider=ReplayProvider(frames={n: synthetic_history(bars, seed=i) for i, n in enumerate(names)})
+    )
+    frames = collector.fetch_all_symbols(period="max")
+    rows = sum(len(df) for df in frames.values())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        orm = await bench_orm(frames, os.path.join(tmp, "orm.db"))
+        bulk = await bench_bulk(frames, os.path.join(tmp, "bulk.db"), batch_size)
+
+    print(f"{'mode':>6} {'rows':>8} {'seconds':>9} {'rows/s':>10}")
+    print(f"{'orm':>6} {rows:>8} {orm:>9.2f} {rows / orm:>10.0f}")
+    print(f"{'bulk':>6} {rows:>8} {bulk:>9.2f} {rows / bulk:>10.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--symbols", type=int, default=50)
+    parser.add_argument("--bars", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    logger.remove()
+    asyncio.run(main(args.symbols, args.bars, args.batch_size))
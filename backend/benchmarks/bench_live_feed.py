@@ -0,0 +1,83 @@
+"""
+Load test the /ws live feed with many local WebSocket clients
+
+Starts the app on a local port, connects the clients, subscribes them all
+to one price topic and publishes a burst of updates, reporting the
+publish-to-receive latency seen by the clients.
+
+    python -m benchmarks.bench_live_feed --clients 1000 --updates 50
+"""
+import argparse
+import asyncio
+import json
+import resource
+import time
+
+import numpy as np
+import uvicorn
+import websockets
+from loguru import logger
+
+from app.main import app
+from app.utils.broadcast import live_feed
+
+TOPIC = "prices:RELIANCE.NS"
+
+
+async def client(url: str, updates: int, ready: asyncio.Event, connected: list, latencies: list):
+    async with websockets.connect(url, max_queue=None) as ws:
+        await ws.send(json.dumps({"action": "subscribe", "topics": [TOPIC]}))
+        await ws.recv()
+        connected.append(1)
+        await ready.wait()
+        received = 0
+        while received < updates:
+            frame = json.loads(await ws.recv())
+            latencies.append(time.time() - frame["data"]["sent_at"])
+            received += 1
+
+
+async def run(clients: int, updates: int, port: int, interval: float):
+    server = uvicorn.Server(uvicorn.Config(app, port=port, log_level="warning", ws_max_queue=1024))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    url = f"ws://127.0.0.1:{port}/ws?policy=drop"
+    ready, connected, latencies = asyncio.Event(), [], []
+    tasks = [asyncio.create_task(client(url, updates, ready, connected, latencies)) for _ in range(clients)]
+    while len(connected) < clients:
+        await asyncio.sleep(0.05)
+    ready.set()
+
+    started = time.perf_counter()
+    for i in range(updates):
+        live_feed.publish(TOPIC, {"close": 2900.0 + i, "sent_at": time.time()})
+        await asyncio.sleep(interval)
+    await asyncio.wait_for(asyncio.gather(*tasks), timeout=120)
+    elapsed = time.perf_counter() - started
+
+    server.should_exit = True
+    await serving
+    return np.array(latencies) * 1000, elapsed, live_feed.get_stats()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--updates", type=int, default=50)
+    parser.add_argument("--interval", type=float, default=0.02, help="Seconds between updates")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, max(soft, args.clients * 2 + 256)), hard))
+    logger.remove()
+
+    latencies, elapsed, stats = asyncio.run(run(args.clients, args.updates, args.port, args.interval))
+    print(f"clients={args.clients} updates={args.updates} frames={len(latencies)} wall={elapsed:.2f}s")
+    print(
+        f"latency ms: p50={np.percentile(latencies, 50):.1f} p95={np.percentile(latencies, 95):.1f} "
+        f"p99={np.percentile(latencies, 99):.1f} max={latencies.max():.1f}"
+    )
+    print(f"published={stats['published']} queued={stats['queued']} sent={stats['sent']} dropped={stats['dropped']}")
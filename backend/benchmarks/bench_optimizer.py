@@ -0,0 +1,51 @@
+"""
+Benchmark EWMA covariance updates and optimizer solve times
+
+    python -m benchmarks.bench_optimizer --symbols 100 500 --bars 500
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app.trading.optimizer import EWMACovariance, optimize, OPTIMIZER_METHODS
+
+
+def synthetic_closes(symbols: int, bars: int, seed: int = 0) -> np.ndarray:
+    """Closes driven by five common factors plus idiosyncratic noise"""
+    rng = np.random.default_rng(seed)
+    loadings = rng.normal(0, 0.006, (symbols, 5))
+    returns = rng.normal(0, 1, (bars, 5)) @ loadings.T + rng.normal(0.0003, 0.012, (bars, symbols))
+    return 100 * np.cumprod(1 + returns, axis=0)
+
+
+def run(symbols: int, bars: int):
+    """Return (ms per bar update, {method: solve ms}) for one universe size"""
+    closes = synthetic_closes(symbols, bars)
+    estimator = EWMACovariance([f"S{i}" for i in range(symbols)], decay=0.94)
+    timestamps = [datetime(2020, 1, 1) + timedelta(days=i) for i in range(bars)]
+
+    started = time.perf_counter()
+    estimator.update_many(timestamps, closes)
+    per_bar = (time.perf_counter() - started) / bars * 1000
+
+    estimates = estimator.estimates()
+    solves = {}
+    for method in OPTIMIZER_METHODS:
+        started = time.perf_counter()
+        optimize(method, estimates["mean"], estimates["cov"], risk_aversion=5.0, max_weight=0.05)
+        solves[method] = (time.perf_counter() - started) * 1000
+    return per_bar, solves
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--symbols", type=int, nargs="+", default=[100, 500])
+    parser.add_argument("--bars", type=int, default=500)
+    args = parser.parse_args()
+
+    print(f"{'symbols':>8} {'update ms/bar':>14} " + " ".join(f"{m + ' ms':>18}" for m in OPTIMIZER_METHODS))
+    for symbols in args.symbols:
+        per_bar, solves = run(symbols, args.bars)
+        print(f"{symbols:>8} {per_bar:>14.3f} " + " ".join(f"{solves[m]:>18.1f}" for m in OPTIMIZER_METHODS))
@@ -0,0 +1,72 @@
+"""
+Benchmark order book tick handling with many resting orders
+
+    python -m benchmarks.bench_order_book --orders 100000 --symbols 500 --ticks 20000
+"""
+import argparse
+import time
+
+import numpy as np
+from loguru import logger
+
+from app.models.trades import OrderSide, OrderType
+from app.trading.engine import TradingEngine
+from app.trading.order_book import OrderBook, RestingOrder
+
+SIDES = [OrderSide.BUY, OrderSide.SELL]
+TYPES = [OrderType.LIMIT, OrderType.STOP_LOSS]
+
+
+def build_book(orders: int, symbols: int, seed: int = 0) -> OrderBook:
+    """Resting limits and stops spread +/-10% around a price of 100 per symbol"""
+    rng = np.random.default_rng(seed)
+    book = OrderBook(flush_seconds=0)
+    book.engine = TradingEngine(initial_capital=1e15)
+    names = [f"S{i:04d}" for i in range(symbols)]
+    for name in names:
+        # Seed holdings so sell orders are fillable
+        book.engine.execute_order(name, "BUY", orders, 100.0)
+    for order_id in range(orders):
+        side, order_type = SIDES[order_id % 2], TYPES[(order_id // 2) % 2]
+        offset = rng.uniform(0.01, 0.10)
+        # Place every order away from 100 so it rests until the price moves
+        below = (side == OrderSide.BUY) == (order_type == OrderType.LIMIT)
+        price = 100.0 * (1 - offset if below else 1 + offset)
+        book.add(RestingOrder(order_id, names[order_id % symbols], side, order_type, 1, price))
+    return book
+
+
+def measure(book: OrderBook, ticks: int, spread: float, seed: int = 1):
+    """Per-tick latencies (microseconds) and fills for random walks around 100"""
+    rng = np.random.default_rng(seed)
+    names = sorted(book.books)
+    symbols = rng.integers(0, len(names), ticks)
+    prices = 100.0 * (1 + rng.uniform(-spread, spread, ticks))
+    latencies = np.empty(ticks)
+    fills = 0
+    for i in range(ticks):
+        started = time.perf_counter()
+        fills += len(book.on_price(names[symbols[i]], prices[i]))
+        latencies[i] = (time.perf_counter() - started) * 1e6
+    return latencies, fills
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--orders", type=int, default=100_000)
+    parser.add_argument("--symbols", type=int, default=500)
+    parser.add_argument("--ticks", type=int, default=20_000)
+    args = parser.parse_args()
+    # The engine logs every fill
+    logger.remove()
+
+    started = time.perf_counter()
+    book = build_book(args.orders, args.symbols)
+    print(f"rested {len(book)} orders in {time.perf_counter() - started:.2f}s")
+
+    print(f"{'ticks':>14} {'fills':>7} {'p50 us':>8} {'p99 us':>8} {'max us':>8}")
+    for label, spread in (("inside (none)", 0.009), ("crossing", 0.12)):
+        latencies, fills = measure(book, args.ticks, spread)
+        p50, p99 = np.percentile(latencies, [50, 99])
+        print(f"{label:>14} {fills:>7} {p50:>8.1f} {p99:>8.1f} {latencies.max():>8.1f}")
+    print(f"{len(book)} orders still resting")
@@ -0,0 +1,48 @@
+"""
+Benchmark per-symbol vs panel indicator computation
+
+    python -m benchmarks.bench_panel --symbols 50 500 2000 --bars 500
+"""
+import argparse
+import time
+
+from loguru import logger
+
+from app.data.collector import DataCollector
+from app.data.panel import ClosePanel, add_panel_indicators, compute_panel_indicators
+from app.data.providers import ReplayProvider, synthetic_history
+
+
+def run(symbols: int, bars: int):
+    """Return (per-symbol, panel, array-only) seconds for one universe size"""
+    frames = {f"SYM{i:04d}.NS": synthetic_history(bars, seed=i) for i in range(symbols)}
+    collector = DataCollector(symbols=[], provider=ReplayProvider())
+
+    started = time.perf_counter()
+    for df in frames.values():
+        collector.add_technical_indicators(df.copy())
+    per_symbol = time.perf_counter() - started
+
+    started = time.perf_counter()
+    add_panel_indicators(frames)
+    panel = time.perf_counter() - started
+
+    closes = ClosePanel.from_frames(frames)
+    started = time.perf_counter()
+    compute_panel_indicators(closes.closes, closes.mask)
+    compute = time.perf_counter() - started
+
+    return per_symbol, panel, compute
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--symbols", type=int, nargs="+", default=[50, 500, 2000])
+    parser.add_argument("--bars", type=int, default=500)
+    args = parser.parse_args()
+
+    logger.remove()
+    print(f"{'symbols':>8} {'per-symbol s':>13} {'panel s':>9} {'arrays s':>9} {'speedup':>8}")
+    for count in args.symbols:
+        per_symbol, panel, compute = run(count, args.bars)
+        print(f"{count:>8} {per_symbol:>13.3f} {panel:>9.3f} {compute:>9.3f} {per_symbol / panel:>7.1f}x")
@@ -0,0 +1,113 @@
+"""
+Benchmark the array-backed position book against the former dict of dicts
+
+    python -m benchmarks.bench_positions --symbols 10000 --fills 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+from loguru import logger
+
+from app.trading.positions import PositionBook
+
+
+class DictPositions:
+    """The previous TradingEngine bookkeeping: a dict rebuilt per BUY, generator sums"""
+
+    def __init__(self):
+        self.positions = {}
+
+    def buy(self, symbol, quantity, price):
+        if symbol in self.positions:
+            current_qty = self.positions[symbol]['quantity']
+            current_avg = self.positions[symbol]['avg_price']
+            new_qty = current_qty + quantity
+            new_avg = ((current_qty * current_avg) + (quantity * price)) / new_qty
+            self.positions[symbol] = {'quantity': new_qty, 'avg_price': new_avg, 'current_price': price}
+        else:
+            self.positions[symbol] = {'quantity': quantity, 'avg_price': price, 'current_price': price}
+
+    def sell(self, symbol, quantity):
+        self.positions[symbol]['quantity'] -= quantity
+        if self.positions[symbol]['quantity'] == 0:
+            del self.positions[symbol]
+
+    def update_prices(self, prices):
+        for symbol, price in prices.items():
+            if symbol in self.positions:
+                self.positions[symbol]['current_price'] = price
+
+    def value(self):
+        return sum(pos['quantity'] * pos['current_price'] for pos in self.positions.values())
+
+
+def fills(symbols: int, count: int, seed: int = 0):
+    """Random fills, selling only what is held (about 1 in 4 fills is a sale)"""
+    rng = np.random.default_rng(seed)
+    names = [f"S{i:05d}" for i in range(symbols)]
+    picks = rng.integers(0, symbols, count).tolist()
+    quantities = rng.integers(1, 100, count).tolist()
+    prices = rng.uniform(10, 1000, count).round(2).tolist()
+    sells = (rng.random(count) < 0.25).tolist()
+    held = [0] * symbols
+    out = []
+    for pick, quantity, price, sell in zip(picks, quantities, prices, sells):
+        if sell and held[pick]:
+            quantity = min(quantity, held[pick])
+            held[pick] -= quantity
+            out.append((False, names[pick], quantity, price))
+        else:
+            held[pick] += quantity
+            out.append((True, names[pick], quantity, price))
+    return names, out
+
+
+def run(book, names, stream, rounds: int):
+    """Seconds for the fills, one full price update and one portfolio valuation"""
+    started = time.perf_counter()
+    for is_buy, symbol, quantity, price in stream:
+        if is_buy:
+            book.buy(symbol, quantity, price)
+        else:
+            book.sell(symbol, quantity)
+    fill_s = time.perf_counter() - started
+
+    rng = np.random.default_rng(1)
+    ticks = [dict(zip(names, rng.uniform(10, 1000, len(names)))) for _ in range(rounds)]
+    started = time.perf_counter()
+    for prices in ticks:
+        book.update_prices(prices)
+    update_s = (time.perf_counter() - started) / rounds
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        value = book.market_value if isinstance(book, PositionBook) else book.value()
+    value_s = (time.perf_counter() - started) / rounds
+    return fill_s, update_s, value_s, value
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--symbols", type=int, default=10_000)
+    parser.add_argument("--fills", type=int, default=1_000_000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+    logger.remove()
+
+    names, stream = fills(args.symbols, args.fills)
+    print(f"{'book':>8} {'fills s':>8} {'fill us':>8} {'update ms':>10} {'value us':>9} {'value':>16}")
+    for label, book in (("dict", DictPositions()), ("array", PositionBook())):
+        fill_s, update_s, value_s, value = run(book, names, stream, args.rounds)
+        print(
+            f"{label:>8} {fill_s:>8.2f} {fill_s / args.fills * 1e6:>8.2f} "
+            f"{update_s * 1e3:>10.2f} {value_s * 1e6:>9.2f} {value:>16.2f}"
+        )
+    aligned = PositionBook()
+    for symbol in names:
+        aligned.buy(symbol, 1, 1.0)
+    prices = np.random.default_rng(2).uniform(10, 1000, len(names))
+    started = time.perf_counter()
+    for _ in range(args.rounds):
+        aligned.update_prices(prices)
+    print(f"aligned array price update: {(time.perf_counter() - started) / args.rounds * 1e3:.3f} ms")
@@ -0,0 +1,85 @@
+"""
+Benchmark response serialization: per-row Pydantic/JSON vs negotiated formats
+
+    python -m benchmarks.bench_serialization --rows 10000 100000
+"""
+import argparse
+import gzip
+import json
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+
+from app.api.trading import TradeResponse
+from app.utils.serialization import brotli, compress_body, encode_columns
+
+
+def trade_columns(rows: int) -> dict:
+    rng = np.random.default_rng(rows)
+    start = datetime(2024, 1, 1, 9, 15)
+    return {
+        "id": np.arange(rows, 0, -1),
+        "symbol": [f"SYM{i % 500:03d}.NS" for i in range(rows)],
+        "side": ["BUY" if i % 2 else "SELL" for i in range(rows)],
+        "quantity": rng.integers(1, 500, rows),
+        "price": np.round(rng.uniform(100, 5000, rows), 2),
+        "pnl": [None if i % 3 else float(i % 97) for i in range(rows)],
+        "timestamp": [start + timedelta(seconds=i) for i in range(rows)],
+    }
+
+
+def baseline(columns: dict) -> bytes:
+    """What the endpoint did before: one model per row, default JSON encoder"""
+    names = list(columns)
+    lists = [list(columns[name]) for name in names]
+    models = [
+        TradeResponse(**dict(zip(names, row)))
+        for row in zip(*[[v.item() if hasattr(v, "item") else v for v in values] for values in lists])
+    ]
+    return json.dumps(jsonable_encoder(models)).encode()
+
+
+def measure(encode, repeat: int = 3):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = encode()
+        best = min(best, time.perf_counter() - started)
+    return body, best
+
+
+def run(rows: int):
+    columns = trade_columns(rows)
+    encoders = {
+        "pydantic+json": lambda: baseline(columns),
+        "orjson rows": lambda: encode_columns(columns, "json"),
+        "columnar json": lambda: encode_columns(columns, "columnar"),
+        "msgpack": lambda: encode_columns(columns, "msgpack"),
+    }
+
+    results = []
+    for name, encode in encoders.items():
+        body, seconds = measure(encode)
+        gzipped, gzip_seconds = measure(lambda: gzip.compress(body, compresslevel=6))
+        if brotli is not None:
+            brotlied, br_seconds = measure(lambda: compress_body(body, "br")[0])
+        else:
+            brotlied, br_seconds = b"", float("nan")
+        results.append((name, seconds, len(body), len(gzipped), gzip_seconds, len(brotlied), br_seconds))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    args = parser.parse_args()
+
+    print(f"{'rows':>7} {'format':<14} {'encode ms':>10} {'KB':>8} {'gzip KB':>8} {'gzip ms':>8} {'br KB':>7} {'br ms':>7}")
+    for rows in args.rows:
+        for name, seconds, size, gz, gz_s, br, br_s in run(rows):
+            print(
+                f"{rows:>7} {name:<14} {seconds * 1000:>10.1f} {size / 1024:>8.0f} "
+                f"{gz / 1024:>8.0f} {gz_s * 1000:>8.1f} {br / 1024:>7.0f} {br_s * 1000:>7.1f}"
+            )
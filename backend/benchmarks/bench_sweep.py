@@ -0,0 +1,59 @@
+"""
+Benchmark sweep throughput, in-process vs. a process pool over shared memory
+
+    python -m benchmarks.bench_sweep --symbols 200 --years 2 --workers 4
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database.init_db import Base
+from app.trading.sweep import SweepRunner, grid, rank_results, walk_forward_splits
+from benchmarks.bench_backtest import synthetic_panel
+
+
+async def main(args):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    panel = synthetic_panel(args.symbols, int(252 * args.years))
+    samples = grid({"short": list(range(5, 5 + 5 * args.short, 5)), "long": [50, 100, 150, 200]})
+    rows = len(panel.timestamps)
+    splits = walk_forward_splits(rows, rows // 2, rows // 8) if args.walk_forward else None
+    rows_per_bar = panel.mask.sum(axis=1)
+    segments = [(start, stop) for a, b, c in splits for start, stop in ((a, b), (b, c))] if splits else [(0, rows)]
+    bars = len(samples) * sum(int(rows_per_bar[start:stop].sum()) for start, stop in segments)
+    print(f"{len(samples)} parameter sets x {len(segments)} segment(s), {bars:,} bars in total")
+    print(f"{'workers':>8} {'tasks':>6} {'seconds':>8} {'tasks/s':>8} {'bars/s':>12}")
+    for workers in sorted({1, args.workers}):
+        runner = SweepRunner(session_factory, workers=workers)
+        started = time.perf_counter()
+        progress = await runner.run(f"bench-{workers}", panel, "sma_crossover", samples, splits, initial_capital=10_000_000)
+        elapsed = time.perf_counter() - started
+        print(
+            f"{workers:>8} {progress['done']:>6} {elapsed:>8.2f} {progress['done'] / elapsed:>8.1f} "
+            f"{bars / elapsed:>12,.0f}"
+        )
+    async with session_factory() as db:
+        best = (await rank_results(db, f"bench-{workers}", "sharpe", "test" if splits else "full", limit=1))[0]
+    print(f"best: {best['params']} sharpe {best['sharpe']:.2f}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--symbols", type=int, default=200)
+    parser.add_argument("--years", type=float, default=2)
+    parser.add_argument("--short", type=int, default=8, help="Short SMA windows (5, 10, ...)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--walk-forward", action="store_true")
+    args = parser.parse_args()
+    logger.remove()
+    asyncio.run(main(args))
@@ -0,0 +1,49 @@
+"""
+Benchmark Monte Carlo VaR: in-process vs process pool
+
+    python -m benchmarks.bench_var --symbols 50 --paths 100000 1000000 --workers 4
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from app.trading.var import VaREngine, parametric_var
+
+
+def synthetic_returns(symbols: int, periods: int = 500, seed: int = 0) -> np.ndarray:
+    """Daily returns driven by one market factor plus idiosyncratic noise"""
+    rng = np.random.default_rng(seed)
+    market = rng.normal(0.0004, 0.01, (periods, 1))
+    betas = rng.uniform(0.5, 1.5, symbols)
+    return market * betas + rng.normal(0.0, 0.015, (periods, symbols))
+
+
+async def run(symbols: int, paths: int, workers: int):
+    """Return (serial s, pooled s, serial VaR, pooled VaR) for one run size"""
+    returns = synthetic_returns(symbols)
+    exposures = np.full(symbols, 1_000_000 / symbols)
+
+    results = []
+    for engine in (VaREngine(workers=1), VaREngine(workers=workers)):
+        # Start the workers outside the timed run
+        await asyncio.get_running_loop().run_in_executor(engine.pool, int)
+        started = time.perf_counter()
+        var = await engine.monte_carlo_var(returns, exposures, 0.99, paths=paths, seed=1)
+        results += [time.perf_counter() - started, var["var"]]
+        engine.shutdown()
+    return results, parametric_var(returns, exposures, 0.99)["var"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--symbols", type=int, default=50)
+    parser.add_argument("--paths", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{'paths':>9} {'serial s':>9} {'pool s':>8} {'MC VaR':>10} {'normal VaR':>11}")
+    for paths in args.paths:
+        (serial_s, _, pooled_s, pooled_var), normal_var = asyncio.run(run(args.symbols, paths, args.workers))
+        print(f"{paths:>9} {serial_s:>9.3f} {pooled_s:>8.3f} {pooled_var:>10.0f} {normal_var:>11.0f}")
@@ -3,9 +3,20 @@ Pytest configuration and fixtures
 """
 import pytest
 import asyncio
+from typing import Callable, NamedTuple, Union
+from httpx import AsyncClient
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
-from app.database.init_db import Base
+from app.database.init_db import Base, get_db
+from app.main import app
+from app.utils.cache import response_cache
+from app.trading.analytics import risk_accumulator
+from app.trading.mark_to_market import mark_to_market
+from app.trading.order_book import order_book
+from app.trading.var import var_engine
+from app.trading.optimizer import covariance_tracker
+from app.trading.sweep import sweep_runner
 
 # Test database URL
 TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
@@ -17,6 +28,13 @@ def event_loop():
     yield loop
     loop.close()
 
+@pytest.fixture(autouse=True)
+def indicator_state_path(tmp_path, monkeypatch):
+    """Keep streaming indicator state written by syncs out of the working tree"""
+    path = tmp_path / "indicator_state.json"
+    monkeypatch.setenv("INDICATOR_STATE_PATH", str(path))
+    return path
+
 @pytest.fixture
 async def test_db():
     """Create a test database"""
@@ -36,3 +54,71 @@ async def test_db():
         await conn.run_sync(Base.metadata.drop_all)
     
     await engine.dispose()
+
+@pytest.fixture
+async def session_factory():
+    """Session factory bound to a fresh in-memory database"""
+    engine = create_async_engine(TEST_DATABASE_URL, echo=False)
+    
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    
+    yield sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    
+    await engine.dispose()
+
+@pytest.fixture
+async def client(session_factory):
+    """API client whose requests use the in-memory test database"""
+    async def override_get_db():
+        async with session_factory() as session:
+            yield session
+            await session.commit()
+    
+    app.dependency_overrides[get_db] = override_get_db
+    response_cache.clear()
+    risk_accumulator.reset()
+    mark_to_market.reset()
+    order_book.reset()
+    order_book.engine = None
+    var_engine.clear()
+    covariance_tracker.reset()
+    sweep_runner.session_factory = session_factory
+    sweep_runner.progress.clear()
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        yield client
+    await sweep_runner.stop()
+    app.dependency_overrides.clear()
+
+class ExecutedStatement(NamedTuple):
+    statement: str
+    parameters: object
+    executemany: bool
+
+@pytest.fixture
+def sql_statements():
+    """
+    Record the SQL an engine runs
+    
+    ``sql_statements(engine, match)`` returns a list that collects an
+    ``ExecutedStatement`` for every statement containing ``match`` (or for
+    which ``match(statement)`` is true). Listeners are removed after the test.
+    """
+    listeners = []
+    
+    def capture(engine, match: Union[str, Callable[[str], bool]] = None):
+        target = getattr(engine, "sync_engine", engine)
+        matches = (lambda statement: match in statement) if isinstance(match, str) else match
+        statements = []
+        
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if matches is None or matches(statement):
+                statements.append(ExecutedStatement(statement, parameters, executemany))
+        
+        event.listen(target, "before_cursor_execute", record)
+        listeners.append((target, record))
+        return statements
+    
+    yield capture
+    for target, record in listeners:
+        event.remove(target, "before_cursor_execute", record)
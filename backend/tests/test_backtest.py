@@ -0,0 +1,133 @@
+"""
+Backtester tests
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import insert
+
+from app.data.bar_store import BarStore
+from app.data.panel import compute_panel_indicators
+from app.models.stock_data import StockPrice
+from app.trading.backtest import (
+    BarPanel, Backtester, RsiReversion, SmaCrossover, Strategy, load_bar_panel
+)
+
+def random_panel(symbols=20, periods=300, seed=0, gaps=True):
+    """Random-walk closes with panel indicators; a few symbols miss some bars"""
+    rng = np.random.default_rng(seed)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (periods, symbols)), axis=0))
+    if gaps:
+        closes[rng.random(closes.shape) < 0.03] = np.nan
+    mask = ~np.isnan(closes)
+    fields = {"close": closes}
+    fields.update({name: values.T for name, values in compute_panel_indicators(closes.T, mask.T).items()})
+    timestamps = pd.date_range("2023-01-02", periods=periods, freq="B")
+    return BarPanel([f"S{i:02d}" for i in range(symbols)], timestamps, fields)
+
+class BuyAndHold(Strategy):
+    def __init__(self, quantity):
+        self.quantity = quantity
+
+    def on_bar(self, timestamp, columns, bar, engine):
+        if engine.positions:
+            return []
+        return [(int(column), self.quantity) for column in columns]
+
+def test_event_driven_fills_through_the_engine():
+    panel = random_panel(symbols=3, periods=50, gaps=False)
+    result = Backtester(initial_capital=100_000, commission_rate=0.002).run(panel, BuyAndHold(10))
+
+    closes = panel.fields["close"]
+    cost = 10 * closes[0].sum()
+    cash = 100_000 - cost * 1.002
+    assert len(result.trades) == 3
+    assert result.trades[0]["timestamp"] == panel.timestamps[0].to_pydatetime()
+    assert result.trades[0]["commission"] == pytest.approx(10 * closes[0, 0] * 0.002)
+    assert result.equity == pytest.approx(cash + 10 * closes.sum(axis=1))
+    assert result.stats["final_value"] == pytest.approx(result.equity[-1])
+    assert result.stats["commission"] == pytest.approx(cost * 0.002)
+
+@pytest.mark.parametrize("strategy", [SmaCrossover(allocation=0.04), RsiReversion(allocation=0.04)])
+def test_vectorized_path_matches_event_driven(strategy):
+    panel = random_panel()
+    backtester = Backtester(initial_capital=1_000_000)
+    event = backtester.run(panel, strategy)
+    fast = backtester.run_vectorized(panel, strategy)
+
+    assert len(event.trades) > 20
+    assert len(fast.trades) == len(event.trades)
+    for a, b in zip(event.trades, fast.trades):
+        assert (a["timestamp"], a["symbol"], a["side"], a["quantity"]) == (b["timestamp"], b["symbol"], b["side"], b["quantity"])
+        assert a["price"] == pytest.approx(b["price"])
+        assert a["pnl"] == pytest.approx(b["pnl"])
+    assert fast.equity == pytest.approx(event.equity, rel=1e-9)
+    assert fast.stats["sharpe"] == pytest.approx(event.stats["sharpe"])
+
+def test_commission_reduces_final_value_by_its_total():
+    panel = random_panel(gaps=False)
+    free = Backtester(1_000_000, commission_rate=0.0).run(panel, SmaCrossover(0.04))
+    paid = Backtester(1_000_000, commission_rate=0.001).run(panel, SmaCrossover(0.04))
+    assert free.stats["commission"] == 0.0
+    assert free.stats["final_value"] - paid.stats["final_value"] == pytest.approx(paid.stats["commission"])
+
+def test_summary_stats():
+    result = Backtester(1_000_000).run(random_panel(), SmaCrossover(0.04))
+    stats = result.stats
+    assert stats["bars"] == int(random_panel().mask.sum())
+    assert stats["symbols"] == 20
+    assert stats["total_return"] == pytest.approx(result.equity[-1] / 1_000_000 - 1)
+    assert 0.0 <= stats["win_rate"] <= 1.0
+    assert stats["max_drawdown"] <= 0.0
+
+async def test_load_bar_panel_streams_stock_prices(session_factory):
+    start = datetime(2024, 1, 1)
+    rows = [
+        {"symbol": symbol, "timestamp": start + timedelta(days=day), "open": 1.0, "high": 1.0, "low": 1.0,
+         "close": 10.0 * (i + 1) + day, "volume": 1, "rsi": None if day < 2 else 50.0}
+        for i, symbol in enumerate(["BBB", "AAA"]) for day in range(5) if (symbol, day) != ("BBB", 3)
+    ]
+    async with session_factory() as db:
+        await db.execute(insert(StockPrice), rows)
+        await db.commit()
+        panel = await load_bar_panel(db, fields=["close", "rsi"])
+
+    assert panel.symbols == ["AAA", "BBB"]
+    assert len(panel.timestamps) == 5
+    assert panel.fields["close"][:, 0].tolist() == [20.0, 21.0, 22.0, 23.0, 24.0]
+    assert np.isnan(panel.fields["close"][3, 1]) and not panel.mask[3, 1]
+    assert np.isnan(panel.fields["rsi"][1, 0]) and panel.fields["rsi"][2, 0] == 50.0
+
+def test_panel_from_bar_store(tmp_path):
+    store = BarStore(str(tmp_path / "bars"))
+    index = pd.date_range("2024-01-01", periods=4, freq="D")
+    def frame(closes, index):
+        return pd.DataFrame({"Open": 1.0, "High": 1.0, "Low": 1.0, "Close": closes, "Volume": 1}, index=index)
+    store.append("AAA", frame([0.0, 1.0, 2.0, 3.0], index))
+    store.append("BBB", frame([10.0, 11.0, 12.0], index[1:]))
+    panel = BarPanel.from_store(store, fields=["close"])
+    assert panel.symbols == ["AAA", "BBB"]
+    assert panel.fields["close"][:, 1].tolist()[1:] == [10.0, 11.0, 12.0]
+    assert not panel.mask[0, 1]
+
+async def test_backtest_endpoint(client, session_factory):
+    start = datetime.utcnow() - timedelta(days=200)
+    panel = random_panel(symbols=2, periods=120, gaps=False)
+    rows = [
+        {"symbol": symbol, "timestamp": start + timedelta(days=t), "open": 1.0, "high": 1.0, "low": 1.0,
+         "close": float(panel.fields["close"][t, i]), "volume": 1,
+         **{name: (None if np.isnan(panel.fields[name][t, i]) else float(panel.fields[name][t, i])) for name in ["sma_20", "sma_50"]}}
+        for i, symbol in enumerate(["AAA.NS", "BBB.NS"]) for t in range(120)
+    ]
+    async with session_factory() as db:
+        await db.execute(insert(StockPrice), rows)
+        await db.commit()
+
+    event = (await client.get("/api/trading/backtest", params={"symbols": "AAA.NS,BBB.NS", "days": 365})).json()
+    fast = (await client.get("/api/trading/backtest", params={"symbols": "AAA.NS,BBB.NS", "days": 365, "vectorized": True})).json()
+    assert len(event["equity"]["value"]) == 120
+    assert event["stats"]["trades"] == fast["stats"]["trades"] > 0
+    assert fast["stats"]["final_value"] == pytest.approx(event["stats"]["final_value"])
+    assert (await client.get("/api/trading/backtest", params={"strategy": "nope"})).status_code == 400
@@ -0,0 +1,70 @@
+"""
+Columnar bar store tests
+"""
+import numpy as np
+import pytest
+
+from app.data.bar_store import BarStore
+from app.data.collector import DataCollector
+from app.data.providers import ReplayProvider, synthetic_history
+
+@pytest.fixture
+def store(tmp_path):
+    return BarStore(str(tmp_path / "bars"))
+
+@pytest.fixture
+def bars():
+    df = synthetic_history(300, seed=21)
+    return DataCollector(symbols=[], provider=ReplayProvider()).add_technical_indicators(df)
+
+def test_append_and_memory_mapped_read(store, bars):
+    """Stored columns come back as memory-mapped arrays"""
+    assert store.append("TCS.NS", bars) == 300
+    
+    data = store.read("TCS.NS", ["close", "rsi"])
+    assert isinstance(data["close"], np.memmap)
+    np.testing.assert_array_equal(data["close"], bars["Close"].to_numpy())
+    np.testing.assert_allclose(data["rsi"], bars["rsi"].to_numpy())
+    assert store.symbols() == ["TCS.NS"]
+
+def test_incremental_append_and_dedupe(store, bars):
+    """Daily runs with overlapping history don't duplicate bars"""
+    assert store.append("TCS.NS", bars.iloc[:200]) == 200
+    assert store.append("TCS.NS", bars.iloc[200:]) == 100
+    assert store.append("TCS.NS", bars.iloc[150:250]) == 0
+    
+    revised = bars.iloc[[10]].copy()
+    revised["Close"] = 1.0
+    assert store.append("TCS.NS", revised) == 0
+    
+    frame = store.to_frame("TCS.NS", ["close"])
+    assert len(frame) == 300
+    assert frame.index.is_monotonic_increasing
+    assert frame["close"].iloc[10] == 1.0
+    assert frame["close"].iloc[11] == bars["Close"].iloc[11]
+
+def test_range_read(store, bars):
+    """start/end bounds slice the mapped arrays without copying"""
+    store.append("TCS.NS", bars)
+    data = store.read("TCS.NS", ["close"], start=bars.index[100], end=bars.index[109])
+    assert len(data["close"]) == 10
+    assert data["timestamp"][0] == bars.index[100].value
+
+def test_empty_symbol(store):
+    assert len(store.read("NONE.NS", ["close"])["close"]) == 0
+
+async def test_bars_endpoint(client, tmp_path, monkeypatch, bars):
+    """The API reads the store without touching the database"""
+    monkeypatch.setenv("BAR_STORE_PATH", str(tmp_path / "bars"))
+    recent = bars.copy()
+    recent.index = recent.index + (np.datetime64("today") - recent.index[-1].to_datetime64())
+    BarStore().append("INFY.NS", recent)
+    
+    response = await client.get("/api/data/bars/INFY.NS", params={"days": 10, "columns": "close,sma_50"})
+    assert response.status_code == 200
+    rows = response.json()
+    assert 0 < len(rows) <= 10
+    assert set(rows[0]) == {"timestamp", "close", "sma_50"}
+    
+    bad = await client.get("/api/data/bars/INFY.NS", params={"columns": "nope"})
+    assert bad.status_code == 400
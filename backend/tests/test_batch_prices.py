@@ -0,0 +1,60 @@
+"""
+Multi-symbol price endpoint tests
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from app.models.stock_data import StockPrice
+
+def bar(symbol, days_ago, close):
+    return {
+        "symbol": symbol, "timestamp": datetime.utcnow().replace(microsecond=0) - timedelta(days=days_ago),
+        "open": close, "high": close + 1, "low": close - 1, "close": close,
+        "volume": 1000, "rsi": 50.0 + days_ago,
+    }
+
+async def seed(session_factory):
+    async with session_factory() as db:
+        rows = [bar(s, d, 100.0 + i * 10 + d) for i, s in enumerate(["AAA", "BBB"]) for d in (40, 3, 2, 1)]
+        await db.execute(insert(StockPrice), rows)
+        await db.commit()
+        return db.bind
+
+async def test_grouped_by_symbol_with_projection(client, session_factory):
+    await seed(session_factory)
+    response = await client.get("/api/data/prices", params={
+        "symbols": "bbb,AAA,ZZZ", "days": 10, "fields": "close,rsi"
+    })
+    assert response.status_code == 200
+    body = response.json()
+    assert body["fields"] == ["close", "rsi"]
+    assert list(body["prices"]) == ["BBB", "AAA", "ZZZ"]
+    
+    aaa = body["prices"]["AAA"]
+    assert [row["close"] for row in aaa] == [103.0, 102.0, 101.0]
+    assert [row["rsi"] for row in aaa] == [53.0, 52.0, 51.0]
+    assert set(aaa[0]) == {"timestamp", "close", "rsi"}
+    assert body["prices"]["ZZZ"] == []
+
+async def test_single_statement(client, session_factory, sql_statements):
+    engine = await seed(session_factory)
+    statements = sql_statements(engine, "stock_prices")
+    
+    await client.get("/api/data/prices", params={"symbols": "AAA,BBB", "fields": "close"})
+    assert len(statements) == 1
+    assert " IN " in statements[0].statement
+    assert "volume" not in statements[0].statement
+
+async def test_columnar_format(client, session_factory):
+    await seed(session_factory)
+    body = (await client.get("/api/data/prices", params={
+        "symbols": "AAA,BBB", "days": 10, "format": "columnar"
+    })).json()
+    assert body["prices"]["BBB"]["close"] == [113.0, 112.0, 111.0]
+    assert len(body["prices"]["BBB"]["timestamp"]) == 3
+
+async def test_rejects_unknown_fields(client):
+    response = await client.get("/api/data/prices", params={"symbols": "AAA", "fields": "close,secret"})
+    assert response.status_code == 400
+    assert (await client.get("/api/data/prices", params={"symbols": " , "})).status_code == 400
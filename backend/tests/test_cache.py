@@ -0,0 +1,128 @@
+"""
+Response cache tests
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+from starlette.requests import Request
+
+from app.data.ingest import BarIngestor
+from app.data.providers import synthetic_history
+from app.models.portfolio import PortfolioSnapshot
+from app.utils.cache import ResponseCache
+
+def make_request(path="/api/test", headers=None):
+    raw = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    return Request({"type": "http", "method": "GET", "path": path, "query_string": b"", "headers": raw})
+
+async def test_single_flight_coalesces_concurrent_misses():
+    cache = ResponseCache(max_entries=8, ttl_seconds=60)
+    calls = 0
+    
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"value": calls}
+    
+    responses = await asyncio.gather(*(cache.serve(make_request(), ["t"], compute) for _ in range(20)))
+    assert calls == 1
+    assert {r.body for r in responses} == {b'{"value":1}'}
+    assert cache.get_stats()["misses"] == 1
+    assert cache.get_stats()["coalesced"] == 19
+
+async def test_failures_are_shared_and_not_cached():
+    cache = ResponseCache(ttl_seconds=60)
+    
+    async def boom():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("db down")
+    
+    results = await asyncio.gather(
+        *(cache.serve(make_request(), ["t"], boom) for _ in range(3)), return_exceptions=True
+    )
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert cache.get_stats()["entries"] == 0
+
+async def test_ttl_lru_and_invalidation():
+    cache = ResponseCache(max_entries=2, ttl_seconds=60)
+    
+    async def compute():
+        return {"ok": True}
+    
+    for path in ["/a", "/b", "/c"]:
+        await cache.serve(make_request(path), [f"tag{path}"], compute)
+    assert cache.get_stats()["entries"] == 2
+    assert cache.get_stats()["evictions"] == 1
+    
+    assert cache.invalidate("tag/b") == 1
+    assert cache.get_stats()["entries"] == 1
+    
+    expired = ResponseCache(ttl_seconds=0.01)
+    await expired.serve(make_request(), ["t"], compute)
+    await asyncio.sleep(0.02)
+    response = await expired.serve(make_request(), ["t"], compute)
+    assert response.headers["x-cache"] == "MISS"
+
+async def test_write_during_render_is_not_stored():
+    cache = ResponseCache(ttl_seconds=60)
+    
+    async def compute():
+        cache.invalidate("prices:tcs.ns")
+        return {"stale": True}
+    
+    await cache.serve(make_request(), ["prices:TCS.NS"], compute)
+    assert cache.get_stats()["entries"] == 0
+
+async def test_etag_and_not_modified(client):
+    first = await client.get("/api/portfolio/metrics")
+    assert first.headers["x-cache"] == "MISS"
+    etag = first.headers["etag"]
+    
+    second = await client.get("/api/portfolio/metrics")
+    assert second.headers["x-cache"] == "HIT"
+    assert second.json() == first.json()
+    
+    conditional = await client.get("/api/portfolio/metrics", headers={"If-None-Match": etag})
+    assert conditional.status_code == 304
+    assert conditional.content == b""
+    
+    stats = (await client.get("/api/cache/stats")).json()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+    assert stats["not_modified"] == 1
+
+async def test_orm_snapshot_write_invalidates_portfolio(client, session_factory):
+    before = (await client.get("/api/portfolio/metrics")).json()
+    assert before["total_value"] == before["cash_balance"]
+    
+    async with session_factory() as db:
+        db.add(PortfolioSnapshot(
+            timestamp=datetime.utcnow(), total_value=1_234_567.0, cash_balance=1_000_000.0,
+            positions_value=234_567.0, total_pnl=234_567.0, total_pnl_percent=23.4
+        ))
+        await db.commit()
+    
+    after = await client.get("/api/portfolio/metrics")
+    assert after.headers["x-cache"] == "MISS"
+    assert after.json()["total_value"] == 1_234_567.0
+
+async def test_bar_ingest_invalidates_only_that_symbol(client, session_factory):
+    df = synthetic_history(60, seed=12)
+    df.index = df.index + (datetime.utcnow().date() - df.index[-1].date())
+    
+    async with session_factory() as db:
+        await BarIngestor(db).ingest_frame("SBIN.NS", df.iloc[:50])
+    
+    assert len((await client.get("/api/data/price/SBIN.NS", params={"days": 120})).json()) == 50
+    await client.get("/api/data/price/ITC.NS", params={"days": 120})
+    
+    async with session_factory() as db:
+        await BarIngestor(db).ingest_frame("SBIN.NS", df.iloc[50:])
+    
+    refreshed = await client.get("/api/data/price/SBIN.NS", params={"days": 120})
+    assert refreshed.headers["x-cache"] == "MISS"
+    assert len(refreshed.json()) == 60
+    
+    untouched = await client.get("/api/data/price/ITC.NS", params={"days": 120})
+    assert untouched.headers["x-cache"] == "HIT"
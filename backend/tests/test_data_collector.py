@@ -0,0 +1,91 @@
+"""
+Data collector tests
+"""
+import pytest
+from app.data.collector import DataCollector
+from app.data.providers import ReplayProvider, RateLimiter, synthetic_history
+
+SYMBOLS = ["RELIANCE.NS", "TCS.NS", "INFY.NS", "ITC.NS"]
+
+def make_provider(**kwargs):
+    frames = {symbol: synthetic_history(300, seed=i) for i, symbol in enumerate(SYMBOLS)}
+    return ReplayProvider(frames=frames, **kwargs)
+
+class FlakyProvider(ReplayProvider):
+    """Replay provider that fails the first N requests per symbol"""
+    
+    def __init__(self, failures: int, **kwargs):
+        super().__init__(**kwargs)
+        self.failures = failures
+        self.calls = {}
+    
+    def fetch_history(self, symbol, period="2y", start=None):
+        self.calls[symbol] = self.calls.get(symbol, 0) + 1
+        if self.calls[symbol] <= self.failures:
+            raise ConnectionError("temporary failure")
+        return super().fetch_history(symbol, period, start)
+
+def test_concurrent_matches_sequential():
+    """Concurrent fetching returns the same frames as a sequential walk"""
+    collector = DataCollector(symbols=SYMBOLS, provider=make_provider())
+    
+    sequential = collector.fetch_all_symbols(max_workers=1)
+    concurrent = collector.fetch_all_symbols(max_workers=4)
+    
+    assert set(sequential) == set(concurrent) == set(SYMBOLS)
+    for symbol in SYMBOLS:
+        assert sequential[symbol].equals(concurrent[symbol])
+        assert "rsi" in concurrent[symbol].columns
+
+def test_fetch_report():
+    """Every symbol gets a timing and status entry"""
+    collector = DataCollector(symbols=SYMBOLS + ["MISSING.NS"], provider=make_provider())
+    data = collector.fetch_all_symbols(max_workers=2)
+    
+    assert "MISSING.NS" not in data
+    assert collector.fetch_report["MISSING.NS"]["status"] == "empty"
+    for symbol in SYMBOLS:
+        report = collector.fetch_report[symbol]
+        assert report["status"] == "ok"
+        assert report["rows"] == len(data[symbol])
+        assert report["elapsed"] >= 0
+
+def test_retry_with_backoff():
+    """Transient provider errors are retried"""
+    frames = {"TCS.NS": synthetic_history(100)}
+    provider = FlakyProvider(failures=2, frames=frames)
+    collector = DataCollector(symbols=["TCS.NS"], provider=provider, max_retries=3, backoff=0.001)
+    
+    df = collector.fetch_historical_data("TCS.NS")
+    
+    assert df is not None
+    assert collector.fetch_report["TCS.NS"]["attempts"] == 3
+
+def test_retries_exhausted():
+    """A symbol that keeps failing is reported with its error"""
+    provider = FlakyProvider(failures=10, frames={"TCS.NS": synthetic_history(100)})
+    collector = DataCollector(symbols=["TCS.NS"], provider=provider, max_retries=1, backoff=0.001)
+    
+    assert collector.fetch_historical_data("TCS.NS") is None
+    report = collector.fetch_report["TCS.NS"]
+    assert report["status"] == "error"
+    assert report["attempts"] == 2
+    assert "temporary failure" in report["error"]
+
+def test_replay_period_and_start():
+    """Replay provider honours period and start filters"""
+    provider = make_provider()
+    full = provider.fetch_history("TCS.NS", period="max")
+    
+    assert len(provider.fetch_history("TCS.NS", period="1mo")) < len(full)
+    tail = provider.fetch_history("TCS.NS", start=full.index[-10])
+    assert len(tail) == 10
+
+def test_rate_limiter_throttles():
+    """Requests beyond the burst wait for new tokens"""
+    import time
+    limiter = RateLimiter(rate=200, burst=1)
+    started = time.perf_counter()
+    for _ in range(5):
+        limiter.acquire()
+    assert time.perf_counter() - started >= 4 / 200 * 0.9
@@ -0,0 +1,117 @@
+"""
+LTTB downsampling tests
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from app.data.ingest import BarIngestor
+from app.data.providers import synthetic_history
+from app.models.portfolio import PortfolioSnapshot
+from app.utils.downsample import bucket_edges, downsample_columns, lttb_indices
+
+def interpolation_error(x, y, selected):
+    """Largest gap between the original series and the line through the kept points"""
+    return np.max(np.abs(np.interp(x, x[selected], y[selected]) - y))
+
+def test_lttb_keeps_endpoints_and_count():
+    x = np.arange(10_000, dtype=float)
+    y = np.random.default_rng(0).normal(size=10_000).cumsum()
+    selected = lttb_indices(x, y, 500)
+    
+    assert len(selected) == 500
+    assert selected[0] == 0 and selected[-1] == 9_999
+    assert np.all(np.diff(selected) > 0)
+    # One point per bucket
+    edges = bucket_edges(10_000, 500)
+    assert np.all(selected >= edges) and np.all(selected[:-1] < edges[1:])
+
+def test_lttb_visual_error_is_bounded():
+    """Smooth series stay within 1% of amplitude; noisy ones keep their range"""
+    x = np.linspace(0, 20 * np.pi, 20_000)
+    y = np.sin(x)
+    assert interpolation_error(x, y, lttb_indices(x, y, 400)) < 0.01
+    
+    y = np.random.default_rng(1).normal(size=20_000).cumsum()
+    selected = lttb_indices(x, y, 400)
+    lttb_error = interpolation_error(x, y, selected)
+    assert np.ptp(y[selected]) > 0.95 * np.ptp(y)
+    
+    # Never worse than the widest range spanned by two adjacent buckets
+    edges = np.append(bucket_edges(20_000, 400), 20_000)
+    widest = max(np.ptp(y[edges[i]:edges[i + 2]]) for i in range(len(edges) - 2))
+    assert lttb_error <= widest
+
+def test_lttb_keeps_spikes():
+    x = np.arange(5_000, dtype=float)
+    y = np.zeros(5_000)
+    y[1_234] = 50.0
+    y[3_210] = -40.0
+    selected = lttb_indices(x, y, 100)
+    assert 1_234 in selected and 3_210 in selected
+
+def test_ohlc_extremes_and_volume_preserved():
+    df = synthetic_history(5_000, seed=5)
+    columns = {
+        "timestamp": df.index.to_pydatetime(),
+        "high": df["High"].to_numpy(),
+        "low": df["Low"].to_numpy(),
+        "close": df["Close"].to_numpy(),
+        "volume": df["Volume"].to_numpy(),
+    }
+    sampled = downsample_columns(
+        columns, 250, x="timestamp", y="close",
+        max_columns=["high"], min_columns=["low"], sum_columns=["volume"]
+    )
+    
+    assert len(sampled["close"]) == 250
+    assert sampled["high"].max() == df["High"].max()
+    assert sampled["low"].min() == df["Low"].min()
+    assert sampled["volume"].sum() == df["Volume"].sum()
+    assert np.all(sampled["low"] <= sampled["close"]) and np.all(sampled["close"] <= sampled["high"])
+    assert set(sampled["close"]) <= set(columns["close"])
+
+def test_short_series_untouched():
+    columns = {"timestamp": np.arange(10), "close": np.arange(10.0)}
+    assert len(downsample_columns(columns, 50, x="timestamp", y="close")["close"]) == 10
+    assert len(downsample_columns(columns, None, x="timestamp", y="close")["close"]) == 10
+
+async def test_price_endpoint_points(client, session_factory):
+    df = synthetic_history(600, seed=6)
+    df.index = df.index + (pd.Timestamp(datetime.utcnow().date()) - df.index[-1])
+    async with session_factory() as db:
+        await BarIngestor(db, rollups=False).ingest_frame("ITC.NS", df)
+    
+    full = (await client.get("/api/data/price/ITC.NS", params={"days": 1000})).json()
+    sampled = (await client.get("/api/data/price/ITC.NS", params={"days": 1000, "points": 100})).json()
+    
+    assert len(full) == 600
+    assert len(sampled) == 100
+    assert sampled[0]["timestamp"] == full[0]["timestamp"]
+    assert sampled[-1]["timestamp"] == full[-1]["timestamp"]
+    assert max(p["high"] for p in sampled) == max(p["high"] for p in full)
+    assert sum(p["volume"] for p in sampled) == sum(p["volume"] for p in full)
+    
+    bad = await client.get("/api/data/price/ITC.NS", params={"points": 1})
+    assert bad.status_code == 422
+
+async def test_performance_endpoint_points(client, session_factory):
+    now = datetime.utcnow()
+    async with session_factory() as db:
+        for i in range(300):
+            value = 1_000_000 + 5_000 * np.sin(i / 10)
+            db.add(PortfolioSnapshot(
+                timestamp=now - timedelta(hours=300 - i),
+                total_value=value, cash_balance=value, positions_value=0.0,
+                total_pnl=value - 1_000_000, total_pnl_percent=(value - 1_000_000) / 10_000
+            ))
+        await db.commit()
+    
+    full = (await client.get("/api/portfolio/performance", params={"days": 30})).json()["history"]
+    sampled = (await client.get("/api/portfolio/performance", params={"days": 30, "points": 60})).json()["history"]
+    
+    assert len(full) == 300
+    assert len(sampled) == 60
+    assert set(full[0]) == set(sampled[0])
+    assert sampled[-1] == full[-1]
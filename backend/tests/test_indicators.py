@@ -0,0 +1,64 @@
+"""
+Streaming indicator tests
+"""
+import json
+import numpy as np
+import pytest
+
+from app.data.collector import DataCollector
+from app.data.indicators import IndicatorEngine, INDICATOR_COLUMNS
+from app.data.providers import ReplayProvider, synthetic_history
+
+# Index of the first defined value for each column (ta warm-up periods)
+FIRST_VALID = {
+    "rsi": 13, "macd": 25, "macd_signal": 33,
+    "bb_upper": 19, "bb_middle": 19, "bb_lower": 19,
+    "sma_20": 19, "sma_50": 49
+}
+
+@pytest.fixture
+def collector(tmp_path):
+    collector = DataCollector(symbols=[], provider=ReplayProvider())
+    collector.indicator_engine = IndicatorEngine(str(tmp_path / "state.json"))
+    return collector
+
+def test_streaming_matches_ta(collector):
+    """Bar-by-bar updates reproduce the ta-based columns"""
+    df = synthetic_history(600, seed=7)
+    expected = collector.add_technical_indicators(df.copy())
+    streamed = collector.update_indicators("TCS.NS", df)
+    
+    for column in INDICATOR_COLUMNS:
+        values = streamed[column].to_numpy(dtype=float)
+        assert np.isnan(values[:FIRST_VALID[column]]).all(), column
+        np.testing.assert_allclose(
+            values[FIRST_VALID[column]:],
+            expected[column].to_numpy()[FIRST_VALID[column]:],
+            rtol=1e-9, err_msg=column
+        )
+
+def test_state_survives_restart(collector, tmp_path):
+    """A saved and reloaded state continues exactly where it stopped"""
+    df = synthetic_history(300, seed=3)
+    full = collector.update_indicators("INFY.NS", df)
+    
+    collector.indicator_engine.reset("INFY.NS")
+    collector.update_indicators("INFY.NS", df.iloc[:200])
+    collector.indicator_engine.save()
+    json.loads((tmp_path / "state.json").read_text())
+    
+    restored = DataCollector(symbols=[], provider=ReplayProvider())
+    restored.indicator_engine = IndicatorEngine(str(tmp_path / "state.json")).load()
+    tail = restored.update_indicators("INFY.NS", df)
+    
+    assert len(tail) == 100
+    for column in INDICATOR_COLUMNS:
+        np.testing.assert_allclose(tail[column], full[column].iloc[200:], rtol=1e-12)
+
+def test_flat_series_rsi():
+    """RSI is 100 when there are no losing bars, as in ta"""
+    engine = IndicatorEngine()
+    values = engine.update_many("FLAT", [100.0] * 20)
+    assert values[12]["rsi"] is None
+    assert values[13]["rsi"] == 100.0
+    assert values[19]["bb_upper"] == pytest.approx(100.0)
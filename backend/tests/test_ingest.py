@@ -0,0 +1,128 @@
+"""
+Bulk ingestion tests
+"""
+import asyncio
+import threading
+
+import pytest
+from datetime import datetime
+
+from sqlalchemy import insert, select, func, text
+
+from app.data.collector import DataCollector
+from app.data.ingest import BarIngestor, ingest_collector
+from app.data.providers import ReplayProvider, synthetic_history
+from app.database.init_db import upgrade_unique_indexes
+from app.models.stock_data import StockPrice
+
+async def count_rows(db, symbol=None):
+    query = select(func.count()).select_from(StockPrice)
+    if symbol:
+        query = query.where(StockPrice.symbol == symbol)
+    return (await db.execute(query)).scalar()
+
+async def test_upsert_is_idempotent(test_db):
+    """Re-ingesting overlapping bars updates rows instead of duplicating them"""
+    df = synthetic_history(250, seed=31)
+    ingestor = BarIngestor(test_db, batch_size=64)
+    
+    assert await ingestor.ingest_frame("ITC.NS", df) == 250
+    
+    revised = df.iloc[200:].copy()
+    revised["Close"] = revised["Close"] * 2
+    await ingestor.ingest_frame("ITC.NS", revised)
+    
+    assert await count_rows(test_db, "ITC.NS") == 250
+    last = (await test_db.execute(
+        select(StockPrice.close).where(StockPrice.symbol == "ITC.NS")
+        .order_by(StockPrice.timestamp.desc()).limit(1)
+    )).scalar()
+    assert last == pytest.approx(df["Close"].iloc[-1] * 2)
+    assert ingestor.stats["rows"] == 300
+    assert ingestor.stats["rows_per_second"] > 0
+
+async def test_ingest_collector_streams_universe(test_db):
+    """Every fetched symbol lands in stock_prices with its indicators"""
+    symbols = [f"SYM{i}.NS" for i in range(6)]
+    provider = ReplayProvider(frames={s: synthetic_history(120, seed=i) for i, s in enumerate(symbols)})
+    collector = DataCollector(symbols=symbols, provider=provider, max_workers=3)
+    
+    stats = await ingest_collector(collector, BarIngestor(test_db, batch_size=100), queue_size=2)
+    
+    assert stats["symbols"] == 6
+    assert stats["rows"] == 720
+    assert await count_rows(test_db) == 720
+    missing_rsi = (await test_db.execute(
+        select(func.count()).select_from(StockPrice).where(StockPrice.rsi.is_(None))
+    )).scalar()
+    # Only each symbol's RSI warm-up bars are undefined
+    assert missing_rsi == 6 * 13
+
+async def test_ingest_collector_writes_only_new_bars(test_db):
+    """A re-run streams indicators for the bars after the last stored one"""
+    history = synthetic_history(150, seed=5)
+    provider = ReplayProvider(frames={"SYM.NS": history.iloc[:120]})
+    collector = DataCollector(symbols=["SYM.NS"], provider=provider, max_workers=1)
+    await ingest_collector(collector, BarIngestor(test_db))
+    
+    provider.frames["SYM.NS"] = history
+    stats = await ingest_collector(collector, BarIngestor(test_db))
+    assert stats["rows"] == 30
+    assert await count_rows(test_db) == 150
+    
+    expected = collector.add_technical_indicators(history.copy())
+    stored = (await test_db.execute(
+        select(StockPrice.sma_50).where(StockPrice.symbol == "SYM.NS").order_by(StockPrice.timestamp)
+    )).scalars().all()
+    assert stored[120:] == pytest.approx(expected["sma_50"].iloc[120:].tolist(), rel=1e-9)
+
+async def test_ingest_collector_stops_producer_when_ingestion_fails(test_db):
+    """A failing ingestor re-raises without leaving the fetch thread blocked on the full queue"""
+    symbols = [f"SYM{i}.NS" for i in range(20)]
+    provider = ReplayProvider(frames={s: synthetic_history(30, seed=i) for i, s in enumerate(symbols)})
+    finished = threading.Event()
+
+    class TrackedCollector(DataCollector):
+        def iter_symbols(self, period="2y", max_workers=None, indicators=True):
+            try:
+                yield from super().iter_symbols(period, max_workers, indicators)
+            finally:
+                finished.set()
+
+    collector = TrackedCollector(symbols=symbols, provider=provider, max_workers=1)
+    fetched = []
+
+    class FailingIngestor(BarIngestor):
+        async def ingest_frame(self, symbol, df):
+            fetched.append(symbol)
+            if len(fetched) == 2:
+                raise RuntimeError("disk full")
+            return await super().ingest_frame(symbol, df)
+
+    with pytest.raises(RuntimeError, match="disk full"):
+        await asyncio.wait_for(ingest_collector(collector, FailingIngestor(test_db), queue_size=1), timeout=10)
+    # The fetch thread returned early instead of blocking on the queue or fetching everything
+    assert finished.wait(timeout=5)
+    assert len(collector.fetch_report) < len(symbols)
+
+async def test_upgrade_rebuilds_a_plain_bar_index_as_unique(session_factory):
+    """Databases created before the upsert index was unique are deduplicated and upgraded"""
+    bar = {"open": 1.0, "high": 1.0, "low": 1.0, "volume": 1}
+    async with session_factory() as db:
+        await db.execute(text("DROP INDEX idx_symbol_timestamp"))
+        await db.execute(text("CREATE INDEX idx_symbol_timestamp ON stock_prices (symbol, timestamp)"))
+        await db.execute(insert(StockPrice), [
+            {"symbol": "ITC.NS", "timestamp": datetime(2024, 1, day), "close": close, **bar}
+            for day, close in [(1, 10.0), (1, 11.0), (2, 12.0), (2, 13.0), (3, 14.0)]
+        ])
+        await db.commit()
+        
+        connection = await db.connection()
+        assert await connection.run_sync(upgrade_unique_indexes) == ["idx_symbol_timestamp"]
+        assert await connection.run_sync(upgrade_unique_indexes) == []
+        await db.commit()
+        
+        closes = (await db.execute(select(StockPrice.close).order_by(StockPrice.timestamp))).scalars().all()
+        assert closes == [11.0, 13.0, 14.0]
+        
+        assert await BarIngestor(db).ingest_frame("ITC.NS", synthetic_history(5, seed=3)) == 5
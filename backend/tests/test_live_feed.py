@@ -0,0 +1,84 @@
+"""
+Live feed broadcaster tests
+"""
+from datetime import datetime
+
+import pytest
+from starlette.testclient import TestClient
+
+from app.data.ingest import BarIngestor
+from app.data.providers import synthetic_history
+from app.main import app
+from app.models.portfolio import PortfolioSnapshot
+from app.utils.broadcast import LiveFeed, Subscriber, live_feed
+
+async def test_update_is_serialized_once_for_all_subscribers():
+    feed = LiveFeed(max_pending=8)
+    subscribers = [feed.connect() for _ in range(50)]
+    for subscriber in subscribers:
+        feed.subscribe(subscriber, "signals")
+    
+    assert feed.publish("signals", {"symbol": "TCS.NS", "signal": "UP"}) == 50
+    assert feed.publish("metrics", {"total_value": 1.0}) == 0
+    
+    frames = [subscriber.drain() for subscriber in subscribers]
+    assert all(f[0] is frames[0][0] for f in frames)
+    assert feed.get_stats()["published"] == 1
+
+async def test_slow_client_policies():
+    coalescing = Subscriber(max_pending=2, policy="coalesce")
+    for i in range(5):
+        coalescing.offer("prices:TCS.NS", f"tcs-{i}")
+    coalescing.offer("signals", "signal-0")
+    coalescing.offer("metrics", "metrics-0")
+    assert coalescing.drain() == ["signal-0", "metrics-0"]
+    assert coalescing.coalesced == 4
+    assert coalescing.dropped == 1
+    
+    dropping = Subscriber(max_pending=3, policy="drop")
+    for i in range(5):
+        dropping.offer("prices:TCS.NS", f"tcs-{i}")
+    assert dropping.drain() == ["tcs-2", "tcs-3", "tcs-4"]
+    assert dropping.dropped == 2
+    assert dropping.pending == 0
+
+@pytest.fixture
+def ws_client():
+    with TestClient(app).websocket_connect("/ws") as websocket:
+        yield websocket
+
+def test_subscribe_and_receive(ws_client):
+    ws_client.send_json({"action": "subscribe", "topics": ["prices:reliance.ns", "metrics"]})
+    assert ws_client.receive_json() == {"subscribed": ["metrics", "prices:RELIANCE.NS"]}
+    
+    # Published from this (non-loop) thread: handed to the server loop
+    live_feed.publish("prices:RELIANCE.NS", {"close": 2900.5})
+    frame = ws_client.receive_json()
+    assert frame["topic"] == "prices:RELIANCE.NS"
+    assert frame["data"] == {"close": 2900.5}
+    
+    ws_client.send_json({"action": "subscribe", "topics": ["weather"]})
+    assert "error" in ws_client.receive_json()
+    
+    ws_client.send_json({"action": "unsubscribe", "topics": ["metrics"]})
+    assert ws_client.receive_json() == {"subscribed": ["prices:RELIANCE.NS"]}
+
+async def test_writers_publish_on_commit(ws_client, test_db):
+    ws_client.send_json({"action": "subscribe", "topics": ["metrics", "prices:INFY.NS"]})
+    ws_client.receive_json()
+    
+    test_db.add(PortfolioSnapshot(
+        timestamp=datetime(2024, 6, 3, 15, 30), total_value=1_050_000.0, cash_balance=900_000.0,
+        positions_value=150_000.0, total_pnl=50_000.0, total_pnl_percent=5.0
+    ))
+    await test_db.commit()
+    frame = ws_client.receive_json()
+    assert frame["topic"] == "metrics"
+    assert frame["data"]["total_value"] == 1_050_000.0
+    
+    df = synthetic_history(30, seed=31)
+    await BarIngestor(test_db, rollups=False).ingest_frame("INFY.NS", df)
+    frame = ws_client.receive_json()
+    assert frame["topic"] == "prices:INFY.NS"
+    assert frame["data"]["timestamp"] == df.index[-1].isoformat()
+    assert frame["data"]["close"] == pytest.approx(df["Close"].iloc[-1])
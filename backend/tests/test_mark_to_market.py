@@ -0,0 +1,96 @@
+"""
+Mark-to-market service tests
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import insert, select
+
+from app.data.ingest import BarIngestor
+from app.models.portfolio import Position
+from app.trading.mark_to_market import MarkToMarket, mark_to_market
+
+def position(symbol, quantity, entry):
+    return {
+        "symbol": symbol, "quantity": quantity, "avg_entry_price": entry,
+        "current_price": entry, "unrealized_pnl": 0.0, "unrealized_pnl_percent": 0.0,
+    }
+
+async def seed(session_factory, rows):
+    async with session_factory() as db:
+        await db.execute(insert(Position), rows)
+        await db.commit()
+        return db.bind
+
+async def test_vectorized_valuation(session_factory):
+    await seed(session_factory, [position("AAA", 10, 100.0), position("BBB", 5, 200.0), position("CCC", 1, 50.0)])
+    service = MarkToMarket(session_factory, flush_seconds=0)
+    async with session_factory() as db:
+        await service.ensure_loaded(db)
+    
+    service.update_prices({"AAA": 110.0, "BBB": 190.0})
+    values = service.valuation()
+    assert list(values["symbol"]) == ["AAA", "BBB", "CCC"]
+    assert values["current_price"].tolist() == [110.0, 190.0, 50.0]
+    assert values["market_value"].tolist() == [1100.0, 950.0, 50.0]
+    assert values["unrealized_pnl"].tolist() == [100.0, -50.0, 0.0]
+    assert np.allclose(values["unrealized_pnl_percent"], [10.0, -5.0, 0.0])
+
+async def test_stale_prices_are_ignored():
+    service = MarkToMarket(flush_seconds=0)
+    now = datetime(2024, 6, 3, 10, 0)
+    service.update_price("AAA", 101.0, now)
+    service.update_price("AAA", 99.0, now - timedelta(minutes=5))
+    assert service.prices["AAA"] == 101.0
+
+async def test_flush_is_one_batched_update(session_factory, sql_statements):
+    symbols = [f"S{i:03d}" for i in range(200)]
+    engine = await seed(session_factory, [position(s, 10, 100.0) for s in symbols])
+    service = MarkToMarket(session_factory, flush_seconds=0)
+    
+    statements = sql_statements(engine, lambda statement: statement.startswith("UPDATE positions"))
+    
+    for tick in range(50):
+        service.update_prices({s: 100.0 + tick for s in symbols[:150]})
+    async with session_factory() as db:
+        written = await service.flush(db)
+        assert await service.flush(db) == 0
+    
+    assert written == 150
+    assert len(statements) == 1 and statements[0].executemany
+    async with session_factory() as db:
+        stored = {p.symbol: p for p in (await db.execute(select(Position))).scalars()}
+    assert stored["S000"].current_price == 149.0
+    assert stored["S000"].unrealized_pnl == pytest.approx(490.0)
+    assert stored["S199"].current_price == 100.0
+
+async def test_position_commits_reload(session_factory):
+    await seed(session_factory, [position("AAA", 10, 100.0)])
+    service = mark_to_market
+    service.reset()
+    async with session_factory() as db:
+        await service.ensure_loaded(db)
+        db.add(Position(**position("BBB", 3, 10.0)))
+        await db.commit()
+        assert not service.loaded
+        await service.ensure_loaded(db)
+    assert list(service.symbols) == ["AAA", "BBB"]
+    service.reset()
+
+async def test_positions_endpoint_uses_ingested_prices(client, session_factory):
+    await seed(session_factory, [position("AAA.NS", 4, 100.0)])
+    index = pd.date_range("2024-06-03", periods=3, freq="D")
+    frame = pd.DataFrame(
+        {"Open": [1.0] * 3, "High": [1.0] * 3, "Low": [1.0] * 3, "Close": [100.0, 105.0, 120.0], "Volume": [1] * 3},
+        index=index
+    )
+    async with session_factory() as db:
+        await BarIngestor(db, rollups=False).ingest_frame("AAA.NS", frame)
+    
+    positions = (await client.get("/api/portfolio/positions")).json()
+    assert positions[0]["current_price"] == 120.0
+    assert positions[0]["market_value"] == 480.0
+    assert positions[0]["unrealized_pnl"] == 80.0
+    assert positions[0]["unrealized_pnl_percent"] == pytest.approx(20.0)
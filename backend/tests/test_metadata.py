@@ -0,0 +1,75 @@
+"""
+Symbol metadata service tests
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.data.collector import DataCollector
+from app.data.metadata import SymbolMetadataService, symbol_metadata
+from app.data.providers import ReplayProvider, synthetic_history
+from app.utils.market_config import MarketConfig
+
+INFO = {
+    "RELIANCE.NS": {"longName": "Reliance Industries Limited", "currency": "INR", "exchange": "NSI", "sector": "Energy"},
+    "TCS.NS": {"longName": "Tata Consultancy Services Limited", "currency": "INR", "exchange": "NSI", "sector": "Technology"},
+}
+
+class CountingProvider(ReplayProvider):
+    """Replay provider that counts metadata requests"""
+    
+    def __init__(self, **kwargs):
+        super().__init__(info=INFO, **kwargs)
+        self.info_calls = 0
+    
+    def fetch_info(self, symbol):
+        self.info_calls += 1
+        return super().fetch_info(symbol)
+
+@pytest.fixture
+def global_metadata():
+    yield symbol_metadata
+    symbol_metadata._cache.clear()
+
+async def test_refresh_only_when_stale(test_db):
+    """Fresh entries are served from the table; expired ones are refetched"""
+    service = SymbolMetadataService(ttl_hours=1)
+    provider = CountingProvider()
+    
+    assert await service.refresh(test_db, list(INFO), provider) == 2
+    assert await service.refresh(test_db, list(INFO), provider) == 0
+    assert provider.info_calls == 2
+    
+    service.get_cached("TCS.NS")["updated_at"] = datetime.utcnow() - timedelta(hours=2)
+    assert await service.refresh(test_db, list(INFO), provider) == 1
+    assert provider.info_calls == 3
+
+async def test_batch_load_without_network(test_db):
+    """A new process loads entries from the table in one query"""
+    await SymbolMetadataService().refresh(test_db, list(INFO), CountingProvider())
+    
+    service = SymbolMetadataService(max_entries=1)
+    entries = await service.get_many(test_db, list(INFO))
+    assert entries["RELIANCE.NS"]["sector"] == "Energy"
+    assert entries["TCS.NS"]["lot_size"] == 1
+    # LRU keeps only the most recent entry
+    assert len(service._cache) == 1
+
+async def test_display_name_and_symbols_endpoint(client, session_factory, global_metadata):
+    """Display names and /symbols read cached metadata"""
+    async with session_factory() as db:
+        await global_metadata.refresh(db, ["RELIANCE.NS"], CountingProvider())
+    
+    assert MarketConfig.get_stock_display_name("RELIANCE.NS") == "Reliance Industries Limited"
+    assert MarketConfig.get_stock_display_name("ITC.NS") == "ITC"
+    
+    response = await client.get("/api/data/symbols")
+    data = response.json()
+    assert data["metadata"]["RELIANCE.NS"]["currency"] == "INR"
+    assert "ITC.NS" in data["symbols"]
+
+def test_fetch_does_not_request_info():
+    """Historical fetches no longer make a metadata round trip"""
+    provider = CountingProvider(frames={"TCS.NS": synthetic_history(60)})
+    DataCollector(symbols=["TCS.NS"], provider=provider).fetch_all_symbols()
+    assert provider.info_calls == 0
@@ -0,0 +1,203 @@
+"""
+Portfolio optimizer and EWMA covariance tests
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import insert
+
+from app.models.stock_data import StockPrice
+from app.trading.optimizer import (
+    EWMACovariance, CovarianceTracker, project_capped_simplex, solve_quadratic,
+    solve_risk_parity, risk_contributions
+)
+
+START = datetime(2024, 1, 1)
+
+def random_covariance(n, seed=0):
+    rng = np.random.default_rng(seed)
+    factors = rng.normal(0, 0.01, (n, 3))
+    return factors @ factors.T + np.diag(rng.uniform(1e-4, 4e-4, n))
+
+def price_paths(n_symbols=4, periods=400, seed=2):
+    rng = np.random.default_rng(seed)
+    cov = random_covariance(n_symbols, seed)
+    returns = rng.multivariate_normal(np.zeros(n_symbols), cov, size=periods)
+    return 100 * np.cumprod(1 + returns, axis=0), cov
+
+def test_ewma_matches_pandas():
+    closes, _ = price_paths()
+    estimator = EWMACovariance(["A", "B", "C", "D"], decay=0.94)
+    estimator.update_many([START + timedelta(days=i) for i in range(len(closes))], closes)
+    
+    returns = pd.DataFrame(closes).pct_change().dropna()
+    lam, mean, cov = 0.94, np.zeros(4), np.zeros((4, 4))
+    for r in returns.to_numpy():
+        d = r - mean
+        mean = mean + (1 - lam) * d
+        cov = lam * cov + (1 - lam) * np.outer(d, d)
+    assert estimator.observations == len(returns)
+    assert np.allclose(estimator.cov, cov)
+    
+    reference = returns.ewm(alpha=1 - lam, adjust=False).cov().iloc[-4:].to_numpy()
+    assert np.allclose(estimator.estimates()["cov"], reference, rtol=0.25)
+
+def test_missing_bars_leave_other_rows_untouched():
+    estimator = EWMACovariance(["A", "B"], decay=0.9)
+    estimator.update(START, [100.0, 50.0])
+    estimator.update(START + timedelta(days=1), [101.0, 51.0])
+    before = estimator.cov.copy()
+    estimator.update(START + timedelta(days=2), [102.0, np.nan])
+    assert estimator.cov[1, 1] == before[1, 1]
+    assert estimator.cov[0, 0] != before[0, 0]
+    estimator.update(START + timedelta(days=3), [102.0, 52.0])
+    assert estimator.last_close.tolist() == [102.0, 52.0]
+
+def test_capped_simplex_projection():
+    w = project_capped_simplex(np.array([3.0, 1.0, -2.0, 0.5]), cap=0.6)
+    assert w.sum() == pytest.approx(1.0)
+    assert w.max() <= 0.6 + 1e-12 and w.min() >= 0
+
+def test_min_variance_matches_closed_form_when_unconstrained():
+    cov = random_covariance(20)
+    ones = np.ones(20)
+    closed = np.linalg.solve(cov, ones)
+    closed /= closed.sum()
+    weights = solve_quadratic(cov)
+    if (closed >= 0).all():
+        assert np.allclose(weights, closed, atol=1e-6)
+    # Long-only optimum can't beat the unconstrained variance and beats equal weight
+    assert weights @ cov @ weights >= closed @ cov @ closed - 1e-12
+    assert weights @ cov @ weights <= ones @ cov @ ones / 400
+    assert weights.min() >= 0 and weights.sum() == pytest.approx(1.0)
+
+def test_mean_variance_tilts_toward_return_and_respects_cap():
+    cov = np.diag([0.04, 0.04, 0.04])
+    mean = np.array([0.10, 0.02, 0.02])
+    weights = solve_quadratic(cov, mean, risk_aversion=2.0, max_weight=0.5)
+    assert weights[0] == pytest.approx(0.5, abs=1e-6)
+    assert weights[1] == pytest.approx(weights[2])
+
+def test_risk_parity_equalizes_contributions():
+    cov = random_covariance(50, seed=3)
+    weights = solve_risk_parity(cov)
+    assert np.allclose(risk_contributions(weights, cov), 1 / 50, atol=1e-6)
+    assert weights.sum() == pytest.approx(1.0)
+
+async def test_tracker_folds_only_new_bars(session_factory, sql_statements):
+    closes, _ = price_paths(3, 60)
+    symbols = ["AAA", "BBB", "CCC"]
+    now = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    times = [now - timedelta(days=60 - i) for i in range(60)]
+    rows = [
+        {"symbol": s, "timestamp": t, "open": c, "high": c, "low": c, "close": float(c), "volume": 0}
+        for i, t in enumerate(times) for s, c in zip(symbols, closes[i])
+    ]
+    async with session_factory() as db:
+        await db.execute(insert(StockPrice), rows[:150])
+        await db.commit()
+        
+        tracker = CovarianceTracker(lookback_days=365, decay=0.94)
+        assert (await tracker.refresh(db, symbols)).observations == 49
+        
+        await db.execute(insert(StockPrice), rows[150:])
+        await db.commit()
+        statements = sql_statements(db.bind, "stock_prices")
+        estimator = await tracker.refresh(db, symbols)
+    
+    full = EWMACovariance(symbols, decay=0.94)
+    full.update_many(times, closes)
+    assert estimator.observations == 59
+    assert np.allclose(estimator.cov, full.cov)
+    assert len(statements) == 1 and "stock_prices.timestamp >" in statements[0].statement
+
+async def test_tracker_keeps_estimators_per_universe(session_factory, sql_statements):
+    closes, _ = price_paths(4, 60)
+    symbols = ["AAA", "BBB", "CCC", "DDD"]
+    now = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    async with session_factory() as db:
+        await db.execute(insert(StockPrice), [
+            {"symbol": s, "timestamp": now - timedelta(days=60 - i), "open": c, "high": c,
+             "low": c, "close": float(c), "volume": 0}
+            for i in range(60) for s, c in zip(symbols, closes[i])
+        ])
+        await db.commit()
+        
+        tracker = CovarianceTracker(lookback_days=365, decay=0.94, cache_size=2)
+        first = await tracker.refresh(db, symbols[:2])
+        await tracker.refresh(db, symbols[2:])
+        statements = sql_statements(db.bind, "stock_prices")
+        # Alternating back reuses the first estimator and only asks for newer bars
+        assert await tracker.refresh(db, symbols[:2]) is first
+        assert len(statements) == 1 and "stock_prices.timestamp >" in statements[0].statement
+        
+        # A third universe evicts the least recently used one
+        await tracker.refresh(db, symbols[1:3])
+    assert list(tracker.estimators) == [tuple(symbols[:2]), tuple(symbols[1:3])]
+
+def test_bias_correction_uses_per_symbol_counts():
+    closes, _ = price_paths(3, 200)
+    closes[:180, 2] = np.nan  # CCC listed for the last 20 bars only
+    times = [START + timedelta(days=i) for i in range(200)]
+    estimator = EWMACovariance(["AAA", "BBB", "CCC"], decay=0.94)
+    estimator.update_many(times, closes)
+    alone = EWMACovariance(["CCC"], decay=0.94)
+    alone.update_many(times[180:], closes[180:, 2:])
+
+    assert estimator.counts[2, 2] == 19 and estimator.counts[0, 0] == 199
+    assert estimator.estimates()["cov"][2, 2] == pytest.approx(alone.estimates()["cov"][0, 0])
+    assert estimator.estimates()["mean"][2] == pytest.approx(alone.estimates()["mean"][0])
+
+async def test_tracker_replays_when_a_bar_arrives_late(session_factory):
+    closes, _ = price_paths(3, 60)
+    symbols = ["AAA", "BBB", "CCC"]
+    now = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    times = [now - timedelta(days=60 - i) for i in range(60)]
+    def row(i, column):
+        c = float(closes[i, column])
+        return {"symbol": symbols[column], "timestamp": times[i], "open": c, "high": c, "low": c, "close": c, "volume": 0}
+
+    tracker = CovarianceTracker(lookback_days=365, decay=0.94)
+    async with session_factory() as db:
+        await db.execute(insert(StockPrice), [row(i, j) for i in range(50) for j in range(3)])
+        # AAA and BBB land for bar 50 before CCC does
+        await db.execute(insert(StockPrice), [row(50, 0), row(50, 1)])
+        await db.commit()
+        assert (await tracker.refresh(db, symbols)).last_timestamp == times[50]
+
+        await db.execute(insert(StockPrice), [row(50, 2)] + [row(i, j) for i in range(51, 60) for j in range(3)])
+        await db.commit()
+        estimator = await tracker.refresh(db, symbols)
+
+    full = EWMACovariance(symbols, decay=0.94)
+    full.update_many(times, closes)
+    assert estimator.observations == 59
+    assert np.allclose(estimator.cov, full.cov)
+    assert (estimator.counts == 59).all()
+
+async def test_optimize_endpoint(client, session_factory):
+    closes, _ = price_paths(4, 250)
+    symbols = ["AAA", "BBB", "CCC", "DDD"]
+    now = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    async with session_factory() as db:
+        await db.execute(insert(StockPrice), [
+            {"symbol": s, "timestamp": now - timedelta(days=250 - i), "open": c, "high": c,
+             "low": c, "close": float(c), "volume": 0}
+            for i in range(250) for s, c in zip(symbols, closes[i])
+        ])
+        await db.commit()
+    
+    for method in ("min_variance", "mean_variance", "risk_parity"):
+        body = (await client.get("/api/portfolio/optimize", params={
+            "method": method, "symbols": "aaa,bbb,ccc,ddd,zzz", "capital": 1000, "max_weight": 0.4
+        })).json()
+        assert list(body["weights"]) == symbols
+        assert sum(body["weights"].values()) == pytest.approx(1.0)
+        assert sum(body["allocations"].values()) == pytest.approx(1000)
+        assert body["missing"] == ["ZZZ"]
+        if method != "risk_parity":
+            assert max(body["weights"].values()) <= 0.4 + 1e-9
+    
+    assert (await client.get("/api/portfolio/optimize", params={"method": "kelly"})).status_code == 400
@@ -0,0 +1,258 @@
+"""
+Order book tests
+"""
+from datetime import datetime
+
+import pandas as pd
+import pytest
+from sqlalchemy import insert, select
+
+from app.data.ingest import BarIngestor
+from app.models.portfolio import Position, PortfolioSnapshot
+from app.models.trades import Order, OrderSide, OrderStatus, OrderType, Trade
+from app.trading.engine import TradingEngine
+from app.trading.order_book import OrderBook, RestingOrder, order_book
+
+BUY, SELL = OrderSide.BUY, OrderSide.SELL
+LIMIT, STOP, MARKET = OrderType.LIMIT, OrderType.STOP_LOSS, OrderType.MARKET
+
+def book_with_engine(session_factory=None, capital=1_000_000):
+    book = OrderBook(session_factory, flush_seconds=0)
+    book.engine = TradingEngine(initial_capital=capital)
+    return book
+
+def test_trigger_semantics():
+    book = book_with_engine()
+    book.engine.execute_order("AAA", "BUY", 100, 100.0)
+    book.add(RestingOrder(1, "AAA", BUY, LIMIT, 1, 95.0))
+    book.add(RestingOrder(2, "AAA", BUY, LIMIT, 1, 90.0))
+    book.add(RestingOrder(3, "AAA", SELL, LIMIT, 1, 110.0))
+    book.add(RestingOrder(4, "AAA", SELL, STOP, 1, 92.0))
+    book.add(RestingOrder(5, "AAA", BUY, STOP, 1, 108.0))
+
+    assert book.on_price("AAA", 100.0) == []
+    assert [f["order_id"] for f in book.on_price("AAA", 94.0)] == [1]
+    assert [f["order_id"] for f in book.on_price("AAA", 89.0)] == [2, 4]
+    assert [f["order_id"] for f in book.on_price("AAA", 111.0)] == [3, 5]
+    assert len(book) == 0
+    assert all(f["price"] == 111.0 for f in book.on_price("AAA", 111.0))
+
+def test_fills_at_the_tick_price_through_the_engine():
+    book = book_with_engine()
+    book.add(RestingOrder(1, "AAA", BUY, LIMIT, 10, 100.0))
+    fill, = book.on_price("AAA", 98.0)
+    assert fill["status"] == "filled" and fill["price"] == 98.0
+    assert book.engine.positions["AAA"]["quantity"] == 10
+    assert book.engine.positions["AAA"]["avg_price"] == 98.0
+
+def test_cancel_is_lazy():
+    book = book_with_engine()
+    book.add(RestingOrder(1, "AAA", BUY, LIMIT, 1, 100.0))
+    book.add(RestingOrder(2, "AAA", BUY, LIMIT, 1, 99.0))
+    assert book.cancel(1)
+    assert not book.cancel(1)
+    assert [f["order_id"] for f in book.on_price("AAA", 95.0)] == [2]
+    assert book.books["AAA"].buy_limits == []
+
+def test_cancelled_entries_are_compacted():
+    book = book_with_engine()
+    for i in range(10):
+        book.add(RestingOrder(i, "AAA", BUY, LIMIT, 1, 90.0 + i))
+    book.add(RestingOrder(10, "BBB", SELL, STOP, 1, 50.0))
+    for i in range(5):
+        book.cancel(i)
+    assert book.books["AAA"].stale == 5 and len(book.books["AAA"]) == 10
+    book.cancel(5)
+    assert book.books["AAA"].stale == 0 and len(book.books["AAA"]) == 4
+    assert sorted(entry[2] for entry in book.books["AAA"].buy_limits) == [6, 7, 8, 9]
+    assert [f["order_id"] for f in book.on_price("AAA", 10.0)] == [9, 8, 7, 6]
+
+    book.cancel(10)
+    assert "BBB" not in book.books
+    assert book.get_stats()["symbols"] == 0
+
+def test_stale_count_drops_as_entries_pop():
+    book = book_with_engine()
+    book.add(RestingOrder(1, "AAA", BUY, LIMIT, 1, 100.0))
+    book.add(RestingOrder(2, "AAA", BUY, LIMIT, 1, 99.0))
+    book.add(RestingOrder(3, "AAA", BUY, LIMIT, 1, 50.0))
+    book.cancel(1)
+    assert book.get_stats()["symbols"] == 1 and book.get_stats()["stale_entries"] == 1
+    assert [f["order_id"] for f in book.on_price("AAA", 95.0)] == [2]
+    assert book.books["AAA"].stale == 0
+
+def test_market_orders_fill_on_the_next_price():
+    book = book_with_engine()
+    assert book.add(RestingOrder(1, "AAA", BUY, MARKET, 1, None)) is None
+    assert [f["order_id"] for f in book.on_price("AAA", 50.0)] == [1]
+    fill = book.add(RestingOrder(2, "AAA", BUY, MARKET, 1, None))
+    assert fill["status"] == "filled" and fill["price"] == 50.0
+
+def test_priced_orders_need_a_price():
+    with pytest.raises(ValueError):
+        book_with_engine().add(RestingOrder(1, "AAA", BUY, LIMIT, 1, None))
+
+@pytest.mark.parametrize("order", [
+    RestingOrder(1, "AAA", BUY, LIMIT, 1, 0.0),
+    RestingOrder(1, "AAA", SELL, STOP, 1, -5.0),
+    RestingOrder(1, "AAA", BUY, MARKET, 0, None),
+    RestingOrder(1, "AAA", SELL, LIMIT, -3, 100.0),
+])
+def test_rejects_non_positive_quantity_and_price(order):
+    book = book_with_engine()
+    with pytest.raises(ValueError):
+        book.add(order)
+    assert len(book) == 0
+
+async def test_load_rejects_invalid_stored_orders(session_factory):
+    async with session_factory() as db:
+        await db.execute(insert(Order), [
+            {"symbol": "AAA", "order_type": LIMIT, "side": BUY, "quantity": 1, "price": 10.0, "status": OrderStatus.PENDING},
+            {"symbol": "AAA", "order_type": LIMIT, "side": BUY, "quantity": 1, "price": -1.0, "status": OrderStatus.PENDING},
+            {"symbol": "AAA", "order_type": MARKET, "side": SELL, "quantity": -2, "price": None, "status": OrderStatus.PENDING},
+        ])
+        await db.commit()
+    book = book_with_engine(session_factory)
+    async with session_factory() as db:
+        assert await book.load(db) == 3
+        assert len(book) == 1
+        await book.flush(db)
+    async with session_factory() as db:
+        statuses = (await db.execute(select(Order.status).order_by(Order.id))).scalars().all()
+    assert statuses == [OrderStatus.PENDING, OrderStatus.REJECTED, OrderStatus.REJECTED]
+
+def test_engine_rejection_rejects_the_order():
+    book = book_with_engine(capital=100)
+    book.add(RestingOrder(1, "AAA", BUY, LIMIT, 10, 100.0))
+    book.add(RestingOrder(2, "AAA", SELL, STOP, 10, 100.0))
+    fills = book.on_price("AAA", 100.0)
+    assert [f["status"] for f in fills] == ["rejected", "rejected"]
+    assert [u["status"] for u in book._order_updates] == ["REJECTED", "REJECTED"]
+    assert book.stats["rejected"] == 2
+
+async def test_flush_batches_order_trade_and_position_writes(session_factory, sql_statements):
+    orders = [
+        {"symbol": f"S{i:02d}", "order_type": LIMIT, "side": BUY, "quantity": 2, "price": 100.0, "status": OrderStatus.PENDING}
+        for i in range(50)
+    ]
+    async with session_factory() as db:
+        await db.execute(insert(Order), orders)
+        await db.commit()
+        bind = db.bind
+    book = book_with_engine(session_factory)
+    async with session_factory() as db:
+        assert await book.load(db) == 50
+
+    statements = sql_statements(bind, lambda statement: statement.split()[0] in ("UPDATE", "INSERT"))
+
+    for i in range(40):
+        book.on_price(f"S{i:02d}", 99.0)
+    async with session_factory() as db:
+        assert await book.flush(db) == 40
+        assert await book.flush(db) == 0
+
+    assert [(s.statement.split()[0], s.executemany) for s in statements] == [("UPDATE", True), ("INSERT", True), ("INSERT", True)]
+    async with session_factory() as db:
+        stored = (await db.execute(select(Order).order_by(Order.id))).scalars().all()
+        trades = (await db.execute(select(Trade))).scalars().all()
+        positions = (await db.execute(select(Position))).scalars().all()
+    assert [o.status for o in stored].count(OrderStatus.FILLED) == 40
+    assert stored[0].filled_quantity == 2 and stored[0].filled_price == 99.0
+    assert stored[45].status == OrderStatus.PENDING
+    assert len(trades) == 40 and trades[0].strategy == "order_book"
+    assert len(positions) == 40 and positions[0].quantity == 2
+
+async def test_flush_removes_closed_positions(session_factory):
+    book = book_with_engine(session_factory)
+    book.add(RestingOrder(1, "AAA", BUY, MARKET, 5, None))
+    book.on_price("AAA", 10.0)
+    async with session_factory() as db:
+        await book.flush(db)
+    book.add(RestingOrder(2, "AAA", SELL, LIMIT, 5, 12.0))
+    book.on_price("AAA", 12.5)
+    async with session_factory() as db:
+        await book.flush(db)
+        assert (await db.execute(select(Position))).scalars().all() == []
+        trade = (await db.execute(select(Trade).where(Trade.side == SELL))).scalar_one()
+    assert trade.pnl == pytest.approx(2.5 * 5 - 12.5 * 5 * 0.001)
+
+async def test_restart_restores_positions_and_cash(session_factory):
+    before = book_with_engine(session_factory, capital=100_000)
+    before.add(RestingOrder(1, "AAA", BUY, MARKET, 100, None))
+    before.on_price("AAA", 50.0)
+    async with session_factory() as db:
+        await before.flush(db)
+        db.add(PortfolioSnapshot(
+            timestamp=datetime.utcnow(), total_value=99_995.0, cash_balance=before.engine.cash_balance,
+            positions_value=5_000.0, total_pnl=-5.0, total_pnl_percent=0.0,
+        ))
+        await db.commit()
+    before.add(RestingOrder(2, "BBB", BUY, MARKET, 10, None))
+    before.on_price("BBB", 20.0)
+    before.on_price("AAA", 55.0)
+    async with session_factory() as db:
+        await before.flush(db)
+
+    # A fresh engine, as built on every startup
+    after = OrderBook(session_factory, flush_seconds=60)
+    await after.start(TradingEngine(initial_capital=100_000))
+    try:
+        assert after.engine.cash_balance == pytest.approx(before.engine.cash_balance)
+        assert after.engine.positions["AAA"]["quantity"] == 100
+        assert after.engine.positions["AAA"]["avg_price"] == 50.0
+        assert after.engine.positions["BBB"]["quantity"] == 10
+
+        after.add(RestingOrder(3, "AAA", SELL, MARKET, 50, None))
+        after.add(RestingOrder(4, "AAA", BUY, MARKET, 10, None))
+        fills = after.on_price("AAA", 60.0)
+        assert [f["status"] for f in fills] == ["filled", "filled"]
+    finally:
+        await after.stop()
+    async with session_factory() as db:
+        stored = (await db.execute(select(Position.quantity).where(Position.symbol == "AAA"))).scalar_one()
+    assert stored == 60
+
+async def test_resting_order_fills_on_ingested_bar(client, session_factory):
+    order_book.engine = TradingEngine(initial_capital=10_000)
+    try:
+        response = await client.post("/api/trading/orders", json={
+            "symbol": "aaa.ns", "side": "BUY", "quantity": 10, "order_type": "LIMIT", "price": 95.0
+        })
+        assert response.json()["status"] == "PENDING"
+        assert (await client.post("/api/trading/orders", json={
+            "symbol": "AAA.NS", "side": "BUY", "quantity": 1, "order_type": "STOP_LOSS"
+        })).status_code == 400
+        for bad in ({"quantity": 0, "price": 95.0}, {"quantity": -1, "price": 95.0}, {"quantity": 1, "price": 0}):
+            assert (await client.post("/api/trading/orders", json={
+                "symbol": "AAA.NS", "side": "BUY", "order_type": "LIMIT", **bad
+            })).status_code == 422
+        assert len(order_book) == 1
+
+        index = pd.date_range("2024-06-03", periods=2, freq="D")
+        frame = pd.DataFrame(
+            {"Open": [1.0] * 2, "High": [1.0] * 2, "Low": [1.0] * 2, "Close": [100.0, 94.0], "Volume": [1] * 2},
+            index=index
+        )
+        async with session_factory() as db:
+            await BarIngestor(db, rollups=False).ingest_frame("AAA.NS", frame)
+        assert order_book.get_stats()["filled"] == 1
+
+        async with session_factory() as db:
+            await order_book.flush(db)
+        orders = (await client.get("/api/trading/orders")).json()
+        assert orders[0]["status"] == "FILLED"
+        assert orders[0]["filled_price"] == 94.0
+    finally:
+        order_book.engine = None
+
+async def test_cancel_endpoint(client, session_factory):
+    order_book.engine = TradingEngine(initial_capital=10_000)
+    try:
+        order_id = (await client.post("/api/trading/orders", json={
+            "symbol": "AAA", "side": "BUY", "quantity": 1, "order_type": "LIMIT", "price": 10.0
+        })).json()["order_id"]
+        assert (await client.delete(f"/api/trading/orders/{order_id}")).json()["status"] == "CANCELLED"
+        assert (await client.delete(f"/api/trading/orders/{order_id}")).status_code == 400
+        assert order_book.on_price("AAA", 5.0) == []
+    finally:
+        order_book.engine = None
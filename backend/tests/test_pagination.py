@@ -0,0 +1,135 @@
+"""
+Keyset cursor pagination tests
+"""
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+from app.data.ingest import BarIngestor
+from app.data.providers import synthetic_history
+from app.models.trades import Trade, Order, OrderSide, OrderType, OrderStatus
+from app.utils.pagination import decode_cursor, encode_cursor
+
+START = datetime(2024, 1, 1, 9, 15)
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(START, 42)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (START, 42)
+
+async def page_through(client, url, params):
+    """Follow X-Next-Cursor until the last page; returns all served ids"""
+    ids, pages = [], 0
+    while True:
+        response = await client.get(url, params=params)
+        assert response.status_code == 200
+        ids += [row["id"] for row in response.json()]
+        pages += 1
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            return ids, pages
+        params = {**params, "cursor": cursor}
+
+async def test_trades_pages_cover_history_once(client, session_factory):
+    """Tied timestamps are split by id, so no row is skipped or repeated"""
+    async with session_factory() as db:
+        for i in range(95):
+            db.add(Trade(
+                symbol="INFY.NS", timestamp=START + timedelta(minutes=i // 3),
+                side=OrderSide.SELL, quantity=1, price=1500.0
+            ))
+        await db.commit()
+    
+    ids, pages = await page_through(client, "/api/trading/trades", {"limit": 10})
+    assert pages == 10
+    assert sorted(ids) == list(range(1, 96))
+    assert len(set(ids)) == 95
+    
+    bad = await client.get("/api/trading/trades", params={"cursor": "not-a-cursor"})
+    assert bad.status_code == 400
+
+async def test_orders_pagination(client, session_factory):
+    async with session_factory() as db:
+        for i in range(30):
+            db.add(Order(
+                symbol="TCS.NS", order_type=OrderType.MARKET, side=OrderSide.BUY,
+                quantity=1, status=OrderStatus.PENDING, created_at=START + timedelta(seconds=i)
+            ))
+        await db.commit()
+    
+    ids, pages = await page_through(client, "/api/trading/orders", {"limit": 7})
+    assert ids == list(range(30, 0, -1))
+    assert pages == 5
+
+async def test_price_history_pages_backwards(client, session_factory):
+    df = synthetic_history(250, seed=9)
+    async with session_factory() as db:
+        await BarIngestor(db).ingest_frame("WIPRO.NS", df)
+    
+    first = await client.get("/api/data/price/WIPRO.NS", params={"limit": 100})
+    bars = first.json()
+    assert len(bars) == 100
+    assert bars[-1]["timestamp"] == df.index[-1].isoformat()
+    assert bars[0]["timestamp"] < bars[-1]["timestamp"]
+    
+    second = await client.get(
+        "/api/data/price/WIPRO.NS",
+        params={"limit": 100, "cursor": first.headers["x-next-cursor"]}
+    )
+    assert second.json()[-1]["timestamp"] == df.index[-101].isoformat()
+    
+    third = await client.get(
+        "/api/data/price/WIPRO.NS",
+        params={"limit": 100, "cursor": second.headers["x-next-cursor"]}
+    )
+    assert len(third.json()) == 50
+    assert "x-next-cursor" not in third.headers
+    
+    weekly = await client.get("/api/data/price/WIPRO.NS", params={"interval": "1w", "limit": 10})
+    assert len(weekly.json()) == 10
+    assert "x-next-cursor" in weekly.headers
+
+async def test_deep_page_latency_at_1m_trades(client, session_factory, sql_statements):
+    """A page near the oldest trade costs about the same as the newest page"""
+    async with session_factory() as db:
+        await db.execute(text(
+            "WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < 1000000) "
+            "INSERT INTO trades (symbol, timestamp, side, quantity, price) "
+            "SELECT 'SYM' || (n % 500), datetime('2020-01-01', '+' || (n / 2) || ' seconds') || '.000000', "
+            "'BUY', 1, 100.0 FROM seq"
+        ))
+        await db.commit()
+        engine = db.bind
+    
+    async def timed(params):
+        started = time.perf_counter()
+        response = await client.get("/api/trading/trades", params=params)
+        elapsed = time.perf_counter() - started
+        assert response.status_code == 200
+        return response, elapsed
+    
+    # Warm up connection and statement caches
+    await timed({"limit": 100})
+    
+    first, first_elapsed = await timed({"limit": 100})
+    assert first.json()[0]["id"] == 1_000_000
+    
+    deep_cursor = encode_cursor(datetime(2020, 1, 1) + timedelta(seconds=250), 500)
+    statements = sql_statements(engine, "FROM trades")
+    deep, deep_elapsed = await timed({"limit": 100, "cursor": deep_cursor})
+    assert deep.json()[0]["id"] == 499
+    assert len(deep.json()) == 100
+    assert deep_elapsed < max(5 * first_elapsed, 0.05)
+    
+    # The page is an index range walk, never a scan or a sort
+    assert len(statements) == 1
+    async with session_factory() as db:
+        connection = await db.connection()
+        plan = (await connection.exec_driver_sql(
+            "EXPLAIN QUERY PLAN " + statements[0].statement, statements[0].parameters
+        )).fetchall()
+    details = " | ".join(row[-1] for row in plan)
+    assert "USING INDEX idx_trade_timestamp_id" in details
+    assert "SCAN" not in details and "TEMP B-TREE" not in details, details
@@ -0,0 +1,90 @@
+"""
+Panel indicator tests
+"""
+import numpy as np
+import pytest
+from sqlalchemy import select
+
+from app.data.collector import DataCollector
+from app.data.indicators import INDICATOR_COLUMNS
+from app.data.panel import ClosePanel, add_panel_indicators, refresh_universe_indicators
+from app.data.providers import ReplayProvider, synthetic_history
+from app.models.stock_data import StockPrice
+
+def ragged_frames():
+    """Symbols with different start dates and a gap in one history"""
+    frames = {
+        "RELIANCE.NS": synthetic_history(400, seed=1),
+        "TCS.NS": synthetic_history(250, seed=2, start="2022-06-01"),
+        "ITC.NS": synthetic_history(30, seed=3, start="2023-01-02"),
+    }
+    gappy = synthetic_history(300, seed=4)
+    frames["INFY.NS"] = gappy.drop(gappy.index[100:110])
+    return frames
+
+def test_panel_matches_per_symbol():
+    """Panel results equal add_technical_indicators for each symbol"""
+    frames = ragged_frames()
+    collector = DataCollector(symbols=[], provider=ReplayProvider())
+    panel_frames = add_panel_indicators(frames)
+    
+    for symbol, df in frames.items():
+        expected = collector.add_technical_indicators(df.copy())
+        for column in INDICATOR_COLUMNS:
+            np.testing.assert_allclose(
+                panel_frames[symbol][column].to_numpy(dtype=float),
+                expected[column].to_numpy(dtype=float),
+                rtol=1e-9, err_msg=f"{symbol} {column}"
+            )
+
+def test_panel_alignment():
+    """The panel mask marks exactly the bars each symbol has"""
+    frames = ragged_frames()
+    panel = ClosePanel.from_frames(frames)
+    
+    assert panel.closes.shape == (len(frames), len(panel.timestamps))
+    for row, symbol in enumerate(panel.symbols):
+        assert panel.mask[row].sum() == len(frames[symbol])
+
+async def test_refresh_universe_writes_columns(test_db):
+    """Stored bars get their indicator columns filled from the panel pass"""
+    df = synthetic_history(120, seed=5)
+    for ts, bar in df.iterrows():
+        test_db.add(StockPrice(
+            symbol="SBIN.NS", timestamp=ts.to_pydatetime(),
+            open=bar.Open, high=bar.High, low=bar.Low, close=bar.Close, volume=int(bar.Volume)
+        ))
+    await test_db.commit()
+    
+    updated = await refresh_universe_indicators(test_db, ["SBIN.NS"])
+    assert updated == 120
+    
+    rows = (await test_db.execute(
+        select(StockPrice.sma_20, StockPrice.sma_50).order_by(StockPrice.timestamp)
+    )).all()
+    assert rows[18].sma_20 is None
+    assert rows[19].sma_20 == pytest.approx(df['Close'].iloc[:20].mean())
+    assert rows[-1].sma_50 == pytest.approx(df['Close'].iloc[-50:].mean())
+
+async def test_refresh_endpoint(client, session_factory):
+    """The admin endpoint writes panel indicators for the requested symbols"""
+    async with session_factory() as db:
+        for symbol, seed in (("SBIN.NS", 6), ("ITC.NS", 7)):
+            for ts, bar in synthetic_history(60, seed=seed).iterrows():
+                db.add(StockPrice(
+                    symbol=symbol, timestamp=ts.to_pydatetime(),
+                    open=bar.Open, high=bar.High, low=bar.Low, close=bar.Close, volume=int(bar.Volume)
+                ))
+        await db.commit()
+    
+    response = await client.post("/api/data/indicators/refresh", params={"symbols": "sbin.ns"})
+    assert response.json() == {"updated": 60, "symbols": ["SBIN.NS"]}
+    assert (await client.post("/api/data/indicators/refresh")).json()["updated"] == 120
+    
+    async with session_factory() as db:
+        missing = (await db.execute(
+            select(StockPrice.symbol).where(StockPrice.sma_50.is_(None)).distinct()
+        )).scalars().all()
+        defined_rsi = (await db.execute(select(StockPrice.rsi).where(StockPrice.rsi.is_not(None)))).all()
+    assert sorted(missing) == ["ITC.NS", "SBIN.NS"]
+    assert len(defined_rsi) == 2 * (60 - 13)
@@ -0,0 +1,66 @@
+"""
+Position book tests
+"""
+import numpy as np
+import pytest
+
+from app.trading.engine import TradingEngine
+from app.trading.positions import PositionBook
+
+def test_reads_like_a_dict_of_positions():
+    book = PositionBook()
+    book.buy("AAA", 10, 100.0)
+    book.buy("AAA", 10, 110.0)
+    assert "AAA" in book and "BBB" not in book
+    assert book["AAA"] == {"quantity": 20, "avg_price": 105.0, "current_price": 110.0}
+    assert book.get("BBB", {}).get("quantity", 0) == 0
+    assert dict(book) == {"AAA": book["AAA"]}
+
+def test_closing_keeps_slots_dense():
+    book = PositionBook(capacity=2)
+    for i, symbol in enumerate(["AAA", "BBB", "CCC", "DDD"]):
+        book.buy(symbol, i + 1, 10.0 * (i + 1))
+    book.sell("AAA", 1)
+    book.sell("CCC", 3)
+    assert sorted(book) == ["BBB", "DDD"]
+    assert book.symbols == ["DDD", "BBB"]
+    assert book["DDD"] == {"quantity": 4, "avg_price": 40.0, "current_price": 40.0}
+    assert book.index == {"DDD": 0, "BBB": 1}
+
+def test_market_value_is_incremental():
+    book = PositionBook()
+    book.buy("AAA", 10, 100.0)
+    book.buy("BBB", 5, 20.0)
+    book.update_prices({"AAA": 101.0, "ZZZ": 1.0})
+    book.buy("BBB", 5, 22.0)
+    book.sell("AAA", 4)
+    assert book.market_value == pytest.approx(6 * 101.0 + 10 * 22.0)
+    assert book.market_value == pytest.approx(book.revalue())
+
+def test_vectorized_price_updates():
+    book = PositionBook()
+    symbols = [f"S{i:03d}" for i in range(100)]
+    for symbol in symbols:
+        book.buy(symbol, 2, 10.0)
+    book.update_prices({symbol: 11.0 for symbol in symbols[:50]})
+    assert book.market_value == pytest.approx(50 * 22.0 + 50 * 20.0)
+
+    aligned = np.arange(100, dtype=float)
+    book.update_prices(aligned)
+    assert book[book.symbols[7]]["current_price"] == 7.0
+    assert book.market_value == pytest.approx(2 * aligned.sum())
+    with pytest.raises(ValueError):
+        book.update_prices(np.ones(3))
+
+def test_engine_portfolio_value_tracks_fills_and_prices():
+    engine = TradingEngine(initial_capital=100_000.0)
+    engine.execute_order("AAA", "BUY", 10, 100.0)
+    engine.execute_order("BBB", "BUY", 5, 200.0)
+    engine.update_prices({"AAA": 110.0, "BBB": 210.0})
+    assert engine.get_portfolio_value() == pytest.approx(engine.cash_balance + 10 * 110.0 + 5 * 210.0)
+
+    assert engine.execute_order("AAA", "SELL", 11, 110.0)["status"] == "rejected"
+    result = engine.execute_order("AAA", "SELL", 10, 110.0)
+    assert result["trade"]["pnl"] == pytest.approx(100.0 - 1.1)
+    assert "AAA" not in engine.positions
+    assert engine.get_portfolio_metrics()["positions_value"] == pytest.approx(5 * 210.0)
@@ -0,0 +1,56 @@
+"""
+Symbol registry tests
+"""
+from datetime import datetime
+
+from sqlalchemy import select, func, delete
+
+from app.data.ingest import BarIngestor
+from app.data.providers import synthetic_history
+from app.data.registry import ensure_registry, get_symbol_range, list_symbols
+from app.models.stock_data import StockPrice, SymbolRegistry
+
+async def stored_coverage(db, symbol):
+    return tuple((await db.execute(
+        select(func.min(StockPrice.timestamp), func.max(StockPrice.timestamp), func.count())
+        .where(StockPrice.symbol == symbol)
+    )).one())
+
+async def test_ingest_maintains_coverage(test_db):
+    df = synthetic_history(300, seed=21)
+    ingestor = BarIngestor(test_db, rollups=False)
+    
+    await ingestor.ingest_frame("TCS.NS", df.iloc[100:200])
+    # Appended tail (incremental path)
+    await ingestor.ingest_frame("TCS.NS", df.iloc[200:])
+    # Backfill overlapping stored history (recount path)
+    await ingestor.ingest_frame("TCS.NS", df.iloc[:150])
+    await ingestor.ingest_frame("INFY.NS", df.iloc[:10])
+    
+    entry = await get_symbol_range(test_db, "TCS.NS")
+    assert (entry["first_timestamp"], entry["last_timestamp"], entry["bar_count"]) == \
+        await stored_coverage(test_db, "TCS.NS")
+    assert entry["bar_count"] == 300
+    
+    assert [e["symbol"] for e in await list_symbols(test_db)] == ["INFY.NS", "TCS.NS"]
+    assert await get_symbol_range(test_db, "SBIN.NS") is None
+
+async def test_ensure_registry_backfills_existing_bars(test_db):
+    await BarIngestor(test_db, rollups=False).ingest_frame("ITC.NS", synthetic_history(50, seed=22))
+    await test_db.execute(delete(SymbolRegistry))
+    await test_db.commit()
+    
+    assert await ensure_registry(test_db) == 1
+    assert (await get_symbol_range(test_db, "ITC.NS"))["bar_count"] == 50
+    # Already populated: nothing to do
+    assert await ensure_registry(test_db) == 0
+
+async def test_symbols_endpoint_reads_registry(client, session_factory):
+    async with session_factory() as db:
+        await BarIngestor(db, rollups=False).ingest_frame("WIPRO.NS", synthetic_history(40, seed=23))
+    
+    body = (await client.get("/api/data/symbols")).json()
+    assert body["symbols"] == ["WIPRO.NS"]
+    coverage = body["coverage"]["WIPRO.NS"]
+    assert coverage["bar_count"] == 40
+    assert datetime.fromisoformat(coverage["first_timestamp"]) < datetime.fromisoformat(coverage["last_timestamp"])
@@ -0,0 +1,169 @@
+"""
+Portfolio risk analytics tests
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import insert
+
+from app.models.portfolio import PortfolioRollup, PortfolioSnapshot
+from app.models.stock_data import StockPrice
+from app.trading.analytics import (
+    RiskAccumulator, risk_metrics, rolling_beta, max_drawdown, beta, simple_returns
+)
+
+START = datetime(2024, 1, 1, 15, 30)
+
+def value_series(n=300, seed=7):
+    rng = np.random.default_rng(seed)
+    bench = 20000 * np.cumprod(1 + rng.normal(0.0004, 0.01, n))
+    bench_returns = np.concatenate(([0.0], bench[1:] / bench[:-1] - 1))
+    returns = 1.3 * bench_returns + rng.normal(0.0002, 0.004, n)
+    return 1_000_000 * np.cumprod(1 + returns), bench
+
+def snapshot(i, value):
+    return PortfolioSnapshot(
+        timestamp=START + timedelta(days=i), total_value=float(value), cash_balance=0.0,
+        positions_value=float(value), total_pnl=0.0, total_pnl_percent=0.0
+    )
+
+def test_metrics_match_reference():
+    values, _ = value_series()
+    returns = pd.Series(values).pct_change().dropna()
+    metrics = risk_metrics(values, periods_per_year=252, risk_free_rate=0.05)
+    
+    excess = returns - 0.05 / 252
+    assert metrics["volatility"] == pytest.approx(returns.std() * np.sqrt(252))
+    assert metrics["sharpe"] == pytest.approx(excess.mean() / returns.std() * np.sqrt(252))
+    downside = np.sqrt((excess.clip(upper=0) ** 2).mean())
+    assert metrics["sortino"] == pytest.approx(excess.mean() / downside * np.sqrt(252))
+    
+    drawdown = (pd.Series(values) / pd.Series(values).cummax() - 1).min()
+    assert metrics["max_drawdown"] == pytest.approx(drawdown)
+    assert metrics["calmar"] == pytest.approx(metrics["annualized_return"] / -drawdown)
+    assert max_drawdown([1, 2, 3]) == 0.0
+
+def test_rolling_beta_matches_windowed_regression():
+    values, bench = value_series()
+    r, b = simple_returns(values), simple_returns(bench)
+    rolling = rolling_beta(r, b, 30)
+    assert np.isnan(rolling[:29]).all()
+    for end in (30, 150, len(r)):
+        assert rolling[end - 1] == pytest.approx(beta(r[end - 30:end], b[end - 30:end]))
+    assert beta(r, b) == pytest.approx(1.3, abs=0.15)
+
+def test_rolling_beta_skips_benchmark_gaps():
+    values, bench = value_series()
+    bench = bench.astype(float).copy()
+    # No benchmark bar before the first three snapshots, and a gap mid-series
+    bench[:3] = np.nan
+    bench[100:104] = np.nan
+    r, b = simple_returns(values), simple_returns(bench)
+    rolling = rolling_beta(r, b, 30)
+    assert np.isfinite(rolling[29:]).all()
+    for end in (30, 105, 120, len(r)):
+        assert rolling[end - 1] == pytest.approx(beta(r[end - 30:end], b[end - 30:end]))
+
+    sparse = np.full_like(b, np.nan)
+    sparse[50] = b[50]
+    assert np.isnan(rolling_beta(r, sparse, 30)).all()
+
+def test_accumulator_matches_batch_metrics():
+    values, _ = value_series()
+    accumulator = RiskAccumulator(history_size=100, periods_per_year=252, risk_free_rate=0.05)
+    accumulator.loaded = True
+    for i, value in enumerate(values):
+        accumulator.record(START + timedelta(days=i), value)
+    
+    overall, batch = accumulator.overall(), risk_metrics(values, 252, 0.05)
+    for key in ("observations", "total_return", "volatility", "sharpe", "sortino", "max_drawdown", "calmar"):
+        assert overall[key] == pytest.approx(batch[key])
+    assert len(accumulator.values) == 100
+    assert accumulator.window(20)["volatility"] == pytest.approx(risk_metrics(values[-21:])["volatility"])
+    
+    accumulator.record(START, 1.0)
+    assert not accumulator.loaded
+
+def test_accumulator_uses_daily_closes():
+    values, _ = value_series(60)
+    accumulator = RiskAccumulator(periods_per_year=252)
+    accumulator.loaded = True
+    day = datetime(2024, 1, 1)
+    for i, close in enumerate(values):
+        # Minute snapshots drifting into the day's close
+        for minute in range(0, 360, 60):
+            accumulator.record(day + timedelta(days=i, hours=9, minutes=minute), close * (1 + (minute - 300) * 1e-5))
+    overall = accumulator.overall()
+    assert overall["observations"] == 59
+    assert overall["volatility"] == pytest.approx(risk_metrics(values)["volatility"])
+    assert list(accumulator.values) == pytest.approx(list(values))
+
+async def test_accumulator_loads_mixed_tiers_as_daily_closes(session_factory):
+    values, _ = value_series(30)
+    day = datetime(2024, 3, 1)
+    def rollup(interval, start, close):
+        return PortfolioRollup(
+            interval=interval, bucket_start=start, open=close, high=close, low=close, close=close,
+            cash_balance=0.0, positions_value=close, total_pnl=0.0, total_pnl_percent=0.0, snapshot_count=60
+        )
+    async with session_factory() as db:
+        # Days 0-19 compacted daily, 20-27 hourly, 28-29 raw minute snapshots
+        db.add_all(rollup("1d", day + timedelta(days=i), float(values[i])) for i in range(20))
+        db.add_all(
+            rollup("1h", day + timedelta(days=i, hours=h), float(values[i] * (1 + (h - 15) * 1e-4)))
+            for i in range(20, 28) for h in range(10, 16)
+        )
+        db.add_all(
+            PortfolioSnapshot(
+                timestamp=day + timedelta(days=i, hours=10, minutes=m), total_value=float(values[i] * (1 + (m - 300) * 1e-5)),
+                cash_balance=0.0, positions_value=0.0, total_pnl=0.0, total_pnl_percent=0.0
+            )
+            for i in range(28, 30) for m in range(0, 301, 60)
+        )
+        await db.commit()
+        accumulator = RiskAccumulator(periods_per_year=252)
+        await accumulator.ensure_loaded(db)
+    overall = accumulator.overall()
+    assert overall["observations"] == 29
+    assert overall["sharpe"] == pytest.approx(risk_metrics(values)["sharpe"])
+    assert overall["max_drawdown"] == pytest.approx(risk_metrics(values)["max_drawdown"])
+
+async def test_risk_endpoint_uses_running_state(client, session_factory, sql_statements):
+    values, bench = value_series(120)
+    async with session_factory() as db:
+        db.add_all(snapshot(i, v) for i, v in enumerate(values[:100]))
+        await db.execute(insert(StockPrice), [
+            {"symbol": "^NSEI", "timestamp": START + timedelta(days=i, hours=-6), "open": c,
+             "high": c, "low": c, "close": float(c), "volume": 0}
+            for i, c in enumerate(bench)
+        ])
+        await db.commit()
+        engine = db.bind
+    
+    first = (await client.get("/api/portfolio/risk", params={"windows": "20,60"})).json()
+    assert first["overall"]["observations"] == 99
+    assert first["windows"]["20"]["observations"] == 20
+    assert first["windows"]["60"]["beta"] == pytest.approx(
+        beta(simple_returns(values[39:100]), simple_returns(bench[39:100]))
+    )
+    assert len(first["rolling_beta"]["beta"]) == 99
+    
+    scans = sql_statements(engine, "FROM portfolio_snapshots")
+    
+    async with session_factory() as db:
+        db.add_all(snapshot(i, v) for i, v in enumerate(values[100:], start=100))
+        await db.commit()
+    
+    second = (await client.get("/api/portfolio/risk", params={"windows": "20,60"})).json()
+    assert scans == []
+    assert second["overall"]["observations"] == 119
+    assert second["overall"]["volatility"] == pytest.approx(risk_metrics(values)["volatility"])
+
+async def test_risk_endpoint_validation(client):
+    assert (await client.get("/api/portfolio/risk", params={"windows": "1"})).status_code == 400
+    assert (await client.get("/api/portfolio/risk", params={"windows": "a,b"})).status_code == 400
+    empty = (await client.get("/api/portfolio/risk")).json()
+    assert empty["overall"]["observations"] == 0
+    assert empty["as_of"] is None
@@ -0,0 +1,76 @@
+"""
+OHLCV rollup tests
+"""
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import select
+
+from app.data.ingest import BarIngestor
+from app.data.providers import synthetic_history
+from app.data.rollups import compute_rollups
+from app.models.stock_data import PriceRollup
+
+def lower(df):
+    return df.rename(columns=str.lower)
+
+async def rollup_rows(db, symbol, interval):
+    result = await db.execute(
+        select(PriceRollup)
+        .where(PriceRollup.symbol == symbol, PriceRollup.interval == interval)
+        .order_by(PriceRollup.bucket_start)
+    )
+    return result.scalars().all()
+
+async def test_incremental_matches_full_rebuild(test_db):
+    """Rollups maintained during ingestion equal a from-scratch aggregation"""
+    df = synthetic_history(300, seed=41)
+    ingestor = BarIngestor(test_db)
+    await ingestor.ingest_frame("TCS.NS", df.iloc[:173])
+    await ingestor.ingest_frame("TCS.NS", df.iloc[173:])
+    
+    for interval in ["1w", "1mo"]:
+        stored = await rollup_rows(test_db, "TCS.NS", interval)
+        expected = compute_rollups(lower(df), interval)
+        
+        assert len(stored) == len(expected)
+        assert [r.bucket_start for r in stored] == list(expected.index.to_pydatetime())
+        np.testing.assert_allclose([r.close for r in stored], expected["close"])
+        np.testing.assert_allclose([r.high for r in stored], expected["high"])
+        assert [r.volume for r in stored] == expected["volume"].tolist()
+        assert sum(r.bar_count for r in stored) == 300
+    
+    # Daily data gets no intraday rollups
+    assert await rollup_rows(test_db, "TCS.NS", "5m") == []
+
+async def test_intraday_rollups(test_db):
+    """Minute bars roll up into 5m/15m/1h buckets"""
+    df = synthetic_history(120, seed=42)
+    df.index = pd.date_range("2024-03-04 09:15", periods=120, freq="1min")
+    await BarIngestor(test_db).ingest_frame("INFY.NS", df)
+    
+    five = await rollup_rows(test_db, "INFY.NS", "5m")
+    hourly = await rollup_rows(test_db, "INFY.NS", "1h")
+    assert len(five) == 24
+    assert five[0].open == pytest.approx(df["Open"].iloc[0])
+    assert five[0].close == pytest.approx(df["Close"].iloc[4])
+    assert [r.bar_count for r in hourly] == [45, 60, 15]
+
+async def test_price_endpoint_interval(client, session_factory):
+    """interval serves rollup rows instead of raw bars"""
+    df = synthetic_history(200, seed=43)
+    df.index = df.index + (pd.Timestamp(datetime.utcnow().date()) - df.index[-1])
+    async with session_factory() as db:
+        await BarIngestor(db).ingest_frame("SBIN.NS", df)
+    
+    raw = (await client.get("/api/data/price/SBIN.NS", params={"days": 365})).json()
+    weekly = (await client.get("/api/data/price/SBIN.NS", params={"days": 365, "interval": "1w"})).json()
+    
+    assert len(raw) == 200
+    assert 0 < len(weekly) < len(raw) / 4
+    assert sum(w["bar_count"] for w in weekly) == 200
+    
+    bad = await client.get("/api/data/price/SBIN.NS", params={"interval": "2d"})
+    assert bad.status_code == 400
@@ -0,0 +1,92 @@
+"""
+Response format negotiation tests
+"""
+import gzip
+from datetime import datetime, timedelta, timezone
+
+import msgpack
+import orjson
+import pytest
+
+from app.models.trades import Trade, OrderSide
+from app.utils.serialization import compress_body, encode_columns
+
+START = datetime(2024, 1, 1, 9, 15)
+
+@pytest.fixture
+def columns():
+    return {
+        "timestamp": [START + timedelta(minutes=i) for i in range(3)],
+        "close": [100.0, 101.5, 99.25],
+        "rsi": [None, 55.0, 48.0],
+    }
+
+def test_json_rows_match_default_encoder(columns):
+    rows = orjson.loads(encode_columns(columns, "json"))
+    assert rows[0] == {"timestamp": START.isoformat(), "close": 100.0, "rsi": None}
+    assert len(rows) == 3
+
+def test_columnar_and_msgpack_layouts(columns):
+    columnar = orjson.loads(encode_columns(columns, "columnar", envelope="history"))
+    assert columnar["history"]["close"] == [100.0, 101.5, 99.25]
+    assert columnar["history"]["timestamp"][1] == (START + timedelta(minutes=1)).isoformat()
+    
+    packed = msgpack.unpackb(encode_columns(columns, "msgpack"))
+    assert packed["rsi"] == [None, 55.0, 48.0]
+    # Wall-clock 2024-01-01 09:15 counted from 1970-01-01 00:00, whatever the server's timezone
+    assert packed["timestamp"][0] == 1704100500000
+
+def test_msgpack_keeps_wall_clock_of_aware_datetimes():
+    ist = timezone(timedelta(hours=5, minutes=30))
+    packed = msgpack.unpackb(encode_columns({"timestamp": [START.replace(tzinfo=ist), None]}, "msgpack"))
+    assert packed["timestamp"] == [1704100500000, None]
+
+def test_compression_thresholds():
+    small = b"x" * 100
+    assert compress_body(small, "gzip, br") == (small, None)
+    
+    large = b'{"close": 100.0}' * 1000
+    body, encoding = compress_body(large, "gzip")
+    assert encoding == "gzip" and gzip.decompress(body) == large
+    assert compress_body(large, "gzip, br")[1] == "br"
+    assert compress_body(large, "identity") == (large, None)
+
+async def test_trades_formats(client, session_factory):
+    async with session_factory() as db:
+        for i in range(200):
+            db.add(Trade(
+                symbol="TCS.NS", timestamp=START + timedelta(minutes=i),
+                side=OrderSide.BUY, quantity=10, price=3500.0 + i, pnl=None
+            ))
+        await db.commit()
+    
+    rows = await client.get("/api/trading/trades", params={"limit": 200})
+    assert rows.headers["content-type"] == "application/json"
+    assert rows.json()[0] == {
+        "id": 200, "symbol": "TCS.NS", "side": "BUY", "quantity": 10,
+        "price": 3699.0, "pnl": None, "timestamp": (START + timedelta(minutes=199)).isoformat()
+    }
+    
+    columnar = await client.get(
+        "/api/trading/trades", params={"limit": 200},
+        headers={"Accept": "application/vnd.quantedge.columnar+json"}
+    )
+    assert columnar.headers["content-type"] == "application/vnd.quantedge.columnar+json"
+    assert columnar.json()["id"][:3] == [200, 199, 198]
+    
+    packed = await client.get(
+        "/api/trading/trades", params={"limit": 200, "format": "msgpack"},
+        headers={"Accept-Encoding": "gzip"}
+    )
+    assert packed.headers["content-encoding"] == "gzip"
+    assert msgpack.unpackb(packed.content)["price"][-1] == 3500.0
+    
+    bad = await client.get("/api/trading/trades", params={"format": "xml"})
+    assert bad.status_code == 400
+
+async def test_performance_envelope(client):
+    response = await client.get("/api/portfolio/performance", params={"format": "columnar"})
+    assert response.json()["history"]["total_value"] == []
+    
+    response = await client.get("/api/portfolio/performance")
+    assert response.json() == {"history": []}
@@ -0,0 +1,51 @@
+"""
+Latest-signal lookup tests
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from app.models.stock_data import MLPrediction
+from app.utils.market_config import MarketConfig
+
+START = datetime(2024, 6, 3, 9, 15)
+
+def prediction(symbol, minutes, direction):
+    return {
+        "symbol": symbol, "timestamp": START + timedelta(minutes=minutes),
+        "model_name": "lstm", "predicted_price": 100.0,
+        "predicted_direction": direction, "confidence": 0.5 + minutes / 1000,
+    }
+
+async def test_latest_prediction_per_symbol(client, session_factory):
+    universe = MarketConfig.get_default_stocks()
+    async with session_factory() as db:
+        rows = [prediction(s, m, "UP" if m == 30 else "DOWN") for s in universe[:3] for m in (10, 30, 20)]
+        rows.append(prediction("AAPL", 99, "UP"))
+        await db.execute(insert(MLPrediction), rows)
+        await db.commit()
+    
+    signals = (await client.get("/api/ml/signals")).json()["signals"]
+    assert [s["symbol"] for s in signals] == universe[:3]
+    assert all(s["signal"] == "UP" for s in signals)
+    assert signals[0]["timestamp"] == (START + timedelta(minutes=30)).isoformat()
+    
+    requested = (await client.get("/api/ml/signals", params={"symbols": "aapl, missing.ns"})).json()
+    assert [s["symbol"] for s in requested["signals"]] == ["AAPL"]
+
+async def test_single_query_for_2000_symbols(client, session_factory, sql_statements):
+    universe = [f"SYM{i:04d}.NS" for i in range(2000)]
+    async with session_factory() as db:
+        rows = [prediction(s, m, "UP") for s in universe for m in range(5)]
+        await db.execute(insert(MLPrediction), rows)
+        await db.commit()
+        engine = db.bind
+    
+    statements = sql_statements(engine, "ml_predictions")
+    small = await client.get("/api/ml/signals", params={"symbols": ",".join(universe[:20])})
+    large = await client.get("/api/ml/signals", params={"symbols": ",".join(universe)})
+    
+    assert len(small.json()["signals"]) == 20
+    assert len(large.json()["signals"]) == 2000
+    # One lookup per request, however many symbols
+    assert len(statements) == 2
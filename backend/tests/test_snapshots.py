@@ -0,0 +1,123 @@
+"""
+Portfolio snapshot recorder and retention compaction tests
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import select, func, insert
+
+from app.models.portfolio import PortfolioSnapshot, PortfolioRollup
+from app.trading.engine import TradingEngine
+from app.trading.snapshots import SnapshotRecorder, compact_snapshots, choose_tier, equity_history
+
+NOW = datetime(2024, 6, 30, 12, 0)
+
+def snapshot_rows(start, periods, freq="1min", seed=3):
+    index = pd.date_range(start, periods=periods, freq=freq)
+    values = 1_000_000 + np.cumsum(np.random.default_rng(seed).normal(0, 500, periods))
+    return [
+        {"timestamp": ts.to_pydatetime(), "total_value": float(v), "cash_balance": 1000.0,
+         "positions_value": float(v) - 1000.0, "total_pnl": float(v) - 1_000_000,
+         "total_pnl_percent": (float(v) - 1_000_000) / 10_000, "daily_return": None}
+        for ts, v in zip(index, values)
+    ]
+
+async def test_recorder_writes_engine_metrics(session_factory):
+    engine = TradingEngine(initial_capital=100000)
+    recorder = SnapshotRecorder(session_factory, interval_seconds=1)
+    recorder.engine = engine
+    
+    await recorder.record(NOW)
+    engine.execute_order("AAA", "BUY", 100, 100.0)
+    engine.update_prices({"AAA": 110.0})
+    snapshot = await recorder.record(NOW + timedelta(days=1))
+    
+    assert snapshot.total_value == pytest.approx(engine.get_portfolio_value())
+    assert snapshot.positions_value == pytest.approx(11000.0)
+    assert snapshot.daily_return == pytest.approx((snapshot.total_value / 100000 - 1) * 100)
+    async with session_factory() as db:
+        assert (await db.execute(select(func.count()).select_from(PortfolioSnapshot))).scalar() == 2
+
+async def test_incremental_compaction_matches_resample(session_factory):
+    # Three days of minute snapshots ending at NOW, plus one old day
+    rows = snapshot_rows(NOW - timedelta(days=3), 3 * 24 * 60)
+    old = snapshot_rows((NOW - timedelta(days=45)).replace(hour=0), 24 * 60, seed=4)
+    async with session_factory() as db:
+        await db.execute(insert(PortfolioSnapshot), rows + old)
+        await db.commit()
+    
+        passes = 0
+        while sum((await compact_snapshots(db, NOW, batch_size=1000)).values()):
+            passes += 1
+        assert passes > 3
+        
+        raw_count = (await db.execute(select(func.count()).select_from(PortfolioSnapshot))).scalar()
+        hourly = (await db.execute(
+            select(PortfolioRollup).where(PortfolioRollup.interval == "1h").order_by(PortfolioRollup.bucket_start)
+        )).scalars().all()
+        daily = (await db.execute(
+            select(PortfolioRollup).where(PortfolioRollup.interval == "1d")
+        )).scalars().all()
+    
+    frame = pd.DataFrame(rows).set_index("timestamp")["total_value"]
+    cutoff = NOW - timedelta(hours=24)
+    assert raw_count == (frame.index >= cutoff).sum()
+    
+    expected = frame[frame.index < cutoff].resample("1h").ohlc()
+    assert [h.bucket_start for h in hourly] == list(expected.index.to_pydatetime())
+    assert np.allclose([h.open for h in hourly], expected["open"])
+    assert np.allclose([h.high for h in hourly], expected["high"])
+    assert np.allclose([h.low for h in hourly], expected["low"])
+    assert np.allclose([h.close for h in hourly], expected["close"])
+    assert all(h.snapshot_count == 60 for h in hourly)
+    
+    old_values = pd.DataFrame(old)["total_value"]
+    assert len(daily) == 1
+    assert daily[0].snapshot_count == 24 * 60
+    assert (daily[0].open, daily[0].high, daily[0].low, daily[0].close) == pytest.approx(
+        (old_values.iloc[0], old_values.max(), old_values.min(), old_values.iloc[-1])
+    )
+
+async def test_history_includes_uncompacted_rows(session_factory):
+    rows = snapshot_rows(NOW - timedelta(days=3), 3 * 24 * 60)
+    async with session_factory() as db:
+        await db.execute(insert(PortfolioSnapshot), rows)
+        await db.commit()
+        await compact_snapshots(db, NOW)
+        
+        hourly = await equity_history(db, NOW - timedelta(days=3), "1h")
+        daily = await equity_history(db, NOW - timedelta(days=3), "1d")
+    
+    frame = pd.DataFrame(rows).set_index("timestamp")["total_value"]
+    assert np.allclose(hourly["close"], frame.resample("1h").last())
+    assert np.allclose(daily["high"], frame.resample("1D").max())
+    assert hourly["snapshot_count"].sum() == len(rows)
+
+def test_choose_tier():
+    assert choose_tier(1) == "raw"
+    assert choose_tier(7) == "1h"
+    assert choose_tier(365) == "1d"
+
+async def test_performance_reads_tier(client, session_factory):
+    now = datetime.utcnow().replace(second=0, microsecond=0)
+    rows = snapshot_rows(now - timedelta(days=3), 3 * 24 * 60)
+    async with session_factory() as db:
+        await db.execute(insert(PortfolioSnapshot), rows)
+        await db.commit()
+        await compact_snapshots(db, now)
+    
+    recent = await client.get("/api/portfolio/performance", params={"days": 1})
+    assert recent.headers["x-snapshot-resolution"] == "raw"
+    assert 24 * 60 - 1 <= len(recent.json()["history"]) <= 24 * 60
+    
+    week = await client.get("/api/portfolio/performance", params={"days": 7})
+    assert week.headers["x-snapshot-resolution"] == "1h"
+    history = week.json()["history"]
+    assert len(history) == 3 * 24 + 1
+    assert history[-1]["total_value"] == pytest.approx(rows[-1]["total_value"])
+    
+    year = await client.get("/api/portfolio/performance", params={"days": 365})
+    assert year.headers["x-snapshot-resolution"] == "1d"
+    assert len(year.json()["history"]) == 4
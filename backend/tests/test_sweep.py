@@ -0,0 +1,298 @@
+"""
+Parameter sweep tests
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import func, insert, select
+
+from app.models.stock_data import StockPrice
+from app.models.trades import SweepResult
+from app.trading.backtest import Backtester, SmaCrossover, rolling_sma
+from app.trading.sweep import (
+    SweepRunner, attach_panel, bayesian_suggest, evaluate, grid, params_key, random_samples,
+    rank_results, share_panel, sweep_runner, walk_forward_report, walk_forward_splits
+)
+from tests.test_backtest import random_panel
+
+SPACE = {"short": [5, 10, 20], "long": [30, 50]}
+
+def test_grid_and_random_samples():
+    combos = grid(SPACE)
+    assert len(combos) == 6 and {"short": 10, "long": 50} in combos
+    with pytest.raises(ValueError):
+        grid({"short": 5})
+
+    samples = random_samples({"short": {"low": 2, "high": 9}, "allocation": {"low": 0.01, "high": 0.1}, "long": [30, 50]}, 200, seed=1)
+    assert samples == random_samples({"short": {"low": 2, "high": 9}, "allocation": {"low": 0.01, "high": 0.1}, "long": [30, 50]}, 200, seed=1)
+    assert {s["short"] for s in samples} == set(range(2, 10))
+    assert all(0.01 <= s["allocation"] <= 0.1 and s["long"] in (30, 50) for s in samples)
+    assert params_key({"a": 1, "b": 2}) == params_key({"b": 2, "a": 1})
+
+def test_bayesian_suggest_moves_towards_the_best_scores():
+    space = {"x": {"low": 0, "high": 100}}
+    assert len(bayesian_suggest(space, [], [], 4, seed=0)) == 4
+
+    observed = [{"x": x} for x in (0, 20, 40, 60, 80, 100)]
+    scores = [-(x - 70) ** 2 for x in (0, 20, 40, 60, 80, 100)]
+    suggestions = bayesian_suggest(space, observed, scores, 3, seed=0)
+    assert len(suggestions) == 3
+    assert all(p not in observed for p in suggestions)
+    assert 55 <= suggestions[0]["x"] <= 85
+
+def test_walk_forward_splits():
+    assert walk_forward_splits(100, 40, 20) == [(0, 40, 60), (20, 60, 80), (40, 80, 100)]
+    assert walk_forward_splits(100, 40, 20, step=30) == [(0, 40, 60), (30, 70, 90)]
+    assert walk_forward_splits(100, 40, 20, anchored=True) == [(0, 40, 60), (0, 60, 80), (0, 80, 100)]
+    assert walk_forward_splits(50, 40, 20) == []
+    assert walk_forward_splits(100, 40, 20, start=30) == [(30, 70, 90)]
+    assert walk_forward_splits(110, 40, 20, anchored=True, start=30) == [(30, 70, 90), (30, 90, 110)]
+
+def test_shared_panel_round_trip():
+    panel = random_panel(symbols=4, periods=60)
+    shm, spec = share_panel(panel)
+    try:
+        attached_shm, attached = attach_panel(spec)
+        assert attached.symbols == panel.symbols
+        assert attached.timestamps.equals(panel.timestamps)
+        np.testing.assert_array_equal(attached.mask, panel.mask)
+        for name, values in panel.fields.items():
+            np.testing.assert_array_equal(attached.fields[name], values)
+        del attached
+        attached_shm.close()
+    finally:
+        shm.close()
+        shm.unlink()
+
+def test_rolling_sma_matches_pandas_per_symbol():
+    panel = random_panel(symbols=5, periods=80)
+    closes = panel.fields["close"]
+    sma = rolling_sma(closes, panel.mask, 7)
+    for column in range(5):
+        bars = pd.Series(closes[:, column]).dropna()
+        expected = bars.rolling(7).mean()
+        np.testing.assert_allclose(sma[bars.index, column], expected.values)
+        assert np.isnan(sma[~panel.mask[:, column], column]).all()
+
+def test_sma_crossover_custom_windows():
+    with pytest.raises(ValueError):
+        SmaCrossover(short=50, long=20)
+    panel = random_panel(symbols=3, periods=120)
+    strategy = SmaCrossover(0.1, short=5, long=30)
+    strategy.prepare(panel)
+    assert {"sma_5", "sma_30"} <= set(panel.fields)
+    event = Backtester(100_000).run(panel, strategy)
+    fast = Backtester(100_000).run_vectorized(panel, strategy)
+    assert len(event.trades) == len(fast.trades) > 0
+
+@pytest.mark.parametrize("workers", [1, 2])
+async def test_sweep_stores_and_ranks_results(session_factory, workers):
+    panel = random_panel(symbols=6, periods=200)
+    runner = SweepRunner(session_factory, workers=workers, write_batch=4)
+    samples = grid({"short": [5, 10, 40], "long": [30, 50]})
+    progress = await runner.run("grid", panel, "sma_crossover", samples, initial_capital=100_000)
+
+    # short=40, long=30 is rejected by the strategy
+    assert progress["status"] == "completed"
+    assert progress["total"] == progress["done"] == 5 and progress["failed"] == 0
+
+    backtester = Backtester(100_000)
+    async with session_factory() as db:
+        ranked = await rank_results(db, "grid", "sharpe")
+        stored = (await db.execute(select(SweepResult).where(SweepResult.sweep_id == "grid"))).scalars().all()
+    assert len(stored) == 5 and all(row.segment == "full" and row.split == 0 for row in stored)
+    assert [row["sharpe"] for row in ranked] == sorted((row["sharpe"] for row in ranked), reverse=True)
+    best = ranked[0]
+    expected = evaluate(panel, backtester, ("sma_crossover", best["params"], 0, 200, True))
+    assert best["sharpe"] == pytest.approx(expected["sharpe"])
+    assert best["trades"] == expected["trades"]
+
+async def test_sweep_resumes_from_stored_results(session_factory):
+    panel = random_panel(symbols=4, periods=150)
+    runner = SweepRunner(session_factory, workers=1, write_batch=100)
+    await runner.run("resume", panel, "sma_crossover", grid({"short": [5, 10], "long": [30]}))
+
+    progress = await runner.run("resume", panel, "sma_crossover", grid({"short": [5, 10, 15], "long": [30]}))
+    assert (progress["total"], progress["skipped"], progress["done"]) == (3, 2, 1)
+    async with session_factory() as db:
+        count = await db.scalar(select(func.count()).select_from(SweepResult).where(SweepResult.sweep_id == "resume"))
+    assert count == 3
+
+async def test_resume_with_a_different_configuration_is_rejected(session_factory):
+    panel = random_panel(symbols=4, periods=150)
+    runner = SweepRunner(session_factory, workers=1)
+    samples = grid({"short": [5, 10], "long": [30]})
+    await runner.run("cfg", panel, "sma_crossover", samples, commission_rate=0.001)
+
+    for options in ({"commission_rate": 0.002}, {"initial_capital": 5_000}, {"start": 10},
+                    {"splits": walk_forward_splits(150, 80, 35)}):
+        with pytest.raises(ValueError, match="different data"):
+            await runner.run("cfg", panel, "sma_crossover", samples, **{"commission_rate": 0.001, **options})
+    with pytest.raises(ValueError):
+        await runner.run("cfg", panel.slice(0, 140), "sma_crossover", samples, commission_rate=0.001)
+
+    progress = await runner.run("cfg", panel, "sma_crossover", samples, commission_rate=0.001)
+    assert progress["skipped"] == 2 and progress["done"] == 0
+
+async def test_warmup_rows_fill_every_window_before_scoring(session_factory):
+    panel = random_panel(symbols=4, periods=200, gaps=False)
+    runner = SweepRunner(session_factory, workers=1)
+    samples = grid({"short": [5, 20], "long": [50, 60]})
+    await runner.run("warm", panel, "sma_crossover", samples, start=60)
+
+    scored = panel.slice(60, 200)
+    for window in (5, 20, 50, 60):
+        assert not np.isnan(scored.fields[f"sma_{window}"][0]).any()
+    # Computed windows agree with the stored ones wherever both are filled
+    np.testing.assert_allclose(rolling_sma(panel.fields["close"], panel.mask, 50)[60:], panel.fields["sma_50"][60:])
+    async with session_factory() as db:
+        rows = (await db.execute(select(SweepResult.start).where(SweepResult.sweep_id == "warm"))).scalars().all()
+    assert set(rows) == {panel.timestamps[60].to_pydatetime()}
+
+async def test_interrupted_sweep_keeps_written_results(session_factory):
+    panel = random_panel(symbols=4, periods=150)
+    runner = SweepRunner(session_factory, workers=1, write_batch=1)
+    samples = grid({"short": list(range(2, 12)), "long": [30]})
+
+    def interrupt(progress):
+        if progress["done"] == 3:
+            task.cancel()
+
+    task = runner.start("stop", runner.run("stop", panel, "sma_crossover", samples, on_progress=interrupt))
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert runner.progress["stop"]["status"] == "interrupted"
+    assert not runner.running("stop")
+
+    progress = await runner.run("stop", panel, "sma_crossover", samples)
+    assert progress["skipped"] == 3 and progress["done"] == 7
+
+async def test_walk_forward_report(session_factory):
+    panel = random_panel(symbols=6, periods=240)
+    runner = SweepRunner(session_factory, workers=1)
+    splits = walk_forward_splits(240, 120, 40)
+    samples = grid({"short": [5, 10], "long": [30, 50]})
+    progress = await runner.run("wf", panel, "sma_crossover", samples, splits)
+    assert progress["done"] == 4 * len(splits) * 2
+
+    async with session_factory() as db:
+        report = await walk_forward_report(db, "wf", "total_return")
+        train = await rank_results(db, "wf", "total_return", "train", limit=None)
+    assert [s["split"] for s in report["splits"]] == [1, 2, 3]
+    backtester = Backtester()
+    for split, (train_start, test_start, test_stop) in zip(report["splits"], splits):
+        scores = {
+            params_key(p): evaluate(panel, backtester, ("sma_crossover", p, train_start, test_start, True))["total_return"]
+            for p in samples
+        }
+        assert split["train"] == pytest.approx(max(scores.values()))
+        test = evaluate(panel, backtester, ("sma_crossover", split["params"], test_start, test_stop, True))
+        assert split["test"] == pytest.approx(test["total_return"])
+        assert split["test_start"] == panel.timestamps[test_start].to_pydatetime()
+    assert report["out_of_sample"] == pytest.approx(np.mean([s["test"] for s in report["splits"]]))
+    assert all(row["segments"] == 3 for row in train)
+
+async def test_bayesian_sweep_rounds(session_factory):
+    panel = random_panel(symbols=4, periods=150)
+    runner = SweepRunner(session_factory, workers=1)
+    space = {"short": {"low": 2, "high": 20}, "long": {"low": 25, "high": 60}}
+    await runner.run_bayesian("bayes", panel, "sma_crossover", space, rounds=3, batch=4, seed=3)
+    async with session_factory() as db:
+        ranked = await rank_results(db, "bayes", limit=None)
+    assert len(ranked) == 12
+    assert len({row["params_key"] for row in ranked}) == 12
+
+async def test_sweep_endpoints(client, session_factory):
+    start = datetime.utcnow() - timedelta(days=300)
+    panel = random_panel(symbols=2, periods=200, gaps=False)
+    rows = [
+        {"symbol": symbol, "timestamp": start + timedelta(days=t), "open": 1.0, "high": 1.0, "low": 1.0,
+         "close": float(panel.fields["close"][t, i]), "volume": 1}
+        for i, symbol in enumerate(["AAA.NS", "BBB.NS"]) for t in range(200)
+    ]
+    async with session_factory() as db:
+        await db.execute(insert(StockPrice), rows)
+        await db.commit()
+
+    body = {
+        "symbols": ["AAA.NS", "BBB.NS"], "days": 365, "space": {"short": [5, 10], "long": [30, 40]},
+        "walk_forward": {"train": 100, "test": 50}, "sweep_id": "api", "metric": "total_return",
+    }
+    response = await client.post("/api/trading/sweeps", json=body)
+    assert response.status_code == 200
+    assert response.json()["splits"] == 2
+    while sweep_runner.running("api"):
+        await asyncio.sleep(0.01)
+
+    sweep = (await client.get("/api/trading/sweeps/api", params={"metric": "total_return"})).json()
+    assert sweep["progress"]["status"] == "completed" and sweep["progress"]["done"] == 16
+    assert sweep["segment"] == "test" and len(sweep["ranked"]) == 4
+    assert len(sweep["walk_forward"]["splits"]) == 2
+
+    assert (await client.post("/api/trading/sweeps", json={**body, "strategy": "nope"})).status_code == 400
+    assert (await client.post("/api/trading/sweeps", json={**body, "space": {"short": [50], "long": [20]}})).status_code == 400
+    assert (await client.post("/api/trading/sweeps", json={**body, "walk_forward": {"train": 500, "test": 50}})).status_code == 400
+    assert (await client.get("/api/trading/sweeps/missing")).status_code == 404
+    assert (await client.post("/api/trading/sweeps", json={**body, "sweep_id": "empty", "days": 50})).status_code == 400
+    changed = await client.post("/api/trading/sweeps", json={**body, "commission_rate": 0.01})
+    assert changed.status_code == 400 and "different data" in changed.json()["detail"]
+
+    # A resume keeps the stored window, so a newer bar does not change the configuration
+    async with session_factory() as db:
+        await db.execute(insert(StockPrice), [{**rows[-1], "timestamp": datetime.utcnow() + timedelta(days=1)}])
+        await db.commit()
+    resumed = await client.post("/api/trading/sweeps", json=body)
+    assert resumed.status_code == 200 and resumed.json()["start"] == response.json()["start"]
+    while sweep_runner.running("api"):
+        await asyncio.sleep(0.01)
+    assert sweep_runner.progress["api"]["skipped"] == 16
+    moved = await client.post("/api/trading/sweeps", json={**body, "end": datetime.utcnow().isoformat()})
+    assert moved.status_code == 400 and "another mode or window" in moved.json()["detail"]
+
+    # Windows are warmed on bars loaded before the requested period
+    recent = (await client.post("/api/trading/sweeps", json={
+        **body, "sweep_id": "recent", "days": 150, "walk_forward": None, "space": {"short": [5], "long": [60]}
+    })).json()
+    assert recent["warmup_bars"] >= 2 * 60
+    while sweep_runner.running("recent"):
+        await asyncio.sleep(0.01)
+    async with session_factory() as db:
+        stored = (await db.execute(select(SweepResult).where(SweepResult.sweep_id == "recent"))).scalar_one()
+    assert stored.start >= datetime.utcnow() - timedelta(days=150)
+    assert stored.trades > 0
+
+async def test_random_sweep_resumes_with_its_stored_samples(client, session_factory):
+    end = datetime(2024, 6, 28)
+    panel = random_panel(symbols=2, periods=120, gaps=False)
+    async with session_factory() as db:
+        await db.execute(insert(StockPrice), [
+            {"symbol": symbol, "timestamp": end - timedelta(days=119 - t), "open": 1.0, "high": 1.0, "low": 1.0,
+             "close": float(panel.fields["close"][t, i]), "volume": 1}
+            for i, symbol in enumerate(["AAA.NS", "BBB.NS"]) for t in range(120)
+        ])
+        await db.commit()
+
+    body = {
+        "symbols": ["AAA.NS", "BBB.NS"], "mode": "random", "samples": 4, "sweep_id": "rand",
+        "space": {"short": {"low": 3, "high": 15}, "long": {"low": 20, "high": 40}},
+        "start": (end - timedelta(days=60)).isoformat(), "end": end.isoformat(),
+    }
+    first = (await client.post("/api/trading/sweeps", json=body)).json()
+    assert first["start"] == (end - timedelta(days=60)).isoformat() and first["end"] == end.isoformat()
+    while sweep_runner.running("rand"):
+        await asyncio.sleep(0.01)
+
+    # No seed was given: the drawn one is stored and the resume replays the same samples
+    resumed = (await client.post("/api/trading/sweeps", json={k: v for k, v in body.items() if k not in ("start", "end")})).json()
+    assert resumed["seed"] == first["seed"]
+    while sweep_runner.running("rand"):
+        await asyncio.sleep(0.01)
+    progress = sweep_runner.progress["rand"]
+    assert progress["skipped"] == progress["total"] and progress["done"] == 0
+
+    report = (await client.get("/api/trading/sweeps/rand")).json()
+    assert report["config"] == {"mode": "random", "start": first["start"], "end": first["end"], "seed": first["seed"]}
+    assert (await client.post("/api/trading/sweeps", json={**body, "mode": "grid"})).status_code == 400
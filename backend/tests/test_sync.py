@@ -0,0 +1,97 @@
+"""
+Incremental sync tests
+"""
+import pytest
+from sqlalchemy import select, func
+
+from app.data.collector import DataCollector
+from app.data.providers import ReplayProvider, synthetic_history
+from app.data.sync import SyncQueueFull, sync_jobs, sync_symbol
+from app.database.init_db import AsyncSessionLocal
+from app.models.stock_data import StockPrice
+
+SYMBOL = "HDFCBANK.NS"
+
+@pytest.fixture
+def history():
+    return synthetic_history(600, seed=11)
+
+def make_collector(df):
+    return DataCollector(symbols=[SYMBOL], provider=ReplayProvider(frames={SYMBOL: df}))
+
+async def test_delta_sync_fetches_only_new_bars(test_db, history):
+    """A second sync adds only the bars after the last stored timestamp"""
+    first = await sync_symbol(test_db, SYMBOL, make_collector(history.iloc[:500]))
+    assert first["rows_added"] == 500
+    
+    second = await sync_symbol(test_db, SYMBOL, make_collector(history))
+    assert second["rows_added"] == 100
+    assert second["bytes_fetched"] > 0
+    
+    count = (await test_db.execute(
+        select(func.count()).select_from(StockPrice).where(StockPrice.symbol == SYMBOL)
+    )).scalar()
+    assert count == 600
+    
+    again = await sync_symbol(test_db, SYMBOL, make_collector(history))
+    assert again["rows_added"] == 0
+
+async def test_tail_indicators_match_full_recompute(test_db, history):
+    """Warm-up window indicators agree with a full-history computation"""
+    await sync_symbol(test_db, SYMBOL, make_collector(history.iloc[:500]))
+    await sync_symbol(test_db, SYMBOL, make_collector(history))
+    
+    expected = make_collector(history).add_technical_indicators(history.copy())
+    rows = (await test_db.execute(
+        select(StockPrice).where(StockPrice.symbol == SYMBOL).order_by(StockPrice.timestamp)
+    )).scalars().all()
+    
+    for row, (_, bar) in zip(rows[500:], expected.iloc[500:].iterrows()):
+        assert row.rsi == pytest.approx(bar.rsi, rel=1e-6)
+        assert row.macd == pytest.approx(bar.macd, rel=1e-6, abs=1e-6)
+        assert row.macd_signal == pytest.approx(bar.macd_signal, rel=1e-6, abs=1e-6)
+        assert row.sma_50 == pytest.approx(bar.sma_50, rel=1e-9)
+
+@pytest.fixture
+def test_jobs(session_factory, history):
+    """Point the shared job manager at the test database and replay data"""
+    sync_jobs.session_factory = session_factory
+    sync_jobs.collector = make_collector(history.iloc[:400])
+    yield sync_jobs
+    sync_jobs.session_factory = AsyncSessionLocal
+    sync_jobs.collector = None
+
+async def test_sync_job_endpoint(client, test_jobs):
+    """POST returns a job id whose status reports the sync"""
+    response = await client.post(f"/api/data/sync/{SYMBOL}")
+    assert response.status_code == 200
+    job_id = response.json()["job_id"]
+    
+    status = (await client.get(f"/api/data/sync/jobs/{job_id}")).json()
+    assert status["status"] == "completed"
+    assert status["rows_added"] == 400
+    assert status["bytes_fetched"] > 0
+    assert status["elapsed"] > 0
+    
+    missing = await client.get("/api/data/sync/jobs/unknown")
+    assert missing.status_code == 404
+
+async def test_job_registry_is_bounded(client, test_jobs):
+    """Finished jobs make room; a registry full of unfinished jobs rejects new ones"""
+    test_jobs.jobs.clear()
+    test_jobs.max_jobs = 2
+    try:
+        first = test_jobs.create("A")
+        test_jobs.create("B")
+        first["status"] = "completed"
+        third = test_jobs.create("C")
+        assert first["job_id"] not in test_jobs.jobs and third["job_id"] in test_jobs.jobs
+        
+        with pytest.raises(SyncQueueFull):
+            test_jobs.create("D")
+        response = await client.post(f"/api/data/sync/{SYMBOL}")
+        assert response.status_code == 429
+        assert len(test_jobs.jobs) == 2
+    finally:
+        test_jobs.max_jobs = 500
+        test_jobs.jobs.clear()
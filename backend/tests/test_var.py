@@ -0,0 +1,152 @@
+"""
+VaR / CVaR engine tests
+"""
+import asyncio
+from datetime import datetime, timedelta
+from statistics import NormalDist
+
+import numpy as np
+import pytest
+from sqlalchemy import insert
+
+from app.models.portfolio import Position
+from app.models.stock_data import StockPrice
+from app.trading.mark_to_market import mark_to_market
+from app.trading.var import (
+    VaREngine, cholesky_factor, exposures_hash, historical_var, parametric_var, simulate_pnl, positions_hash
+)
+
+COVARIANCE = np.array([[4e-4, 1.2e-4], [1.2e-4, 9e-4]])
+EXPOSURES = np.array([60_000.0, 40_000.0])
+
+def correlated_returns(n=2000, seed=11):
+    rng = np.random.default_rng(seed)
+    return rng.multivariate_normal([0.0005, 0.0002], COVARIANCE, size=n)
+
+def analytic_var(confidence):
+    sd = np.sqrt(EXPOSURES @ COVARIANCE @ EXPOSURES)
+    return -NormalDist().inv_cdf(1 - confidence) * sd
+
+def test_cholesky_reproduces_covariance():
+    factor = cholesky_factor(COVARIANCE)
+    assert np.allclose(factor @ factor.T, COVARIANCE)
+    singular = np.array([[1.0, 1.0], [1.0, 1.0]])
+    factor = cholesky_factor(singular)
+    assert np.allclose(factor @ factor.T, singular, atol=1e-6)
+
+def test_methods_agree_on_normal_returns():
+    returns = correlated_returns()
+    expected = analytic_var(0.99)
+    parametric = parametric_var(returns, EXPOSURES, 0.99)
+    historical = historical_var(returns, EXPOSURES, 0.99)
+    assert parametric["var"] == pytest.approx(expected, rel=0.08)
+    assert historical["var"] == pytest.approx(expected, rel=0.15)
+    assert parametric["cvar"] > parametric["var"]
+    assert historical["cvar"] >= historical["var"]
+    assert parametric_var(returns, EXPOSURES, 0.99, horizon=4)["var"] == pytest.approx(
+        2 * parametric["var"] - 2 * float(returns.mean(axis=0) @ EXPOSURES), rel=1e-9
+    )
+
+def test_horizon_scaling_is_consistent_across_methods():
+    returns = correlated_returns(5000)
+    mean = float(returns.mean(axis=0) @ EXPOSURES)
+    one_day = historical_var(returns, EXPOSURES, 0.99)
+    # Mean grows with the horizon, deviations with its square root
+    assert historical_var(returns, EXPOSURES, 0.99, horizon=4)["var"] == pytest.approx(
+        2 * one_day["var"] - 2 * mean, rel=1e-9
+    )
+    assert historical_var(returns, EXPOSURES, 0.99, horizon=10)["var"] == pytest.approx(
+        parametric_var(returns, EXPOSURES, 0.99, horizon=10)["var"], rel=0.1
+    )
+
+def test_simulation_matches_covariance():
+    pnl = simulate_pnl(np.zeros(2), cholesky_factor(COVARIANCE), EXPOSURES, 200_000, seed=1)
+    assert pnl.std() == pytest.approx(np.sqrt(EXPOSURES @ COVARIANCE @ EXPOSURES), rel=0.01)
+
+async def test_monte_carlo_chunks_are_reproducible():
+    returns = correlated_returns()
+    engine = VaREngine(workers=1, chunk_paths=30_000)
+    first = await engine.monte_carlo_var(returns, EXPOSURES, 0.99, paths=100_000, seed=5)
+    second = await engine.monte_carlo_var(returns, EXPOSURES, 0.99, paths=100_000, seed=5)
+    assert first == second
+    assert first["var"] == pytest.approx(parametric_var(returns, EXPOSURES, 0.99)["var"], rel=0.05)
+
+async def test_in_process_simulation_leaves_event_loop_free():
+    returns = correlated_returns()
+    engine = VaREngine(workers=1, chunk_paths=200_000)
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0)
+
+    ticker = asyncio.create_task(tick())
+    await engine.monte_carlo_var(returns, EXPOSURES, 0.99, paths=1_000_000, seed=3)
+    ticker.cancel()
+    assert ticks > 1
+
+async def test_process_pool_matches_in_process():
+    returns = correlated_returns()
+    pooled = VaREngine(workers=2, chunk_paths=50_000)
+    try:
+        result = await pooled.monte_carlo_var(returns, EXPOSURES, 0.95, paths=100_000, seed=9)
+    finally:
+        pooled.shutdown()
+    serial = await VaREngine(workers=1, chunk_paths=50_000).monte_carlo_var(
+        returns, EXPOSURES, 0.95, paths=100_000, seed=9
+    )
+    assert result == serial
+
+def test_positions_hash_ignores_order_and_flat_positions():
+    assert positions_hash(["A", "B"], [1, 2]) == positions_hash(["B", "A", "C"], [2, 1, 0])
+    assert positions_hash(["A"], [1]) != positions_hash(["A"], [2])
+
+def test_exposures_hash_is_coarse():
+    assert exposures_hash(["A", "B"], [60_010.0, 40_000.0]) == exposures_hash(["B", "A"], [40_020.0, 60_040.0])
+    assert exposures_hash(["A"], [60_000.0]) != exposures_hash(["A"], [61_000.0])
+
+async def test_var_endpoint(client, session_factory):
+    returns = correlated_returns(300)
+    closes = 100 * np.cumprod(1 + returns, axis=0)
+    start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=300)
+    async with session_factory() as db:
+        await db.execute(insert(StockPrice), [
+            {"symbol": symbol, "timestamp": start + timedelta(days=i), "open": c, "high": c,
+             "low": c, "close": float(c), "volume": 0}
+            for j, symbol in enumerate(["AAA", "BBB"]) for i, c in enumerate(closes[:, j])
+        ])
+        await db.execute(insert(Position), [
+            {"symbol": "AAA", "quantity": 600, "avg_entry_price": 90.0, "current_price": 100.0,
+             "unrealized_pnl": 0.0, "unrealized_pnl_percent": 0.0},
+            {"symbol": "BBB", "quantity": 400, "avg_entry_price": 90.0, "current_price": 100.0,
+             "unrealized_pnl": 0.0, "unrealized_pnl_percent": 0.0},
+            {"symbol": "NEW", "quantity": 10, "avg_entry_price": 5.0, "current_price": 5.0,
+             "unrealized_pnl": 0.0, "unrealized_pnl_percent": 0.0},
+        ])
+        await db.commit()
+    
+    params = {"method": "monte_carlo", "confidence": 0.99, "paths": 20_000}
+    first = (await client.get("/api/portfolio/var", params=params)).json()
+    assert first["symbols"] == ["AAA", "BBB"]
+    assert first["missing"] == ["NEW"]
+    assert first["observations"] == 299
+    assert first["var"] == pytest.approx(analytic_var(0.99), rel=0.25)
+    assert first["cvar"] > first["var"] > 0
+    assert not first["cached"]
+    
+    second = (await client.get("/api/portfolio/var", params=params)).json()
+    assert second["cached"] and second["var"] == first["var"]
+    seeded = (await client.get("/api/portfolio/var", params={**params, "seed": 5})).json()
+    assert not seeded["cached"]
+    assert (await client.get("/api/portfolio/var", params={**params, "seed": 5})).json()["cached"]
+    
+    # A price move changes the exposures and so the cache key
+    mark_to_market.update_prices({"AAA": 110.0})
+    moved = (await client.get("/api/portfolio/var", params=params)).json()
+    assert not moved["cached"] and moved["portfolio_value"] == first["portfolio_value"] + 6000
+    
+    historical = (await client.get("/api/portfolio/var")).json()
+    assert historical["method"] == "historical" and not historical["cached"]
+    assert (await client.get("/api/portfolio/var", params={"method": "garch"})).status_code == 400
@@ -13,7 +13,10 @@ export const api = {
   // Portfolio
   getPositions: () => fetch(`${API_BASE_URL}/api/portfolio/positions`).then(r => r.json()),
   getMetrics: () => fetch(`${API_BASE_URL}/api/portfolio/metrics`).then(r => r.json()),
-  getPerformance: (days = 30) => fetch(`${API_BASE_URL}/api/portfolio/performance?days=${days}`).then(r => r.json()),
+  getRisk: (windows = '20,60,252') => fetch(`${API_BASE_URL}/api/portfolio/risk?windows=${windows}`).then(r => r.json()),
+  getVaR: (method = 'historical', confidence = 0.95, horizon = 1) => fetch(`${API_BASE_URL}/api/portfolio/var?method=${method}&confidence=${confidence}&horizon=${horizon}`).then(r => r.json()),
+  getTargetWeights: (method = 'min_variance', symbols?: string[]) => fetch(`${API_BASE_URL}/api/portfolio/optimize?method=${method}${symbols ? `&symbols=${encodeURIComponent(symbols.join(','))}` : ''}`).then(r => r.json()),
+  getPerformance: (days = 30, points?: number) => fetch(`${API_BASE_URL}/api/portfolio/performance?days=${days}${points ? `&points=${points}` : ''}`).then(r => r.json()),
   
   // Trading
   getTrades: (limit = 50) => fetch(`${API_BASE_URL}/api/trading/trades?limit=${limit}`).then(r => r.json()),
@@ -22,11 +25,16 @@ export const api = {
     headers: { 'Content-Type': 'application/json' },
     body: JSON.stringify(order)
   }).then(r => r.json()),
+  runBacktest: (strategy = 'sma_crossover', symbols?: string[], days = 730, vectorized = false) => fetch(`${API_BASE_URL}/api/trading/backtest?strategy=${strategy}&days=${days}&vectorized=${vectorized}${symbols ? `&symbols=${encodeURIComponent(symbols.join(','))}` : ''}`).then(r => r.json()),
+  startSweep: (sweep: Record<string, unknown>) => fetch(`${API_BASE_URL}/api/trading/sweeps`, { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify(sweep) }).then(r => r.json()),
+  getSweep: (sweepId: string, metric = 'sharpe', limit = 20) => fetch(`${API_BASE_URL}/api/trading/sweeps/${sweepId}?metric=${metric}&limit=${limit}`).then(r => r.json()),
+  cancelOrder: (orderId: number) => fetch(`${API_BASE_URL}/api/trading/orders/${orderId}`, { method: 'DELETE' }).then(r => r.json()),
   
   // ML
   getSignals: () => fetch(`${API_BASE_URL}/api/ml/signals`).then(r => r.json()),
   getPredictions: (symbol: string) => fetch(`${API_BASE_URL}/api/ml/predictions/${symbol}`).then(r => r.json()),
   
   // Data
-  getPrice: (symbol: string, days = 30) => fetch(`${API_BASE_URL}/api/data/price/${symbol}?days=${days}`).then(r => r.json()),
+  getPrice: (symbol: string, days = 30, points?: number) => fetch(`${API_BASE_URL}/api/data/price/${symbol}?days=${days}${points ? `&points=${points}` : ''}`).then(r => r.json()),
+  getPrices: (symbols: string[], days = 30, fields = ['close']) => fetch(`${API_BASE_URL}/api/data/prices?symbols=${encodeURIComponent(symbols.join(','))}&days=${days}&fields=${fields.join(',')}`).then(r => r.json()),
 };